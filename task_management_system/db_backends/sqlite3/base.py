@@ -0,0 +1,225 @@
+"""
+SQLite backend tuned for concurrent use.
+
+Use it with ``'ENGINE': 'task_management_system.db_backends.sqlite3'``. On top of
+Django's stock SQLite backend it
+
+* applies the per-connection PRAGMAs given in ``OPTIONS['pragmas']``
+  (``busy_timeout``, ``synchronous``, ``mmap_size``, ``cache_size``, ...) to
+  every new connection,
+* applies the PRAGMAs that are stored in the database file (``journal_mode``)
+  only when asked to, through ``apply_persistent_pragmas()`` or the
+  ``sqlite_pragmas`` command, so opening a connection never rewrites the file,
+  and
+* with ``OPTIONS['serialize_writes']`` routes writers through a single FIFO
+  queue. ``atomic()`` blocks wait their turn and then start with ``BEGIN
+  IMMEDIATE``, and standalone INSERT/UPDATE/DELETE statements wait for the
+  queue for the duration of the statement. Reads outside transactions never
+  touch the queue and run in parallel under WAL.
+
+There is one queue for every database of the process, not one per database,
+and a thread that holds it can take it again, e.g. for a shard's transaction
+nested in the primary's. With a queue per database, two threads opening
+transactions on the same two databases in opposite orders (shard then
+primary, primary then shard) would each hold one queue and wait for the
+other's until the timeout. The price is that in-process writers to different
+database files take turns too.
+
+Stock SQLite starts transactions as ``BEGIN`` (deferred). Two such transactions
+that read and then write cannot both upgrade to a write lock, and SQLite
+fails one of them immediately with "database is locked" without waiting for
+``busy_timeout``. Taking the queue up front and starting the transaction
+IMMEDIATE removes that failure mode inside a process; ``busy_timeout`` still
+covers contention between processes.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+from django.db.backends.sqlite3 import base
+
+WRITE_STATEMENT_RE = re.compile(
+    r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE
+)
+
+# PRAGMAs whose setting is written to the database file instead of the connection
+PERSISTENT_PRAGMAS = {'journal_mode'}
+
+class WriteQueue:
+    """First-come, first-served lock, re-entrant per thread"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting = deque()
+        self._owner = None
+        self._depth = 0
+
+    def acquire(self, timeout):
+        me = threading.get_ident()
+        ticket = object()
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            if self._owner == me:
+                self._depth += 1
+                return
+            self._waiting.append(ticket)
+            while self._owner is not None or self._waiting[0] is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._condition.notify_all()
+                    raise base.Database.OperationalError(
+                        'database is locked (timed out waiting for the writer queue)'
+                    )
+                self._condition.wait(remaining)
+            self._waiting.popleft()
+            self._owner = me
+            self._depth = 1
+
+    def release(self):
+        with self._condition:
+            self._depth -= 1
+            if self._depth == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+
+# Shared by every database, so writers can't wait for each other in a cycle
+write_queue = WriteQueue()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite connection with per-connection PRAGMAs and serialized writers"""
+
+    # Milliseconds, used when OPTIONS['pragmas'] doesn't set busy_timeout
+    default_busy_timeout = 5000
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict.get('OPTIONS', {})
+        self.pragmas = dict(options.get('pragmas', {}))
+        self.serialize_writes = options.get('serialize_writes', False)
+        self.holds_write_lock = False
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        # Our options are not sqlite3.connect() arguments
+        params.pop('pragmas', None)
+        params.pop('serialize_writes', None)
+        params.setdefault('timeout', self.busy_timeout / 1000)
+        return params
+
+    @property
+    def busy_timeout(self):
+        return int(self.pragmas.get('busy_timeout', self.default_busy_timeout))
+
+    @property
+    def write_queue(self):
+        return write_queue
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            if name not in PERSISTENT_PRAGMAS:
+                conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def apply_persistent_pragmas(self):
+        """
+        Write the PRAGMAs that persist in the database file (e.g. WAL journal
+        mode) and return their resulting values as a name -> value dict.
+        """
+        results = {}
+        if self.is_in_memory_db():
+            return results
+        with self.cursor() as cursor:
+            for name, value in self.pragmas.items():
+                if name in PERSISTENT_PRAGMAS:
+                    cursor.execute(f'PRAGMA {name} = {value}')
+                    row = cursor.fetchone()
+                    results[name] = row[0] if row else value
+        return results
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=SQLiteCursorWrapper)
+        cursor.database_wrapper = self
+        return cursor
+
+    def acquire_write_lock(self):
+        if self.serialize_writes and not self.holds_write_lock:
+            self.write_queue.acquire(self.busy_timeout / 1000)
+            self.holds_write_lock = True
+
+    def release_write_lock(self):
+        if self.holds_write_lock:
+            self.holds_write_lock = False
+            self.write_queue.release()
+
+    def _start_transaction_under_autocommit(self):
+        if not self.serialize_writes:
+            return super()._start_transaction_under_autocommit()
+        with self.wrap_database_errors:
+            self.acquire_write_lock()
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self.release_write_lock()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_write_lock()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_write_lock()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_write_lock()
+
+
+class SQLiteCursorWrapper(base.SQLiteCursorWrapper):
+    """Cursor that takes the write queue for standalone write statements"""
+
+    database_wrapper = None
+
+    def execute(self, query, params=None):
+        with self._write_turn(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self._write_turn(query):
+            return super().executemany(query, param_list)
+
+    def _write_turn(self, query):
+        return _WriteTurn(self.database_wrapper, query)
+
+
+class _WriteTurn:
+    """Hold the write queue around one statement when it writes outside a transaction"""
+
+    def __init__(self, database_wrapper, query):
+        self.database_wrapper = database_wrapper
+        self.needed = (
+            database_wrapper is not None
+            and database_wrapper.serialize_writes
+            and not database_wrapper.holds_write_lock
+            and WRITE_STATEMENT_RE.match(query) is not None
+        )
+
+    def __enter__(self):
+        if self.needed:
+            self.database_wrapper.acquire_write_lock()
+
+    def __exit__(self, *exc_info):
+        # Keep the lock if the statement opened a transaction (autocommit off)
+        if self.needed and not self.database_wrapper.connection.in_transaction:
+            self.database_wrapper.release_write_lock()
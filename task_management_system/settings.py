@@ -6,6 +6,7 @@ Generated by 'django-admin startproject' using Django 4.2.
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tasks.replicas.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,9 +76,10 @@ TEMPLATES = [
 WSGI_APPLICATION = 'task_management_system.wsgi.application'
 
 # Database (can also be switched via env)
+SQLITE_ENGINE = 'task_management_system.db_backends.sqlite3'
 DATABASES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'ENGINE': os.getenv('DB_ENGINE', SQLITE_ENGINE),
         'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
         'USER': os.getenv('DB_USER', ''),
         'PASSWORD': os.getenv('DB_PASSWORD', ''),
@@ -85,6 +88,48 @@ DATABASES = {
     }
 }
 
+# Concurrency profile for the SQLite backend (see db_backends/sqlite3/base.py)
+if DATABASES['default']['ENGINE'] == SQLITE_ENGINE:
+    DATABASES['default']['OPTIONS'] = {
+        'pragmas': {
+            'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+            'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+            'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+            'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+            'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),  # negative = KiB
+        },
+        'serialize_writes': os.getenv('SQLITE_SERIALIZE_WRITES', 'True') == 'True',
+    }
+
+# Read replicas: DB_REPLICAS lists replica database names (SQLite files locally),
+# each using the primary's engine and credentials (see tasks/replicas.py)
+DATABASE_REPLICAS = []
+for index, replica_name in enumerate(filter(None, os.getenv('DB_REPLICAS', '').split(',')), start=1):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': replica_name.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Task sharding: DB_SHARDS lists shard database names (SQLite files locally),
+# each using the primary's engine and credentials. Tasks, comments and history
+# are spread over them by assignee (see tasks/sharding.py).
+TASK_SHARDS = []
+for index, shard_name in enumerate(filter(None, os.getenv('DB_SHARDS', '').split(',')), start=1):
+    alias = f'shard{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': shard_name.strip(),
+    }
+    TASK_SHARDS.append(alias)
+
+DATABASE_ROUTERS = ['tasks.sharding.ShardRouter', 'tasks.replicas.PrimaryReplicaRouter']
+
+# How long a user's reads stay on the primary after they write
+READ_YOUR_WRITES_SECONDS = int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '10'))
+
 # Custom user model
 AUTH_USER_MODEL = 'tasks.User'
 
@@ -111,6 +156,97 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# TaskHistory archive (see tasks/history_archive.py)
+HISTORY_ARCHIVE_DIR = Path(os.getenv('HISTORY_ARCHIVE_DIR', BASE_DIR / 'archive' / 'history'))
+HISTORY_ARCHIVE_AFTER_DAYS = int(os.getenv('HISTORY_ARCHIVE_AFTER_DAYS', '180'))
+
+# Completed task archive tier (see tasks/task_archive.py)
+TASK_ARCHIVE_AFTER_DAYS = int(os.getenv('TASK_ARCHIVE_AFTER_DAYS', '90'))
+
+# Rows removed per transaction when purging deleted tasks and users (see tasks/deletion.py)
+DELETION_CHUNK_SIZE = int(os.getenv('DELETION_CHUNK_SIZE', '500'))
+
+# Tasks updated per transaction by admin bulk updates (see tasks/bulk_update.py)
+BULK_UPDATE_CHUNK_SIZE = int(os.getenv('BULK_UPDATE_CHUNK_SIZE', '500'))
+
+# Most task ids one GET /api/tasks/batch/ request may ask for
+TASK_BATCH_MAX_IDS = int(os.getenv('TASK_BATCH_MAX_IDS', '300'))
+
+# Most sub-requests one POST /api/batch/ request may carry
+BATCH_MAX_REQUESTS = int(os.getenv('BATCH_MAX_REQUESTS', '50'))
+
+# Task change feed (see tasks/changes.py): days change log entries, and so
+# sync tokens, are kept, and the most changes one GET /api/tasks/changes/ returns
+TASK_CHANGES_KEEP_DAYS = int(os.getenv('TASK_CHANGES_KEEP_DAYS', '30'))
+TASK_CHANGES_MAX_LIMIT = int(os.getenv('TASK_CHANGES_MAX_LIMIT', '500'))
+
+# Server-sent task events (see tasks/events.py): how often each worker's hub
+# polls the change log, events queued per stream before a slow client is
+# left to catch up from the log, keepalive interval and stream lifetime
+TASK_EVENTS_POLL_SECONDS = float(os.getenv('TASK_EVENTS_POLL_SECONDS', '1'))
+TASK_EVENTS_QUEUE_SIZE = int(os.getenv('TASK_EVENTS_QUEUE_SIZE', '100'))
+TASK_EVENTS_HEARTBEAT_SECONDS = float(os.getenv('TASK_EVENTS_HEARTBEAT_SECONDS', '15'))
+TASK_EVENTS_MAX_SECONDS = float(os.getenv('TASK_EVENTS_MAX_SECONDS', '300'))
+
+# Activity feeds (see tasks/activity.py): entries kept per user, days they
+# are kept, and the most entries one GET /api/activity/ returns
+ACTIVITY_FEED_MAX_ENTRIES = int(os.getenv('ACTIVITY_FEED_MAX_ENTRIES', '500'))
+ACTIVITY_FEED_KEEP_DAYS = int(os.getenv('ACTIVITY_FEED_KEEP_DAYS', '90'))
+ACTIVITY_FEED_MAX_LIMIT = int(os.getenv('ACTIVITY_FEED_MAX_LIMIT', '100'))
+
+# Due-date reminders (see tasks/reminders.py), sent by manage.py run_workers:
+# hours before the due date, how far ahead the scheduler loads, and where
+# reminders go (log, feed, webhook, or sinks registered with @reminder_sink)
+REMINDER_LEAD_HOURS = float(os.getenv('REMINDER_LEAD_HOURS', '24'))
+REMINDER_LOOKAHEAD_SECONDS = int(os.getenv('REMINDER_LOOKAHEAD_SECONDS', '300'))
+REMINDER_SINKS = [name for name in os.getenv('REMINDER_SINKS', 'log,feed,webhook').split(',') if name]
+
+# Recurring tasks (see tasks/recurrence.py): days ahead occurrences are
+# materialized, rules taken per background job run, tasks per bulk INSERT,
+# and how often manage.py run_workers looks for rules falling due
+RECURRENCE_HORIZON_DAYS = int(os.getenv('RECURRENCE_HORIZON_DAYS', '14'))
+RECURRENCE_RULES_PER_RUN = int(os.getenv('RECURRENCE_RULES_PER_RUN', '200'))
+RECURRENCE_BATCH_SIZE = int(os.getenv('RECURRENCE_BATCH_SIZE', '500'))
+RECURRENCE_CHECK_SECONDS = int(os.getenv('RECURRENCE_CHECK_SECONDS', '300'))
+
+# Outbound webhooks (see tasks/webhooks.py): events per delivery, request
+# timeout, retries (backoff doubling from WEBHOOK_RETRY_BACKOFF_SECONDS up to
+# WEBHOOK_RETRY_MAX_DELAY_SECONDS) before an event is dead-lettered
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '100'))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv('WEBHOOK_TIMEOUT_SECONDS', '10'))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '8'))
+WEBHOOK_RETRY_BACKOFF_SECONDS = float(os.getenv('WEBHOOK_RETRY_BACKOFF_SECONDS', '30'))
+WEBHOOK_RETRY_MAX_DELAY_SECONDS = float(os.getenv('WEBHOOK_RETRY_MAX_DELAY_SECONDS', '3600'))
+
+# In-process user directory (see tasks/user_directory.py): users kept per
+# process, and seconds an entry is served before it is reloaded
+USER_DIRECTORY_SIZE = int(os.getenv('USER_DIRECTORY_SIZE', '10000'))
+USER_DIRECTORY_TTL_SECONDS = float(os.getenv('USER_DIRECTORY_TTL_SECONDS', '300'))
+
+# Optimistic concurrency: task writes that send the task's ETag in If-Match
+# get 412 if it is out of date. Set to True once every client sends it, to
+# refuse writes without it (428).
+TASK_REQUIRE_IF_MATCH = os.getenv('TASK_REQUIRE_IF_MATCH', 'False') == 'True'
+
+# Idempotency-Key on write requests (see tasks/idempotency.py): hours a key
+# and its stored response are kept, how long a retry waits for the request
+# it duplicates, and after how long a request holding a key is presumed dead
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv('IDEMPOTENCY_WAIT_SECONDS', '10'))
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = int(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT_SECONDS', '60'))
+
+# Background jobs for request side effects (see tasks/jobs.py).
+# JOB_WORKERS threads per web process; 0 leaves every job to manage.py run_workers.
+# The test runner sets it to 0 (tests run jobs with run_pending()).
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv('JOB_RETRY_BACKOFF_SECONDS', '5'))
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv('JOB_LOCK_TIMEOUT_SECONDS', '600'))
+JOB_KEEP_FINISHED_DAYS = int(os.getenv('JOB_KEEP_FINISHED_DAYS', '7'))
+
+# Runs the tests without job threads (see tasks/tests/runner.py)
+TEST_RUNNER = 'tasks.tests.runner.TestRunner'
+
 # Default primary key field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -152,6 +288,9 @@ SIMPLE_JWT = {
 # CORS
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
+# Browsers only let clients read these response headers, and send these request headers, when allowed
+CORS_EXPOSE_HEADERS = ['ETag', 'Idempotent-Replayed']
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match', 'idempotency-key', 'last-event-id')
 
 # Logging
 LOGGING = {
@@ -0,0 +1,180 @@
+"""
+Per-user activity feeds: what happened to the tasks a user is assigned,
+created or commented on.
+
+Feeds are fanned out on write. Whenever history entries or comments are
+recorded, ``publish_activity`` enqueues a job that works out who is
+interested in each task (its assignee, its creator and everyone who
+commented on it, except whoever did it) and copies a compact, self-contained
+``ActivityEntry`` into each of their feeds. Entries live on the reader's
+shard, so reading a feed is one range scan over (user_id, id), newest first,
+with ids as cursors.
+
+A user's ``ActivityFeed`` row holds the last entry id they have read; the
+unread count is the number of entries after it. Feeds are trimmed to the
+newest ``ACTIVITY_FEED_MAX_ENTRIES`` entries as they grow, and entries older
+than ``ACTIVITY_FEED_KEEP_DAYS`` are pruned by the job workers.
+
+Each event is keyed by its task, action, summary and the second it
+happened at, and a feed holds an event once: a retried fan-out doesn't add
+it twice, nor do the identical history entries a view and the Task signals
+may both record for one change.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import Truncator
+
+from .jobs import enqueue, job_handler
+from .models import ActivityEntry, ActivityFeed, Task, TaskComment
+from .sharding import scatter, shard_for_user, shards_for_tasks
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_LENGTH = ActivityEntry._meta.get_field('summary').max_length
+
+
+def activity_event(task_id, actor_id, action, summary, timestamp=None):
+    """An event for publish_activity"""
+    return {
+        'task_id': task_id,
+        'actor_id': actor_id,
+        'action': action,
+        'summary': Truncator(summary).chars(SUMMARY_LENGTH),
+        'timestamp': (timestamp or timezone.now()).isoformat(),
+    }
+
+
+def event_key(event):
+    identity = f"{event['task_id']}|{event['action']}|{event['summary']}|{event['timestamp'][:19]}"
+    return hashlib.md5(identity.encode()).hexdigest()
+
+
+def publish_activity(events, using=None):
+    """
+    Fan events out to the feeds of the users interested in their tasks, in
+    the background, once the transaction open on `using` commits.
+    """
+    if not events:
+        return
+    for event in events:
+        event.setdefault('key', event_key(event))
+    enqueue('fan_out_activity', {'events': events}, using=using)
+
+
+def _feed_database(user):
+    """Where a user's feed is: their shard, or always the primary (not a replica) when not sharded"""
+    return shard_for_user(user) or DEFAULT_DB_ALIAS
+
+
+def _interested_users(task_ids):
+    """{task id: (title, user ids interested in it)} for the tasks that still exist"""
+    by_shard = {}
+    for task_id, using in shards_for_tasks(task_ids).items():
+        by_shard.setdefault(using, []).append(task_id)
+
+    interested = {}
+    for using, ids in by_shard.items():
+        for task_id, title, assignee_id, creator_id in (
+            Task.objects.using(using).filter(id__in=ids).values_list('id', 'title', 'assigned_to_id', 'created_by_id')
+        ):
+            interested[task_id] = (title, {assignee_id, creator_id})
+        commenters = (
+            TaskComment.objects.using(using).filter(task_id__in=ids)
+            .values_list('task_id', 'author_id').distinct()
+        )
+        for task_id, author_id in commenters:
+            if task_id in interested:
+                interested[task_id][1].add(author_id)
+    return interested
+
+
+def trim_feeds(user_ids, using):
+    """Drop all but the newest ACTIVITY_FEED_MAX_ENTRIES entries of each user's feed"""
+    keep = settings.ACTIVITY_FEED_MAX_ENTRIES
+    entries = ActivityEntry.objects.using(using)
+    for user_id in user_ids:
+        oldest_kept = entries.filter(user_id=user_id).order_by('-id').values_list('id', flat=True)[keep - 1:keep].first()
+        if oldest_kept is not None:
+            entries.filter(user_id=user_id, id__lt=oldest_kept).delete()
+
+
+@job_handler('fan_out_activity', batch_size=50)
+def fan_out_activity(payloads):
+    """Copy published events into the feeds of the users interested in their tasks"""
+    events = [event for payload in payloads for event in payload['events']]
+    interested = _interested_users({event['task_id'] for event in events})
+
+    by_shard = {}
+    for event in events:
+        if event['task_id'] not in interested:
+            continue
+        title, user_ids = interested[event['task_id']]
+        for user_id in user_ids - {event['actor_id']}:
+            by_shard.setdefault(_feed_database(user_id), []).append(ActivityEntry(
+                user_id=user_id,
+                task_id=event['task_id'],
+                actor_id=event['actor_id'],
+                action=event['action'],
+                task_title=title,
+                summary=event['summary'],
+                created_at=parse_datetime(event['timestamp']),
+                event_key=event['key'],
+            ))
+
+    for using, entries in by_shard.items():
+        with transaction.atomic(using=using):
+            ActivityEntry.objects.using(using).bulk_create(entries, ignore_conflicts=True)
+            trim_feeds({entry.user_id for entry in entries}, using=using)
+    logger.debug(f"Fanned out {len(events)} activity events")
+
+
+def read_feed(user, before=None, limit=20):
+    """
+    Up to `limit` entries of a user's feed, newest first, older than the entry
+    id `before` if given. Returns (entries, has_more).
+    """
+    entries = ActivityEntry.objects.using(_feed_database(user)).filter(user_id=user.pk)
+    if before is not None:
+        entries = entries.filter(id__lt=before)
+    page = list(entries.order_by('-id')[:limit + 1])
+    return page[:limit], len(page) > limit
+
+
+def unread_count(user):
+    """(last read entry id, number of entries after it) of a user's feed"""
+    using = _feed_database(user)
+    last_read_id = (
+        ActivityFeed.objects.using(using).filter(user_id=user.pk).values_list('last_read_id', flat=True).first() or 0
+    )
+    count = ActivityEntry.objects.using(using).filter(user_id=user.pk, id__gt=last_read_id).count()
+    return last_read_id, count
+
+
+def mark_feed_read(user, up_to=None):
+    """Mark a user's feed read up to entry id `up_to` (the newest entry by default). Never moves back."""
+    using = _feed_database(user)
+    if up_to is None:
+        up_to = (
+            ActivityEntry.objects.using(using).filter(user_id=user.pk)
+            .order_by('-id').values_list('id', flat=True).first() or 0
+        )
+    with transaction.atomic(using=using):
+        feed, _ = ActivityFeed.objects.using(using).select_for_update().get_or_create(user_id=user.pk)
+        if up_to > feed.last_read_id:
+            feed.last_read_id = up_to
+            feed.read_at = timezone.now()
+            feed.save(update_fields=['last_read_id', 'read_at'])
+    return feed.last_read_id
+
+
+def prune_activity(days=None):
+    """Delete feed entries older than `days` (ACTIVITY_FEED_KEEP_DAYS). Returns the number deleted."""
+    days = settings.ACTIVITY_FEED_KEEP_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return sum(scatter(lambda alias: ActivityEntry.objects.using(alias).filter(created_at__lt=cutoff).delete()[0]))
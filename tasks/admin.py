@@ -1,17 +1,159 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.utils.html import format_html
-from .models import User, Task, TaskComment, TaskHistory
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import BooleanField, Case, Count, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.forms.models import BaseInlineFormSet
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
+from .history_archive import get_archived_history
+from .deletion import schedule_task_deletion, schedule_user_deletion
+from .models import User, Task, TaskComment, TaskHistory, ArchivedTask, DeletionJob, BackgroundJob
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the database's row estimate for unfiltered changelists
+    instead of a full COUNT(*), falling back to an exact count when filtered.
+    
+    Hiding soft-deleted rows doesn't count as filtering: the purge job keeps
+    them few, so the table's estimate stays close.
+    """
+
+    # Below this many rows an exact count is cheap enough to keep
+    estimate_threshold = 10000
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is not None and estimate > self.estimate_threshold:
+            return estimate
+        return super().count
+
+    def _estimated_count(self):
+        """Return the planner's row estimate for the table, or None"""
+        query = getattr(self.object_list, 'query', None)
+        if query is None or not self._is_unfiltered(query):
+            return None
+
+        table = query.model._meta.db_table
+        connection = connections[self.object_list.db]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT table_rows FROM information_schema.tables '
+                    'WHERE table_schema = DATABASE() AND table_name = %s', [table]
+                )
+            elif connection.vendor == 'sqlite':
+                # sqlite_stat1 only exists once ANALYZE has been run
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                row = cursor.fetchone()
+                return int(row[0].split()[0]) if row else None
+            else:
+                return None
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    @staticmethod
+    def _is_unfiltered(query):
+        """Whether the query's only condition, if any, is the soft-delete one"""
+        where = query.where
+        if not where:
+            return True
+        if where.connector != 'AND' or where.negated:
+            return False
+        try:
+            query.model._meta.get_field('deleted_at')
+        except FieldDoesNotExist:
+            return False
+        not_deleted = query.model._base_manager.filter(deleted_at__isnull=True).query.where.children[0]
+        return all(condition == not_deleted for condition in where.children)
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that only loads one page of related rows"""
+
+    per_page = 20
+    request = None
+
+    @property
+    def page_param(self):
+        return f'{self.prefix}-page'
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            qs = super().get_queryset()
+            page_number = self.request.GET.get(self.page_param) if self.request else None
+            self.paginator = Paginator(qs, self.per_page)
+            self.page = self.paginator.get_page(page_number)
+            # Every row points at the parent; reuse it instead of a lookup per row
+            self._queryset = list(self.page.object_list)
+            for obj in self._queryset:
+                self.fk.set_cached_value(obj, self.instance)
+        return self._queryset
+
+
+class PaginatedInlineMixin:
+    """Bound and paginate an inline on the parent change page"""
+
+    formset = PaginatedInlineFormSet
+    template = 'admin/tasks/edit_inline/paginated_tabular.html'
+    per_page = 20
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.request = request
+        formset.per_page = self.per_page
+        return formset
+
+
+class SoftDeleteAdminMixin:
+    """
+    Delete through a background purge job instead of an in-request cascade.
+    
+    Subclasses set ``schedule_deletion`` to the tasks.deletion scheduler.
+    """
+    
+    schedule_deletion = None
+    
+    def get_deleted_objects(self, objs, request):
+        # Skip walking the cascade for the confirmation page; the purge
+        # job reports what it removed
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
+    
+    def delete_model(self, request, obj):
+        type(self).schedule_deletion(obj, request.user)
+    
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            type(self).schedule_deletion(obj, request.user)
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(SoftDeleteAdminMixin, BaseUserAdmin):
     """Custom User admin"""
     
     list_display = ('username', 'email', 'role', 'is_active', 'date_joined', 'task_counts')
     list_filter = ('role', 'is_active', 'date_joined')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('-date_joined',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    schedule_deletion = schedule_user_deletion
     
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Role Information', {'fields': ('role',)}),
@@ -21,34 +163,66 @@ class UserAdmin(BaseUserAdmin):
         ('Role Information', {'fields': ('role',)}),
     )
     
+    def get_queryset(self, request):
+        """Annotate task counts with correlated subqueries instead of per-row COUNTs"""
+        def task_count(model, field):
+            counts = (
+                model.objects.filter(**{field: OuterRef('pk')})
+                .order_by()
+                .values(field)
+                .annotate(total=Count('pk'))
+                .values('total')
+            )
+            return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+        # Counts cover both the hot and the archive tier
+        return super().get_queryset(request).filter(deleted_at__isnull=True).annotate(
+            assigned_tasks_total=(
+                task_count(Task, 'assigned_to') + task_count(ArchivedTask, 'assigned_to')
+            ),
+            created_tasks_total=(
+                task_count(Task, 'created_by') + task_count(ArchivedTask, 'created_by')
+            ),
+        )
+
     def task_counts(self, obj):
         """Display task counts for user"""
-        assigned = obj.get_assigned_tasks_count()
-        created = obj.get_created_tasks_count()
         return format_html(
             '<span style="color: blue;">Assigned: {}</span><br>'
             '<span style="color: green;">Created: {}</span>',
-            assigned, created
+            obj.assigned_tasks_total, obj.created_tasks_total
         )
     task_counts.short_description = 'Task Counts'
 
 
-class TaskCommentInline(admin.TabularInline):
+class TaskCommentInline(PaginatedInlineMixin, admin.TabularInline):
     """Inline admin for task comments"""
     model = TaskComment
     extra = 0
+    raw_id_fields = ('author',)
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('author')
 
-class TaskHistoryInline(admin.TabularInline):
+
+class TaskHistoryInline(PaginatedInlineMixin, admin.TabularInline):
     """Inline admin for task history"""
     model = TaskHistory
     extra = 0
-    readonly_fields = ('timestamp',)
+    can_delete = False
+    fields = ('user', 'action', 'description', 'timestamp')
+    readonly_fields = fields
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(SoftDeleteAdminMixin, admin.ModelAdmin):
     """Task admin configuration"""
     
     list_display = (
@@ -56,9 +230,13 @@ class TaskAdmin(admin.ModelAdmin):
         'created_by', 'due_date', 'is_overdue_display', 'created_at'
     )
     list_filter = ('status', 'priority', 'created_at', 'due_date')
+    list_select_related = ('assigned_to', 'created_by')
     search_fields = ('title', 'description', 'assigned_to__username', 'created_by__username')
     ordering = ('-created_at',)
-    date_hierarchy = 'created_at'
+    autocomplete_fields = ('assigned_to', 'created_by')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    schedule_deletion = schedule_task_deletion
     
     fieldsets = (
         ('Basic Information', {
@@ -74,17 +252,52 @@ class TaskAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
+        ('Archived History', {
+            'fields': ('archived_history',),
+            'classes': ('collapse',)
+        }),
     )
     
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('created_at', 'updated_at', 'archived_history')
     inlines = [TaskCommentInline, TaskHistoryInline]
+    archived_history_limit = 50
     
+    def get_queryset(self, request):
+        """Compute overdue status in SQL rather than per row"""
+        return super().get_queryset(request).annotate(
+            overdue=Case(
+                When(
+                    Q(due_date__lt=timezone.now()) & ~Q(status='completed'),
+                    then=Value(True)
+                ),
+                default=Value(False),
+                output_field=BooleanField()
+            )
+        )
+
     def is_overdue_display(self, obj):
         """Display overdue status with color"""
-        if obj.is_overdue():
+        if obj.overdue:
             return format_html('<span style="color: red; font-weight: bold;">Yes</span>')
         return format_html('<span style="color: green;">No</span>')
     is_overdue_display.short_description = 'Overdue'
+    is_overdue_display.admin_order_field = 'overdue'
+    
+    def archived_history(self, obj):
+        """Show the most recent history entries moved to the archive"""
+        if not obj.pk:
+            return '-'
+        records = get_archived_history(obj.pk)[:self.archived_history_limit]
+        if not records:
+            return 'No archived history'
+        return format_html(
+            '<table>{}</table>',
+            format_html_join(
+                '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+                ((r['timestamp'], r['user_username'], r['action'], r['description']) for r in records)
+            )
+        )
+    archived_history.short_description = 'Archived history'
     
     def save_model(self, request, obj, form, change):
         """Override save to set created_by if not set"""
@@ -98,9 +311,13 @@ class TaskCommentAdmin(admin.ModelAdmin):
     """Task comment admin"""
     
     list_display = ('task', 'author', 'content_preview', 'created_at')
-    list_filter = ('created_at', 'author')
+    list_filter = ('created_at', 'author__role')
+    list_select_related = ('task', 'author')
     search_fields = ('content', 'task__title', 'author__username')
     ordering = ('-created_at',)
+    raw_id_fields = ('task', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def content_preview(self, obj):
         """Show preview of comment content"""
@@ -114,11 +331,66 @@ class TaskHistoryAdmin(admin.ModelAdmin):
     
     list_display = ('task', 'user', 'action', 'description_preview', 'timestamp')
     list_filter = ('action', 'timestamp')
+    list_select_related = ('task', 'user')
     search_fields = ('task__title', 'user__username', 'description')
     ordering = ('-timestamp',)
+    raw_id_fields = ('task', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def description_preview(self, obj):
         """Show preview of description"""
         return obj.description[:50] + '...' if len(obj.description) > 50 else obj.description
     description_preview.short_description = 'Description Preview'
 
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(admin.ModelAdmin):
+    """Read-only view of completed tasks moved to the archive tier"""
+    
+    list_display = ('title', 'status', 'priority', 'assigned_to', 'created_by', 'due_date', 'archived_at')
+    list_filter = ('priority', 'archived_at')
+    list_select_related = ('assigned_to', 'created_by')
+    search_fields = ('title', 'assigned_to__username', 'created_by__username')
+    ordering = ('-created_at',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    """Progress of background deletions"""
+    
+    list_display = ('target_type', 'target_id', 'target_repr', 'status', 'deleted_rows', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'target_type')
+    list_select_related = ('requested_by',)
+    ordering = ('-created_at',)
+    readonly_fields = (
+        'target_type', 'target_id', 'target_repr', 'status', 'requested_by', 'progress',
+        'deleted_rows', 'error', 'created_at', 'started_at', 'finished_at'
+    )
+    
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    """Queued side effects of requests"""
+    
+    list_display = ('name', 'status', 'attempts', 'run_after', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    ordering = ('-created_at',)
+    readonly_fields = (
+        'name', 'payload', 'status', 'attempts', 'max_attempts', 'run_after', 'claimed_by',
+        'last_error', 'created_at', 'started_at', 'finished_at'
+    )
+    
+    def has_add_permission(self, request):
+        return False
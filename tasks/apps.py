@@ -8,4 +8,11 @@ class TasksConfig(AppConfig):
 
     def ready(self):
         # Import signals when app is ready 
-        import tasks.signals
\ No newline at end of file
+        import tasks.signals
+        # Modules defining background job handlers, so workers know them
+        import tasks.activity
+        import tasks.bulk_update
+        import tasks.deletion
+        import tasks.recurrence
+        import tasks.side_effects
+        import tasks.webhooks
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+Async versions of the read hot paths, for deployments served over ASGI.
+
+A sync view issues its queries one after another. These views await the
+independent queries of a response concurrently instead (``fan_out``), so a
+response takes about as long as its slowest query rather than the sum of
+them. They reuse the query plans of the sync views in tasks/views.py and
+return the same JSON, under /api/async/.
+
+Single queries use Django's async ORM (``aget``, ``afirst``...). It runs
+every query of a request on that request's single sync thread, though, so
+awaiting several of them at once would not overlap them: ``fan_out`` gives
+each of a response's independent queries its own worker thread and database
+connection instead. Code shared with the sync views (list planning, user
+lookups, DRF authentication and serializers) is sync only and runs through
+``sync_to_async``.
+
+DRF views are sync only; ``async_api_view`` does the same authentication and
+permission checks as ``@api_view`` + ``@permission_classes`` for GET views.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import prefetch_related_objects
+from django.http import HttpResponse
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from .history_archive import get_task_history as get_full_task_history
+from .models import Task
+from .permissions import IsAdminUser
+from .replicas import use_replica
+from .serializers import TaskListRowSerializer, TaskSerializer
+from .sharding import ashard_for_task
+from .tags import tags_of
+from .task_archive import aget_task_in_any_tier
+from .views import (
+    build_dashboard, build_statistics, dashboard_queries, plan_task_list,
+    requested_fields, statistics_queries, task_etag, task_list_response,
+)
+
+
+def render(data, status_code=200, headers=None):
+    """Render data the way a DRF Response with the JSON renderer would"""
+    response = HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type=JSONRenderer.media_type
+    )
+    response['Vary'] = 'Accept'
+    response['Allow'] = 'GET, OPTIONS'
+    for name, value in (headers or {}).items():
+        response[name] = value
+    return response
+
+
+def render_response(response):
+    """Render a DRF Response built by shared sync code"""
+    headers = {name: value for name, value in response.headers.items() if name.lower() != 'content-type'}
+    return render(response.data, response.status_code, headers)
+
+
+def _check_permissions(request, permission_classes):
+    """APIView.check_permissions for a function view"""
+    for permission_class in permission_classes:
+        permission = permission_class()
+        if not permission.has_permission(request, None):
+            if request.authenticators and not request.successful_authenticator:
+                raise exceptions.NotAuthenticated()
+            raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+
+def _handle_exception(request, exc):
+    """APIView.handle_exception for a function view"""
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        auth_header = request.authenticators[0].authenticate_header(request) if request.authenticators else None
+        if auth_header:
+            exc.auth_header = auth_header
+        else:
+            exc.status_code = 403
+    return render_response(exception_handler(exc, {'request': request}))
+
+
+def async_api_view(permission_classes):
+    """Async counterpart of @api_view(['GET']) + @permission_classes"""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            drf_request = Request(
+                request,
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            )
+            try:
+                if request.method != 'GET':
+                    raise exceptions.MethodNotAllowed(request.method)
+                # Authentication looks the user up, so it runs on a thread
+                await sync_to_async(_check_permissions)(drf_request, permission_classes)
+                return await view(drf_request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _handle_exception(drf_request, exc)
+        # Like APIView, token-authenticated API views skip CSRF
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def _closing_connections(query):
+    def run():
+        try:
+            return query()
+        finally:
+            # Worker threads outlive the query; honour CONN_MAX_AGE like a request would
+            close_old_connections()
+    return run
+
+
+async def fan_out(queries):
+    """Run a name -> callable mapping of blocking queries concurrently"""
+    results = await asyncio.gather(*(
+        sync_to_async(_closing_connections(query), thread_sensitive=False)()
+        for query in queries.values()
+    ))
+    return dict(zip(queries, results))
+
+
+@async_api_view([IsAuthenticated])
+@use_replica
+async def list_tasks(request):
+    """List tasks with filtering and pagination"""
+    plan, error_response = await sync_to_async(plan_task_list)(request)
+    if error_response is not None:
+        return render_response(error_response)
+
+    results = await fan_out({
+        'count': plan['count'],
+        'tasks': lambda: TaskListRowSerializer(
+            plan['fetch'](), fields=plan['fields'], expand=plan['expand']
+        ).data,
+    })
+    return render(task_list_response(plan, results['count'], results['tasks']))
+
+
+@async_api_view([IsAuthenticated])
+@use_replica
+async def get_task(request, task_id):
+    """Get a specific task"""
+    fields, expand, error_response = requested_fields(
+        request, TaskSerializer.Meta.fields, TaskSerializer.expandable_fields
+    )
+    if error_response is not None:
+        return render_response(error_response)
+
+    include_archived = request.GET.get('include_archived', '').lower() == 'true'
+
+    def optimize(queryset):
+        # Comments are loaded below, alongside the history
+        return TaskSerializer.optimize(
+            queryset, fields, expand, also=['assigned_to', 'version']
+        ).prefetch_related(None)
+
+    try:
+        if include_archived:
+            task = await aget_task_in_any_tier(task_id, prepare=optimize)
+        else:
+            shard = await ashard_for_task(task_id)
+            task = await optimize(Task.objects.using(shard)).aget(id=task_id)
+    except Task.DoesNotExist:
+        return render({
+            'success': False,
+            'message': 'Task not found'
+        }, 404)
+
+    # Check permissions
+    if not request.user.is_admin() and task.assigned_to_id != request.user.id:
+        return render({
+            'success': False,
+            'message': 'Permission denied'
+        }, 403)
+
+    # Comments, history and tags are independent; load the requested ones side by side
+    names = set(TaskSerializer.Meta.fields if fields is None else fields)
+    queries = {}
+    if 'comments' in names:
+        queries['comments'] = lambda: prefetch_related_objects([task], 'comments')
+    if 'history' in names:
+        queries['history'] = lambda: get_full_task_history(task)
+    if 'tags' in names:
+        queries['tags'] = lambda: tags_of([task])
+    results = await fan_out(queries)
+    context = {name: results[name] for name in ('history', 'tags') if name in results}
+    data = await sync_to_async(
+        lambda: TaskSerializer(task, fields=fields, expand=expand, context=context).data
+    )()
+    return render({
+        'success': True,
+        'task': data
+    }, headers={'ETag': task_etag(task)})
+
+
+@async_api_view([IsAuthenticated])
+@use_replica
+async def get_dashboard(request):
+    """Get dashboard data for the current user"""
+    results = await fan_out(dashboard_queries(request.user))
+    return render({
+        'success': True,
+        'dashboard': build_dashboard(request.user, results)
+    })
+
+
+@async_api_view([IsAuthenticated, IsAdminUser])
+@use_replica
+async def get_task_statistics(request):
+    """Get task statistics (Admin only)"""
+    results = await fan_out(statistics_queries())
+    return render({
+        'success': True,
+        'statistics': build_statistics(results)
+    })
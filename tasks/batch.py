@@ -0,0 +1,188 @@
+"""
+Multiplexed API requests: many sub-requests in one HTTP round trip.
+
+``POST /api/batch/`` takes an ordered list of sub-requests against the routes
+in ``tasks/urls.py``::
+
+    {"atomic": false,
+     "requests": [
+        {"method": "PATCH", "path": "/api/tasks/3/status/", "body": {"status": "completed"},
+         "headers": {"If-Match": "\"4\""}},
+        {"method": "POST", "path": "/api/tasks/3/comments/", "body": {"content": "Done"}},
+        {"method": "GET", "path": "/api/dashboard/"}
+     ]}
+
+The batch request is authenticated once; each sub-request is dispatched
+in-process to its view with that user forced onto it, so it skips the
+middleware and the JWT decode. Only the headers a sub-request lists in
+``headers`` are passed to its view; the batch request's own are not.
+Responses come back in the same order, each with its own status code and
+the headers in ``SUB_RESPONSE_HEADERS`` it set.
+
+With ``"atomic": true`` the sub-requests run inside one transaction on the
+primary and every shard. The first one to fail rolls all of them back and the
+rest are not run. Cross-shard reads a view fans out to other threads (admin
+task lists, statistics) only see committed data.
+"""
+import json
+import logging
+from contextlib import ExitStack
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+
+from .replicas import pin_to_primary
+from .sharding import get_shards
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Routes that can't be run inside a batch
+EXCLUDED_ROUTES = {'tasks:batch'}
+
+# Response headers returned with each sub-response
+SUB_RESPONSE_HEADERS = ('ETag',)
+
+
+class BatchError(ValueError):
+    """A sub-request that can't be dispatched"""
+
+
+def parse_sub_requests(data):
+    """
+    Validate the batch body. Returns the list of sub-request dicts, or raises
+    BatchError with a message for the client.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list):
+        raise BatchError('requests must be a list of sub-requests')
+    sub_requests = data['requests']
+    if not sub_requests:
+        raise BatchError('requests is required')
+    if len(sub_requests) > settings.BATCH_MAX_REQUESTS:
+        raise BatchError(f'At most {settings.BATCH_MAX_REQUESTS} requests per batch')
+
+    parsed = []
+    for index, item in enumerate(sub_requests):
+        if not isinstance(item, dict):
+            raise BatchError(f'requests[{index}] must be an object')
+        method = str(item.get('method', 'GET')).upper()
+        if method not in METHODS:
+            raise BatchError(f'requests[{index}]: method must be one of {", ".join(METHODS)}')
+        path = item.get('path')
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise BatchError(f'requests[{index}]: path must be an absolute path, e.g. /api/tasks/1/')
+        headers = item.get('headers') or {}
+        if not isinstance(headers, dict) or not all(isinstance(value, str) for value in headers.values()):
+            raise BatchError(f'requests[{index}]: headers must be an object of strings')
+        parsed.append({'method': method, 'path': path, 'body': item.get('body'), 'headers': headers})
+    return parsed
+
+
+def build_sub_request(request, method, path, body, headers=None):
+    """An HttpRequest for one sub-request, authenticated as the batch's user"""
+    url = urlsplit(path)
+    sub_request = HttpRequest()
+    sub_request.method = method
+    sub_request.path = sub_request.path_info = url.path
+    sub_request.META = {
+        key: value for key, value in request.META.items()
+        if not key.startswith(('HTTP_', 'CONTENT_'))
+    }
+    for name, value in (headers or {}).items():
+        sub_request.META['HTTP_' + name.upper().replace('-', '_')] = value
+    sub_request.META['QUERY_STRING'] = url.query
+    sub_request.GET = QueryDict(url.query)
+
+    content = b'' if body is None else json.dumps(body).encode()
+    sub_request.META['CONTENT_TYPE'] = 'application/json'
+    sub_request.META['CONTENT_LENGTH'] = str(len(content))
+    sub_request._body = content
+    sub_request._read_started = True
+
+    # DRF uses these instead of running the authentication classes again
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def dispatch(request, method, path, body, headers=None):
+    """Run one sub-request through its view. Returns (status code, data, headers)."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return status.HTTP_404_NOT_FOUND, {'success': False, 'message': 'Not found'}, {}
+    route = f'{match.namespace}:{match.url_name}'
+    if match.namespace != 'tasks' or route in EXCLUDED_ROUTES:
+        return status.HTTP_404_NOT_FOUND, {'success': False, 'message': 'Not found'}, {}
+    if iscoroutinefunction(match.func):
+        return status.HTTP_400_BAD_REQUEST, {
+            'success': False,
+            'message': 'Async endpoints cannot be batched; use the /api/ endpoint instead'
+        }, {}
+
+    sub_request = build_sub_request(request, method, path, body, headers)
+    response = match.func(sub_request, *match.args, **match.kwargs)
+    data = getattr(response, 'data', None)
+    response_headers = {name: response[name] for name in SUB_RESPONSE_HEADERS if response.has_header(name)}
+
+    # As ReadYourWritesMiddleware does: later reads in the batch, and the
+    # user's next requests, must see this write
+    if method != 'GET' and response.status_code < 400:
+        pin_to_primary(request.user)
+    return response.status_code, data, response_headers
+
+
+def writable_aliases():
+    """The primary and every shard, in a fixed order so concurrent batches lock them alike"""
+    return [DEFAULT_DB_ALIAS] + get_shards()
+
+
+def run_batch(request, sub_requests, atomic=False):
+    """
+    Dispatch the sub-requests in order. Returns (results, rolled_back), with
+    one {'status': ..., 'headers': ..., 'body': ...} per sub-request.
+    """
+    if not atomic:
+        return [_run_one(request, **item) for item in sub_requests], False
+
+    results = []
+    with ExitStack() as stack:
+        for using in writable_aliases():
+            stack.enter_context(transaction.atomic(using=using))
+        for item in sub_requests:
+            result = _run_one(request, **item)
+            results.append(result)
+            if result['status'] >= 400:
+                break
+        rolled_back = results[-1]['status'] >= 400
+        if rolled_back:
+            for using in writable_aliases():
+                transaction.set_rollback(True, using=using)
+
+    if rolled_back:
+        skipped = {
+            'status': status.HTTP_424_FAILED_DEPENDENCY,
+            'headers': {},
+            'body': {'success': False, 'message': 'Not run: an earlier request in the batch failed'}
+        }
+        results += [skipped] * (len(sub_requests) - len(results))
+    return results, rolled_back
+
+
+def _run_one(request, method, path, body, headers):
+    try:
+        status_code, data, response_headers = dispatch(request, method, path, body, headers)
+    except Exception as e:
+        logger.error(f"Batch sub-request {method} {path} failed: {e}")
+        status_code, data, response_headers = status.HTTP_500_INTERNAL_SERVER_ERROR, {
+            'success': False,
+            'message': 'Internal server error'
+        }, {}
+    return {'status': status_code, 'headers': response_headers, 'body': data}
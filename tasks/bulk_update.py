@@ -0,0 +1,222 @@
+"""
+Set-based bulk updates of tasks, for admins.
+
+``POST /api/admin/tasks/bulk-update/`` selects tasks with the list_tasks
+filter parameters in its query string and sets the fields in ``patch`` on
+every one of them::
+
+    POST /api/admin/tasks/bulk-update/?assigned_to=alice&status=in_progress
+    {"patch": {"assigned_to_username": "bob"}, "dry_run": true}
+
+A dry run only counts the tasks. Otherwise a ``BulkUpdateJob`` is recorded
+and a background job applies the patch database by database, in id order,
+``BULK_UPDATE_CHUNK_SIZE`` tasks per transaction. Each chunk is:
+
+- one UPDATE ... WHERE id IN (...), which also bumps the tasks' versions;
+- one bulk INSERT of history rows, and the change feed entries (the
+  activity feeds are fanned out from the history once it commits);
+- for tasks reassigned to a user on another shard, a move to that shard.
+
+The job keeps the number of tasks updated and, per database, the last task
+id done, so a retried job resumes where it stopped. The progress is at
+GET /api/admin/bulk-updates/<id>/.
+
+Status transitions are checked in SQL: only tasks whose status may change to
+the new one (Task.STATUS_TRANSITIONS) are selected, and tasks that already
+have every value in the patch are left alone. A patch that completes tasks
+skips those with open blockers (see tasks/hierarchy.py), which dry runs still
+count. Tasks are written with update(), so the save signals don't run; what
+they would record is written here instead.
+"""
+import logging
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .activity import activity_event, publish_activity
+from .changes import record_task_changes
+from .filters import apply_task_filters
+from .hierarchy import blocked_task_ids
+from .jobs import enqueue, job_handler
+from .models import BulkUpdateJob, Task, TaskHistory
+from .sharding import move_tasks, scatter, shard_aliases, shard_for_user
+from .user_directory import user_directory
+
+logger = logging.getLogger(__name__)
+
+
+def _patch_values(patch):
+    """A job's patch as Task field values"""
+    values = dict(patch)
+    if 'due_date' in values:
+        values['due_date'] = parse_datetime(values['due_date'])
+    return values
+
+
+def statuses_changing_to(status):
+    """The statuses a task may be in to get `status`, including it"""
+    return [status] + [current for current, targets in Task.STATUS_TRANSITIONS.items() if status in targets]
+
+
+def tasks_to_update(queryset, filters, patch):
+    """The tasks of a queryset matching the filters that the patch is valid for and would change"""
+    values = _patch_values(patch)
+    queryset = apply_task_filters(queryset, filters, is_admin=True)
+    if 'status' in values:
+        queryset = queryset.filter(status__in=statuses_changing_to(values['status']))
+    # Already as the patch would leave them
+    return queryset.exclude(Q(**values))
+
+
+def count_bulk_update(filters, patch):
+    """
+    (matched, to update): the tasks matching the filters on every database,
+    and how many of them the patch would change. Raises TaskFilterError.
+    """
+    def count(using):
+        tasks = Task.objects.using(using)
+        return (
+            apply_task_filters(tasks, filters, is_admin=True).count(),
+            tasks_to_update(tasks, filters, patch).count(),
+        )
+
+    counts = scatter(count)
+    return sum(matched for matched, _ in counts), sum(to_update for _, to_update in counts)
+
+
+def schedule_bulk_update(filters, patch, requested_by, matched):
+    """Record a bulk update and apply it in the background once committed"""
+    with transaction.atomic():
+        job = BulkUpdateJob.objects.create(
+            filters=filters,
+            patch=patch,
+            requested_by=requested_by,
+            matched=matched,
+        )
+        enqueue('bulk_update_tasks', {'bulk_update_job_id': job.id})
+    return job
+
+
+def _history_rows(job, rows, values, now):
+    """TaskHistory rows for a chunk, like the ones the save signals record"""
+    usernames = {}
+    if 'assigned_to_id' in values:
+        user_ids = {row['assigned_to_id'] for row in rows} | {values['assigned_to_id']}
+        usernames = {user_id: entry.username for user_id, entry in user_directory.get_many(user_ids).items()}
+
+    entries = []
+    for row in rows:
+        def add(action, description):
+            entries.append(TaskHistory(
+                task_id=row['id'],
+                user_id=job.requested_by_id,
+                action=action,
+                description=description,
+                timestamp=now,
+            ))
+
+        if 'status' in values and row['status'] != values['status']:
+            add('status_changed', f"Status changed from {row['status']} to {values['status']}")
+        if 'assigned_to_id' in values and row['assigned_to_id'] != values['assigned_to_id']:
+            add('assigned', (
+                f"Task reassigned from {usernames.get(row['assigned_to_id'])} "
+                f"to {usernames.get(values['assigned_to_id'])}"
+            ))
+        if 'priority' in values and row['priority'] != values['priority']:
+            add('updated', f"Priority changed from {row['priority']} to {values['priority']}")
+        if 'due_date' in values and row['due_date'] != values['due_date']:
+            add('updated', f"Due date changed from {row['due_date'].isoformat()} to {values['due_date'].isoformat()}")
+    return entries
+
+
+def _update_chunk(job, using, rows, values, now):
+    """Apply the patch to one chunk of tasks, in the transaction open on `using`"""
+    ids = [row['id'] for row in rows]
+    Task.objects.using(using).filter(id__in=ids).update(**values, updated_at=now, version=F('version') + 1)
+    history = TaskHistory.objects.using(using).bulk_create(_history_rows(job, rows, values, now))
+    publish_activity([
+        activity_event(entry.task_id, entry.user_id, entry.action, entry.description, now)
+        for entry in history
+    ], using=using)
+
+    # The change feed, grouped by previous assignee for reassigned tasks
+    action = 'status_changed' if set(values) == {'status'} else 'updated'
+    new_assignee = values.get('assigned_to_id')
+    by_previous = {}
+    for row in rows:
+        reassigned = new_assignee is not None and new_assignee != row['assigned_to_id']
+        by_previous.setdefault(row['assigned_to_id'] if reassigned else None, []).append(
+            (row['id'], new_assignee or row['assigned_to_id'])
+        )
+    for previous_assignee_id, tasks in by_previous.items():
+        record_task_changes(action, tasks, using=using, previous_assignee_id=previous_assignee_id)
+
+    # Reassigned to a user on another shard: the tasks follow them
+    if new_assignee is not None:
+        target = shard_for_user(new_assignee)
+        if target is not None and target != using:
+            move_tasks([(task_id, new_assignee) for task_id in ids], using, target)
+
+
+def _apply_on_database(job, using, values, chunk_size):
+    key = using or DEFAULT_DB_ALIAS
+    tasks = tasks_to_update(Task.objects.using(using), job.filters, job.patch)
+    while True:
+        now = timezone.now()
+        with transaction.atomic(using=using):
+            rows = list(
+                tasks.filter(id__gt=job.progress.get(key, 0)).select_for_update().order_by('id')
+                .values('id', 'assigned_to_id', 'status', 'priority', 'due_date')[:chunk_size]
+            )
+            if not rows:
+                return
+            last_id = rows[-1]['id']
+            if values.get('status') == 'completed':
+                blocked = blocked_task_ids([row['id'] for row in rows])
+                rows = [row for row in rows if row['id'] not in blocked]
+            if rows:
+                _update_chunk(job, using, rows, values, now)
+        job.progress[key] = last_id
+        job.updated_rows += len(rows)
+        job.save(update_fields=['progress', 'updated_rows'])
+
+
+def run_bulk_update_job(job_id):
+    """Apply a bulk update, resuming from its progress"""
+    job = BulkUpdateJob.objects.get(id=job_id)
+    if job.status == 'completed':
+        return job
+
+    job.status = 'running'
+    job.started_at = job.started_at or timezone.now()
+    job.error = ''
+    job.save(update_fields=['status', 'started_at', 'error'])
+
+    try:
+        if job.requested_by_id is None:
+            raise RuntimeError('The admin who requested the update no longer exists')
+        values = _patch_values(job.patch)
+        for using in shard_aliases():
+            _apply_on_database(job, using, values, settings.BULK_UPDATE_CHUNK_SIZE)
+    except Exception as e:
+        logger.error(f"Bulk update job {job.id} failed: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'completed'
+        logger.info(f"Bulk update job {job.id} updated {job.updated_rows} tasks")
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+@job_handler('bulk_update_tasks')
+def bulk_update_tasks(payloads):
+    """Background job: run bulk updates, failing (and so retrying) if one fails"""
+    for payload in payloads:
+        job = run_bulk_update_job(payload['bulk_update_job_id'])
+        if job.status == 'failed':
+            raise RuntimeError(job.error)
@@ -0,0 +1,208 @@
+"""
+Change feed for incremental client sync.
+
+Every write to a task adds a ``TaskChange`` entry on the task's database, in
+the same transaction as the write: saves (through the Task signals, so admin
+edits too), deletes, archiving and restoring, and moves between shards. The
+entry's id is a sequence number per database.
+
+A sync token is a signed cursor, the last sequence number a client has seen
+on each database. ``read_changes`` returns the entries visible to the user
+after it: for an admin every entry, for a user the entries of tasks assigned
+to them before or after the change. Only the user's own shard is read for a
+user, so a sync costs a range scan over what changed, not a list query.
+
+The feed reports each changed task's current state, not the change itself:
+a task that no longer shows up in the user's task list (deleted, archived,
+reassigned to someone else) comes back as a tombstone.
+
+Entries older than ``TASK_CHANGES_KEEP_DAYS`` are pruned, and tokens expire
+after the same time, so a client that has been away longer reloads its list.
+Sequence numbers must become visible in order, or a reader could move its
+cursor past an entry still being committed. The SQLite backend serializes
+writers per database, which guarantees it; on PostgreSQL each entry is added
+under a transaction-level advisory lock, so writers of entries take turns
+from their first entry until they commit. Other engines have neither, and
+the ``tasks.E001`` check refuses to start on them.
+"""
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import checks, signing
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .models import Task, TaskChange
+from .sharding import scatter, shard_aliases, shard_for_user, shards_for_tasks
+from .webhooks import publish_task_events
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'tasks.changes'
+
+# Engines on which change log entries commit in sequence order
+ORDERED_VENDORS = {'sqlite', 'postgresql'}
+
+# pg_advisory_xact_lock key of the change log
+CHANGE_LOG_LOCK_ID = 0x7461736b
+
+
+class InvalidSyncToken(ValueError):
+    """A sync token that was tampered with or belongs to someone else"""
+
+
+class ExpiredSyncToken(InvalidSyncToken):
+    """A sync token the feed can no longer continue from; reload and start over"""
+
+
+@checks.register()
+def check_change_log_ordering(app_configs, **kwargs):
+    """The change feed needs databases that commit its entries in sequence order"""
+    return [
+        checks.Error(
+            f"Database '{_key(alias)}' uses the {connections[_key(alias)].vendor} engine, "
+            f"on which the task change feed could skip changes",
+            hint=f"Use one of: {', '.join(sorted(ORDERED_VENDORS))}",
+            id='tasks.E001',
+        )
+        for alias in shard_aliases()
+        if connections[_key(alias)].vendor not in ORDERED_VENDORS
+    ]
+
+
+def _lock_change_log(using):
+    """Make other writers of change log entries on `using` wait until this transaction ends"""
+    connection = connections[_key(using)]
+    if connection.vendor == 'sqlite':
+        return  # Only one writer at a time anyway
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [CHANGE_LOG_LOCK_ID])
+        return
+    raise ImproperlyConfigured(f'The task change feed does not support {connection.vendor}')
+
+
+def record_task_changes(action, tasks, using=None, previous_assignee_id=None):
+    """
+    Add a change log entry per task on database `using`. Tasks are given as
+    instances or (task id, assigned_to id) pairs.
+    """
+    now = timezone.now()
+    entries = []
+    for task in tasks:
+        task_id, assignee_id = (task.id, task.assigned_to_id) if hasattr(task, 'assigned_to_id') else task
+        entries.append(TaskChange(
+            task_id=task_id,
+            assignee_id=assignee_id,
+            previous_assignee_id=previous_assignee_id,
+            action=action,
+            changed_at=now,
+        ))
+    # The lock lasts until the caller's transaction (or this one) commits
+    with transaction.atomic(using=using):
+        _lock_change_log(using)
+        TaskChange.objects.using(using).bulk_create(entries)
+    # Every change to a task passes through here, so its webhooks go out from here too
+    publish_task_events(action, [entry.task_id for entry in entries], using=using)
+
+
+def record_task_change(task, action, previous_assignee_id=None, using=None):
+    """Add a change log entry for one task, on its database unless `using` is given"""
+    record_task_changes(action, [task], using=using or task._state.db, previous_assignee_id=previous_assignee_id)
+
+
+def _key(alias):
+    return alias or DEFAULT_DB_ALIAS
+
+
+def _on_feed_databases(user, fn):
+    """{cursor key: fn(alias)} for the databases holding the user's changes (everyone's for None)"""
+    if user is None or user.is_admin():
+        aliases = shard_aliases()
+        return dict(zip(map(_key, aliases), scatter(fn)))
+    alias = shard_for_user(user)
+    return {_key(alias): fn(alias)}
+
+
+def current_cursors(user):
+    """Cursors at the end of the change log, for a user starting to sync"""
+    def last_id(alias):
+        return TaskChange.objects.using(alias).aggregate(last=Max('id'))['last'] or 0
+    return _on_feed_databases(user, last_id)
+
+
+def make_sync_token(user, cursors):
+    return signing.dumps({'u': user.pk, 'a': user.is_admin(), 'c': cursors}, salt=TOKEN_SALT, compress=True)
+
+
+def parse_sync_token(user, token):
+    """The cursors in a sync token issued to this user"""
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=timedelta(days=settings.TASK_CHANGES_KEEP_DAYS))
+    except signing.SignatureExpired:
+        raise ExpiredSyncToken('Sync token has expired')
+    except signing.BadSignature:
+        raise InvalidSyncToken('Invalid sync token')
+    if data.get('u') != user.pk:
+        raise InvalidSyncToken('Invalid sync token')
+
+    # What the user can see, or where their changes are kept, has changed
+    # since the token was issued (role change, resharding)
+    expected = set(_on_feed_databases(user, lambda alias: None))
+    if data.get('a') != user.is_admin() or set(data['c']) != expected:
+        raise ExpiredSyncToken('Sync token no longer matches your task list')
+    return data['c']
+
+
+def read_changes(user, cursors, limit):
+    """
+    Up to `limit` change entries visible to the user (every entry for None)
+    after the cursors, oldest first. Returns (entries, new cursors, has_more);
+    entries are TaskChange values() dicts plus 'key', their cursor's key.
+    """
+    def fetch(alias):
+        changes = TaskChange.objects.using(alias).filter(id__gt=cursors[_key(alias)])
+        if user is not None and not user.is_admin():
+            changes = changes.filter(Q(assignee_id=user.pk) | Q(previous_assignee_id=user.pk))
+        return [
+            dict(entry, key=_key(alias))
+            for entry in changes.order_by('id').values(
+                'id', 'task_id', 'assignee_id', 'previous_assignee_id', 'action', 'changed_at'
+            )[:limit + 1]
+        ]
+
+    # heapq.merge keeps each database's entries in sequence order, so the
+    # page is a prefix of every database's entries
+    merged = list(heapq.merge(*_on_feed_databases(user, fetch).values(), key=lambda entry: entry['changed_at']))
+    page = merged[:limit]
+
+    new_cursors = dict(cursors)
+    for entry in page:
+        new_cursors[entry['key']] = max(new_cursors[entry['key']], entry['id'])
+    return page, new_cursors, len(merged) > limit
+
+
+def current_task_rows(task_ids, columns):
+    """{task id: values() row of `columns`} for the tasks that are in the task list now, wherever they are"""
+    by_shard = {}
+    for task_id, using in shards_for_tasks(task_ids).items():
+        by_shard.setdefault(using, []).append(task_id)
+
+    def load(using):
+        ids = by_shard.get(using)
+        if not ids:
+            return []
+        return list(Task.objects.using(using).filter(id__in=ids).values(*columns))
+
+    return {row['id']: row for shard_rows in scatter(load) for row in shard_rows}
+
+
+def prune_task_changes(days=None):
+    """Delete change log entries older than `days` (TASK_CHANGES_KEEP_DAYS). Returns the number deleted."""
+    days = settings.TASK_CHANGES_KEEP_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return sum(scatter(lambda alias: TaskChange.objects.using(alias).filter(changed_at__lt=cutoff).delete()[0]))
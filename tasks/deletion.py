@@ -0,0 +1,270 @@
+"""
+Soft delete with background, chunked purging.
+
+Deleting a task or user only marks it (and, for users, the tasks they are
+assigned to or created) with ``deleted_at`` in the request. That is a single
+UPDATE, after which the default managers no longer return the rows. A
+``DeletionJob`` is recorded and, once the request transaction commits, a
+background job (see tasks/jobs.py) removes the dependents in chunks of
+``DELETION_CHUNK_SIZE`` rows, each in its own short transaction, recording
+progress on the job. A purge that fails is retried by the job queue.
+
+Deletion jobs left pending or failed can also be run by hand with
+``manage.py purge_deleted``.
+
+With sharding enabled a task is purged on its shard, and a user's tasks are
+purged on every shard before the user is removed from the primary. A task on
+a shard is hidden in two steps, as the ``DeletionJob`` lives on the primary:
+
+1. the ``DeletionJob`` row is created on the primary;
+2. the task is hidden on its shard, in one transaction with its change log
+   entry and the purge job (enqueued on the shard, so a hidden task is always
+   purged).
+
+If step 2 fails the job row is deleted again. If the process dies between
+the two steps, the job is left for a task that was never hidden; running it
+marks it failed instead of purging a visible task. If the primary's
+transaction rolls back after the shard's committed, the purge job recreates
+the job row from its payload.
+
+A user is hidden on the primary in one transaction with the job row and the
+purge job, and then on every shard. The purge removes the user's tasks on
+every shard whether or not they were hidden, so a failure part way only
+shortens how long they stay visible. Before the user row itself, the purge
+deletes the user's recurrence rules and admin log entries and unlinks the
+jobs and webhooks that refer to the user, in chunks, so deleting the user
+cascades to nothing.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import (
+    DeletionJob, Task, TaskComment, TaskHistory, TaskTag, TaskVersionConflict, User,
+    ArchivedTask, ArchivedTaskComment, ArchivedTaskHistory, ArchivedTaskTag, ActivityEntry, ActivityFeed,
+    BulkUpdateJob, RecurrenceRule, WebhookSubscription,
+)
+from .changes import record_task_change, record_task_changes
+from .hierarchy import unlink_tasks
+from .jobs import enqueue, job_handler
+from .sharding import forget_tasks, get_shards, shard_aliases, shard_for_task
+from .user_directory import user_directory
+
+logger = logging.getLogger(__name__)
+
+
+def _task_steps(task_id):
+    """(label, queryset) pairs that purge a task, dependents first"""
+    try:
+        using = shard_for_task(task_id)
+    except Task.DoesNotExist:
+        # Already purged and dropped from the shard directory
+        return []
+    return [
+        ('comments', TaskComment.objects.using(using).filter(task_id=task_id)),
+        ('history', TaskHistory.objects.using(using).filter(task_id=task_id)),
+        ('archived_comments', ArchivedTaskComment.objects.using(using).filter(task_id=task_id)),
+        ('archived_history', ArchivedTaskHistory.objects.using(using).filter(task_id=task_id)),
+        ('tags', TaskTag.objects.using(using).filter(task_id=task_id)),
+        ('archived_tags', ArchivedTaskTag.objects.using(using).filter(task_id=task_id)),
+        ('tasks', Task.all_objects.using(using).filter(id=task_id)),
+        ('archived_tasks', ArchivedTask.all_objects.using(using).filter(id=task_id)),
+    ]
+
+
+def _user_steps(user_id):
+    """(label, queryset) pairs that purge a user, dependents first"""
+    owned = Q(assigned_to_id=user_id) | Q(created_by_id=user_id)
+    steps = []
+    for using in shard_aliases():
+        tasks = Task.all_objects.using(using).filter(owned).values('id')
+        archived_tasks = ArchivedTask.all_objects.using(using).filter(owned).values('id')
+        steps += [
+            ('comments', TaskComment.objects.using(using).filter(Q(author_id=user_id) | Q(task_id__in=tasks))),
+            ('history', TaskHistory.objects.using(using).filter(Q(user_id=user_id) | Q(task_id__in=tasks))),
+            ('archived_comments', ArchivedTaskComment.objects.using(using).filter(
+                Q(author_id=user_id) | Q(task_id__in=archived_tasks)
+            )),
+            ('archived_history', ArchivedTaskHistory.objects.using(using).filter(
+                Q(user_id=user_id) | Q(task_id__in=archived_tasks)
+            )),
+            ('tags', TaskTag.objects.using(using).filter(task_id__in=tasks)),
+            ('archived_tags', ArchivedTaskTag.objects.using(using).filter(task_id__in=archived_tasks)),
+            ('tasks', Task.all_objects.using(using).filter(owned)),
+            ('archived_tasks', ArchivedTask.all_objects.using(using).filter(owned)),
+            ('activity', ActivityEntry.objects.using(using).filter(user_id=user_id)),
+            ('activity_feeds', ActivityFeed.objects.using(using).filter(user_id=user_id)),
+        ]
+    # What else refers to the user, so deleting it cascades to nothing;
+    # (label, queryset, field) steps clear the field instead of deleting
+    steps += [
+        ('recurrence_rules', RecurrenceRule.objects.filter(Q(assigned_to_id=user_id) | Q(created_by_id=user_id))),
+        ('admin_log', LogEntry.objects.filter(user_id=user_id)),
+        ('deletion_jobs', DeletionJob.objects.filter(requested_by_id=user_id), 'requested_by'),
+        ('bulk_update_jobs', BulkUpdateJob.objects.filter(requested_by_id=user_id), 'requested_by'),
+        ('webhook_subscriptions', WebhookSubscription.objects.filter(created_by_id=user_id), 'created_by'),
+    ]
+    # Deleting the user also removes its copies on the shards
+    steps.append(('users', User.objects.filter(id=user_id)))
+    return steps
+
+
+def _new_job(target_type, target_id, target_repr, requested_by):
+    return DeletionJob.objects.create(
+        target_type=target_type,
+        target_id=target_id,
+        target_repr=target_repr[:255],
+        requested_by=requested_by,
+    )
+
+
+def _schedule(job, using=None):
+    """Queue the purge in the transaction open on `using`, to start once it commits"""
+    enqueue('purge_deleted', {
+        'deletion_job_id': job.id,
+        'target_type': job.target_type,
+        'target_id': job.target_id,
+        'target_repr': job.target_repr,
+    }, using=using)
+
+
+def schedule_task_deletion(task, requested_by, version=None):
+    """
+    Hide a task (hot or archived) immediately and purge it in the background.
+    With `version`, only if the task is still at that version; raises
+    TaskVersionConflict otherwise.
+    """
+    using = task._state.db
+    job = _new_job('task', task.id, task.title, requested_by)
+    try:
+        with transaction.atomic(using=using):
+            rows = type(task).all_objects.using(using).filter(id=task.id)
+            if version is not None:
+                rows = rows.filter(version=version)
+            if not rows.update(deleted_at=timezone.now(), version=F('version') + 1):
+                raise TaskVersionConflict(f'Task {task.id} has changed since version {version}')
+            record_task_change(task, 'deleted')
+            _schedule(job, using=using)
+    except Exception:
+        job.delete()
+        raise
+    return job
+
+
+def schedule_user_deletion(user, requested_by):
+    """Deactivate a user and hide their tasks immediately, then purge in the background"""
+    now = timezone.now()
+    owned = Q(assigned_to=user) | Q(created_by=user)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        User.objects.filter(id=user.id).update(deleted_at=now, is_active=False)
+        # update() doesn't send the signals that keep the user directory current
+        transaction.on_commit(lambda: user_directory.invalidate(user.id))
+        job = _new_job('user', user.id, user.username, requested_by)
+        _schedule(job)
+    for using in shard_aliases():
+        with transaction.atomic(using=using):
+            if using in get_shards():
+                User.objects.using(using).filter(id=user.id).update(deleted_at=now, is_active=False)
+            tasks = list(Task.objects.using(using).filter(owned).values_list('id', 'assigned_to_id'))
+            Task.objects.using(using).filter(owned).update(deleted_at=now, version=F('version') + 1)
+            record_task_changes('deleted', tasks, using=using)
+            ArchivedTask.objects.using(using).filter(owned).update(deleted_at=now, version=F('version') + 1)
+    return job
+
+
+def _purge_step(job, label, queryset, chunk_size, clear_field=None):
+    """
+    Delete a queryset chunk by chunk, or with `clear_field` set that field
+    to NULL instead, recording progress on the job
+    """
+    while True:
+        with transaction.atomic(using=queryset.db):
+            ids = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return
+            rows = queryset.model._base_manager.using(queryset.db).filter(pk__in=ids)
+            if clear_field:
+                done = rows.update(**{clear_field: None})
+            else:
+                done, _ = rows.delete()
+                job.deleted_rows += done
+            job.progress[label] = job.progress.get(label, 0) + done
+            job.save(update_fields=['progress', 'deleted_rows'])
+        if queryset.model in (Task, ArchivedTask):
+            unlink_tasks(ids)
+            forget_tasks(ids)
+
+
+def _target_is_hidden(job):
+    """Whether the job's task or user was hidden (or is gone already), so it may be purged"""
+    if job.target_type == 'user':
+        return not User.objects.filter(id=job.target_id, deleted_at__isnull=True).exists()
+    try:
+        using = shard_for_task(job.target_id)
+    except Task.DoesNotExist:
+        return True
+    return not any(
+        model.all_objects.using(using).filter(id=job.target_id, deleted_at__isnull=True).exists()
+        for model in (Task, ArchivedTask)
+    )
+
+
+def run_deletion_job(job_id):
+    """Purge everything a deletion job covers"""
+    job = DeletionJob.objects.get(id=job_id)
+    if job.status == 'completed':
+        return job
+    if not _target_is_hidden(job):
+        # Scheduling stopped before the target was hidden; it stays
+        logger.error(f"Deletion job {job.id}: {job.target_type} {job.target_id} was never hidden")
+        job.status = 'failed'
+        job.error = f'{job.get_target_type_display()} was not deleted'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+
+    job.status = 'running'
+    job.started_at = job.started_at or timezone.now()
+    job.error = ''
+    job.save(update_fields=['status', 'started_at', 'error'])
+
+    steps = _task_steps(job.target_id) if job.target_type == 'task' else _user_steps(job.target_id)
+    try:
+        for label, queryset, *clear_field in steps:
+            _purge_step(job, label, queryset, settings.DELETION_CHUNK_SIZE, *clear_field)
+    except Exception as e:
+        logger.error(f"Deletion job {job.id} failed: {e}")
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'completed'
+        logger.info(f"Deletion job {job.id} purged {job.deleted_rows} rows")
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+@job_handler('purge_deleted')
+def purge_deleted(payloads):
+    """Background job: run deletion jobs, failing (and so retrying) if one fails"""
+    for payload in payloads:
+        if 'target_id' in payload:
+            # Missing if the primary's transaction rolled back after the shard's committed
+            DeletionJob.objects.get_or_create(id=payload['deletion_job_id'], defaults={
+                'target_type': payload['target_type'],
+                'target_id': payload['target_id'],
+                'target_repr': payload['target_repr'],
+            })
+        job = run_deletion_job(payload['deletion_job_id'])
+        if job.status == 'failed':
+            raise RuntimeError(job.error)
+
+
+def resume_deletion_jobs():
+    """Run every job that is not completed, e.g. after a restart. Returns the jobs run."""
+    jobs = list(DeletionJob.objects.exclude(status='completed').order_by('created_at'))
+    return [run_deletion_job(job.id) for job in jobs]
@@ -0,0 +1,268 @@
+"""
+Server-sent events stream of task changes, for deployments served over ASGI.
+
+``GET /api/async/events/`` keeps the connection open and pushes an event
+whenever one of the user's tasks (every task, for admins) is created,
+updated, changes status, gets a comment, or is deleted, archived, restored
+or reassigned away::
+
+    id: <sync token>
+    event: task.status_changed
+    data: {"id": 5, "action": "status_changed", "deleted": false, "task": {...}}
+
+``task`` is the task as it is when the event is sent, as a task list row;
+``deleted`` is true, and ``task`` is left out, when by then the task is no
+longer in the user's list.
+
+Events come from the change log behind the change feed (tasks/changes.py).
+Each worker process has one ``ChangeHub`` per event loop, which polls the log
+every ``TASK_EVENTS_POLL_SECONDS`` while anyone is subscribed, loads the
+changed tasks once and hands the entries to every subscriber that can see
+them. A thousand open streams cost one poller, not a thousand.
+
+An event's id is a sync token for the position just after it. Browsers send
+it back as ``Last-Event-ID`` when they reconnect (``?sync_token=`` works too)
+and the stream resumes from there, so no event is lost across reconnects.
+
+Each subscriber has a queue of ``TASK_EVENTS_QUEUE_SIZE`` events. When a
+slow client lets it fill up, the hub stops queueing for it instead of
+buffering without bound or slowing down everyone else; once the client has
+drained its queue, its stream catches up from the change log, from its own
+position, and rejoins the live events.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.permissions import IsAuthenticated
+
+from .async_views import _closing_connections, async_api_view, render
+from .changes import (
+    ExpiredSyncToken, InvalidSyncToken, current_cursors, current_task_rows, make_sync_token,
+    parse_sync_token, read_changes,
+)
+from .serializers import TaskListRowSerializer
+
+logger = logging.getLogger(__name__)
+
+# Entries read from the change log per query
+READ_BATCH_SIZE = 200
+
+
+def _run(fn, *args):
+    """Run a blocking call on a worker thread of its own, as fan_out does"""
+    return sync_to_async(_closing_connections(lambda: fn(*args)), thread_sensitive=False)()
+
+
+def load_payloads(entries):
+    """
+    task id -> (assigned_to id, serialized task list row) for the tasks of
+    the entries that are still in the task list, serialized once for every
+    subscriber.
+    """
+    columns = TaskListRowSerializer.columns()
+    columns += [column for column in ('assigned_to_id',) if column not in columns]
+    rows = list(current_task_rows({entry['task_id'] for entry in entries}, columns).values())
+    return {
+        row['id']: (row['assigned_to_id'], data)
+        for row, data in zip(rows, TaskListRowSerializer(rows).data)
+    }
+
+
+class Subscriber:
+    """One open stream: who is listening, where they are and their queue"""
+
+    def __init__(self, user, cursors):
+        self.user = user
+        self.is_admin = user.is_admin()
+        self.cursors = cursors
+        self.queue = asyncio.Queue(maxsize=settings.TASK_EVENTS_QUEUE_SIZE)
+        # Starts by catching up from its cursors, then follows the hub
+        self.lagging = True
+
+    def wants(self, entry):
+        if entry['key'] not in self.cursors:
+            # Another shard's entry; this user's changes are all on their own
+            return False
+        return self.is_admin or self.user.pk in (entry['assignee_id'], entry['previous_assignee_id'])
+
+    def offer(self, entry, payload):
+        """Queue an event unless the stream has fallen behind"""
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait((entry, payload))
+        except asyncio.QueueFull:
+            # It will catch up from the change log once it has drained its queue
+            self.lagging = True
+
+    def fall_behind(self):
+        """Have the stream catch up from the change log now, rather than at its next heartbeat"""
+        self.lagging = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            # It isn't waiting on the queue, and checks lagging once it has drained it
+            pass
+
+    def format(self, entry, payload):
+        """The SSE message for an entry, moving the stream's position past it"""
+        self.cursors[entry['key']] = entry['id']
+        data = {'id': entry['task_id'], 'action': entry['action'], 'deleted': True}
+        if payload is not None and (self.is_admin or payload[0] == self.user.pk):
+            data['deleted'] = False
+            data['task'] = payload[1]
+        return (
+            f"id: {make_sync_token(self.user, self.cursors)}\n"
+            f"event: task.{entry['action']}\n"
+            f"data: {json.dumps(data)}\n\n"
+        )
+
+
+class ChangeHub:
+    """Polls the change log for an event loop's subscribers and fans the entries out"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.cursors = None
+        self.poller = None
+
+    async def subscribe(self, subscriber):
+        self.subscribers.add(subscriber)
+        if self.cursors is None:
+            # Before the subscriber catches up, so nothing falls between the two
+            self.cursors = await _run(current_cursors, None)
+        if self.poller is None:
+            self.poller = asyncio.ensure_future(self.run())
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def run(self):
+        try:
+            while self.subscribers:
+                await asyncio.sleep(settings.TASK_EVENTS_POLL_SECONDS)
+                await self.poll()
+        except Exception as e:
+            logger.error(f"Task event hub failed: {e}")
+            # Streams catch up from the change log and restart it
+            for subscriber in self.subscribers:
+                subscriber.fall_behind()
+        finally:
+            self.poller = None
+            if not self.subscribers:
+                # The next subscriber starts from the end of the log
+                self.cursors = None
+
+    async def poll(self):
+        has_more = True
+        while has_more:
+            entries, self.cursors, has_more = await _run(read_changes, None, self.cursors, READ_BATCH_SIZE)
+            if not entries:
+                return
+            payloads = await _run(load_payloads, entries)
+            for subscriber in list(self.subscribers):
+                for entry in entries:
+                    if subscriber.wants(entry):
+                        subscriber.offer(entry, payloads.get(entry['task_id']))
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """The hub of the running event loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = ChangeHub()
+    return _hubs[loop]
+
+
+async def catch_up(subscriber):
+    """Events from the change log after the subscriber's position, up to now"""
+    has_more = True
+    while has_more:
+        entries, _, has_more = await _run(read_changes, subscriber.user, dict(subscriber.cursors), READ_BATCH_SIZE)
+        if not entries:
+            return
+        payloads = await _run(load_payloads, entries)
+        for entry in entries:
+            yield subscriber.format(entry, payloads.get(entry['task_id']))
+
+
+async def stream(subscriber):
+    hub = get_hub()
+    loop = asyncio.get_running_loop()
+    # Django 4.2 doesn't tell a streaming response that its client went away,
+    # so streams end after a while and the client reconnects from where it was
+    closes_at = loop.time() + settings.TASK_EVENTS_MAX_SECONDS
+    try:
+        # Reconnect after 3 seconds when the connection drops
+        yield 'retry: 3000\n\n'
+        while loop.time() < closes_at:
+            if subscriber.lagging or hub.poller is None:
+                # Whatever is queued is in the change log too
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                await hub.subscribe(subscriber)
+                subscriber.lagging = False
+                async for message in catch_up(subscriber):
+                    yield message
+                continue
+            try:
+                event = await asyncio.wait_for(
+                    subscriber.queue.get(),
+                    timeout=min(settings.TASK_EVENTS_HEARTBEAT_SECONDS, max(closes_at - loop.time(), 0))
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection, and finds dropped ones
+                yield ': keepalive\n\n'
+                continue
+            if event is None:
+                # Woken by fall_behind()
+                continue
+            entry, payload = event
+            if entry['id'] <= subscriber.cursors[entry['key']]:
+                # Already sent while catching up
+                continue
+            yield subscriber.format(entry, payload)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+@async_api_view([IsAuthenticated])
+async def task_events(request):
+    """Stream task changes as server-sent events (ASGI only)"""
+    if not isinstance(request._request, ASGIRequest):
+        return render({
+            'success': False,
+            'message': 'Event streams need the ASGI application (task_management_system/asgi.py)'
+        }, 501)
+
+    token = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('sync_token')
+    try:
+        if token:
+            cursors = await sync_to_async(parse_sync_token)(request.user, token)
+        else:
+            cursors = await _run(current_cursors, request.user)
+    except ExpiredSyncToken as e:
+        return render({
+            'success': False,
+            'message': f'{e}; reload the task list and reconnect without a Last-Event-ID'
+        }, 410)
+    except InvalidSyncToken as e:
+        return render({
+            'success': False,
+            'message': str(e)
+        }, 400)
+
+    response = StreamingHttpResponse(stream(Subscriber(request.user, cursors)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Don't let nginx buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,112 @@
+"""
+The task list filters (``?status=``, ``?overdue=true``, ...), shared by
+list_tasks and the admin bulk update, which works on the same sets of tasks.
+"""
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+
+from .tags import filter_by_tags, normalize_tag_names
+from .user_directory import user_directory
+
+# Query parameters apply_task_filters reads
+FILTER_PARAMS = (
+    'status', 'priority', 'due_date', 'due_date_from', 'due_date_to',
+    'overdue', 'search', 'assigned_to', 'tags', 'any_tags',
+)
+
+
+class TaskFilterError(ValueError):
+    """An invalid filter parameter; status_code is the response status for it"""
+
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _tag_names(params, name):
+    """The comma-separated tag names of a parameter"""
+    try:
+        return normalize_tag_names([tag for tag in params.get(name, '').split(',') if tag.strip()])
+    except ValueError as e:
+        raise TaskFilterError(f'{name}: {e}')
+
+
+def apply_task_filters(queryset, params, is_admin=False):
+    """
+    Apply the list_tasks filter parameters in `params` (a QueryDict or dict)
+    to a task queryset. The assigned_to filter is for admins only.
+    Raises TaskFilterError for invalid parameters.
+    """
+    # Apply filters
+    status_filter = params.get('status')
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    priority_filter = params.get('priority')
+    if priority_filter:
+        queryset = queryset.filter(priority=priority_filter)
+
+    # Date filtering
+    due_date_filter = params.get('due_date')
+    if due_date_filter:
+        try:
+            due_date = datetime.strptime(due_date_filter, '%Y-%m-%d').date()
+        except ValueError:
+            raise TaskFilterError('Invalid date format. Use YYYY-MM-DD')
+        queryset = queryset.filter(due_date__date=due_date)
+
+    # Date range filtering
+    due_date_from = params.get('due_date_from')
+    due_date_to = params.get('due_date_to')
+
+    if due_date_from:
+        try:
+            from_date = datetime.strptime(due_date_from, '%Y-%m-%d')
+        except ValueError:
+            raise TaskFilterError('Invalid due_date_from format. Use YYYY-MM-DD')
+        queryset = queryset.filter(due_date__gte=from_date)
+
+    if due_date_to:
+        try:
+            to_date = datetime.strptime(due_date_to, '%Y-%m-%d')
+        except ValueError:
+            raise TaskFilterError('Invalid due_date_to format. Use YYYY-MM-DD')
+        to_date = to_date.replace(hour=23, minute=59, second=59)
+        queryset = queryset.filter(due_date__lte=to_date)
+
+    # Overdue filter
+    overdue_filter = params.get('overdue')
+    if overdue_filter and overdue_filter.lower() == 'true':
+        queryset = queryset.filter(
+            due_date__lt=timezone.now(),
+            status__in=['not_started', 'in_progress']
+        )
+
+    # Search functionality
+    search = params.get('search')
+    if search:
+        queryset = queryset.filter(
+            Q(title__icontains=search) | Q(description__icontains=search)
+        )
+
+    # Tag filters: every tag in ?tags=, at least one in ?any_tags=
+    all_tags = _tag_names(params, 'tags')
+    if all_tags:
+        queryset = filter_by_tags(queryset, all_tags, match_all=True)
+
+    any_tags = _tag_names(params, 'any_tags')
+    if any_tags:
+        queryset = filter_by_tags(queryset, any_tags, match_all=False)
+
+    # Assigned user filter (admin only)
+    assigned_to_filter = params.get('assigned_to')
+    if assigned_to_filter and is_admin:
+        assigned_user = user_directory.find(assigned_to_filter)
+        if assigned_user is None:
+            raise TaskFilterError('Assigned user not found', status.HTTP_404_NOT_FOUND)
+        queryset = queryset.filter(assigned_to_id=assigned_user.id)
+
+    return queryset
@@ -0,0 +1,313 @@
+"""
+Subtasks and blockers.
+
+A task can have one parent, which makes trees of epics and their subtasks,
+and any number of blockers: tasks that have to be completed before it can
+be. Both are kept as closure tables on the primary. ``SubtaskPath`` has a
+row for every (ancestor, descendant) pair of a tree, with the number of
+levels between them; ``BlockerPath`` has one for every (blocker, blocked)
+pair connected by a chain of "blocked by" links, with the number of such
+chains. So "all descendants of X" is one range of the unique (ancestor_id,
+descendant_id) index, "all blockers of X" one range of (blocked_id,
+blocker_id), and the rollup progress of X one aggregate over the tasks whose
+ids are in that range, instead of walking the links level by level.
+
+The work is done when linking:
+
+- setting a parent cuts the task's subtree off its old ancestors (one
+  DELETE) and joins it to the new ones (one bulk INSERT of ancestors x
+  subtree rows);
+- adding a blocker adds its chains to every (blocker's blockers x blocked
+  task's dependents) pair, and removing one subtracts them and drops the
+  pairs left with none. Counting the chains is what keeps removal exact
+  when tasks are linked in more than one way.
+
+A link that would close a cycle, a task becoming its own ancestor or
+blocking itself through a chain, is found with one lookup of the reverse
+pair and refused with HierarchyError. The linked tasks are locked until the
+link is written, so two links that would close a cycle together can't both
+pass the check.
+
+Without sharding the closure tables sit next to the tasks and the
+descendants, blockers and progress queries join them in the database. With
+sharding a tree's tasks may be on different shards: the ids are read from
+the primary, then the tasks from each shard holding any of them.
+
+A task with open blockers, direct or through a chain, can't be completed
+(Task._validate_status_transition), and bulk updates to completed leave it
+alone. Purged tasks are unlinked: their subtasks become top-level tasks and
+the chains through them go.
+"""
+from contextlib import ExitStack, contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q
+
+from .models import ArchivedTask, BlockerPath, SubtaskPath, Task
+from .sharding import is_sharded, scatter, shards_for_tasks
+
+
+class HierarchyError(ValueError):
+    """A link between tasks that can't be made"""
+
+
+def _gather(ids, fetch):
+    """
+    fetch(alias, ids) for the tasks with `ids`, a values_list() query of
+    task ids. Without sharding it is called once with that query, which its
+    task query joins in the database; with sharding (where `ids` may also be
+    a set), with the ids read from it, on every shard holding any of them.
+    """
+    if not is_sharded():
+        return [fetch(None, ids)]
+    by_shard = {}
+    for task_id, using in shards_for_tasks(ids).items():
+        by_shard.setdefault(using, []).append(task_id)
+    results = scatter(lambda using: fetch(using, by_shard[using]) if using in by_shard else None)
+    return [result for result in results if result is not None]
+
+
+@contextmanager
+def _locked(task_ids):
+    """
+    Transactions on the primary and the tasks' shards, with the tasks'
+    rows locked; HierarchyError if one of them is not an active task.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(transaction.atomic(using=DEFAULT_DB_ALIAS))
+        by_shard = {}
+        for task_id, using in shards_for_tasks(task_ids).items():
+            by_shard.setdefault(using or DEFAULT_DB_ALIAS, []).append(task_id)
+        found = set()
+        # In the same order everywhere, so linkers don't deadlock
+        for using in sorted(by_shard):
+            stack.enter_context(transaction.atomic(using=using))
+            found.update(
+                Task.objects.using(using).filter(id__in=by_shard[using])
+                .select_for_update().order_by('id').values_list('id', flat=True)
+            )
+        missing = set(task_ids) - found
+        if missing:
+            raise HierarchyError(f'Task {min(missing)} not found')
+        yield
+
+
+# Subtasks
+
+def parent_id_of(task_id):
+    """Id of a task's parent, or None for a top-level task"""
+    return (
+        SubtaskPath.objects.using(DEFAULT_DB_ALIAS)
+        .filter(descendant_id=task_id, depth=1)
+        .values_list('ancestor_id', flat=True)
+        .first()
+    )
+
+
+def _move_subtree(task_id, parent_id):
+    """Relink a task and its subtasks under `parent_id` (None: top level), in the open transaction"""
+    paths = SubtaskPath.objects.using(DEFAULT_DB_ALIAS)
+    # The task and its subtasks, with their depth below it
+    subtree = [(task_id, 0)] + list(paths.filter(ancestor_id=task_id).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    paths.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+    if parent_id is None:
+        return
+    ancestors = [(parent_id, 0)] + list(paths.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+    paths.bulk_create([
+        SubtaskPath(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=above + 1 + below)
+        for ancestor_id, above in ancestors
+        for descendant_id, below in subtree
+    ])
+
+
+def set_parent(task_id, parent_id):
+    """
+    Make a task (with its subtasks) a subtask of `parent_id`, or a top-level
+    task with None. Returns the id of its previous parent.
+    """
+    if parent_id == task_id:
+        raise HierarchyError('A task cannot be its own parent')
+    with _locked([task_id] if parent_id is None else [task_id, parent_id]):
+        previous_id = parent_id_of(task_id)
+        if previous_id == parent_id:
+            return previous_id
+        if parent_id is not None and SubtaskPath.objects.using(DEFAULT_DB_ALIAS).filter(
+            ancestor_id=task_id, descendant_id=parent_id
+        ).exists():
+            raise HierarchyError(f'Task {parent_id} is a subtask of task {task_id}')
+        _move_subtree(task_id, parent_id)
+    return previous_id
+
+
+def subtask_rows(task_id, columns, max_depth=None):
+    """values() rows of `columns` of a task's subtasks (down to `max_depth` levels), by id"""
+    paths = SubtaskPath.objects.filter(ancestor_id=task_id)
+    if max_depth is not None:
+        paths = paths.filter(depth__lte=max_depth)
+    results = _gather(
+        paths.values_list('descendant_id', flat=True),
+        lambda using, ids: list(Task.objects.using(using).filter(id__in=ids).values(*columns))
+    )
+    return sorted((row for rows in results for row in rows), key=lambda row: row['id'])
+
+
+def subtask_progress(task_id):
+    """
+    Completion of a task's subtasks at every level: {'total', 'completed',
+    'percent'}, percent being None without subtasks. Archived subtasks count
+    as completed.
+    """
+    ids = SubtaskPath.objects.filter(ancestor_id=task_id).values_list('descendant_id', flat=True)
+
+    def count(using, ids):
+        counts = Task.objects.using(using).filter(id__in=ids).aggregate(
+            total=Count('id'), completed=Count('id', filter=Q(status='completed'))
+        )
+        archived = ArchivedTask.objects.using(using).filter(id__in=ids).count()
+        return counts['total'] + archived, counts['completed'] + archived
+
+    results = _gather(ids, count)
+    total = sum(total for total, _ in results)
+    completed = sum(completed for _, completed in results)
+    return {
+        'total': total,
+        'completed': completed,
+        'percent': round(100 * completed / total, 1) if total else None,
+    }
+
+
+# Blockers
+
+def _add_chains(blocker_id, blocked_id, sign):
+    """Add (sign 1) or remove (-1) the chains through the link blocker -> blocked, in the open transaction"""
+    paths = BlockerPath.objects.using(DEFAULT_DB_ALIAS)
+    # Chains into the blocker, and out of the blocked task
+    upstream = [(blocker_id, 1)] + list(paths.filter(blocked_id=blocker_id).values_list('blocker_id', 'paths'))
+    downstream = [(blocked_id, 1)] + list(paths.filter(blocker_id=blocked_id).values_list('blocked_id', 'paths'))
+    pairs = paths.filter(
+        blocker_id__in=[task_id for task_id, _ in upstream],
+        blocked_id__in=[task_id for task_id, _ in downstream]
+    )
+    existing = set(pairs.values_list('blocker_id', 'blocked_id'))
+
+    changes = {}
+    new = []
+    for upstream_id, upstream_paths in upstream:
+        for downstream_id, downstream_paths in downstream:
+            chains = upstream_paths * downstream_paths
+            if (upstream_id, downstream_id) in existing:
+                changes.setdefault((upstream_id, sign * chains), []).append(downstream_id)
+            else:
+                new.append(BlockerPath(blocker_id=upstream_id, blocked_id=downstream_id, paths=chains))
+    # One UPDATE per blocker and change, mostly a single one per blocker
+    for (upstream_id, change), downstream_ids in changes.items():
+        paths.filter(blocker_id=upstream_id, blocked_id__in=downstream_ids).update(paths=F('paths') + change)
+    if sign > 0:
+        paths.bulk_create(new)
+    else:
+        pairs.filter(paths=0).delete()
+
+
+def add_blocker(task_id, blocker_id):
+    """Make a task blocked by `blocker_id`; False if it already was directly"""
+    if blocker_id == task_id:
+        raise HierarchyError('A task cannot block itself')
+    with _locked([task_id, blocker_id]):
+        paths = BlockerPath.objects.using(DEFAULT_DB_ALIAS)
+        if paths.filter(blocked_id=blocker_id, blocker_id=task_id).exists():
+            raise HierarchyError(f'Task {blocker_id} is blocked by task {task_id}')
+        if paths.filter(blocked_id=task_id, blocker_id=blocker_id, is_direct=True).exists():
+            return False
+        _add_chains(blocker_id, task_id, 1)
+        paths.filter(blocked_id=task_id, blocker_id=blocker_id).update(is_direct=True)
+    return True
+
+
+def _remove_link(task_id, blocker_id):
+    """Remove the direct link of a task to a blocker, in the open transaction; False if there is none"""
+    if not BlockerPath.objects.using(DEFAULT_DB_ALIAS).filter(
+        blocked_id=task_id, blocker_id=blocker_id, is_direct=True
+    ).update(is_direct=False):
+        return False
+    _add_chains(blocker_id, task_id, -1)
+    return True
+
+
+def remove_blocker(task_id, blocker_id):
+    """Make a task no longer blocked by `blocker_id` directly; False if it wasn't"""
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        return _remove_link(task_id, blocker_id)
+
+
+def direct_blocker_ids(task_id):
+    """Ids of the tasks a task is linked to as blocked by"""
+    return list(
+        BlockerPath.objects.filter(blocked_id=task_id, is_direct=True)
+        .order_by('blocker_id').values_list('blocker_id', flat=True)
+    )
+
+
+def blocker_rows(task_id, columns):
+    """values() rows of `columns` of the active tasks blocking a task, directly or through others, by id"""
+    results = _gather(
+        BlockerPath.objects.filter(blocked_id=task_id).values_list('blocker_id', flat=True),
+        lambda using, ids: list(Task.objects.using(using).filter(id__in=ids).values(*columns))
+    )
+    return sorted((row for rows in results for row in rows), key=lambda row: row['id'])
+
+
+def open_blocker_ids(task_id):
+    """Ids of the open tasks blocking a task, directly or through others; read from the primary"""
+    results = _gather(
+        BlockerPath.objects.using(DEFAULT_DB_ALIAS).filter(blocked_id=task_id).values_list('blocker_id', flat=True),
+        lambda using, ids: list(
+            Task.objects.using(using or DEFAULT_DB_ALIAS)
+            .filter(id__in=ids, status__in=Task.OPEN_STATUSES).values_list('id', flat=True)
+        )
+    )
+    return {blocker_id for ids in results for blocker_id in ids}
+
+
+def blocked_task_ids(task_ids):
+    """The tasks among `task_ids` that have open blockers; read from the primary"""
+    paths = BlockerPath.objects.using(DEFAULT_DB_ALIAS).filter(blocked_id__in=list(task_ids))
+    if not is_sharded():
+        open_tasks = Task.objects.using(DEFAULT_DB_ALIAS).filter(status__in=Task.OPEN_STATUSES)
+        return set(paths.filter(blocker_id__in=open_tasks.values('id')).values_list('blocked_id', flat=True))
+    pairs = list(paths.values_list('blocked_id', 'blocker_id'))
+    results = _gather(
+        {blocker_id for _, blocker_id in pairs},
+        lambda using, ids: list(
+            Task.objects.using(using).filter(id__in=ids, status__in=Task.OPEN_STATUSES).values_list('id', flat=True)
+        )
+    )
+    open_ids = {blocker_id for ids in results for blocker_id in ids}
+    return {blocked_id for blocked_id, blocker_id in pairs if blocker_id in open_ids}
+
+
+def unlink_tasks(task_ids):
+    """
+    Take purged tasks out of the closure tables: their subtasks become
+    top-level tasks, and the chains through them are removed.
+    """
+    task_ids = list(task_ids)
+    subtask_paths = SubtaskPath.objects.using(DEFAULT_DB_ALIAS)
+    blocker_paths = BlockerPath.objects.using(DEFAULT_DB_ALIAS)
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        # Most tasks are in no tree: only those with a parent or children are relinked
+        linked = set()
+        for ancestor_id, descendant_id in subtask_paths.filter(
+            Q(ancestor_id__in=task_ids) | Q(descendant_id__in=task_ids), depth=1
+        ).values_list('ancestor_id', 'descendant_id'):
+            linked.update({ancestor_id, descendant_id})
+        for task_id in sorted(linked.intersection(task_ids)):
+            for child_id in list(subtask_paths.filter(ancestor_id=task_id, depth=1).values_list('descendant_id', flat=True)):
+                _move_subtree(child_id, None)
+            _move_subtree(task_id, None)
+
+        links = blocker_paths.filter(
+            Q(blocked_id__in=task_ids) | Q(blocker_id__in=task_ids), is_direct=True
+        ).values_list('blocked_id', 'blocker_id')
+        for blocked_id, blocker_id in list(links):
+            _remove_link(blocked_id, blocker_id)
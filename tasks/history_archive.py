@@ -0,0 +1,338 @@
+"""
+Cold storage for TaskHistory.
+
+Rows older than ``HISTORY_ARCHIVE_AFTER_DAYS`` are moved out of the database
+into monthly, gzip-compressed NDJSON segments under ``HISTORY_ARCHIVE_DIR``::
+
+    <HISTORY_ARCHIVE_DIR>/
+        index.json
+        2025/2025-05.ndjson.gz
+        2025/2025-05.ids
+        2025/2025-06.ndjson.gz
+        2025/2025-06.ids
+
+Each chunk is appended to its segment as a new gzip member, and the ids of
+its tasks to the segment's ``.ids`` sidecar, so neither ever has to be
+rewritten. Readers only open segments whose sidecar lists the task they are
+asked about. ``index.json`` records per segment the row count and timestamp
+range. Archivers take turns through a lock file, so chunks archived
+concurrently (e.g. from several shards) don't lose each other's index updates.
+
+Records are stored in the same shape ``TaskHistorySerializer`` emits (plus
+``task``), which lets the API return hot and archived rows side by side.
+History ids are only unique per shard and change when a task moves between
+shards, so records are told apart by id and timestamp together.
+"""
+import copy
+import fcntl
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import TaskHistory
+from .sharding import shard_aliases
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = 'index.json'
+LOCK_FILENAME = '.lock'
+
+_index_lock = threading.Lock()
+_index_cache = {'mtime': None, 'index': None}
+_task_ids_cache = {}
+
+
+def get_archive_dir():
+    """Directory holding the archive segments and index"""
+    return str(settings.HISTORY_ARCHIVE_DIR)
+
+
+def segment_key(timestamp):
+    """Monthly partition key for a timestamp, e.g. '2025-05'"""
+    return timestamp.strftime('%Y-%m')
+
+
+def segment_path(key):
+    """Path of a segment relative to the archive directory"""
+    return os.path.join(key[:4], f'{key}.ndjson.gz')
+
+
+def task_ids_path(key):
+    """Path of a segment's task id sidecar relative to the archive directory"""
+    return os.path.join(key[:4], f'{key}.ids')
+
+
+@contextmanager
+def archive_lock():
+    """Hold the archive's lock file, shared by every process writing to the archive"""
+    archive_dir = get_archive_dir()
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, LOCK_FILENAME), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def load_index():
+    """Load index.json, reusing the parsed copy while the file is unchanged"""
+    path = os.path.join(get_archive_dir(), INDEX_FILENAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {'segments': {}}
+
+    with _index_lock:
+        if _index_cache['mtime'] != mtime:
+            with open(path, encoding='utf-8') as fh:
+                _index_cache['index'] = json.load(fh)
+            _index_cache['mtime'] = mtime
+        return _index_cache['index']
+
+
+def _write_index(index):
+    """Atomically replace index.json"""
+    archive_dir = get_archive_dir()
+    fd, tmp_path = tempfile.mkstemp(dir=archive_dir, prefix='.index-', suffix='.json')
+    with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+        json.dump(index, fh, sort_keys=True)
+    os.replace(tmp_path, os.path.join(archive_dir, INDEX_FILENAME))
+
+
+def _append_task_ids(key, task_ids):
+    """Add task ids to a segment's sidecar"""
+    path = os.path.join(get_archive_dir(), task_ids_path(key))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as fh:
+        fh.write(''.join(f'{task_id}\n' for task_id in task_ids))
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def segment_task_ids(key, meta):
+    """Ids of the tasks with rows in a segment, reusing the parsed set while its sidecar is unchanged"""
+    path = os.path.join(get_archive_dir(), task_ids_path(key))
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        # Written before segments had sidecars
+        return set(meta.get('task_ids', ()))
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _index_lock:
+        cached = _task_ids_cache.get(path)
+    if cached is None or cached[0] != version:
+        with open(path, encoding='utf-8') as fh:
+            task_ids = {int(line) for line in fh if line.strip()}
+        task_ids.update(meta.get('task_ids', ()))
+        cached = (version, task_ids)
+        with _index_lock:
+            _task_ids_cache[path] = cached
+    return cached[1]
+
+
+def serialize_history(entry):
+    """Archive record for a TaskHistory row"""
+    # Imported here to avoid a circular import with serializers
+    from .serializers import TaskHistorySerializer
+
+    record = dict(TaskHistorySerializer(entry).data)
+    record['task'] = entry.task_id
+    return record
+
+
+def _append_segment(key, records):
+    """Append records to a segment as a new gzip member"""
+    path = os.path.join(get_archive_dir(), segment_path(key))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    payload = ''.join(json.dumps(record, sort_keys=True) + '\n' for record in records)
+    with gzip.open(path, 'at', encoding='utf-8') as fh:
+        fh.write(payload)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+
+def archive_chunk(cutoff, chunk_size, using=None):
+    """
+    Move one chunk of history rows older than cutoff (from one shard) to the
+    archive.
+
+    Segments are written and the index updated before the rows are deleted,
+    so a crash can at worst leave a row both hot and archived; readers drop
+    such duplicates by id and timestamp. Returns the number of rows archived.
+    """
+    entries = list(
+        TaskHistory.objects.using(using).filter(timestamp__lt=cutoff)
+        .select_related('user')
+        .order_by('timestamp', 'id')[:chunk_size]
+    )
+    if not entries:
+        return 0
+
+    by_segment = defaultdict(list)
+    for entry in entries:
+        by_segment[segment_key(entry.timestamp)].append(entry)
+
+    with archive_lock():
+        index = copy.deepcopy(load_index())
+        for key, segment_entries in sorted(by_segment.items()):
+            _append_segment(key, [serialize_history(entry) for entry in segment_entries])
+
+            meta = index['segments'].setdefault(key, {
+                'path': segment_path(key),
+                'rows': 0,
+                'min_timestamp': None,
+                'max_timestamp': None,
+            })
+            # Ids listed in the index by older versions move to the sidecar
+            task_ids = set(meta.pop('task_ids', ())) | {entry.task_id for entry in segment_entries}
+            _append_task_ids(key, sorted(task_ids))
+
+            first = segment_entries[0].timestamp.isoformat()
+            last = segment_entries[-1].timestamp.isoformat()
+            meta['rows'] += len(segment_entries)
+            meta['min_timestamp'] = min(filter(None, [meta['min_timestamp'], first]))
+            meta['max_timestamp'] = max(filter(None, [meta['max_timestamp'], last]))
+        _write_index(index)
+
+    # Short write transaction: delete by primary key only
+    with transaction.atomic(using=using):
+        TaskHistory.objects.using(using).filter(id__in=[entry.id for entry in entries]).delete()
+
+    return len(entries)
+
+
+def archive_history(older_than_days=None, chunk_size=1000, pause=0.0, max_chunks=None):
+    """Archive history rows in chunks until none older than the cutoff remain"""
+    if older_than_days is None:
+        older_than_days = settings.HISTORY_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    total = 0
+    chunks = 0
+    for using in shard_aliases():
+        while max_chunks is None or chunks < max_chunks:
+            archived = archive_chunk(cutoff, chunk_size, using)
+            if not archived:
+                break
+            total += archived
+            chunks += 1
+            logger.info(f"Archived {archived} history rows (total {total})")
+            if pause:
+                time.sleep(pause)
+    return total
+
+
+def iter_segment(key):
+    """Yield the records stored in one segment"""
+    path = os.path.join(get_archive_dir(), segment_path(key))
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as fh:
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+    except FileNotFoundError:
+        return
+
+
+def get_archived_histories(task_ids):
+    """Archived history records for several tasks, newest first: {task id: records}"""
+    wanted = set(task_ids)
+    records = {task_id: {} for task_id in wanted}
+    segments = load_index()['segments']
+    for key in sorted(segments, reverse=True):
+        hits = wanted & segment_task_ids(key, segments[key])
+        if not hits:
+            continue
+        # Each segment is read once, whatever the number of tasks in it
+        for record in iter_segment(key):
+            if record['task'] in hits:
+                records[record['task']][(record['id'], record['timestamp'])] = record
+
+    return {
+        task_id: sorted(
+            task_records.values(),
+            key=lambda r: (parse_datetime(r['timestamp']), r['id']),
+            reverse=True
+        )
+        for task_id, task_records in records.items()
+    }
+
+
+def get_archived_history(task_id):
+    """Archived history records for a task, newest first"""
+    return get_archived_histories([task_id])[task_id]
+
+
+def _add_archived(entries, archived_records, limit=None):
+    """Append archived records not already among the hot entries, up to limit"""
+    # Hot rows are always newer than archived ones
+    seen = {(entry['id'], entry['timestamp']) for entry in entries}
+    for record in archived_records:
+        if (record['id'], record['timestamp']) in seen:
+            continue
+        record = {k: v for k, v in record.items() if k != 'task'}
+        entries.append(record)
+        if limit is not None and len(entries) >= limit:
+            break
+    return entries
+
+
+def get_task_history(task, limit=None):
+    """
+    Full history for a task across the database and the archive, newest
+    first, in TaskHistorySerializer's output shape.
+    """
+    from .serializers import TaskHistorySerializer
+
+    # task.history is TaskHistory or, for archived tasks, ArchivedTaskHistory
+    hot = task.history.order_by('-timestamp', '-id')
+    if limit is not None:
+        hot = hot[:limit]
+    entries = TaskHistorySerializer(hot, many=True).data
+    if limit is not None and len(entries) >= limit:
+        return entries
+
+    return _add_archived(entries, get_archived_history(task.id), limit)
+
+
+def get_tasks_history(tasks):
+    """
+    get_task_history for many tasks at once: {task id: entries}. Runs one
+    query per tier and database, and reads each archive segment at most once.
+    """
+    from .serializers import TaskHistorySerializer
+
+    histories = {task.id: [] for task in tasks}
+    groups = {}
+    for task in tasks:
+        groups.setdefault((type(task), task._state.db), []).append(task.id)
+    for (model, using), task_ids in groups.items():
+        # TaskHistory or, for archived tasks, ArchivedTaskHistory
+        history_model = model._meta.get_field('history').related_model
+        hot = list(
+            history_model.objects.using(using)
+            .filter(task_id__in=task_ids)
+            .order_by('-timestamp', '-id')
+        )
+        for entry, data in zip(hot, TaskHistorySerializer(hot, many=True).data):
+            histories[entry.task_id].append(data)
+
+    archived = get_archived_histories(histories)
+    return {
+        task_id: _add_archived(entries, archived[task_id])
+        for task_id, entries in histories.items()
+    }
@@ -0,0 +1,211 @@
+"""
+Idempotency keys for write requests.
+
+Clients on flaky networks retry writes whose response they never got. A
+write sent with an ``Idempotency-Key: <unique string>`` header runs once per
+user and key:
+
+- The first request claims the key with a row in ``IdempotencyKey`` on the
+  primary, committed before the view runs, then stores its response there
+  (zlib-compressed) once the view has returned.
+- A retry of a finished request gets the stored response back, with an
+  ``Idempotent-Replayed: true`` header, without running the view again.
+- A retry that arrives while the first request is still running waits up to
+  ``IDEMPOTENCY_WAIT_SECONDS`` for it and then replays its response, or gets
+  409 if it is still running by then.
+- Reusing a key for a different request (method, path or body) gets 422.
+
+Only successful responses are stored: a request that fails (4xx, 5xx or an
+exception) releases its key, so the client can fix it and retry with the
+same key. A key held by a request that has been running for longer than
+``IDEMPOTENCY_LOCK_TIMEOUT_SECONDS`` (its process died) is taken over by the
+next retry. Keys expire after ``IDEMPOTENCY_KEY_TTL_HOURS``; the job
+workers delete expired ones.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import zlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+# Response headers stored and replayed along with the body
+STORED_HEADERS = ('ETag', 'Location')
+
+# How often a waiting retry checks on a request running in another process
+POLL_SECONDS = 0.05
+
+# Key id -> event set when the request holding the key finishes, so retries
+# waiting in this process wake up at once instead of at the next poll
+_finished = {}
+_finished_lock = threading.Lock()
+
+
+def _keys():
+    return IdempotencyKey.objects.using(DEFAULT_DB_ALIAS)
+
+
+def request_fingerprint(request):
+    """Hash of what the request does: method, path and query, and body"""
+    data = request.data
+    if hasattr(data, 'lists'):
+        # Form data: keep repeated keys
+        data = dict(data.lists())
+    payload = json.dumps([request.method, request.get_full_path(), data], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim(user_id, key, fingerprint):
+    """
+    Claim a key for a request. Returns (record, True) if the caller is to run
+    the request, or (record, False) if another request already holds the key.
+    """
+    now = timezone.now()
+    while True:
+        # An expired key is free to use again
+        _keys().filter(user_id=user_id, key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                record = _keys().create(
+                    user_id=user_id,
+                    key=key,
+                    fingerprint=fingerprint,
+                    locked_at=now,
+                    expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+            return record, True
+        except IntegrityError:
+            record = _keys().filter(user_id=user_id, key=key).first()
+            if record is not None:
+                return record, False
+            # Released between the insert and the read; try again
+
+
+def take_over(record):
+    """Claim a key whose request has been running for too long, e.g. because its process died"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT_SECONDS)
+    return bool(
+        _keys().filter(id=record.id, status_code__isnull=True, locked_at__lt=cutoff)
+        .update(locked_at=timezone.now())
+    )
+
+
+def wait_for(record, deadline):
+    """
+    Wait until the request holding the key finishes or the deadline passes.
+    Returns the record as it is then, or None if the request failed and
+    released the key.
+    """
+    with _finished_lock:
+        event = _finished.setdefault(record.id, threading.Event())
+    while True:
+        current = _keys().filter(id=record.id).first()
+        remaining = deadline - time.monotonic()
+        if current is None or current.status_code is not None or remaining <= 0:
+            return current
+        event.wait(min(POLL_SECONDS, remaining))
+
+
+def _notify(record):
+    with _finished_lock:
+        event = _finished.pop(record.id, None)
+    if event is not None:
+        event.set()
+
+
+def store(record, response):
+    headers = {name: response[name] for name in STORED_HEADERS if response.has_header(name)}
+    packed = zlib.compress(JSONRenderer().render({'data': response.data, 'headers': headers}))
+    _keys().filter(id=record.id).update(status_code=response.status_code, response=packed)
+
+
+def release(record):
+    _keys().filter(id=record.id).delete()
+
+
+def replay(record):
+    payload = json.loads(zlib.decompress(record.response))
+    response = Response(payload['data'], status=record.status_code, headers=payload['headers'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def execute(record, view, request, args, kwargs):
+    """Run the view for the request holding the key and store or release it"""
+    try:
+        response = view(request, *args, **kwargs)
+        if response.status_code < 400 and hasattr(response, 'data'):
+            store(record, response)
+        else:
+            release(record)
+        return response
+    except Exception:
+        release(record)
+        raise
+    finally:
+        _notify(record)
+
+
+def idempotent(view):
+    """
+    Make a write view honour Idempotency-Key. Goes below @permission_classes,
+    so it runs after authentication and keys are kept per user.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'success': False,
+                'message': f'Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            record, claimed = claim(request.user.pk, key, fingerprint)
+            if not claimed and record.fingerprint != fingerprint:
+                return Response({
+                    'success': False,
+                    'message': 'Idempotency-Key was already used for a different request'
+                }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if claimed or (record.status_code is None and take_over(record)):
+                return execute(record, view, request, args, kwargs)
+
+            if record.status_code is None:
+                logger.info(f"Request with Idempotency-Key {key} of {request.user.username} is in progress, waiting")
+                record = wait_for(record, deadline)
+                if record is None:
+                    # The first attempt failed and let go of the key: run this one
+                    continue
+            if record.status_code is not None:
+                return replay(record)
+            return Response({
+                'success': False,
+                'message': 'A request with this Idempotency-Key is still in progress; retry later'
+            }, status=status.HTTP_409_CONFLICT)
+
+    return wrapper
+
+
+def prune_idempotency_keys():
+    """Delete expired idempotency keys. Returns the number deleted."""
+    return _keys().filter(expires_at__lte=timezone.now()).delete()[0]
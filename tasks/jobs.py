@@ -0,0 +1,264 @@
+"""
+Durable background jobs for the side effects of requests.
+
+``enqueue(name, payload, using)`` inserts a ``BackgroundJob`` row in the
+transaction open on `using`, the database the change it follows from is
+written to: a transactional outbox. The job commits or rolls back with the
+change, so a request that rolls back leaves no job behind and one that
+commits always does; committing only wakes the workers. With sharding each
+shard keeps the jobs of its own writes and the workers claim jobs from every
+database. A worker claims pending jobs, calls
+the handler registered for their name with ``@job_handler(name)`` and marks
+them completed. A job whose handler raises is retried with exponential
+backoff (``JOB_RETRY_BACKOFF_SECONDS``, doubling) and marked failed after
+``JOB_MAX_ATTEMPTS`` attempts.
+
+Jobs are run by ``JOB_WORKERS`` threads in the web process, woken whenever
+a job is enqueued, and/or by ``manage.py run_workers``. Claiming is an UPDATE
+guarded by the job's status, so any number of threads and processes can
+share the table.
+
+Handlers receive a list of payloads: up to ``batch_size`` pending jobs of
+the same name (and database) are claimed and handled together. If a batch
+fails, its jobs are run again one by one, so a bad payload only holds back
+itself. Part of the batch may have been written by then, so handlers must be
+idempotent: running a payload again must not repeat what it already did.
+"""
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import BackgroundJob
+from .sharding import get_shards
+
+logger = logging.getLogger(__name__)
+
+# name -> (handler, batch_size)
+_handlers = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+_scheduled_drains = 0
+
+
+def job_handler(name, batch_size=1):
+    """Register fn(payloads) as the handler of jobs called name"""
+    def decorator(fn):
+        _handlers[name] = (fn, batch_size)
+        return fn
+    return decorator
+
+
+def job_databases():
+    """Aliases of the databases holding jobs: the primary and every shard"""
+    return [DEFAULT_DB_ALIAS] + get_shards()
+
+
+def _jobs(using=DEFAULT_DB_ALIAS):
+    # Never a replica: it may not have a job, or its claim, yet
+    return BackgroundJob.objects.using(using)
+
+
+def enqueue(name, payload, using=None, delay=0):
+    """
+    Record a job in the transaction open on `using` (committed right away
+    outside a transaction), and wake the workers once it commits. The
+    payload must be JSON serializable.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    _jobs(using).create(
+        name=name,
+        payload=payload,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    transaction.on_commit(wake_workers, using=using)
+
+
+def wake_workers():
+    """Have the web process's worker threads run pending jobs"""
+    global _executor, _scheduled_drains
+    workers = settings.JOB_WORKERS
+    if workers <= 0:
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs')
+            # First wake-up of this process: pick up jobs a previous one left running
+            _executor.submit(_run_in_thread, requeue_stale_jobs)
+        if _scheduled_drains >= workers:
+            # Enough drains are queued; they will see this job too
+            return
+        _scheduled_drains += 1
+    _executor.submit(_drain)
+
+
+def _drain():
+    global _scheduled_drains
+    with _executor_lock:
+        # Jobs enqueued from now on schedule a drain of their own
+        _scheduled_drains -= 1
+    _run_in_thread(run_pending)
+
+
+def _run_in_thread(fn):
+    try:
+        fn()
+    except Exception as e:
+        logger.error(f"Job worker error: {e}")
+    finally:
+        # Runs on a pool thread; don't leave its connections open
+        connections.close_all()
+
+
+def _due(using, now):
+    return _jobs(using).filter(status='pending', run_after__lte=now).order_by('run_after', 'id')
+
+
+def _claim_on(using):
+    """Claim the next batch of due jobs of one name on a database; [] when none are due"""
+    while True:
+        now = timezone.now()
+        due = _due(using, now)
+        name = due.values_list('name', flat=True).first()
+        if name is None:
+            return []
+        _, batch_size = _handlers.get(name, (None, 1))
+        ids = list(due.filter(name=name).values_list('id', flat=True)[:batch_size])
+
+        token = uuid.uuid4().hex
+        claimed = _jobs(using).filter(id__in=ids, status='pending').update(
+            status='running',
+            claimed_by=token,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return list(_jobs(using).filter(claimed_by=token).order_by('id'))
+        # Another worker got there first; look again
+
+
+def claim_batch():
+    """
+    Claim the next batch of due jobs of one name, from the database whose
+    oldest due job has waited longest; [] when none are due
+    """
+    now = timezone.now()
+    waiting = []
+    for using in job_databases():
+        run_after = _due(using, now).values_list('run_after', flat=True).first()
+        if run_after is not None:
+            waiting.append((run_after, using))
+    for _, using in sorted(waiting):
+        jobs = _claim_on(using)
+        if jobs:
+            return jobs
+    return []
+
+
+def _retry_or_fail(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        logger.error(f"Job {job.id} ({job.name}) failed after {job.attempts} attempts: {error}")
+        updates = {'status': 'failed', 'finished_at': now}
+    else:
+        delay = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        logger.warning(f"Job {job.id} ({job.name}) attempt {job.attempts} failed, retrying in {delay:g}s: {error}")
+        updates = {'status': 'pending', 'run_after': now + timedelta(seconds=delay)}
+    _jobs(job._state.db).filter(id=job.id, claimed_by=job.claimed_by).update(
+        claimed_by='', last_error=str(error)[:2000], **updates
+    )
+
+
+def run_batch(jobs):
+    """Run claimed jobs of one name through their handler"""
+    name = jobs[0].name
+    using = jobs[0]._state.db
+    if name not in _handlers:
+        # Retrying won't help
+        logger.error(f"No handler registered for job {name}")
+        _jobs(using).filter(id__in=[job.id for job in jobs], claimed_by=jobs[0].claimed_by).update(
+            status='failed', claimed_by='', last_error=f'No handler registered for job {name}',
+            finished_at=timezone.now()
+        )
+        return
+
+    handler, _ = _handlers[name]
+    try:
+        handler([job.payload for job in jobs])
+    except Exception as e:
+        if len(jobs) > 1:
+            for job in jobs:
+                run_batch([job])
+            return
+        _retry_or_fail(jobs[0], e)
+        return
+
+    _jobs(using).filter(id__in=[job.id for job in jobs], claimed_by=jobs[0].claimed_by).update(
+        status='completed', claimed_by='', finished_at=timezone.now()
+    )
+
+
+def run_pending(limit=None):
+    """Run due jobs until there are none left (or `limit` have run). Returns the number run."""
+    processed = 0
+    while limit is None or processed < limit:
+        jobs = claim_batch()
+        if not jobs:
+            break
+        run_batch(jobs)
+        processed += len(jobs)
+    return processed
+
+
+def requeue_stale_jobs():
+    """Make jobs claimed longer than JOB_LOCK_TIMEOUT_SECONDS ago (e.g. by a process that died) pending again"""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT_SECONDS)
+    requeued = sum(
+        _jobs(using).filter(status='running', started_at__lt=cutoff).update(status='pending', claimed_by='')
+        for using in job_databases()
+    )
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale jobs")
+    return requeued
+
+
+def delete_finished_jobs(days=None):
+    """Delete jobs that completed more than `days` (JOB_KEEP_FINISHED_DAYS) ago"""
+    days = settings.JOB_KEEP_FINISHED_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return sum(
+        _jobs(using).filter(status='completed', finished_at__lt=cutoff).delete()[0]
+        for using in job_databases()
+    )
+
+
+def latest_jobs(limit=50, **filters):
+    """The `limit` newest jobs matching `filters`, across the job databases"""
+    jobs = [
+        job for using in job_databases()
+        for job in _jobs(using).filter(**filters).order_by('-created_at', '-id')[:limit]
+    ]
+    return sorted(jobs, key=lambda job: job.created_at, reverse=True)[:limit]
+
+
+def job_summary():
+    """Job counts by status, and by name and status, over the job databases"""
+    summary = {'by_status': {}, 'by_name': {}}
+    for using in job_databases():
+        rows = (
+            _jobs(using).order_by().values('name', 'status').annotate(count=Count('id'))
+            .values_list('name', 'status', 'count')
+        )
+        for name, job_status, count in rows:
+            summary['by_status'][job_status] = summary['by_status'].get(job_status, 0) + count
+            by_name = summary['by_name'].setdefault(name, {})
+            by_name[job_status] = by_name.get(job_status, 0) + count
+    return summary
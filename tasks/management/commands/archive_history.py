@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.history_archive import archive_history, get_archive_dir
+
+
+class Command(BaseCommand):
+    """Move old TaskHistory rows into compressed monthly archive segments"""
+
+    help = 'Archive task history older than a given age to gzip NDJSON segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.HISTORY_ARCHIVE_AFTER_DAYS,
+            help='Archive rows older than this many days'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Rows moved per chunk (one short delete transaction each)'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Seconds to sleep between chunks'
+        )
+        parser.add_argument(
+            '--max-chunks',
+            type=int,
+            default=None,
+            help='Stop after this many chunks'
+        )
+
+    def handle(self, *args, **options):
+        total = archive_history(
+            older_than_days=options['days'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            max_chunks=options['max_chunks'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} history rows to {get_archive_dir()}'
+        ))
@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.task_archive import archive_completed_tasks
+
+
+class Command(BaseCommand):
+    """Move old completed tasks, with their comments and history, to the archive tier"""
+
+    help = 'Archive completed tasks that have not changed for a given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TASK_ARCHIVE_AFTER_DAYS,
+            help='Archive completed tasks last updated more than this many days ago'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Tasks moved per transaction'
+        )
+
+    def handle(self, *args, **options):
+        total = archive_completed_tasks(
+            older_than_days=options['days'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} completed tasks'))
@@ -0,0 +1,91 @@
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from tasks.management.scratch import scratch_databases, seed_tasks
+from tasks.models import Task
+from tasks.serializers import TaskListRowSerializer, TaskListSerializer
+
+SORTS = ['-created_at', 'title', 'due_date', '-priority']
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the list_tasks page serialization paths on scratch databases.
+
+    * drf: model instances with select_related('assigned_to') through
+      TaskListSerializer(many=True), as list_tasks used to do.
+    * rows: values() rows through TaskListRowSerializer, as list_tasks does now.
+
+    Before timing, both paths' rendered JSON is compared byte for byte for
+    every page size and sort order (with timezone.now() frozen, since the DRF
+    path reads the clock once per row).
+    """
+
+    help = 'Compare TaskListSerializer against the values()-based TaskListRowSerializer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=2000, help='Tasks to seed')
+        parser.add_argument('--page-sizes', default='20,100', help='Comma-separated page sizes')
+        parser.add_argument('--iterations', type=int, default=200, help='Pages serialized per path and size')
+
+    def handle(self, *args, **options):
+        page_sizes = [int(size) for size in options['page_sizes'].split(',')]
+
+        with scratch_databases('bench-task-list-'):
+            seed_tasks(options['tasks'], 20, prefix='bench')
+            self.check_identical(page_sizes)
+            self.stdout.write(
+                f"{'page':>5} {'path':<5} {'query ms':>9} {'serialize ms':>13} {'render ms':>10} "
+                f"{'total ms':>9} {'speedup':>8}"
+            )
+            for page_size in page_sizes:
+                baseline = None
+                for path in ('drf', 'rows'):
+                    timings = self.time_path(path, page_size, options['iterations'])
+                    total = sum(timings)
+                    baseline = baseline or total
+                    self.stdout.write(
+                        f"{page_size:>5} {path:<5} {timings[0]:>9.3f} {timings[1]:>13.3f} "
+                        f"{timings[2]:>10.3f} {total:>9.3f} {baseline / total:>7.2f}x"
+                    )
+
+    def fetch(self, path, page_size, sort_by='-created_at'):
+        queryset = Task.objects.order_by(sort_by, 'id')
+        if path == 'drf':
+            return list(queryset.select_related('assigned_to')[:page_size])
+        return list(queryset.values(*TaskListRowSerializer.columns())[:page_size])
+
+    def serialize(self, path, tasks):
+        if path == 'drf':
+            return TaskListSerializer(tasks, many=True).data
+        return TaskListRowSerializer(tasks).data
+
+    def check_identical(self, page_sizes):
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now()):
+            for page_size in page_sizes:
+                for sort_by in SORTS:
+                    expected = JSONRenderer().render(self.serialize('drf', self.fetch('drf', page_size, sort_by)))
+                    actual = JSONRenderer().render(self.serialize('rows', self.fetch('rows', page_size, sort_by)))
+                    if actual != expected:
+                        raise CommandError(f'Output differs for page_size={page_size} sort_by={sort_by}')
+        self.stdout.write(f'Output identical for page sizes {page_sizes} and sorts {SORTS}')
+
+    def time_path(self, path, page_size, iterations):
+        """Mean milliseconds per page for (query, serialize, render)"""
+        totals = [0.0, 0.0, 0.0]
+        for _ in range(iterations):
+            started = time.perf_counter()
+            tasks = self.fetch(path, page_size)
+            fetched = time.perf_counter()
+            data = self.serialize(path, tasks)
+            serialized = time.perf_counter()
+            JSONRenderer().render(data)
+            rendered = time.perf_counter()
+            totals[0] += fetched - started
+            totals[1] += serialized - fetched
+            totals[2] += rendered - serialized
+        return [total * 1000 / iterations for total in totals]
@@ -0,0 +1,196 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from tasks.management.scratch import scratch_databases, seed_tasks
+from tasks.sharding import shard_for_user
+
+HOST = 'testserver'
+
+
+class Command(BaseCommand):
+    """
+    Load test for the read hot paths.
+
+    Seeds a scratch copy of the configured databases (like the test runner)
+    and drives Django's request handlers in-process, so no HTTP server is
+    involved:
+
+    * wsgi-sync: the sync views through WSGIHandler from a pool of threads,
+      as a threaded WSGI server would run them.
+    * asgi-sync: the same sync views through ASGIHandler.
+    * asgi-async: the async views (/api/async/...) through ASGIHandler.
+
+    Each mode is run at every concurrency level with the same request mix:
+    task list, task detail, dashboard and statistics.
+    """
+
+    help = 'Compare throughput and p99 latency of the read views under WSGI-sync and ASGI-async'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,8,32,64', help='Comma-separated concurrency levels')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per mode and level')
+        parser.add_argument('--tasks', type=int, default=2000, help='Tasks to seed')
+        parser.add_argument('--users', type=int, default=20, help='Regular users to seed')
+        parser.add_argument(
+            '--modes', default='wsgi-sync,asgi-sync,asgi-async', help='Comma-separated modes to run'
+        )
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        modes = options['modes'].split(',')
+
+        if HOST not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, HOST]
+
+        with scratch_databases('loadtest-'):
+            requests = self.seed(options['tasks'], options['users'])
+            self.stdout.write(
+                f"{'mode':<11} {'conc':>5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+            )
+            for level in levels:
+                for mode in modes:
+                    result = self.run_mode(mode, requests, level, options['requests'])
+                    self.stdout.write(
+                        f"{mode:<11} {level:>5} {result['throughput']:>9.1f} "
+                        f"{result['p50']:>8.1f} {result['p99']:>8.1f} {result['errors']:>7}"
+                    )
+
+    def seed(self, task_count, user_count):
+        """Seed the scratch databases; return the request mix"""
+        admin, users, by_shard = seed_tasks(task_count, user_count, prefix='loadtest')
+        sample = by_shard[shard_for_user(users[0])][0]
+        admin_token = f'Bearer {RefreshToken.for_user(admin).access_token}'
+        user_token = f'Bearer {RefreshToken.for_user(users[0]).access_token}'
+        return [
+            ('tasks/', 'page_size=20&sort_by=-created_at', admin_token),
+            ('tasks/', 'page_size=20&status=in_progress', user_token),
+            (f'tasks/{sample.id}/', '', admin_token),
+            ('dashboard/', '', admin_token),
+            ('dashboard/', '', user_token),
+            ('admin/statistics/', '', admin_token),
+        ]
+
+    def run_mode(self, mode, requests, concurrency, total):
+        prefix = '/api/async/' if mode == 'asgi-async' else '/api/'
+        calls = [(prefix + path, query, token) for path, query, token in requests]
+        per_worker = max(total // concurrency, 1)
+
+        if mode == 'wsgi-sync':
+            latencies, errors, elapsed = self.run_wsgi(calls, concurrency, per_worker)
+        else:
+            latencies, errors, elapsed = asyncio.run(self.run_asgi(calls, concurrency, per_worker))
+
+        latencies.sort()
+        return {
+            'throughput': len(latencies) / elapsed if elapsed else 0.0,
+            'p50': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            'p99': latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000 if latencies else 0.0,
+            'errors': errors,
+        }
+
+    def run_wsgi(self, calls, concurrency, per_worker):
+        handler = WSGIHandler()
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def call(path, query, token):
+            status = []
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': HOST,
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'REMOTE_ADDR': '127.0.0.1',
+                'HTTP_HOST': HOST,
+                'HTTP_AUTHORIZATION': token,
+                'wsgi.input': io.BytesIO(b''),
+                'wsgi.errors': sys.stderr,
+                'wsgi.url_scheme': 'http',
+            }
+            response = handler(environ, lambda code, headers, exc_info=None: status.append(code))
+            try:
+                b''.join(response)
+            finally:
+                response.close()
+            return int(status[0].split()[0])
+
+        def worker(offset):
+            nonlocal errors
+            local_latencies, local_errors = [], 0
+            for i in range(per_worker):
+                path, query, token = calls[(offset + i) % len(calls)]
+                started = time.perf_counter()
+                if call(path, query, token) != 200:
+                    local_errors += 1
+                local_latencies.append(time.perf_counter() - started)
+            with lock:
+                latencies.extend(local_latencies)
+                errors += local_errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
+
+    async def run_asgi(self, calls, concurrency, per_worker):
+        handler = ASGIHandler()
+        latencies = []
+        errors = 0
+
+        async def call(path, query, token):
+            status = []
+            request_sent = False
+
+            async def receive():
+                nonlocal request_sent
+                if not request_sent:
+                    request_sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client never disconnects
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            await handler({
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'root_path': '',
+                'headers': [(b'host', HOST.encode()), (b'authorization', token.encode())],
+                'client': ('127.0.0.1', 0),
+                'server': (HOST, 80),
+            }, receive, send)
+            return status[0]
+
+        async def worker(offset):
+            nonlocal errors
+            for i in range(per_worker):
+                path, query, token = calls[(offset + i) % len(calls)]
+                started = time.perf_counter()
+                if await call(path, query, token) != 200:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+        return latencies, errors, time.perf_counter() - started
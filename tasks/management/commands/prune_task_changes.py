@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.changes import prune_task_changes
+
+
+class Command(BaseCommand):
+    """Delete old entries of the task change log behind the change feed"""
+
+    help = 'Delete task change log entries older than a given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TASK_CHANGES_KEEP_DAYS,
+            help='Delete entries older than this many days (no fewer than TASK_CHANGES_KEEP_DAYS, how long sync tokens last)'
+        )
+
+    def handle(self, *args, **options):
+        total = prune_task_changes(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} task change log entries'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.deletion import resume_deletion_jobs
+
+
+class Command(BaseCommand):
+    """Run deletion jobs that are pending or failed, e.g. after a restart"""
+
+    help = 'Purge soft-deleted tasks and users whose deletion jobs have not completed'
+
+    def handle(self, *args, **options):
+        jobs = resume_deletion_jobs()
+        for job in jobs:
+            self.stdout.write(f'Job {job.id} ({job.target_type} {job.target_id}): {job.status}, {job.deleted_rows} rows')
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(jobs)} deletion jobs'))
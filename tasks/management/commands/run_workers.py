@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from tasks.activity import prune_activity
+from tasks.changes import prune_task_changes
+from tasks.idempotency import prune_idempotency_keys
+from tasks.jobs import delete_finished_jobs, requeue_stale_jobs, run_pending
+from tasks.recurrence import schedule_materialization
+from tasks.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    """
+    Run background jobs (see tasks/jobs.py) outside the web processes.
+
+    Polls for due jobs with a pool of worker threads until interrupted, and
+    sends due-date reminders (see tasks/reminders.py) between polls. Every
+    RECURRENCE_CHECK_SECONDS it queues the job materializing recurring
+    tasks (see tasks/recurrence.py).
+    Several of these processes, and the web processes' own worker threads,
+    can run side by side.
+    """
+
+    help = 'Run queued background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when no job is due')
+        parser.add_argument('--once', action='store_true', help='Run the jobs that are due, then exit')
+        parser.add_argument('--no-reminders', action='store_true', help="Don't send due-date reminders")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        last_cleanup = None
+        last_recurrence_check = None
+        reminders = None if options['no_reminders'] else ReminderScheduler()
+
+        def drain():
+            try:
+                return run_pending()
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jobs') as pool:
+            try:
+                while True:
+                    requeue_stale_jobs()
+                    if last_cleanup is None or time.monotonic() - last_cleanup > 3600:
+                        deleted = delete_finished_jobs()
+                        if deleted:
+                            self.stdout.write(f'Deleted {deleted} finished jobs')
+                        pruned = prune_task_changes()
+                        if pruned:
+                            self.stdout.write(f'Pruned {pruned} task change log entries')
+                        trimmed = prune_activity()
+                        if trimmed:
+                            self.stdout.write(f'Pruned {trimmed} activity feed entries')
+                        expired = prune_idempotency_keys()
+                        if expired:
+                            self.stdout.write(f'Deleted {expired} expired idempotency keys')
+                        last_cleanup = time.monotonic()
+
+                    if (
+                        last_recurrence_check is None
+                        or time.monotonic() - last_recurrence_check > settings.RECURRENCE_CHECK_SECONDS
+                    ):
+                        schedule_materialization()
+                        last_recurrence_check = time.monotonic()
+
+                    if reminders is not None:
+                        try:
+                            sent = reminders.tick()
+                        except Exception as e:
+                            self.stderr.write(f'Reminder scheduler error: {e}')
+                            # Start over from the checkpoint
+                            reminders = ReminderScheduler()
+                        else:
+                            if sent:
+                                self.stdout.write(f'Sent {len(sent)} due-date reminders')
+
+                    processed = sum(pool.map(lambda _: drain(), range(workers)))
+                    if processed:
+                        self.stdout.write(f'Ran {processed} jobs')
+                    if options['once']:
+                        break
+                    if not processed:
+                        time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping workers')
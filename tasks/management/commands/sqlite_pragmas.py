@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """
+    Write the persistent SQLite PRAGMAs (WAL journal mode) into the database
+    files. Connections only set per-connection PRAGMAs, so run this once per
+    database file, e.g. after creating it.
+    """
+
+    help = 'Apply the persistent PRAGMAs from OPTIONS["pragmas"] to the SQLite database files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            dest='databases',
+            help='Database alias to tune (repeatable; default: every database on the tuned backend)'
+        )
+
+    def handle(self, *args, **options):
+        aliases = options['databases'] or [
+            alias for alias in connections
+            if hasattr(connections[alias], 'apply_persistent_pragmas')
+        ]
+        for alias in aliases:
+            connection = connections[alias]
+            if not hasattr(connection, 'apply_persistent_pragmas'):
+                raise CommandError(f'{alias} does not use the tuned SQLite backend')
+            pragmas = connection.apply_persistent_pragmas()
+            applied = ', '.join(f'{name}={value}' for name, value in pragmas.items()) or 'nothing to apply'
+            self.stdout.write(f'{alias}: {applied}')
+        self.stdout.write(self.style.SUCCESS('SQLite PRAGMAs applied'))
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+STOCK_ENGINE = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    """
+    Concurrency stress test for the SQLite backends.
+
+    Runs the same workload against a scratch database file with Django's stock
+    SQLite backend and with the tuned backend from settings.SQLITE_ENGINE.
+    Writers mimic create_task/update_task_status: an atomic() block that reads,
+    then inserts or updates a task and appends a history row. Readers issue
+    plain autocommit SELECTs alongside them.
+    """
+
+    help = 'Compare write throughput and "database is locked" errors across SQLite backends'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=16, help='Concurrent writer threads')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads')
+        parser.add_argument('--ops', type=int, default=100, help='Transactions per writer thread')
+        parser.add_argument('--busy-timeout', type=int, default=5000, help='busy_timeout in ms for both backends')
+
+    def handle(self, *args, **options):
+        workdir = tempfile.mkdtemp(prefix='sqlite-stress-')
+        try:
+            tuned_options = {
+                'pragmas': {
+                    'journal_mode': 'WAL',
+                    'busy_timeout': options['busy_timeout'],
+                    'synchronous': 'NORMAL',
+                    'mmap_size': 256 * 1024 * 1024,
+                    'cache_size': -65536,
+                },
+                'serialize_writes': True,
+            }
+            profiles = [
+                ('stock', STOCK_ENGINE, {'timeout': options['busy_timeout'] / 1000}),
+                ('tuned', settings.SQLITE_ENGINE, tuned_options),
+            ]
+            self.stdout.write(
+                f"{'backend':<8} {'committed':>10} {'errors':>8} {'error %':>8} "
+                f"{'writes/s':>10} {'reads/s':>10} {'seconds':>8}"
+            )
+            for label, engine, engine_options in profiles:
+                result = self.run_profile(
+                    label, engine, engine_options, os.path.join(workdir, f'{label}.sqlite3'), options
+                )
+                self.stdout.write(
+                    f"{label:<8} {result['committed']:>10} {result['errors']:>8} "
+                    f"{result['error_rate']:>7.1%} {result['writes_per_second']:>10.1f} "
+                    f"{result['reads_per_second']:>10.1f} {result['elapsed']:>8.2f}"
+                )
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run_profile(self, label, engine, engine_options, path, options):
+        alias = f'sqlite_stress_{label}'
+        settings_dict = dict(connections[DEFAULT_DB_ALIAS].settings_dict)
+        settings_dict.update({'ENGINE': engine, 'NAME': path, 'OPTIONS': engine_options, 'TEST': {}})
+        connections.settings[alias] = settings_dict
+
+        try:
+            if hasattr(connections[alias], 'apply_persistent_pragmas'):
+                connections[alias].apply_persistent_pragmas()
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    'CREATE TABLE stress_task ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, status TEXT, updated_at REAL)'
+                )
+                cursor.execute(
+                    'CREATE TABLE stress_history ('
+                    'id INTEGER PRIMARY KEY AUTOINCREMENT, task_id INTEGER, description TEXT)'
+                )
+                cursor.execute('CREATE INDEX stress_task_status ON stress_task (status)')
+                for i in range(100):
+                    cursor.execute(
+                        'INSERT INTO stress_task (title, status, updated_at) VALUES (%s, %s, %s)',
+                        [f'seed {i}', 'not_started', time.time()]
+                    )
+
+            counts = {'committed': 0, 'errors': 0, 'reads': 0}
+            counts_lock = threading.Lock()
+            writers_done = threading.Event()
+
+            def writer(worker):
+                committed = errors = 0
+                try:
+                    for i in range(options['ops']):
+                        try:
+                            with transaction.atomic(using=alias):
+                                with connections[alias].cursor() as cursor:
+                                    if i % 2 == 0:
+                                        # create_task: validate, insert, record history
+                                        cursor.execute(
+                                            'SELECT COUNT(*) FROM stress_task WHERE status = %s', ['not_started']
+                                        )
+                                        cursor.execute(
+                                            'INSERT INTO stress_task (title, status, updated_at) VALUES (%s, %s, %s)',
+                                            [f'task {worker}-{i}', 'not_started', time.time()]
+                                        )
+                                        task_id = cursor.lastrowid
+                                    else:
+                                        # update_task_status: read, update, record history
+                                        task_id = (worker * options['ops'] + i) % 100 + 1
+                                        cursor.execute('SELECT status FROM stress_task WHERE id = %s', [task_id])
+                                        cursor.fetchone()
+                                        cursor.execute(
+                                            'UPDATE stress_task SET status = %s, updated_at = %s WHERE id = %s',
+                                            ['in_progress', time.time(), task_id]
+                                        )
+                                    cursor.execute(
+                                        'INSERT INTO stress_history (task_id, description) VALUES (%s, %s)',
+                                        [task_id, f'change by worker {worker}']
+                                    )
+                            committed += 1
+                        except OperationalError:
+                            errors += 1
+                finally:
+                    connections[alias].close()
+                with counts_lock:
+                    counts['committed'] += committed
+                    counts['errors'] += errors
+
+            def reader():
+                reads = 0
+                try:
+                    while not writers_done.is_set():
+                        with connections[alias].cursor() as cursor:
+                            cursor.execute(
+                                'SELECT id, title, status FROM stress_task WHERE status = %s LIMIT 20', ['not_started']
+                            )
+                            cursor.fetchall()
+                        reads += 1
+                except OperationalError:
+                    pass
+                finally:
+                    connections[alias].close()
+                with counts_lock:
+                    counts['reads'] += reads
+
+            writer_threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+            reader_threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+            started = time.perf_counter()
+            for thread in reader_threads + writer_threads:
+                thread.start()
+            for thread in writer_threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            writers_done.set()
+            for thread in reader_threads:
+                thread.join()
+        finally:
+            connections[alias].close()
+            del connections.settings[alias]
+
+        attempted = counts['committed'] + counts['errors']
+        return {
+            'committed': counts['committed'],
+            'errors': counts['errors'],
+            'error_rate': counts['errors'] / attempted if attempted else 0.0,
+            'writes_per_second': counts['committed'] / elapsed if elapsed else 0.0,
+            'reads_per_second': counts['reads'] / elapsed if elapsed else 0.0,
+            'elapsed': elapsed,
+        }
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tasks.replicas import get_replicas, sync_sqlite_replicas
+
+
+class Command(BaseCommand):
+    """Copy the primary SQLite database onto the configured replicas (local testing)"""
+
+    help = 'Bring local SQLite replica files in sync with the primary'
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'sqlite':
+            raise CommandError('sync_replicas only supports SQLite; use real replication elsewhere')
+        if not get_replicas():
+            raise CommandError('No replicas configured; set DB_REPLICAS')
+        for alias in sync_sqlite_replicas():
+            self.stdout.write(f'Synced {alias}')
+        self.stdout.write(self.style.SUCCESS('Replicas are in sync with the primary'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.models import Tag, User
+from tasks.sharding import copy_tags_to_shards, copy_user_to_shards, get_shards, move_tasks_to_shards
+
+
+class Command(BaseCommand):
+    """
+    Prepare task shards for use: copy every user and tag to each shard, then
+    move any tasks still stored on the primary to their assignees' shards.
+
+    Run after ``migrate --database <shard>`` for each shard when enabling
+    sharding on an existing database; it is safe to run again.
+    """
+
+    help = 'Copy users to the task shards and move unsharded tasks onto them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=200, help='Tasks moved per transaction')
+
+    def handle(self, *args, **options):
+        if not get_shards():
+            raise CommandError('No shards configured; set DB_SHARDS')
+
+        users = 0
+        for user in User.objects.order_by('id').iterator():
+            copy_user_to_shards(user)
+            users += 1
+        self.stdout.write(f'Copied {users} users to {len(get_shards())} shards')
+
+        tags = list(Tag.objects.all())
+        copy_tags_to_shards(tags)
+        self.stdout.write(f'Copied {len(tags)} tags to {len(get_shards())} shards')
+
+        moved = move_tasks_to_shards(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Moved {moved} tasks onto their shards'))
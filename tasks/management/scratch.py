@@ -0,0 +1,76 @@
+"""Scratch databases and seed data for the benchmark and load test commands."""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connections
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from tasks.models import Task, TaskComment, TaskHistory, User
+from tasks.sharding import allocate_task_id, shard_for_user
+
+
+@contextmanager
+def scratch_databases(prefix):
+    """
+    Create throwaway copies of every configured database, as the test runner
+    does, for the duration of the block.
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    # File-backed scratch databases, so SQLite runs with its real journal mode
+    for alias in connections:
+        settings_dict = connections[alias].settings_dict
+        if settings_dict['ENGINE'].endswith('sqlite3') and not settings_dict['TEST'].get('MIRROR'):
+            settings_dict['TEST']['NAME'] = os.path.join(workdir, f'{alias}.sqlite3')
+
+    old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+    try:
+        yield
+    finally:
+        connections.close_all()
+        teardown_databases(old_config, verbosity=0)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def seed_tasks(task_count, user_count, prefix='seed'):
+    """
+    Create an admin, `user_count` users and `task_count` tasks spread over
+    them, each task with a history entry and every fifth with a comment.
+    Returns (admin, users, {shard: tasks}).
+    """
+    admin = User.objects.create(username=f'{prefix}_admin', role='admin')
+    users = [User.objects.create(username=f'{prefix}_user{i}') for i in range(user_count)]
+
+    statuses = ['not_started', 'in_progress', 'completed']
+    priorities = ['low', 'medium', 'high', 'urgent']
+    now = timezone.now()
+    by_shard = {}
+    for i in range(task_count):
+        assignee = users[i % user_count]
+        shard = shard_for_user(assignee)
+        by_shard.setdefault(shard, []).append(Task(
+            id=allocate_task_id(shard) if shard is not None else None,
+            title=f'Seeded task {i}',
+            description='Seeded task description ' * 4,
+            # Some overdue, some due later
+            due_date=now + timedelta(days=i % 60 - 10, hours=i % 24),
+            status=statuses[i % len(statuses)],
+            priority=priorities[i % len(priorities)],
+            assigned_to=assignee,
+            created_by=admin,
+        ))
+
+    for shard, tasks in by_shard.items():
+        tasks = Task.objects.using(shard).bulk_create(tasks, batch_size=500)
+        TaskHistory.objects.using(shard).bulk_create([
+            TaskHistory(task=task, user=admin, action='created', description='Task created')
+            for task in tasks
+        ], batch_size=500)
+        TaskComment.objects.using(shard).bulk_create([
+            TaskComment(task=task, author=task.assigned_to, content='Working on it')
+            for task in tasks[::5]
+        ], batch_size=500)
+    return admin, users, by_shard
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_task_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='taskhistory',
+            index=models.Index(fields=['task', 'timestamp'], name='tasks_taskh_task_id_638326_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskhistory',
+            index=models.Index(fields=['timestamp'], name='tasks_taskh_timesta_fc4004_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0005_soft_delete_and_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskLocation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('shard', models.CharField(db_index=True, max_length=50)),
+            ],
+            options={
+                'verbose_name': 'Task Location',
+                'verbose_name_plural': 'Task Locations',
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:38
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_background_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('task_id', models.BigIntegerField()),
+                ('assignee_id', models.BigIntegerField(help_text='Assignee after the change')),
+                ('previous_assignee_id', models.BigIntegerField(blank=True, help_text='Assignee before the change, when it was reassigned', null=True)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted'), ('archived', 'Archived'), ('restored', 'Restored'), ('moved', 'Moved')], max_length=10)),
+                ('changed_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Task Change',
+                'verbose_name_plural': 'Task Changes',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['assignee_id', 'id'], name='tasks_taskc_assigne_8168b1_idx'), models.Index(fields=['previous_assignee_id', 'id'], name='tasks_taskc_previou_76e0e6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_changes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='taskchange',
+            name='action',
+            field=models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('status_changed', 'Status Changed'), ('commented', 'Commented'), ('deleted', 'Deleted'), ('archived', 'Archived'), ('restored', 'Restored'), ('moved', 'Moved')], max_length=20),
+        ),
+    ]
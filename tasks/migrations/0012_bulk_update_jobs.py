@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-19 01:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkUpdateJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filters', models.JSONField(default=dict, help_text='list_tasks filter parameters selecting the tasks')),
+                ('patch', models.JSONField(default=dict, help_text='Field values to set on them')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('matched', models.PositiveBigIntegerField(default=0, help_text='Tasks to update, as counted when the job was created')),
+                ('updated_rows', models.PositiveBigIntegerField(default=0)),
+                ('progress', models.JSONField(default=dict, help_text='Last task id done, per database')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bulk_update_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Bulk Update Job',
+                'verbose_name_plural': 'Bulk Update Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
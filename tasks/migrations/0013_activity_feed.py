@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:00
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_bulk_update_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityFeed',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('last_read_id', models.BigIntegerField(default=0)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Activity Feed',
+                'verbose_name_plural': 'Activity Feeds',
+            },
+        ),
+        migrations.CreateModel(
+            name='ActivityEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('user_id', models.BigIntegerField(help_text='Whose feed the entry is in')),
+                ('task_id', models.BigIntegerField()),
+                ('actor_id', models.BigIntegerField(blank=True, null=True)),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('status_changed', 'Status Changed'), ('assigned', 'Assigned'), ('completed', 'Completed'), ('commented', 'Commented')], max_length=20)),
+                ('task_title', models.CharField(max_length=200)),
+                ('summary', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('event_key', models.CharField(max_length=32)),
+            ],
+            options={
+                'verbose_name': 'Activity Entry',
+                'verbose_name_plural': 'Activity Entries',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user_id', 'id'], name='tasks_activ_user_id_8f780b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='activityentry',
+            constraint=models.UniqueConstraint(fields=('user_id', 'event_key'), name='unique_activity_event_per_user'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import tasks.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_activity_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=500)),
+                ('event_types', models.JSONField(default=list, help_text='Event types delivered to the endpoint')),
+                ('secret', models.CharField(default=tasks.models.generate_webhook_secret, help_text='Key the deliveries are signed with', max_length=128)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('last_success_at', models.DateTimeField(blank=True, null=True)),
+                ('last_failure_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='webhook_subscriptions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Webhook Subscription',
+                'verbose_name_plural': 'Webhook Subscriptions',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookDeadLetter',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_id', models.CharField(max_length=32)),
+                ('event_type', models.CharField(choices=[('task.created', 'Task Created'), ('task.updated', 'Task Updated'), ('task.status_changed', 'Task Status Changed'), ('task.deleted', 'Task Deleted'), ('comment.added', 'Comment Added')], max_length=30)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(help_text='When the event happened')),
+                ('failed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField()),
+                ('last_error', models.TextField(blank=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dead_letters', to='tasks.webhooksubscription')),
+            ],
+            options={
+                'verbose_name': 'Webhook Dead Letter',
+                'verbose_name_plural': 'Webhook Dead Letters',
+                'ordering': ['-failed_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('event_id', models.CharField(help_text='Same for every subscription the event goes to', max_length=32)),
+                ('event_type', models.CharField(choices=[('task.created', 'Task Created'), ('task.updated', 'Task Updated'), ('task.status_changed', 'Task Status Changed'), ('task.deleted', 'Task Deleted'), ('comment.added', 'Comment Added')], max_length=30)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, help_text='Dispatcher delivering the event now', max_length=32)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('subscription', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_events', to='tasks.webhooksubscription')),
+            ],
+            options={
+                'verbose_name': 'Webhook Event',
+                'verbose_name_plural': 'Webhook Events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['claimed_by', 'next_attempt_at'], name='tasks_webho_claimed_a593f2_idx'), models.Index(fields=['subscription', 'id'], name='tasks_webho_subscri_144661_idx')],
+            },
+        ),
+    ]
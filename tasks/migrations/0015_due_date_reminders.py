@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_webhooks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('fired_through', models.DateTimeField(help_text='Every reminder due up to this time has been sent')),
+                ('cursors', models.JSONField(default=dict, help_text='Change log position, per database')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Reminder Checkpoint',
+                'verbose_name_plural': 'Reminder Checkpoints',
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='reminder_sent_for',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Due date the last due-date reminder was sent for (see tasks/reminders.py)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='activityentry',
+            name='action',
+            field=models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('status_changed', 'Status Changed'), ('assigned', 'Assigned'), ('completed', 'Completed'), ('commented', 'Commented'), ('reminder', 'Due Date Reminder')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='webhookdeadletter',
+            name='event_type',
+            field=models.CharField(choices=[('task.created', 'Task Created'), ('task.updated', 'Task Updated'), ('task.status_changed', 'Task Status Changed'), ('task.deleted', 'Task Deleted'), ('comment.added', 'Comment Added'), ('task.due_soon', 'Task Due Soon')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='webhookevent',
+            name='event_type',
+            field=models.CharField(choices=[('task.created', 'Task Created'), ('task.updated', 'Task Updated'), ('task.status_changed', 'Task Status Changed'), ('task.deleted', 'Task Deleted'), ('comment.added', 'Comment Added'), ('task.due_soon', 'Task Due Soon')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_due_date_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True, max_length=2000)),
+                ('priority', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('urgent', 'Urgent')], default='medium', max_length=10)),
+                ('frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('interval', models.PositiveSmallIntegerField(default=1, help_text='Every how many days, weeks or months')),
+                ('starts_at', models.DateTimeField(help_text='Due date of the first occurrence')),
+                ('until', models.DateTimeField(blank=True, help_text='No occurrences are due after this', null=True)),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Number of occurrences in all', null=True)),
+                ('materialized_count', models.PositiveIntegerField(default=0, help_text='Occurrences materialized (or skipped) so far; the next one is this index')),
+                ('next_due_date', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Recurrence Rule',
+                'verbose_name_plural': 'Recurrence Rules',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='occurrence',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text="Which of its rule's occurrences this task is, from 0", null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='recurrence_rule_id',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='RecurrenceRule this task is an occurrence of (see tasks/recurrence.py)', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(fields=('recurrence_rule_id', 'occurrence'), name='unique_task_occurrence'),
+        ),
+        migrations.AddField(
+            model_name='recurrencerule',
+            name='assigned_to',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence_rules', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='recurrencerule',
+            name='created_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='created_recurrence_rules', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='recurrencerule',
+            index=models.Index(fields=['is_active', 'next_due_date'], name='tasks_recur_is_acti_1f78aa_idx'),
+        ),
+    ]
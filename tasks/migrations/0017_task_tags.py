@@ -0,0 +1,71 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_recurring_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Tag',
+                'verbose_name_plural': 'Tags',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recurrencerule',
+            name='tags',
+            field=models.JSONField(blank=True, default=list, help_text='Tag names each occurrence gets'),
+        ),
+        migrations.CreateModel(
+            name='TaskTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='task_tags', to='tasks.tag')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_tags', to='tasks.task')),
+            ],
+            options={
+                'verbose_name': 'Task Tag',
+                'verbose_name_plural': 'Task Tags',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTaskTag',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_task_tags', to='tasks.tag')),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_tags', to='tasks.archivedtask')),
+            ],
+            options={
+                'verbose_name': 'Archived Task Tag',
+                'verbose_name_plural': 'Archived Task Tags',
+            },
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='tags',
+            field=models.ManyToManyField(blank=True, help_text='Labels for the task (see tasks/tags.py)', related_name='tasks', through='tasks.TaskTag', to='tasks.tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='tasktag',
+            constraint=models.UniqueConstraint(fields=('tag', 'task'), name='unique_task_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='archivedtasktag',
+            constraint=models.UniqueConstraint(fields=('tag', 'task'), name='unique_archived_task_tag'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0017_task_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockerPath',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('blocker_id', models.BigIntegerField()),
+                ('blocked_id', models.BigIntegerField()),
+                ('paths', models.PositiveIntegerField(default=1, help_text='Chains of links from the blocker to the blocked task')),
+                ('is_direct', models.BooleanField(default=False, help_text='The blocked task is linked to the blocker itself')),
+            ],
+            options={
+                'verbose_name': 'Blocker Path',
+                'verbose_name_plural': 'Blocker Paths',
+            },
+        ),
+        migrations.CreateModel(
+            name='SubtaskPath',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('ancestor_id', models.BigIntegerField()),
+                ('descendant_id', models.BigIntegerField()),
+                ('depth', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Subtask Path',
+                'verbose_name_plural': 'Subtask Paths',
+                'indexes': [models.Index(fields=['descendant_id', 'depth'], name='tasks_subta_descend_2c6734_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='subtaskpath',
+            constraint=models.UniqueConstraint(fields=('ancestor_id', 'descendant_id'), name='unique_subtask_path'),
+        ),
+        migrations.AddIndex(
+            model_name='blockerpath',
+            index=models.Index(fields=['blocker_id'], name='tasks_block_blocker_16153d_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='blockerpath',
+            constraint=models.UniqueConstraint(fields=('blocked_id', 'blocker_id'), name='unique_blocker_path'),
+        ),
+    ]
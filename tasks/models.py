@@ -6,6 +6,8 @@ from django.db import models
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from datetime import datetime, timedelta
+import calendar
+import secrets
 
 
 def validate_future_date(value):
@@ -14,12 +16,27 @@ def validate_future_date(value):
         raise ValidationError('Due date cannot be in the past')
 
 
+# How far ahead a due date may be
+MAX_DUE_DATE_AHEAD = timedelta(days=365*2)  # 2 years
+
+
 def validate_reasonable_due_date(value):
     """Validator to ensure due date is not too far in the future"""
-    max_future_date = timezone.now() + timedelta(days=365*2)  # 2 years
+    max_future_date = timezone.now() + MAX_DUE_DATE_AHEAD
     if value > max_future_date:
         raise ValidationError('Due date cannot be more than 2 years in the future')
 
+class TaskVersionConflict(Exception):
+    """A task was saved from a stale copy: someone else saved it since it was loaded"""
+
+
+class ActiveManager(models.Manager):
+    """Manager that hides soft-deleted rows"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class User(AbstractUser):
     """Custom User model with role-based permissions"""
     
@@ -36,6 +53,11 @@ class User(AbstractUser):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Set when the user is deleted; rows are purged in the background'
+    )
     
     class Meta:
         db_table = 'auth_user'
@@ -54,12 +76,17 @@ class User(AbstractUser):
         return self.role == 'user'
     
     def get_assigned_tasks_count(self):
-        """Get count of tasks assigned to this user"""
-        return self.assigned_tasks.count()
+        """Get count of tasks assigned to this user, including archived ones"""
+        return self.assigned_tasks.count() + self.archived_assigned_tasks.count()
     
     def get_created_tasks_count(self):
-        """Get count of tasks created by this user"""
-        return self.created_tasks.count()
+        """Get count of tasks created by this user, including archived ones"""
+        # Created tasks live on their assignees' shards, so count on every shard
+        from .sharding import count_on_shards
+        return (
+            count_on_shards(Task.objects.filter(created_by=self))
+            + count_on_shards(ArchivedTask.objects.filter(created_by=self))
+        )
 class Task(models.Model):
     """Task model for managing user tasks"""
     
@@ -69,6 +96,16 @@ class Task(models.Model):
         ('completed', 'Completed'),
     ]
     
+    # Status -> statuses it may change to
+    STATUS_TRANSITIONS = {
+        'not_started': ['in_progress', 'completed'],
+        'in_progress': ['not_started', 'completed'],
+        'completed': ['in_progress'],
+    }
+    
+    # Statuses of a task that still has to be done
+    OPEN_STATUSES = ('not_started', 'in_progress')
+    
     PRIORITY_CHOICES = [
         ('low', 'Low'),
         ('medium', 'Medium'),
@@ -115,6 +152,43 @@ class Task(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text='Set when the task is deleted; rows are purged in the background'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        help_text='Incremented by every change; the ETag clients send back in If-Match'
+    )
+    reminder_sent_for = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='Due date the last due-date reminder was sent for (see tasks/reminders.py)'
+    )
+    recurrence_rule_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text='RecurrenceRule this task is an occurrence of (see tasks/recurrence.py)'
+    )
+    occurrence = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Which of its rule's occurrences this task is, from 0"
+    )
+    tags = models.ManyToManyField(
+        'Tag',
+        through='TaskTag',
+        related_name='tasks',
+        blank=True,
+        help_text='Labels for the task (see tasks/tags.py)'
+    )
+    
+    objects = ActiveManager()
+    all_objects = models.Manager()
     
     class Meta:
         ordering = ['-created_at']
@@ -122,6 +196,12 @@ class Task(models.Model):
             models.Index(fields=['status', 'due_date']),
             models.Index(fields=['assigned_to', 'status']),
             models.Index(fields=['priority', 'due_date']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
+        constraints = [
+            # Each occurrence of a recurring task is materialized once
+            models.UniqueConstraint(fields=['recurrence_rule_id', 'occurrence'], name='unique_task_occurrence'),
         ]
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
@@ -157,8 +237,8 @@ class Task(models.Model):
             raise ValidationError({'assigned_to': 'Cannot assign task to inactive user'})
         
         # Validate status transitions for existing tasks
-        if self.pk:
-            old_task = Task.objects.get(pk=self.pk)
+        if self.pk and not self._state.adding:
+            old_task = Task.objects.using(self._state.db).get(pk=self.pk)
             if old_task.status != self.status:
                 self._validate_status_transition(old_task.status, self.status)
     
@@ -174,11 +254,68 @@ class Task(models.Model):
             raise ValidationError({
                 'status': f'Invalid status transition from {old_status} to {new_status}'
             })
+        
+        # A task can't be completed before the tasks blocking it
+        if new_status == 'completed':
+            blocker_ids = self.open_blocker_ids()
+            if blocker_ids:
+                raise ValidationError({
+                    'status': f'Task is blocked by open tasks {", ".join(map(str, sorted(blocker_ids)))}'
+                })
+    
+    def open_blocker_ids(self):
+        """Ids of the open tasks blocking this one, directly or through others (see tasks/hierarchy.py)"""
+        from .hierarchy import open_blocker_ids
+        return open_blocker_ids(self.pk)
     
     def save(self, *args, **kwargs):
-        """Override save to include validation"""
-        self.full_clean()
-        super().save(*args, **kwargs)
+        """
+        Override save to include validation and optimistic concurrency: an
+        update only applies if the row is still at the version this copy
+        was loaded at, and raises TaskVersionConflict otherwise.
+        
+        The due date is only validated when it changes, so an overdue task
+        can still be updated.
+        """
+        exclude = None
+        if not self._state.adding:
+            stored_due_date = (
+                Task.all_objects.using(self._state.db).filter(pk=self.pk)
+                .values_list('due_date', flat=True).first()
+            )
+            if stored_due_date == self.due_date:
+                exclude = ['due_date']
+        self.full_clean(exclude=exclude)
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        
+        self._expected_version = self.version
+        self.version += 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = self._expected_version
+            raise
+        finally:
+            self._expected_version = None
+    
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if not update_fields or 'reminder_sent_for' not in update_fields:
+            # Set by claim_reminder() without a version bump: a copy loaded before the reminder went out keeps it
+            values = [value for value in values if value[0].name != 'reminder_sent_for']
+        expected_version = getattr(self, '_expected_version', None)
+        if expected_version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        # UPDATE ... WHERE id = %s AND version = %s: no lock held between reading and writing
+        updated = super()._do_update(
+            base_qs.filter(version=expected_version), using, pk_val, values, update_fields, forced_update
+        )
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise TaskVersionConflict(f'Task {pk_val} has changed since version {expected_version}')
+        return updated
 
 
 class TaskComment(models.Model):
@@ -207,6 +344,52 @@ class TaskComment(models.Model):
         return f"Comment by {self.author.username} on {self.task.title}"
 
 
+class Tag(models.Model):
+    """
+    A label for tasks (see tasks/tags.py). Created the first time it is used
+    and never renamed; kept on the primary and copied to every shard.
+    """
+    
+    name = models.CharField(max_length=50, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Tag'
+        verbose_name_plural = 'Tags'
+    
+    def __str__(self):
+        return self.name
+
+
+class TaskTag(models.Model):
+    """A tag on a task. The (tag, task) index holds each tag's task ids in order."""
+    
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name='task_tags'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='task_tags',
+        # Covered by the (tag, task) index
+        db_index=False
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'task'], name='unique_task_tag'),
+        ]
+        verbose_name = 'Task Tag'
+        verbose_name_plural = 'Task Tags'
+    
+    def __str__(self):
+        return f"{self.tag_id} on task {self.task_id}"
+
+
 class TaskHistory(models.Model):
     """Track task changes for audit purposes"""
     
@@ -230,12 +413,654 @@ class TaskHistory(models.Model):
     )
     action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     description = models.TextField(max_length=500)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the change happens; the row itself may be written later by a job
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['task', 'timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
         verbose_name = 'Task History'
         verbose_name_plural = 'Task Histories'
     
     def __str__(self):
-        return f"{self.action} - {self.task.title} by {self.user.username}"
\ No newline at end of file
+        return f"{self.action} - {self.task.title} by {self.user.username}"
+
+class ArchivedTask(models.Model):
+    """Completed task moved out of the hot tasks table (see tasks/task_archive.py)"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True, max_length=2000)
+    due_date = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Task.STATUS_CHOICES, default='completed')
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES, db_index=True)
+    assigned_to = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_assigned_tasks'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_created_tasks'
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    version = models.PositiveIntegerField(default=1)
+    reminder_sent_for = models.DateTimeField(null=True, blank=True, editable=False)
+    recurrence_rule_id = models.BigIntegerField(null=True, blank=True, editable=False)
+    occurrence = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    archived_at = models.DateTimeField(db_index=True)
+    
+    objects = ActiveManager()
+    all_objects = models.Manager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['assigned_to', 'status']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['recurrence_rule_id', 'occurrence']),
+        ]
+        verbose_name = 'Archived Task'
+        verbose_name_plural = 'Archived Tasks'
+    
+    def __str__(self):
+        return f"{self.title} - {self.get_status_display()} (archived)"
+    
+    def is_overdue(self):
+        """Archived tasks are completed, so never overdue"""
+        return False
+    
+    def days_until_due(self):
+        """Archived tasks are completed, so have no days until due"""
+        return None
+
+
+class ArchivedTaskComment(models.Model):
+    """Comment belonging to an archived task"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(
+        ArchivedTask,
+        on_delete=models.CASCADE,
+        related_name='comments'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_task_comments'
+    )
+    content = models.TextField(max_length=1000)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Archived Task Comment'
+        verbose_name_plural = 'Archived Task Comments'
+
+
+class ArchivedTaskHistory(models.Model):
+    """History entry belonging to an archived task"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(
+        ArchivedTask,
+        on_delete=models.CASCADE,
+        related_name='history'
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_task_actions'
+    )
+    action = models.CharField(max_length=20, choices=TaskHistory.ACTION_CHOICES)
+    description = models.TextField(max_length=500)
+    timestamp = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['task', 'timestamp']),
+        ]
+        verbose_name = 'Archived Task History'
+        verbose_name_plural = 'Archived Task Histories'
+
+
+class ArchivedTaskTag(models.Model):
+    """Tag on an archived task"""
+    
+    id = models.BigIntegerField(primary_key=True)
+    task = models.ForeignKey(
+        ArchivedTask,
+        on_delete=models.CASCADE,
+        related_name='task_tags'
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name='archived_task_tags',
+        db_index=False
+    )
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'task'], name='unique_archived_task_tag'),
+        ]
+        verbose_name = 'Archived Task Tag'
+        verbose_name_plural = 'Archived Task Tags'
+
+
+class DeletionJob(models.Model):
+    """Background purge of a soft-deleted task or user and everything that depends on it"""
+    
+    TARGET_CHOICES = [
+        ('task', 'Task'),
+        ('user', 'User'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    target_type = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    target_id = models.BigIntegerField()
+    target_repr = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='deletion_jobs'
+    )
+    progress = models.JSONField(default=dict, help_text='Rows deleted so far, per step')
+    deleted_rows = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Deletion Job'
+        verbose_name_plural = 'Deletion Jobs'
+    
+    def __str__(self):
+        return f"Delete {self.target_type} {self.target_id} - {self.get_status_display()}"
+
+
+class BulkUpdateJob(models.Model):
+    """Background update of every task matching a set of task list filters (see tasks/bulk_update.py)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    filters = models.JSONField(default=dict, help_text='list_tasks filter parameters selecting the tasks')
+    patch = models.JSONField(default=dict, help_text='Field values to set on them')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='bulk_update_jobs'
+    )
+    matched = models.PositiveBigIntegerField(default=0, help_text='Tasks to update, as counted when the job was created')
+    updated_rows = models.PositiveBigIntegerField(default=0)
+    progress = models.JSONField(default=dict, help_text='Last task id done, per database')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Bulk Update Job'
+        verbose_name_plural = 'Bulk Update Jobs'
+    
+    def __str__(self):
+        return f"Bulk update #{self.id} - {self.get_status_display()}"
+
+
+class TaskLocation(models.Model):
+    """
+    Directory of which shard holds each task, kept on the primary database.
+    
+    Its ids are the task ids, so they stay unique across shards.
+    """
+    
+    id = models.BigAutoField(primary_key=True)
+    shard = models.CharField(max_length=50, db_index=True)
+    
+    class Meta:
+        verbose_name = 'Task Location'
+        verbose_name_plural = 'Task Locations'
+    
+    def __str__(self):
+        return f"Task {self.id} on {self.shard}"
+
+
+class BackgroundJob(models.Model):
+    """A side effect of a request, run by the job workers (see tasks/jobs.py)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100, db_index=True)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now, help_text='Not run before this time (retry backoff)')
+    claimed_by = models.CharField(max_length=32, blank=True, db_index=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Background Job'
+        verbose_name_plural = 'Background Jobs'
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} - {self.get_status_display()}"
+
+
+class TaskChange(models.Model):
+    """
+    Change log entry for a task, read by the change feed (see tasks/changes.py).
+    
+    Kept on the task's database, in the same transaction as the change; its
+    id is the sequence number sync tokens point into.
+    """
+    
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('status_changed', 'Status Changed'),
+        ('commented', 'Commented'),
+        ('deleted', 'Deleted'),
+        ('archived', 'Archived'),
+        ('restored', 'Restored'),
+        ('moved', 'Moved'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    # Not foreign keys: entries outlive the purged tasks they are tombstones for
+    task_id = models.BigIntegerField()
+    assignee_id = models.BigIntegerField(help_text='Assignee after the change')
+    previous_assignee_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text='Assignee before the change, when it was reassigned'
+    )
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['assignee_id', 'id']),
+            models.Index(fields=['previous_assignee_id', 'id']),
+        ]
+        verbose_name = 'Task Change'
+        verbose_name_plural = 'Task Changes'
+    
+    def __str__(self):
+        return f"#{self.id} task {self.task_id} {self.action}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    A write request made with an Idempotency-Key header, and its response
+    to replay for retries (see tasks/idempotency.py). Kept on the primary.
+    """
+    
+    id = models.BigAutoField(primary_key=True)
+    # Not a foreign key: keys expire on their own, and outlive nothing
+    user_id = models.BigIntegerField()
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text='Hash of the method, path and body the key was first used with')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, help_text='Empty while the request is running')
+    response = models.BinaryField(null=True, blank=True, help_text='zlib-compressed JSON body and headers')
+    locked_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+    
+    def __str__(self):
+        return f"{self.key} (user {self.user_id})"
+
+
+class ActivityEntry(models.Model):
+    """
+    An entry in a user's activity feed (see tasks/activity.py): something
+    that happened to a task they are assigned, created or commented on.
+    
+    Kept on the user's shard and self-contained, so reading a feed is a
+    range scan over (user_id, id) with no joins.
+    """
+    
+    ACTION_CHOICES = TaskHistory.ACTION_CHOICES + [
+        ('commented', 'Commented'),
+        ('reminder', 'Due Date Reminder'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    # Not foreign keys: the task may be on another shard, or purged
+    user_id = models.BigIntegerField(help_text='Whose feed the entry is in')
+    task_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    task_title = models.CharField(max_length=200)
+    summary = models.CharField(max_length=255)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Identifies the event, so a retried fan-out doesn't add it twice
+    event_key = models.CharField(max_length=32)
+    
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user_id', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user_id', 'event_key'], name='unique_activity_event_per_user'),
+        ]
+        verbose_name = 'Activity Entry'
+        verbose_name_plural = 'Activity Entries'
+    
+    def __str__(self):
+        return f"#{self.id} for user {self.user_id}: {self.action} task {self.task_id}"
+
+
+class ActivityFeed(models.Model):
+    """How far a user has read their activity feed; kept next to its entries"""
+    
+    user_id = models.BigIntegerField(primary_key=True)
+    last_read_id = models.BigIntegerField(default=0)
+    read_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Activity Feed'
+        verbose_name_plural = 'Activity Feeds'
+    
+    def __str__(self):
+        return f"Activity feed of user {self.user_id}"
+
+
+def generate_webhook_secret():
+    return secrets.token_hex(32)
+
+
+class WebhookSubscription(models.Model):
+    """An endpoint that task events are POSTed to (see tasks/webhooks.py). Kept on the primary."""
+    
+    EVENT_TYPE_CHOICES = [
+        ('task.created', 'Task Created'),
+        ('task.updated', 'Task Updated'),
+        ('task.status_changed', 'Task Status Changed'),
+        ('task.deleted', 'Task Deleted'),
+        ('comment.added', 'Comment Added'),
+        ('task.due_soon', 'Task Due Soon'),
+    ]
+    
+    url = models.URLField(max_length=500)
+    event_types = models.JSONField(default=list, help_text='Event types delivered to the endpoint')
+    secret = models.CharField(
+        max_length=128,
+        default=generate_webhook_secret,
+        help_text='Key the deliveries are signed with'
+    )
+    is_active = models.BooleanField(default=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='webhook_subscriptions'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Webhook Subscription'
+        verbose_name_plural = 'Webhook Subscriptions'
+    
+    def __str__(self):
+        return f"{self.url} ({', '.join(self.event_types)})"
+
+
+class WebhookEvent(models.Model):
+    """An event waiting to be delivered to one subscription; removed once delivered"""
+    
+    id = models.BigAutoField(primary_key=True)
+    subscription = models.ForeignKey(
+        WebhookSubscription,
+        on_delete=models.CASCADE,
+        related_name='pending_events'
+    )
+    event_id = models.CharField(max_length=32, help_text='Same for every subscription the event goes to')
+    event_type = models.CharField(max_length=30, choices=WebhookSubscription.EVENT_TYPE_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, blank=True, help_text='Dispatcher delivering the event now')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['claimed_by', 'next_attempt_at']),
+            models.Index(fields=['subscription', 'id']),
+        ]
+        verbose_name = 'Webhook Event'
+        verbose_name_plural = 'Webhook Events'
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} for subscription {self.subscription_id}"
+
+
+class WebhookDeadLetter(models.Model):
+    """An event a subscription kept failing to accept, set aside after WEBHOOK_MAX_ATTEMPTS"""
+    
+    id = models.BigAutoField(primary_key=True)
+    subscription = models.ForeignKey(
+        WebhookSubscription,
+        on_delete=models.CASCADE,
+        related_name='dead_letters'
+    )
+    event_id = models.CharField(max_length=32)
+    event_type = models.CharField(max_length=30, choices=WebhookSubscription.EVENT_TYPE_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(help_text='When the event happened')
+    failed_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField()
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        ordering = ['-failed_at']
+        verbose_name = 'Webhook Dead Letter'
+        verbose_name_plural = 'Webhook Dead Letters'
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} for subscription {self.subscription_id} (dead)"
+
+
+class ReminderCheckpoint(models.Model):
+    """
+    How far a reminder scheduler has got (see tasks/reminders.py), so a
+    restarted one carries on where it stopped. Kept on the primary.
+    """
+    
+    name = models.CharField(max_length=50, unique=True)
+    fired_through = models.DateTimeField(help_text='Every reminder due up to this time has been sent')
+    cursors = models.JSONField(default=dict, help_text='Change log position, per database')
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Reminder Checkpoint'
+        verbose_name_plural = 'Reminder Checkpoints'
+    
+    def __str__(self):
+        return f"{self.name} through {self.fired_through}"
+
+
+
+class RecurrenceRule(models.Model):
+    """
+    A task that repeats daily, weekly or monthly (see tasks/recurrence.py).
+    
+    Occurrence n is due `interval` * n days, weeks or months after
+    starts_at, and is a Task copied from the template fields here. The rule
+    ends after `count` occurrences or at `until`, whichever comes first.
+    Occurrences are materialized ahead of time up to a rolling horizon;
+    next_due_date is the due date of the next one to materialize, or null
+    once the rule has ended. Kept on the primary.
+    """
+    
+    FREQUENCY_CHOICES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+    
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True, max_length=2000)
+    priority = models.CharField(max_length=10, choices=Task.PRIORITY_CHOICES, default='medium')
+    assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurrence_rules')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_recurrence_rules')
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    interval = models.PositiveSmallIntegerField(default=1, help_text='Every how many days, weeks or months')
+    starts_at = models.DateTimeField(help_text='Due date of the first occurrence')
+    until = models.DateTimeField(null=True, blank=True, help_text='No occurrences are due after this')
+    count = models.PositiveIntegerField(null=True, blank=True, help_text='Number of occurrences in all')
+    tags = models.JSONField(default=list, blank=True, help_text='Tag names each occurrence gets')
+    materialized_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Occurrences materialized (or skipped) so far; the next one is this index'
+    )
+    next_due_date = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'next_due_date']),
+        ]
+        verbose_name = 'Recurrence Rule'
+        verbose_name_plural = 'Recurrence Rules'
+    
+    def __str__(self):
+        return f"{self.title} ({self.get_frequency_display()})"
+    
+    def due_date_of(self, index):
+        """Due date of occurrence `index`, or None if the rule has ended by then"""
+        if self.count is not None and index >= self.count:
+            return None
+        steps = index * self.interval
+        if self.frequency == 'daily':
+            due_date = self.starts_at + timedelta(days=steps)
+        elif self.frequency == 'weekly':
+            due_date = self.starts_at + timedelta(weeks=steps)
+        else:
+            # Counted from starts_at so a rule starting on the 31st stays on month ends
+            month = self.starts_at.month - 1 + steps
+            year, month = self.starts_at.year + month // 12, month % 12 + 1
+            due_date = self.starts_at.replace(
+                year=year, month=month, day=min(self.starts_at.day, calendar.monthrange(year, month)[1])
+            )
+        if self.until is not None and due_date > self.until:
+            return None
+        return due_date
+
+
+class SubtaskPath(models.Model):
+    """
+    Closure table of the subtask trees (see tasks/hierarchy.py): a row for
+    every (ancestor, descendant) pair of tasks, with the number of levels
+    between them; depth 1 is the task's parent. Kept on the primary.
+    """
+    
+    id = models.BigAutoField(primary_key=True)
+    # Not foreign keys: a tree's tasks may be on any shard, in either tier
+    ancestor_id = models.BigIntegerField()
+    descendant_id = models.BigIntegerField()
+    depth = models.PositiveIntegerField()
+    
+    class Meta:
+        constraints = [
+            # Also the index "all descendants of" is read from
+            models.UniqueConstraint(fields=['ancestor_id', 'descendant_id'], name='unique_subtask_path'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant_id', 'depth']),
+        ]
+        verbose_name = 'Subtask Path'
+        verbose_name_plural = 'Subtask Paths'
+    
+    def __str__(self):
+        return f"Task {self.descendant_id} is {self.depth} below task {self.ancestor_id}"
+
+
+class BlockerPath(models.Model):
+    """
+    Closure table of the "blocked by" links (see tasks/hierarchy.py): a row
+    for every (blocker, blocked) pair of tasks connected by a chain of links,
+    with the number of such chains. Kept on the primary.
+    """
+    
+    id = models.BigAutoField(primary_key=True)
+    # Not foreign keys: the tasks may be on any shard, in either tier
+    blocker_id = models.BigIntegerField()
+    blocked_id = models.BigIntegerField()
+    paths = models.PositiveIntegerField(default=1, help_text='Chains of links from the blocker to the blocked task')
+    is_direct = models.BooleanField(default=False, help_text='The blocked task is linked to the blocker itself')
+    
+    class Meta:
+        constraints = [
+            # Also the index "all blockers of" is read from
+            models.UniqueConstraint(fields=['blocked_id', 'blocker_id'], name='unique_blocker_path'),
+        ]
+        indexes = [
+            models.Index(fields=['blocker_id']),
+        ]
+        verbose_name = 'Blocker Path'
+        verbose_name_plural = 'Blocker Paths'
+    
+    def __str__(self):
+        return f"Task {self.blocked_id} is blocked by task {self.blocker_id}"
@@ -0,0 +1,204 @@
+"""
+Recurring tasks.
+
+A ``RecurrenceRule`` is a task that repeats daily, weekly or monthly, every
+`interval` days, weeks or months, until a date or for a number of
+occurrences. Creating a task with a ``recurrence`` makes it the rule's first
+occurrence; the others are materialized lazily, as ordinary tasks, once they
+are due within ``RECURRENCE_HORIZON_DAYS`` (and never further ahead than a
+due date may be, MAX_DUE_DATE_AHEAD). Each occurrence is a separate task that
+is assigned, completed and deleted on its own.
+
+Rules keep the due date of their next occurrence, so the background job
+finds the rules needing work with one range scan over the
+(is_active, next_due_date) index. It takes ``RECURRENCE_RULES_PER_RUN`` of
+them at a time, soonest first, and inserts their occurrences with bulk
+INSERTs of ``RECURRENCE_BATCH_SIZE`` tasks per database, writing the change
+log, history and activity a save would have (bulk_create doesn't send the
+save signals). If more rules are due it queues itself again rather than
+looping, so thousands of rules falling due at the same moment are worked
+through in a steady series of batches with other jobs running in between.
+As occurrences are made days ahead of their due date, that happens well
+before anyone needs them.
+
+Occurrences are numbered from 0 and a task's (recurrence_rule_id,
+occurrence) is unique: an occurrence that already exists, even deleted, is
+not made again, so a retried or concurrent run doesn't duplicate tasks.
+Occurrences whose due date has passed by the time they would be made (the
+rule was paused, or its assignee deactivated) are skipped.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from .activity import activity_event, publish_activity
+from .changes import record_task_changes
+from .jobs import enqueue, job_handler
+from .models import MAX_DUE_DATE_AHEAD, ArchivedTask, BackgroundJob, RecurrenceRule, Task, TaskHistory
+from .sharding import allocate_task_ids, shard_for_user
+from .tags import tag_tasks
+from .user_directory import user_directory
+
+logger = logging.getLogger(__name__)
+
+
+def materialization_horizon(now):
+    """Occurrences due up to this are materialized"""
+    return now + min(timedelta(days=settings.RECURRENCE_HORIZON_DAYS), MAX_DUE_DATE_AHEAD)
+
+
+def plan_occurrences(rule, now, horizon):
+    """
+    (occurrences, next index): the (index, due date) of the rule's occurrences
+    to materialize up to `horizon`, and the index of the first one left for
+    later. Occurrences due before `now` are left out.
+    """
+    occurrences = []
+    index = rule.materialized_count
+    while True:
+        due_date = rule.due_date_of(index)
+        if due_date is None or due_date > horizon:
+            return occurrences, index
+        if due_date >= now:
+            occurrences.append((index, due_date))
+        index += 1
+
+
+def schedule_materialization():
+    """
+    Have a worker materialize due occurrences, unless one is already going
+    to. The job goes in the transaction open on the primary, with the rules.
+    """
+    if not BackgroundJob.objects.using(DEFAULT_DB_ALIAS).filter(
+        name='materialize_recurring_tasks', status='pending'
+    ).exists():
+        enqueue('materialize_recurring_tasks', {}, using=DEFAULT_DB_ALIAS)
+
+
+def _occurrence_task(rule, index, due_date):
+    return Task(
+        title=rule.title,
+        description=rule.description,
+        priority=rule.priority,
+        due_date=due_date,
+        assigned_to_id=rule.assigned_to_id,
+        created_by_id=rule.created_by_id,
+        recurrence_rule_id=rule.id,
+        occurrence=index,
+    )
+
+
+def _create_occurrences(using, tasks, now, rule_tags):
+    """
+    Insert a batch of occurrences on `using`, skipping those that exist, and
+    give them their rule's tags ({rule id: names}). Returns the tasks inserted.
+    """
+    with transaction.atomic(using=using):
+        # Archived occurrences exist too
+        existing = {
+            key
+            for model in (Task, ArchivedTask)
+            for key in model.all_objects.using(using)
+            .filter(
+                recurrence_rule_id__in={task.recurrence_rule_id for task in tasks},
+                occurrence__in={task.occurrence for task in tasks}
+            )
+            .values_list('recurrence_rule_id', 'occurrence')
+        }
+        tasks = [task for task in tasks if (task.recurrence_rule_id, task.occurrence) not in existing]
+        if not tasks:
+            return []
+        if using is not None:
+            for task, task_id in zip(tasks, allocate_task_ids(using, len(tasks))):
+                task.id = task_id
+        created = Task.objects.using(using).bulk_create(tasks)
+        by_tags = {}
+        for task in created:
+            by_tags.setdefault(tuple(rule_tags.get(task.recurrence_rule_id, ())), []).append(task)
+        for names, tagged in by_tags.items():
+            tag_tasks(tagged, list(names), using)
+
+        # What the save signals record for a created task
+        record_task_changes('created', created, using=using)
+        usernames = user_directory.get_many({task.assigned_to_id for task in created})
+        history = TaskHistory.objects.using(using).bulk_create([
+            TaskHistory(
+                task_id=task.id,
+                user_id=task.created_by_id,
+                action='created',
+                description=(
+                    f"Recurring task created and assigned to "
+                    f"{usernames[task.assigned_to_id].username if task.assigned_to_id in usernames else 'unknown'}"
+                ),
+                timestamp=now,
+            )
+            for task in created
+        ])
+        publish_activity([
+            activity_event(entry.task_id, entry.user_id, entry.action, entry.description, now)
+            for entry in history
+        ], using=using)
+    return created
+
+
+def materialize_due_rules(now=None, limit=None):
+    """
+    Materialize the occurrences within the horizon of up to `limit`
+    (RECURRENCE_RULES_PER_RUN) rules, those due soonest first.
+    Returns (tasks created, whether more rules may be due).
+    """
+    now = now or timezone.now()
+    limit = limit or settings.RECURRENCE_RULES_PER_RUN
+    horizon = materialization_horizon(now)
+    rules = list(
+        RecurrenceRule.objects.using(DEFAULT_DB_ALIAS)
+        .filter(is_active=True, next_due_date__lte=horizon)
+        .order_by('next_due_date', 'id')[:limit]
+    )
+    if not rules:
+        return 0, False
+
+    assignees = user_directory.get_many({rule.assigned_to_id for rule in rules})
+    by_shard = {}
+    progress = []
+    for rule in rules:
+        occurrences, next_index = plan_occurrences(rule, now, horizon)
+        assignee = assignees.get(rule.assigned_to_id)
+        # Occurrences of an inactive user are skipped, like past ones
+        if assignee is not None and assignee.is_active:
+            by_shard.setdefault(shard_for_user(rule.assigned_to_id), []).extend(
+                _occurrence_task(rule, index, due_date) for index, due_date in occurrences
+            )
+        progress.append((rule, next_index))
+
+    created = 0
+    batch_size = settings.RECURRENCE_BATCH_SIZE
+    rule_tags = {rule.id: rule.tags for rule in rules if rule.tags}
+    for using, tasks in by_shard.items():
+        for start in range(0, len(tasks), batch_size):
+            created += len(_create_occurrences(using, tasks[start:start + batch_size], now, rule_tags))
+
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        for rule, next_index in progress:
+            values = {'materialized_count': next_index, 'next_due_date': rule.due_date_of(next_index)}
+            if values['next_due_date'] is None:
+                values['is_active'] = False
+            # Unless a concurrent run got further already
+            RecurrenceRule.objects.using(DEFAULT_DB_ALIAS).filter(
+                id=rule.id, materialized_count=rule.materialized_count
+            ).update(**values, updated_at=now)
+    return created, len(rules) == limit
+
+
+@job_handler('materialize_recurring_tasks', batch_size=100)
+def materialize_recurring_tasks(payloads):
+    """Background job: materialize the occurrences of one run of due rules"""
+    created, more = materialize_due_rules()
+    if created:
+        logger.info(f"Materialized {created} recurring task occurrences")
+    if more:
+        # The next run is a job of its own, so other jobs get a turn in between
+        enqueue('materialize_recurring_tasks', {})
@@ -0,0 +1,239 @@
+"""
+Due-date reminders, ``REMINDER_LEAD_HOURS`` before an open task is due.
+
+Instead of scanning every task every minute, ``ReminderScheduler`` keeps the
+reminders coming up in the next ``REMINDER_LOOKAHEAD_SECONDS`` in a min-heap
+ordered by reminder time. Each ``tick``:
+
+1. reads the change log (tasks/changes.py) since its cursors, and queues
+   the created, updated or reopened tasks whose reminder time now falls in
+   the part of the timeline already loaded (or has passed);
+2. extends the loaded timeline to now + lookahead with one range query per
+   database over open tasks by due date (the (status, due_date) index);
+3. pops the reminders that are due and sends each one to the sinks in
+   ``REMINDER_SINKS``.
+
+Heap entries are never updated in place: a task whose due date changed or
+that was completed keeps its old entry, and sending a reminder first marks
+the task with a conditional UPDATE (still open, same due date, not reminded
+for it yet), which skips stale entries and makes the reminder go out once
+even with several schedulers running. Task.save() leaves that mark alone,
+so saving a copy of the task loaded before the reminder went out doesn't
+clear it.
+
+A ``ReminderCheckpoint`` on the primary records the change log cursors and
+the time up to which every reminder has been sent. A scheduler that starts
+from it loads the timeline from that time, so reminders that fell due while
+no scheduler ran are sent at once, and replays the changes made meanwhile.
+
+Sinks are functions taking a list of reminders (dicts with the task's id,
+title, due_date, priority, assigned_to_id and created_by_id), registered
+with ``@reminder_sink(name)``: 'log', 'feed' (the activity feeds) and
+'webhook' (task.due_soon) are built in.
+"""
+import heapq
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .activity import activity_event, publish_activity
+from .changes import current_cursors, current_task_rows, read_changes
+from .models import ReminderCheckpoint, Task
+from .sharding import scatter, shards_for_tasks
+from .user_directory import user_directory
+from .webhooks import publish_due_soon_events
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = 'due_date_reminders'
+
+OPEN_STATUSES = Task.OPEN_STATUSES
+
+# Change log actions after which a task may need a reminder it didn't
+REFRESH_ACTIONS = ('created', 'updated', 'status_changed', 'restored', 'moved')
+
+# Columns of a task that sinks get
+REMINDER_COLUMNS = ['id', 'title', 'due_date', 'priority', 'assigned_to_id', 'created_by_id']
+
+# How often the checkpoint is saved when nothing else changed
+CHECKPOINT_SECONDS = 60
+
+# name -> fn(reminders)
+_sinks = {}
+
+
+def reminder_sink(name):
+    """Register fn(reminders) as the reminder sink called name"""
+    def decorator(fn):
+        _sinks[name] = fn
+        return fn
+    return decorator
+
+
+@reminder_sink('log')
+def log_reminders(reminders):
+    usernames = user_directory.get_many({reminder['assigned_to_id'] for reminder in reminders})
+    for reminder in reminders:
+        assignee = usernames.get(reminder['assigned_to_id'])
+        logger.info(
+            f"Reminder: task {reminder['id']} ({reminder['title']}) of "
+            f"{assignee.username if assignee else 'unknown'} is due at {reminder['due_date'].isoformat()}"
+        )
+
+
+@reminder_sink('feed')
+def feed_reminders(reminders):
+    now = timezone.now()
+    publish_activity([
+        activity_event(reminder['id'], None, 'reminder', f"Due {reminder['due_date']:%Y-%m-%d %H:%M} UTC", now)
+        for reminder in reminders
+    ])
+
+
+@reminder_sink('webhook')
+def webhook_reminders(reminders):
+    publish_due_soon_events([reminder['id'] for reminder in reminders])
+
+
+def send_reminders(reminders):
+    """Hand reminders to every configured sink; one failing doesn't stop the others"""
+    for name in settings.REMINDER_SINKS:
+        if name not in _sinks:
+            logger.error(f"No reminder sink registered as {name}")
+            continue
+        try:
+            _sinks[name](reminders)
+        except Exception as e:
+            logger.error(f"Reminder sink {name} failed for {len(reminders)} reminders: {e}")
+
+
+def claim_reminder(task_id, due_date, using):
+    """Mark a task reminded for `due_date`; False if it is closed, was rescheduled or was reminded already"""
+    return bool(
+        Task.objects.using(using)
+        .filter(id=task_id, due_date=due_date, status__in=OPEN_STATUSES)
+        .exclude(reminder_sent_for=due_date)
+        .update(reminder_sent_for=due_date)
+    )
+
+
+class ReminderScheduler:
+    """Min-heap of upcoming (reminder time, task id, due date), fed from the change log and the due date index"""
+
+    def __init__(self):
+        self._heap = []
+        self._queued = set()
+        self._checkpoint = None
+        self._saved_at = None
+        # Reminder times up to this are in the heap (or sent)
+        self._loaded_until = None
+
+    @property
+    def lead(self):
+        return timedelta(hours=settings.REMINDER_LEAD_HOURS)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def start(self):
+        """Carry on from the checkpoint, or start from now"""
+        cursors = current_cursors(None)
+        self._checkpoint, _ = ReminderCheckpoint.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+            name=CHECKPOINT_NAME,
+            defaults={'fired_through': timezone.now(), 'cursors': cursors}
+        )
+        if set(self._checkpoint.cursors) != set(cursors):
+            # The databases changed (sharding was turned on or off); the timeline reload covers the tasks
+            self._checkpoint.cursors = cursors
+        self._loaded_until = self._checkpoint.fired_through
+        self._heap, self._queued = [], set()
+        logger.info(f"Reminder scheduler starting from {self._loaded_until.isoformat()}")
+
+    def _push(self, task_id, due_date):
+        if (task_id, due_date) not in self._queued:
+            self._queued.add((task_id, due_date))
+            heapq.heappush(self._heap, (due_date - self.lead, task_id, due_date))
+
+    def _apply_changes(self):
+        """Queue changed tasks whose reminder time is in the loaded timeline; True if there were changes"""
+        task_ids = set()
+        cursors = self._checkpoint.cursors
+        while True:
+            entries, cursors, has_more = read_changes(None, cursors, 500)
+            task_ids.update(entry['task_id'] for entry in entries if entry['action'] in REFRESH_ACTIONS)
+            if not has_more:
+                break
+        changed = cursors != self._checkpoint.cursors
+        self._checkpoint.cursors = cursors
+
+        rows = current_task_rows(task_ids, ['id', 'status', 'due_date', 'reminder_sent_for'])
+        for row in rows.values():
+            if (
+                row['status'] in OPEN_STATUSES
+                and row['reminder_sent_for'] != row['due_date']
+                and row['due_date'] - self.lead <= self._loaded_until
+            ):
+                self._push(row['id'], row['due_date'])
+        return changed
+
+    def _load(self, until):
+        """Queue the open tasks whose reminder time is after the loaded timeline and up to `until`"""
+        if until <= self._loaded_until:
+            return
+        start, end = self._loaded_until + self.lead, until + self.lead
+
+        def fetch(using):
+            return list(
+                Task.objects.using(using)
+                .filter(status__in=OPEN_STATUSES, due_date__gt=start, due_date__lte=end)
+                .order_by('due_date')
+                .values_list('id', 'due_date', 'reminder_sent_for')
+            )
+
+        for rows in scatter(fetch):
+            for task_id, due_date, reminder_sent_for in rows:
+                if reminder_sent_for != due_date:
+                    self._push(task_id, due_date)
+        self._loaded_until = until
+
+    def _fire_due(self, now):
+        """Send the reminders whose time has come; returns them"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, due_date = heapq.heappop(self._heap)
+            self._queued.discard((task_id, due_date))
+            due.append((task_id, due_date))
+        if not due:
+            return []
+
+        locations = shards_for_tasks({task_id for task_id, _ in due})
+        claimed = [
+            task_id for task_id, due_date in due
+            if task_id in locations and claim_reminder(task_id, due_date, locations[task_id])
+        ]
+        rows = current_task_rows(claimed, REMINDER_COLUMNS)
+        reminders = [rows[task_id] for task_id in claimed if task_id in rows]
+        if reminders:
+            send_reminders(reminders)
+        return reminders
+
+    def tick(self, now=None):
+        """Catch up with changes, load the next stretch of the timeline and send due reminders"""
+        if self._checkpoint is None:
+            self.start()
+        now = now or timezone.now()
+
+        changed = self._apply_changes()
+        self._load(now + timedelta(seconds=settings.REMINDER_LOOKAHEAD_SECONDS))
+        reminders = self._fire_due(now)
+
+        if now > self._checkpoint.fired_through:
+            self._checkpoint.fired_through = now
+        saved_long_ago = self._saved_at is None or (now - self._saved_at).total_seconds() > CHECKPOINT_SECONDS
+        if changed or reminders or saved_long_ago:
+            self._checkpoint.save(update_fields=['fired_through', 'cursors', 'updated_at'])
+            self._saved_at = now
+        return reminders
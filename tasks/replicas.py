@@ -0,0 +1,137 @@
+"""
+Read replica routing with read-your-writes stickiness.
+
+Replicas are listed in ``settings.DATABASE_REPLICAS`` (aliases in DATABASES).
+Only views decorated with ``@use_replica`` read from them; every write, and
+every read made anywhere else, goes to the primary (``default``).
+
+After a user makes a successful non-GET request, ``ReadYourWritesMiddleware``
+pins that user to the primary for ``READ_YOUR_WRITES_SECONDS``, so their next
+reads cannot miss a write a replica has not caught up with yet. Pins are kept
+in the Django cache; use a shared cache backend when running several
+processes.
+
+For local testing with SQLite, ``sync_sqlite_replicas()`` (and
+``manage.py sync_replicas``) copies the primary file over each replica.
+"""
+import contextvars
+import functools
+import random
+import sqlite3
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+PIN_KEY = 'db-primary-pin:{user_id}'
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_to_primary(user):
+    """Send this user's reads to the primary for the read-your-writes window"""
+    cache.set(PIN_KEY.format(user_id=user.pk), True, settings.READ_YOUR_WRITES_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return bool(user and user.is_authenticated and cache.get(PIN_KEY.format(user_id=user.pk)))
+
+
+def use_replica(view):
+    """Let a read-only view (sync or async) read from a replica unless the user just wrote"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            pinned = await sync_to_async(is_pinned_to_primary)(request.user)
+            token = _replica_reads.set(bool(get_replicas()) and not pinned)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _replica_reads.set(bool(get_replicas()) and not is_pinned_to_primary(request.user))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+class ReadYourWritesMiddleware:
+    """Pin users to the primary after a successful write request"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            await sync_to_async(self.pin_after_write)(request, response)
+        return response
+
+    def pin_after_write(self, request, response):
+        user = getattr(request, 'user', None)
+        if (request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and response.status_code < 400
+                and user is not None and user.is_authenticated):
+            pin_to_primary(user)
+
+
+class PrimaryReplicaRouter:
+    """Route reads inside @use_replica views to a random replica, everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if replicas and _replica_reads.get():
+            return random.choice(replicas)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db not in get_replicas()
+
+
+def sync_sqlite_replicas():
+    """Copy the primary SQLite database over every replica file"""
+    primary = connections[DEFAULT_DB_ALIAS]
+    primary.close()
+    synced = []
+    for alias in get_replicas():
+        replica = connections[alias]
+        replica.close()
+        source = sqlite3.connect(str(primary.settings_dict['NAME']))
+        target = sqlite3.connect(str(replica.settings_dict['NAME']))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        synced.append(alias)
+    return synced
@@ -1,8 +1,18 @@
-from rest_framework import serializers
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.db import models
 from django.utils import timezone
 from datetime import timedelta
-from .models import Task, User, TaskComment, TaskHistory
+from .models import (
+    Task, User, TaskComment, TaskHistory, DeletionJob, BackgroundJob, BulkUpdateJob, ActivityEntry,
+    WebhookSubscription, WebhookDeadLetter, RecurrenceRule,
+)
+from .recurrence import schedule_materialization
+from .sharding import allocate_task_id, shard_for_user
+from .tags import normalize_tag_names, set_task_tags, tags_of
+from .user_directory import user_directory, user_instance
 import re
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """Serializer for user registration"""
@@ -100,52 +110,222 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return obj.get_created_tasks_count()
 
 
+class TaskUserSerializer(serializers.ModelSerializer):
+    """Compact user representation for expanded task relations"""
+    
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name']
+        read_only_fields = fields
+
+
+class UsernameField(serializers.ReadOnlyField):
+    """A user's username, looked up by id in the user directory instead of through a join"""
+    
+    def to_representation(self, value):
+        # Looked up for the whole list already (see UsernameListSerializer)
+        users = getattr(self.parent, 'listed_users', None)
+        if users is not None:
+            entry = users.get(value)
+            return entry.username if entry is not None else None
+        return user_directory.username(value)
+
+
+class UsernameListSerializer(serializers.ListSerializer):
+    """many=True for serializers with UsernameFields: looks up every row's users at once"""
+    
+    def to_representation(self, data):
+        rows = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        fields = [field for field in self.child.fields.values() if isinstance(field, UsernameField)]
+        if not fields:
+            return super().to_representation(rows)
+        
+        self.child.listed_users = user_directory.get_many(
+            {field.get_attribute(row) for row in rows for field in fields} - {None}
+        )
+        try:
+            return super().to_representation(rows)
+        finally:
+            del self.child.listed_users
+
+
+class TagsField(serializers.Field):
+    """
+    A task's tag names, written as a list that replaces them. Read from the
+    context's 'tags' ({task id: names}) when the caller loaded them already.
+    """
+    
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+    
+    def to_representation(self, task):
+        if 'tags' in self.context:
+            return self.context['tags'].get(task.id, [])
+        return tags_of([task])[task.id]
+    
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError('Give a list of tag names')
+        try:
+            return {'tags': normalize_tag_names(data)}
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+
+class SparseFieldsMixin:
+    """
+    Serializer options set from ?fields= and ?expand=: ``fields`` lists the
+    fields to keep (None keeps them all) and ``expand`` the relations in
+    ``expandable_fields`` to nest as objects instead of ids.
+    """
+    
+    expandable_fields = {}
+    
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name](read_only=True)
+        if fields is not None:
+            for name in set(self.fields) - set(fields) - set(expand):
+                self.fields.pop(name)
+
+
 class TaskCommentSerializer(serializers.ModelSerializer):
     """Serializer for task comments"""
     
-    author_username = serializers.CharField(source='author.username', read_only=True)
+    author_username = UsernameField(source='author_id')
     
     class Meta:
         model = TaskComment
+        list_serializer_class = UsernameListSerializer
         fields = ['id', 'content', 'author', 'author_username', 'created_at', 'updated_at']
         read_only_fields = ['id', 'author', 'created_at', 'updated_at']
+    
+    def create(self, validated_data):
+        """Create through the task so the comment lands on the task's shard"""
+        task = validated_data.pop('task')
+        return task.comments.create(**validated_data)
 
 
 class TaskHistorySerializer(serializers.ModelSerializer):
     """Serializer for task history"""
     
-    user_username = serializers.CharField(source='user.username', read_only=True)
+    user_username = UsernameField(source='user_id')
     
     class Meta:
         model = TaskHistory
+        list_serializer_class = UsernameListSerializer
         fields = ['id', 'action', 'description', 'user', 'user_username', 'timestamp']
         read_only_fields = ['id', 'user', 'timestamp']
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class ActivityEntrySerializer(serializers.ModelSerializer):
+    """Serializer for activity feed entries; pass the feed's last_read_id in the context"""
+    
+    actor_username = UsernameField(source='actor_id')
+    unread = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ActivityEntry
+        list_serializer_class = UsernameListSerializer
+        fields = ['id', 'task_id', 'task_title', 'action', 'summary', 'actor_id', 'actor_username', 'created_at', 'unread']
+        read_only_fields = fields
+    
+    def get_unread(self, obj):
+        return obj.id > self.context.get('last_read_id', 0)
+
+
+def validate_unblocked(task, status):
+    """Refuse to complete a task that has open blockers (see tasks/hierarchy.py)"""
+    if status == 'completed' and task.status != 'completed':
+        blocker_ids = task.open_blocker_ids()
+        if blocker_ids:
+            raise serializers.ValidationError(
+                f'Task is blocked by open tasks {", ".join(map(str, sorted(blocker_ids)))}'
+            )
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Main task serializer"""
     
-    assigned_to_username = serializers.CharField(source='assigned_to.username', read_only=True)
-    created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+    assigned_to_username = UsernameField(source='assigned_to_id')
+    created_by_username = UsernameField(source='created_by_id')
     is_overdue = serializers.BooleanField(read_only=True)
     days_until_due = serializers.SerializerMethodField()
+    tags = TagsField(required=False)
     comments = TaskCommentSerializer(many=True, read_only=True)
-    history = TaskHistorySerializer(many=True, read_only=True)
+    history = serializers.SerializerMethodField()
     
     class Meta:
         model = Task
+        list_serializer_class = UsernameListSerializer
         fields = [
             'id', 'title', 'description', 'due_date', 'status', 'priority',
             'assigned_to', 'assigned_to_username', 'created_by', 
-            'created_by_username', 'created_at', 'updated_at', 
-            'is_overdue', 'days_until_due', 'comments', 'history'
+            'created_by_username', 'created_at', 'updated_at', 'version',
+            'is_overdue', 'days_until_due', 'tags', 'comments', 'history'
         ]
-        read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_by', 'created_at', 'updated_at', 'version']
+    
+    expandable_fields = {'assigned_to': TaskUserSerializer, 'created_by': TaskUserSerializer}
+    
+    # Columns each field reads, where that isn't just its own name
+    field_columns = {
+        # Usernames come from the user directory, not joins
+        'assigned_to_username': ['assigned_to'],
+        'created_by_username': ['created_by'],
+        'is_overdue': ['due_date', 'status'],
+        'days_until_due': ['due_date', 'status'],
+        'tags': [],
+        'comments': [],
+        'history': [],
+    }
+    
+    @classmethod
+    def optimize(cls, queryset, fields=None, expand=(), also=()):
+        """
+        Load only what TaskSerializer(fields=fields, expand=expand) reads:
+        the columns behind the selected fields, joins for the expanded users
+        and the comments only if they are included. `also` names the columns
+        the caller reads itself, e.g. the assignee for permission checks or
+        the version for the ETag.
+        """
+        names = set(cls.Meta.fields if fields is None else fields) | set(expand)
+        columns = {'id', *also}
+        for name in names:
+            columns.update(cls.field_columns.get(name, [name]))
+        for name in expand:
+            columns.update(f'{name}__{field}' for field in TaskUserSerializer.Meta.fields)
+        
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        queryset = queryset.select_related(*related).only(*columns | related)
+        if 'comments' in names:
+            queryset = queryset.prefetch_related('comments')
+        return queryset
     
     def get_days_until_due(self, obj):
         """Get days until due date"""
         return obj.days_until_due()
     
+    def get_history(self, obj):
+        """Get task history, including rows moved to the archive"""
+        # Callers that already loaded it (e.g. concurrently, or for many
+        # tasks at once) pass it in
+        if 'history' in self.context:
+            return self.context['history']
+        if 'histories' in self.context:
+            return self.context['histories'][obj.id]
+        from .history_archive import get_task_history
+        return get_task_history(obj)
+    
+    def update(self, instance, validated_data):
+        """Update the task, then its tags if given; tag_changes is (added, removed)"""
+        tags = validated_data.pop('tags', None)
+        instance = super().update(instance, validated_data)
+        self.tag_changes = ([], []) if tags is None else set_task_tags(instance, tags)
+        return instance
+    
     def validate_title(self, value):
         """Validate task title"""
         if len(value.strip()) < 3:
@@ -154,6 +334,12 @@ class TaskSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Title cannot exceed 200 characters")
         return value.strip()
     
+    def validate_status(self, value):
+        """Validate that a blocked task isn't completed"""
+        if self.instance is not None:
+            validate_unblocked(self.instance, value)
+        return value
+    
     def validate_description(self, value):
         """Validate task description"""
         if len(value) > 2000:
@@ -178,22 +364,32 @@ class TaskSerializer(serializers.ModelSerializer):
         return value
 
 
+class RecurrenceSerializer(serializers.Serializer):
+    """How a task created with TaskCreateSerializer repeats; its due date is the first occurrence's"""
+    
+    frequency = serializers.ChoiceField(choices=RecurrenceRule.FREQUENCY_CHOICES)
+    interval = serializers.IntegerField(min_value=1, max_value=365, default=1)
+    until = serializers.DateTimeField(required=False, allow_null=True)
+    count = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+
+
 class TaskCreateSerializer(serializers.ModelSerializer):
-    """Serializer for creating tasks"""
+    """Serializer for creating tasks, optionally recurring"""
     
     assigned_to_username = serializers.CharField(write_only=True)
+    tags = serializers.ListField(child=serializers.CharField(), write_only=True, required=False)
+    recurrence = RecurrenceSerializer(write_only=True, required=False)
     
     class Meta:
         model = Task
-        fields = ['title', 'description', 'due_date', 'priority', 'assigned_to_username']
+        fields = ['title', 'description', 'due_date', 'priority', 'assigned_to_username', 'tags', 'recurrence']
     
     def validate_assigned_to_username(self, value):
         """Validate assigned user exists"""
-        try:
-            user = User.objects.get(username=value, is_active=True)
-            return user
-        except User.DoesNotExist:
+        entry = user_directory.find(value)
+        if entry is None or not entry.is_active:
             raise serializers.ValidationError("User with this username does not exist or is inactive")
+        return user_instance(entry)
     
     def validate_title(self, value):
         """Validate title"""
@@ -207,25 +403,67 @@ class TaskCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Due date cannot be in the past")
         return value
     
+    def validate_tags(self, value):
+        """Validate tag names"""
+        try:
+            return normalize_tag_names(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+    
+    def validate(self, attrs):
+        """Validate that a recurrence ends after it starts"""
+        until = attrs.get('recurrence', {}).get('until')
+        if until is not None and until < attrs['due_date']:
+            raise serializers.ValidationError({'recurrence': 'until cannot be before the due date'})
+        return attrs
+    
     def create(self, validated_data):
-        """Create new task"""
+        """Create new task, and its recurrence rule if it repeats"""
         assigned_to = validated_data.pop('assigned_to_username')
+        recurrence = validated_data.pop('recurrence', None)
+        tags = validated_data.pop('tags', [])
         validated_data['assigned_to'] = assigned_to
         validated_data['created_by'] = self.context['request'].user
-        return Task.objects.create(**validated_data)
+        shard = shard_for_user(assigned_to)
+        if shard is not None:
+            validated_data['id'] = allocate_task_id(shard)
+        if recurrence is not None:
+            # The task is occurrence 0; the rest are materialized in the background
+            rule = RecurrenceRule(
+                title=validated_data['title'],
+                description=validated_data.get('description', ''),
+                priority=validated_data.get('priority', 'medium'),
+                assigned_to=assigned_to,
+                created_by=validated_data['created_by'],
+                starts_at=validated_data['due_date'],
+                tags=tags,
+                materialized_count=1,
+                **recurrence
+            )
+            rule.next_due_date = rule.due_date_of(1)
+            rule.is_active = rule.next_due_date is not None
+            rule.save()
+            validated_data['recurrence_rule_id'] = rule.id
+            validated_data['occurrence'] = 0
+            schedule_materialization()
+        task = Task.objects.using(shard).create(**validated_data)
+        if tags:
+            set_task_tags(task, tags)
+        return task
 
 
 class TaskListSerializer(serializers.ModelSerializer):
     """Lightweight serializer for task lists"""
     
-    assigned_to_username = serializers.CharField(source='assigned_to.username', read_only=True)
+    assigned_to_username = UsernameField(source='assigned_to_id')
     is_overdue = serializers.BooleanField(read_only=True)
     days_until_due = serializers.SerializerMethodField()
     
     class Meta:
         model = Task
+        list_serializer_class = UsernameListSerializer
         fields = [
-            'id', 'title', 'due_date', 'status', 'priority',
+            'id', 'title', 'due_date', 'status', 'priority', 'version',
             'assigned_to_username', 'is_overdue', 'days_until_due'
         ]
     
@@ -234,6 +472,141 @@ class TaskListSerializer(serializers.ModelSerializer):
         return obj.days_until_due()
 
 
+class TaskListRowSerializer:
+    """
+    Read-only fast path for TaskListSerializer.
+    
+    Takes rows fetched with ``.values(*TaskListRowSerializer.columns(...))``
+    (hot or archived tier) instead of model instances and builds the same
+    output as TaskListSerializer(many=True).data, skipping DRF's per-field
+    machinery. is_overdue and days_until_due are computed against one
+    timestamp, `now` (default: when the serializer is created), instead of
+    calling timezone.now() for every row.
+    
+    ``fields`` and ``expand`` work as for SparseFieldsMixin.
+    """
+    
+    output_fields = (
+        'id', 'title', 'due_date', 'status', 'priority', 'version',
+        'assigned_to_username', 'is_overdue', 'days_until_due'
+    )
+    expandable_fields = ('assigned_to', 'created_by')
+    
+    # Columns each output field reads
+    field_columns = {
+        'id': ['id'],
+        'title': ['title'],
+        'due_date': ['due_date'],
+        'status': ['status'],
+        'priority': ['priority'],
+        'version': ['version'],
+        'assigned_to_username': ['assigned_to_id'],
+        'is_overdue': ['due_date', 'status'],
+        'days_until_due': ['due_date', 'status'],
+    }
+    
+    def __init__(self, rows, now=None, fields=None, expand=()):
+        self.rows = rows
+        self.now = now or timezone.now()
+        self.fields = fields
+        self.expand = expand
+    
+    @classmethod
+    def columns(cls, fields=None, expand=()):
+        """Columns to fetch with values() for the given fields and expansions"""
+        columns = []
+        for name in cls.output_fields:
+            if fields is None or name in fields:
+                columns += [column for column in cls.field_columns[name] if column not in columns]
+        for name in expand:
+            columns += [f'{name}__{field}' for field in TaskUserSerializer.Meta.fields]
+        return columns
+    
+    @staticmethod
+    def _datetime_formatter():
+        """DRF DateTimeField.to_representation, inlined for ISO 8601 output"""
+        if (api_settings.DATETIME_FORMAT or '').lower() != ISO_8601:
+            return serializers.DateTimeField().to_representation
+        tz = timezone.get_current_timezone() if settings.USE_TZ else None
+        
+        def to_representation(value):
+            if not value:
+                return None
+            if tz is not None:
+                value = value.astimezone(tz)
+            value = value.isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return to_representation
+    
+    @staticmethod
+    def _user_getter(name):
+        keys = [(field, f'{name}__{field}') for field in TaskUserSerializer.Meta.fields]
+        return lambda row: {field: row[key] for field, key in keys}
+    
+    @property
+    def data(self):
+        now = self.now
+        format_datetime = self._datetime_formatter()
+        # Every assignee on the page from the user directory, loading the missing ones at once
+        users = {}
+        if self.fields is None or 'assigned_to_username' in self.fields:
+            users = user_directory.get_many({row['assigned_to_id'] for row in self.rows})
+        
+        def assignee_username(row):
+            entry = users.get(row['assigned_to_id'])
+            return entry.username if entry is not None else None
+        
+        if self.fields is None and not self.expand:
+            # Everything: build the dicts directly, the hot path
+            return [
+                {
+                    'id': row['id'],
+                    'title': row['title'],
+                    'due_date': format_datetime(row['due_date']),
+                    'status': row['status'],
+                    'priority': row['priority'],
+                    'version': row['version'],
+                    'assigned_to_username': assignee_username(row),
+                    # Same rules as Task.is_overdue() and Task.days_until_due()
+                    'is_overdue': row['status'] != 'completed' and row['due_date'] < now,
+                    'days_until_due': None if row['status'] == 'completed' else (row['due_date'] - now).days,
+                }
+                for row in self.rows
+            ]
+        
+        getters = {
+            'id': lambda row: row['id'],
+            'title': lambda row: row['title'],
+            'due_date': lambda row: format_datetime(row['due_date']),
+            'status': lambda row: row['status'],
+            'priority': lambda row: row['priority'],
+            'version': lambda row: row['version'],
+            'assigned_to_username': assignee_username,
+            'is_overdue': lambda row: row['status'] != 'completed' and row['due_date'] < now,
+            'days_until_due': lambda row: None if row['status'] == 'completed' else (row['due_date'] - now).days,
+        }
+        selected = [
+            (name, getter) for name, getter in getters.items()
+            if self.fields is None or name in self.fields
+        ]
+        selected += [(name, self._user_getter(name)) for name in self.expand]
+        return [{name: getter(row) for name, getter in selected} for row in self.rows]
+
+
+class TaskParentSerializer(serializers.Serializer):
+    """Serializer for setting a task's parent; null makes it a top-level task"""
+    
+    parent_id = serializers.IntegerField(allow_null=True)
+
+
+class TaskBlockerSerializer(serializers.Serializer):
+    """Serializer for adding a blocker to a task"""
+    
+    blocked_by = serializers.IntegerField()
+
+
 class TaskStatusUpdateSerializer(serializers.Serializer):
     """Serializer for updating task status"""
     
@@ -246,17 +619,12 @@ class TaskStatusUpdateSerializer(serializers.Serializer):
             return value
         
         # Validate status transitions
-        valid_transitions = {
-            'not_started': ['in_progress', 'completed'],
-            'in_progress': ['not_started', 'completed'],
-            'completed': ['in_progress']
-        }
-        
         current_status = task.status
-        if value != current_status and value not in valid_transitions.get(current_status, []):
+        if value != current_status and value not in Task.STATUS_TRANSITIONS.get(current_status, []):
             raise serializers.ValidationError(
                 f'Invalid status transition from {current_status} to {value}'
             )
+        validate_unblocked(task, value)
         
         return value
 
@@ -278,3 +646,179 @@ class BulkStatusUpdateSerializer(serializers.Serializer):
         return value
 
 
+class BulkTaskPatchSerializer(serializers.Serializer):
+    """Serializer for the field values a bulk update sets"""
+    
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Task.PRIORITY_CHOICES, required=False)
+    assigned_to_username = serializers.CharField(required=False)
+    due_date = serializers.DateTimeField(required=False)
+    
+    def validate_assigned_to_username(self, value):
+        """Validate assigned user exists and is active"""
+        entry = user_directory.find(value)
+        if entry is None:
+            raise serializers.ValidationError("User not found")
+        if not entry.is_active:
+            raise serializers.ValidationError("Cannot assign task to inactive user")
+        return entry
+    
+    def validate_due_date(self, value):
+        """Validate due date"""
+        if value < timezone.now():
+            raise serializers.ValidationError("Due date cannot be in the past")
+        
+        max_future_date = timezone.now() + timedelta(days=365*2)
+        if value > max_future_date:
+            raise serializers.ValidationError("Due date cannot be more than 2 years in the future")
+        
+        return value
+    
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Set at least one of status, priority, assigned_to_username, due_date")
+        return attrs
+    
+    def to_patch(self):
+        """The validated values as Task field values, JSON-serializable for the job"""
+        patch = dict(self.validated_data)
+        if 'assigned_to_username' in patch:
+            patch['assigned_to_id'] = patch.pop('assigned_to_username').id
+        if 'due_date' in patch:
+            patch['due_date'] = patch['due_date'].isoformat()
+        return patch
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Serializer for background deletion jobs"""
+    
+    requested_by_username = serializers.CharField(source='requested_by.username', read_only=True, default=None)
+    
+    class Meta:
+        model = DeletionJob
+        fields = [
+            'id', 'target_type', 'target_id', 'target_repr', 'status',
+            'requested_by', 'requested_by_username', 'progress', 'deleted_rows',
+            'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class BulkUpdateJobSerializer(serializers.ModelSerializer):
+    """Serializer for background bulk updates"""
+    
+    requested_by_username = serializers.CharField(source='requested_by.username', read_only=True, default=None)
+    
+    class Meta:
+        model = BulkUpdateJob
+        fields = [
+            'id', 'filters', 'patch', 'status', 'requested_by', 'requested_by_username',
+            'matched', 'updated_rows', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    """Serializer for background jobs; ids are per database"""
+    
+    database = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = BackgroundJob
+        fields = [
+            'id', 'database', 'name', 'payload', 'status', 'attempts', 'max_attempts',
+            'run_after', 'last_error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+    
+    def get_database(self, obj):
+        """Alias of the database holding the job"""
+        return obj._state.db
+
+
+class WebhookSubscriptionSerializer(serializers.ModelSerializer):
+    """Serializer for webhook subscriptions; the secret is only shown when set"""
+    
+    secret = serializers.CharField(write_only=True, required=False, min_length=16, max_length=128)
+    
+    class Meta:
+        model = WebhookSubscription
+        fields = [
+            'id', 'url', 'event_types', 'secret', 'is_active', 'created_by',
+            'created_at', 'updated_at', 'last_success_at', 'last_failure_at', 'last_error'
+        ]
+        read_only_fields = [
+            'id', 'created_by', 'created_at', 'updated_at', 'last_success_at', 'last_failure_at', 'last_error'
+        ]
+    
+    def validate_url(self, value):
+        if not value.startswith(('http://', 'https://')):
+            raise serializers.ValidationError('Webhook URLs must be http or https')
+        return value
+    
+    def validate_event_types(self, value):
+        choices = [choice for choice, _ in WebhookSubscription.EVENT_TYPE_CHOICES]
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError(f'Give a list of event types: {", ".join(choices)}')
+        unknown = [event_type for event_type in value if event_type not in choices]
+        if unknown:
+            raise serializers.ValidationError(f'Unknown event types: {", ".join(map(str, unknown))}')
+        return list(dict.fromkeys(value))
+
+
+class RecurrenceRuleSerializer(serializers.ModelSerializer):
+    """Serializer for recurrence rules; changes apply to the occurrences not materialized yet"""
+    
+    assigned_to_username = UsernameField(source='assigned_to_id')
+    created_by_username = UsernameField(source='created_by_id')
+    
+    class Meta:
+        model = RecurrenceRule
+        list_serializer_class = UsernameListSerializer
+        fields = [
+            'id', 'title', 'description', 'priority', 'assigned_to_username', 'created_by_username',
+            'frequency', 'interval', 'starts_at', 'until', 'count', 'tags', 'materialized_count', 'next_due_date',
+            'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'frequency', 'interval', 'starts_at', 'materialized_count', 'next_due_date',
+            'created_at', 'updated_at'
+        ]
+    
+    def validate_title(self, value):
+        """Validate title"""
+        if len(value.strip()) < 3:
+            raise serializers.ValidationError("Title must be at least 3 characters long")
+        return value.strip()
+    
+    def validate_tags(self, value):
+        """Validate tag names"""
+        if not isinstance(value, list):
+            raise serializers.ValidationError('Give a list of tag names')
+        try:
+            return normalize_tag_names(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+    
+    def validate_until(self, value):
+        """Validate that the rule ends after it starts"""
+        if value is not None and value < self.instance.starts_at:
+            raise serializers.ValidationError("until cannot be before the first occurrence")
+        return value
+    
+    def update(self, instance, validated_data):
+        """Apply the changes and work out the next occurrence again"""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.next_due_date = instance.due_date_of(instance.materialized_count)
+        instance.save()
+        return instance
+
+
+class WebhookDeadLetterSerializer(serializers.ModelSerializer):
+    """Serializer for webhook events that could not be delivered"""
+    
+    class Meta:
+        model = WebhookDeadLetter
+        fields = ['id', 'event_id', 'event_type', 'payload', 'created_at', 'failed_at', 'attempts', 'last_error']
+        read_only_fields = fields
@@ -0,0 +1,414 @@
+"""
+Horizontal sharding of the task tables by assignee.
+
+When ``settings.TASK_SHARDS`` lists database aliases, ``Task``, ``TaskComment``,
+``TaskHistory`` and ``TaskTag`` (and their archive-tier counterparts, and the
+``TaskChange`` log) are stored on the shard of the task's assigned user,
+``TASK_SHARDS[user_id % len(TASK_SHARDS)]``.
+All other models stay on the primary. Each user and tag is copied to every
+shard so that foreign keys and ``select_related('assigned_to')`` keep
+working inside one shard.
+
+Task ids have to be unique across shards. They are handed out by the
+``TaskLocation`` directory on the primary, which also records which shard
+each task is on. Comment and history ids are only unique within a shard.
+
+Queries about one user's tasks go straight to that user's shard. Admin-wide
+views run the same query on every shard in parallel (``scatter``) and merge
+the results (``gather_page``, ``sum_counts``). When a task is reassigned to
+a user on another shard, ``move_task`` moves it there.
+
+If no shards are configured, the helpers return ``None`` as the alias, and
+``using(None)`` leaves the choice between primary and replica to the routers.
+"""
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import (
+    Tag, Task, TaskComment, TaskHistory, TaskLocation, TaskTag, User,
+    ArchivedTask, ArchivedTaskComment, ArchivedTaskHistory, ArchivedTaskTag,
+)
+
+logger = logging.getLogger(__name__)
+
+SHARDED_MODELS = {
+    'tasks.task', 'tasks.taskcomment', 'tasks.taskhistory', 'tasks.tasktag',
+    'tasks.archivedtask', 'tasks.archivedtaskcomment', 'tasks.archivedtaskhistory', 'tasks.archivedtasktag',
+    'tasks.taskchange',
+}
+
+# (model, column the rows are selected by, keep primary key) per tier
+HOT_TABLES = [
+    (Task, 'id', True),
+    (TaskComment, 'task_id', False),
+    (TaskHistory, 'task_id', False),
+    (TaskTag, 'task_id', False),
+]
+ARCHIVED_TABLES = [
+    (ArchivedTask, 'id', True),
+    (ArchivedTaskComment, 'task_id', False),
+    (ArchivedTaskHistory, 'task_id', False),
+    (ArchivedTaskTag, 'task_id', False),
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_shards():
+    return list(getattr(settings, 'TASK_SHARDS', []))
+
+
+def is_sharded():
+    return bool(get_shards())
+
+
+def shard_aliases():
+    """Aliases a cross-shard query runs on; [None] (router's choice) when not sharded"""
+    return get_shards() or [None]
+
+
+def shard_for_user(user):
+    """Alias of the shard holding a user's tasks, or None when not sharded"""
+    shards = get_shards()
+    if not shards:
+        return None
+    user_id = getattr(user, 'pk', user)
+    return shards[user_id % len(shards)]
+
+
+def shard_for_task(task_id):
+    """
+    Alias of the shard holding a task, or None when not sharded.
+
+    Raises Task.DoesNotExist for ids the directory does not know.
+    """
+    if not is_sharded():
+        return None
+    # Always ask the primary; a lagging replica may not know a new task yet
+    shard = (
+        TaskLocation.objects.using(DEFAULT_DB_ALIAS)
+        .filter(id=task_id)
+        .values_list('shard', flat=True)
+        .first()
+    )
+    if shard is None:
+        raise Task.DoesNotExist(f'Task {task_id} does not exist')
+    return shard
+
+
+async def ashard_for_task(task_id):
+    """Async version of shard_for_task()"""
+    if not is_sharded():
+        return None
+    shard = await (
+        TaskLocation.objects.using(DEFAULT_DB_ALIAS)
+        .filter(id=task_id)
+        .values_list('shard', flat=True)
+        .afirst()
+    )
+    if shard is None:
+        raise Task.DoesNotExist(f'Task {task_id} does not exist')
+    return shard
+
+
+def shards_for_tasks(task_ids):
+    """task id -> shard alias (None when not sharded) for the ids the directory knows"""
+    if not is_sharded():
+        return {task_id: None for task_id in task_ids}
+    return dict(
+        TaskLocation.objects.using(DEFAULT_DB_ALIAS)
+        .filter(id__in=list(task_ids))
+        .values_list('id', 'shard')
+    )
+
+
+def allocate_task_id(shard):
+    """Reserve a task id on the given shard"""
+    return TaskLocation.objects.using(DEFAULT_DB_ALIAS).create(shard=shard).id
+
+
+def allocate_task_ids(shard, count):
+    """Reserve `count` task ids on the given shard, with one INSERT"""
+    locations = TaskLocation.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+        [TaskLocation(shard=shard) for _ in range(count)]
+    )
+    return [location.id for location in locations]
+
+
+def forget_tasks(task_ids):
+    """Drop directory entries of purged tasks"""
+    if is_sharded():
+        TaskLocation.objects.using(DEFAULT_DB_ALIAS).filter(id__in=list(task_ids)).delete()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=4 * max(len(get_shards()), 1),
+                thread_name_prefix='shard'
+            )
+        return _executor
+
+
+def scatter(fn):
+    """Call fn(alias) for every shard in parallel and return the results in shard order"""
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return [fn(aliases[0])]
+
+    def run(alias):
+        try:
+            return fn(alias)
+        finally:
+            # Runs on a pool thread; don't leave its connection open
+            connections[alias].close()
+
+    return list(_get_executor().map(run, aliases))
+
+
+def count_on_shards(queryset):
+    """COUNT(*) of a queryset summed over every shard"""
+    return sum(scatter(lambda alias: queryset.using(alias).count()))
+
+
+def sum_counts(results):
+    """Add up per-shard dicts of counts (nested dicts are added key by key)"""
+    total = {}
+    for result in results:
+        for key, value in result.items():
+            if isinstance(value, dict):
+                total[key] = sum_counts([total.get(key, {}), value])
+            else:
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def _sort_key(sort_by):
+    """Python equivalent of ORDER BY sort_by, id (NULLs first, as on SQLite)"""
+    field = sort_by.lstrip('-')
+    descending = sort_by.startswith('-')
+
+    def key(obj):
+        # Model instances or values() rows
+        if isinstance(obj, dict):
+            value, obj_id = obj[field], obj['id']
+        else:
+            value, obj_id = getattr(obj, field), obj.id
+        return (value is not None, value, -obj_id if descending else obj_id)
+    return key, descending
+
+
+def gather_page(fetch, sort_by, start, end):
+    """
+    One page of results across shards.
+
+    fetch(alias, start, end) returns that slice of one shard's results ordered
+    by (sort_by, 'id'). Every shard is asked for its first `end` rows and the
+    lists are merge-sorted.
+    """
+    aliases = shard_aliases()
+    if len(aliases) == 1:
+        return list(fetch(aliases[0], start, end))
+
+    key, descending = _sort_key(sort_by)
+    pages = scatter(lambda alias: list(fetch(alias, 0, end)))
+    return list(itertools.islice(heapq.merge(*pages, key=key, reverse=descending), start, end))
+
+
+def _copy_rows(model, source, target, where_column, ids, keep_pk):
+    """
+    Copy rows between databases without going through save(), so timestamps,
+    validation and signals are left alone. Rows that don't keep their primary
+    key get a new one on the target.
+    """
+    fields = [field for field in model._meta.concrete_fields if keep_pk or not field.primary_key]
+    rows = list(
+        model._base_manager.using(source)
+        .filter(**{f'{where_column}__in': ids})
+        .values_list(*[field.attname for field in fields])
+    )
+    if not rows:
+        return 0
+
+    connection = connections[target]
+    qn = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {qn(model._meta.db_table)} '
+        f'({", ".join(qn(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))})'
+    )
+    params = [
+        [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(rows)
+
+
+def _move_rows(task_ids, source, target, tables):
+    """Copy tasks and their dependents to target, then delete them from source"""
+    # The target may not hold a copy of every tag on the tasks yet
+    for model, _, _ in tables:
+        if model in (TaskTag, ArchivedTaskTag):
+            tag_ids = set(model._base_manager.using(source).filter(task_id__in=task_ids).values_list('tag_id', flat=True))
+            if tag_ids:
+                copy_tags_to_shards(list(Tag.objects.using(DEFAULT_DB_ALIAS).filter(id__in=tag_ids)), [target])
+    for model, where_column, keep_pk in tables:
+        _copy_rows(model, source, target, where_column, task_ids, keep_pk)
+    # Children first, then the tasks themselves
+    for model, where_column, _ in reversed(tables):
+        model._base_manager.using(source).filter(**{f'{where_column}__in': task_ids})._raw_delete(source)
+
+
+def move_task(task, target):
+    """
+    Move a task, with its comments and history, to another shard and return
+    it as loaded from there.
+
+    The copy, the directory update and the delete run in one transaction on
+    each of the three databases, and any error before they commit rolls all
+    of them back. The target commits before the directory, so the directory
+    never points at a shard without the task; a commit failing after that
+    can at worst leave an unreachable copy on the source.
+    """
+    source = task._state.db
+    if source == target:
+        return task
+
+    tables = ARCHIVED_TABLES if isinstance(task, ArchivedTask) else HOT_TABLES
+    move_tasks([(task.id, task.assigned_to_id)], source, target, tables)
+    return type(task)._base_manager.using(target).get(id=task.id)
+
+
+def move_tasks(tasks, source, target, tables=HOT_TABLES):
+    """
+    Move tasks, given as (task id, assigned_to id) pairs, with their
+    comments and history from one shard to another, as move_task does.
+    """
+    task_ids = [task_id for task_id, _ in tasks]
+    with transaction.atomic(using=DEFAULT_DB_ALIAS), \
+            transaction.atomic(using=source), \
+            transaction.atomic(using=target):
+        _move_rows(task_ids, source, target, tables)
+        TaskLocation.objects.using(DEFAULT_DB_ALIAS).filter(id__in=task_ids).update(shard=target)
+        # The target's change feed hasn't seen these tasks yet
+        from .changes import record_task_changes
+        record_task_changes('moved', tasks, using=target)
+
+    if len(task_ids) == 1:
+        logger.info(f"Task {task_ids[0]} moved from {source} to {target}")
+    else:
+        logger.info(f"{len(task_ids)} tasks moved from {source} to {target}")
+
+
+def move_tasks_to_shards(source=DEFAULT_DB_ALIAS, chunk_size=200):
+    """
+    Move tasks stored on an unsharded database to their assignees' shards,
+    registering them in the directory under their current ids. Returns the
+    number moved.
+    """
+    total = 0
+    for tables in (HOT_TABLES, ARCHIVED_TABLES):
+        model = tables[0][0]
+        while True:
+            tasks = list(
+                model._base_manager.using(source)
+                .order_by('id')
+                .values_list('id', 'assigned_to_id')[:chunk_size]
+            )
+            if not tasks:
+                break
+            by_shard = {}
+            for task_id, assigned_to_id in tasks:
+                by_shard.setdefault(shard_for_user(assigned_to_id), []).append(task_id)
+            for target, task_ids in by_shard.items():
+                with transaction.atomic(using=DEFAULT_DB_ALIAS), \
+                        transaction.atomic(using=source), \
+                        transaction.atomic(using=target):
+                    _move_rows(task_ids, source, target, tables)
+                    TaskLocation.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+                        [TaskLocation(id=task_id, shard=target) for task_id in task_ids]
+                    )
+            total += len(tasks)
+            logger.info(f"Moved {len(tasks)} tasks to shards (total {total})")
+
+    # The directory now holds explicit ids; move its sequence past them
+    connection = connections[DEFAULT_DB_ALIAS]
+    reset_sql = connection.ops.sequence_reset_sql(no_style(), [TaskLocation])
+    if reset_sql:
+        with connection.cursor() as cursor:
+            for sql in reset_sql:
+                cursor.execute(sql)
+    return total
+
+
+def copy_user_to_shards(user):
+    """Create or refresh the copy of a user held by every shard"""
+    values = {
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields if not field.primary_key
+    }
+    for alias in get_shards():
+        users = User._base_manager.using(alias)
+        if not users.filter(pk=user.pk).update(**values):
+            users.create(pk=user.pk, **values)
+
+
+def copy_tags_to_shards(tags, aliases=None):
+    """Create the copies of tags that the shards (or those in `aliases`) don't hold yet"""
+    for alias in get_shards() if aliases is None else aliases:
+        existing = set(Tag.objects.using(alias).filter(id__in=[tag.id for tag in tags]).values_list('id', flat=True))
+        Tag.objects.using(alias).bulk_create([Tag(id=tag.id, name=tag.name) for tag in tags if tag.id not in existing])
+
+
+def delete_user_from_shards(user_id):
+    """Remove the copies of a user from every shard"""
+    for alias in get_shards():
+        User._base_manager.using(alias).filter(pk=user_id).delete()
+
+
+class ShardRouter:
+    """
+    Route the task tables to the shard their hints point at.
+
+    Related lookups carry the instance they start from: a user (whose shard
+    holds their tasks) or a task-table row (whose rows share its shard).
+    Queries without such a hint fall through to the next router, so views
+    name the shard explicitly with using().
+    """
+
+    def _db_for_model(self, model, **hints):
+        if model._meta.label_lower not in SHARDED_MODELS or not is_sharded():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if isinstance(instance, User):
+            return shard_for_user(instance)
+        if instance._state.db:
+            return instance._state.db
+        if getattr(instance, 'assigned_to_id', None):
+            return shard_for_user(instance.assigned_to_id)
+        return None
+
+    db_for_read = _db_for_model
+    db_for_write = _db_for_model
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The directory, idempotency keys, reminder checkpoints and task links only live on the primary
+        if app_label == 'tasks' and model_name in (
+            'tasklocation', 'idempotencykey', 'remindercheckpoint', 'subtaskpath', 'blockerpath'
+        ):
+            return db == DEFAULT_DB_ALIAS
+        return None
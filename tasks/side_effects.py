@@ -0,0 +1,89 @@
+"""
+Side effects of task writes, run as background jobs (see tasks/jobs.py).
+
+Views and signals enqueue them inside their transaction, so they are
+recorded if and only if it commits, and carried out by the job workers, off
+the request path.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .activity import activity_event, publish_activity
+from .jobs import enqueue, job_handler
+from .models import Task, TaskHistory
+from .sharding import shards_for_tasks
+
+logger = logging.getLogger(__name__)
+
+
+def record_history(task, user, action, description, log_message='', using=None):
+    """
+    Add a TaskHistory entry for a task in the background, stamped with the
+    current time. `log_message` is logged once the entry is written.
+    `using` is the database whose transaction the change is part of
+    (default: the task's).
+    """
+    enqueue('record_task_history', {
+        'task_id': task.id,
+        'user_id': getattr(user, 'pk', user),
+        'action': action,
+        'description': description,
+        'timestamp': timezone.now().isoformat(),
+        'log_message': log_message,
+    }, using=using or task._state.db)
+
+
+def _history_key(task_id, user_id, action, description, timestamp):
+    return (task_id, user_id, action, description, timestamp)
+
+
+@job_handler('record_task_history', batch_size=200)
+def write_task_history(payloads):
+    """
+    Insert queued history entries, one bulk insert per shard. Idempotent:
+    entries already written (same task, user, action, description and
+    timestamp) by an earlier run of the payload are skipped.
+    """
+    locations = shards_for_tasks({payload['task_id'] for payload in payloads})
+    by_shard = {}
+    for payload in payloads:
+        if payload['task_id'] in locations:
+            by_shard.setdefault(locations[payload['task_id']], []).append(payload)
+
+    for using, entries in by_shard.items():
+        task_ids = {entry['task_id'] for entry in entries}
+        timestamps = {parse_datetime(entry['timestamp']) for entry in entries}
+        # The insert and its activity job commit together, or neither does
+        with transaction.atomic(using=using):
+            existing = set(Task.all_objects.using(using).filter(id__in=task_ids).values_list('id', flat=True))
+            written_before = {
+                _history_key(*row) for row in
+                TaskHistory.objects.using(using).filter(task_id__in=task_ids, timestamp__in=timestamps)
+                .values_list('task_id', 'user_id', 'action', 'description', 'timestamp')
+            }
+            history = []
+            for entry in entries:
+                row = TaskHistory(
+                    task_id=entry['task_id'],
+                    user_id=entry['user_id'],
+                    action=entry['action'],
+                    description=entry['description'],
+                    timestamp=parse_datetime(entry['timestamp']),
+                )
+                key = _history_key(row.task_id, row.user_id, row.action, row.description, row.timestamp)
+                if row.task_id in existing and key not in written_before:
+                    # Also drops a payload queued twice in one batch
+                    written_before.add(key)
+                    history.append(row)
+            written = TaskHistory.objects.using(using).bulk_create(history)
+            publish_activity([
+                activity_event(entry.task_id, entry.user_id, entry.action, entry.description, entry.timestamp)
+                for entry in written
+            ], using=using)
+
+    for payload in payloads:
+        if payload['log_message']:
+            logger.info(payload['log_message'])
@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save, pre_save
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.signals import user_logged_in
-from .models import Task, TaskHistory, User
+from .activity import activity_event, publish_activity
+from .changes import record_task_change
+from .models import Task, TaskComment, User, WebhookSubscription
+from .sharding import copy_user_to_shards, delete_user_from_shards
+from .side_effects import record_history
+from .user_directory import user_directory
+from .webhooks import forget_subscriptions, publish_comment_event
 import logging
 
 logger = logging.getLogger(__name__)
@@ -10,45 +17,109 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=Task)
 def create_task_history(sender, instance, created, **kwargs):
     """Create history entry when task is created or updated"""
+    # The change feed's entry, in the save's transaction
     if created:
-        TaskHistory.objects.create(
-            task=instance,
-            user=instance.created_by,
-            action='created',
-            description=f'Task created and assigned to {instance.assigned_to.username}'
+        action = 'created'
+    else:
+        action = 'status_changed' if getattr(instance, '_status_changed', False) else 'updated'
+    record_task_change(
+        instance,
+        action,
+        previous_assignee_id=getattr(instance, '_previous_assignee_id', None),
+        using=kwargs['using']
+    )
+    
+    if created:
+        # Written by a background job once the save commits
+        record_history(
+            instance,
+            instance.created_by,
+            'created',
+            f'Task created and assigned to {instance.assigned_to.username}',
+            log_message=f'Task {instance.id} created by {instance.created_by.username}',
+            using=kwargs['using']
         )
-        logger.info(f'Task {instance.id} created by {instance.created_by.username}')
 
 
 @receiver(pre_save, sender=Task)
 def track_task_changes(sender, instance, **kwargs):
     """Track changes to task fields"""
-    if instance.pk:  # Only for existing tasks
+    instance._previous_assignee_id = None
+    instance._status_changed = False
+    if instance.pk and not instance._state.adding:  # Only for existing tasks
         try:
-            old_task = Task.objects.get(pk=instance.pk)
+            old_task = Task.objects.using(kwargs['using']).get(pk=instance.pk)
             
             # Track assignment changes
             if old_task.assigned_to != instance.assigned_to:
-                TaskHistory.objects.create(
-                    task=instance,
-                    user=instance.assigned_to,  # This will be set after save
-                    action='assigned',
-                    description=f'Task reassigned from {old_task.assigned_to.username} to {instance.assigned_to.username}'
+                # The change feed tells the previous assignee the task is gone
+                instance._previous_assignee_id = old_task.assigned_to_id
+                record_history(
+                    instance,
+                    instance.assigned_to,  # This will be set after save
+                    'assigned',
+                    f'Task reassigned from {old_task.assigned_to.username} to {instance.assigned_to.username}',
+                    using=kwargs['using']
                 )
             
             # Track status changes
             if old_task.status != instance.status:
-                TaskHistory.objects.create(
-                    task=instance,
-                    user=instance.assigned_to,  # This will be updated in the view
-                    action='status_changed',
-                    description=f'Status changed from {old_task.status} to {instance.status}'
+                instance._status_changed = True
+                record_history(
+                    instance,
+                    instance.assigned_to,  # This will be updated in the view
+                    'status_changed',
+                    f'Status changed from {old_task.status} to {instance.status}',
+                    using=kwargs['using']
                 )
         
         except Task.DoesNotExist:
             pass
 
 
+@receiver(post_save, sender=TaskComment)
+def record_comment_change(sender, instance, created, **kwargs):
+    """Tell the change feed, activity feeds and webhooks a task got a comment"""
+    if created:
+        record_task_change(instance.task, 'commented', using=kwargs['using'])
+        # And the activity feeds of the people following the task
+        event = activity_event(instance.task_id, instance.author_id, 'commented', instance.content, instance.created_at)
+        # Two comments are two entries, even with the same text in the same second
+        event['key'] = f'comment-{instance.task_id}-{instance.id}'
+        publish_activity([event], using=kwargs['using'])
+        publish_comment_event(instance, using=kwargs['using'])
+
+
+@receiver(post_save, sender=User)
+def replicate_user(sender, instance, using, **kwargs):
+    """Keep the shards' copies of a user in step with the primary"""
+    if using == DEFAULT_DB_ALIAS:
+        copy_user_to_shards(instance)
+
+
+@receiver(post_delete, sender=User)
+def remove_replicated_user(sender, instance, using, **kwargs):
+    """Drop the shards' copies of a deleted user"""
+    if using == DEFAULT_DB_ALIAS:
+        delete_user_from_shards(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_directory(sender, instance, using, **kwargs):
+    """Have the user directory reload a changed user"""
+    user_directory.invalidate(instance.pk)
+    # Again once committed, in case it was reloaded from before the change meanwhile
+    transaction.on_commit(lambda: user_directory.invalidate(instance.pk), using=using)
+
+
+@receiver(post_save, sender=WebhookSubscription)
+@receiver(post_delete, sender=WebhookSubscription)
+def refresh_webhook_subscriptions(sender, **kwargs):
+    """Start or stop publishing the event types a subscription wants"""
+    forget_subscriptions()
+
+
 @receiver(user_logged_in)
 def log_user_login(sender, request, user, **kwargs):
     """Log user login events"""
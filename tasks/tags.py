@@ -0,0 +1,183 @@
+"""
+Task tags.
+
+``Tag`` rows hold the names. Like users they live on the primary and are
+copied to every shard, so ``TaskTag`` rows (``ArchivedTaskTag`` in the
+archive tier) sit on their task's shard with working foreign keys and move
+with it. Tags are created the first time they are used and never renamed,
+so each process keeps a name <-> id directory that only ever grows.
+
+The unique (tag_id, task_id) index holds every tag's task ids as one sorted
+range: a per-tag id set kept up to date by the database. Filtering by tags
+adds a semi-join per tag to the task query (``id IN (SELECT task_id FROM
+tasks_tasktag WHERE tag_id = %s)``), so the intersection of several tags is
+read off those ranges, and combined with the other filters, the sort and
+the page limit in the same query on every shard, instead of shipping id
+sets between the database and Python.
+"""
+import re
+import threading
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+
+from .models import ArchivedTask, ArchivedTaskTag, Tag, Task, TaskTag
+from .sharding import copy_tags_to_shards, scatter
+
+TAG_NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+TAG_NAME_LENGTH = Tag._meta.get_field('name').max_length
+MAX_TAGS_PER_TASK = 20
+
+# Task model -> the model of its tags
+TAG_MODELS = {Task: TaskTag, ArchivedTask: ArchivedTaskTag}
+
+
+def normalize_tag_names(names):
+    """Lower-cased, de-duplicated tag names; ValueError for invalid ones"""
+    normalized = []
+    for name in names:
+        if not isinstance(name, str):
+            raise ValueError('Tags must be strings')
+        name = name.strip().lower()
+        if not TAG_NAME_RE.match(name) or len(name) > TAG_NAME_LENGTH:
+            raise ValueError(
+                f'Invalid tag "{name}": use up to {TAG_NAME_LENGTH} letters, digits, "-" and "_"'
+            )
+        if name not in normalized:
+            normalized.append(name)
+    if len(normalized) > MAX_TAGS_PER_TASK:
+        raise ValueError(f'At most {MAX_TAGS_PER_TASK} tags per task')
+    return normalized
+
+
+class TagDirectory:
+    """Tag names and ids, loaded from the primary as they are asked for"""
+
+    def __init__(self):
+        self._ids = {}
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def _remember(self, rows):
+        with self._lock:
+            for tag_id, name in rows:
+                self._ids[name] = tag_id
+                self._names[tag_id] = name
+
+    def _load(self, **lookup):
+        """(id, name) of the tags matching a lookup on the primary, remembered once committed"""
+        rows = list(Tag.objects.using(DEFAULT_DB_ALIAS).filter(**lookup).values_list('id', 'name'))
+        # A tag created in a transaction that rolls back must not be remembered
+        transaction.on_commit(lambda: self._remember(rows), using=DEFAULT_DB_ALIAS)
+        return rows
+
+    def ids(self, names, create=False, using=None):
+        """
+        {name: id} of the tags in `names` that exist. With `create` the
+        missing ones are created, and the tags are copied to the shard
+        `using` if it doesn't hold them yet.
+        """
+        found = {name: self._ids[name] for name in names if name in self._ids}
+        missing = [name for name in names if name not in found]
+        if missing and create:
+            Tag.objects.using(DEFAULT_DB_ALIAS).bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+        if missing:
+            found.update((name, tag_id) for tag_id, name in self._load(name__in=missing))
+        if create and using is not None:
+            copy_tags_to_shards([Tag(id=tag_id, name=name) for name, tag_id in found.items()], [using])
+        return found
+
+    def names(self, ids):
+        """{id: name} of tag ids"""
+        found = {tag_id: self._names[tag_id] for tag_id in ids if tag_id in self._names}
+        missing = [tag_id for tag_id in ids if tag_id not in found]
+        if missing:
+            found.update(self._load(id__in=missing))
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+            self._names.clear()
+
+
+tag_directory = TagDirectory()
+
+
+def tags_of(tasks):
+    """{task id: sorted tag names} for Task or ArchivedTask instances, one query per database and tier"""
+    groups = {}
+    for task in tasks:
+        groups.setdefault((type(task), task._state.db), []).append(task.id)
+
+    tag_ids = {task.id: [] for task in tasks}
+    for (model, using), ids in groups.items():
+        rows = TAG_MODELS[model].objects.using(using).filter(task_id__in=ids).values_list('task_id', 'tag_id')
+        for task_id, tag_id in rows:
+            tag_ids[task_id].append(tag_id)
+
+    names = tag_directory.names({tag_id for ids in tag_ids.values() for tag_id in ids})
+    return {task_id: sorted(names[tag_id] for tag_id in ids if tag_id in names) for task_id, ids in tag_ids.items()}
+
+
+def set_task_tags(task, names):
+    """
+    Give a task exactly the tags `names` (normalized), on its database.
+    Returns (added, removed) names.
+    """
+    current = tags_of([task])[task.id]
+    added = [name for name in names if name not in current]
+    removed = [name for name in current if name not in names]
+    model = TAG_MODELS[type(task)]
+    using = task._state.db
+    if removed:
+        model.objects.using(using).filter(
+            task_id=task.id, tag_id__in=tag_directory.ids(removed).values()
+        ).delete()
+    if added:
+        model.objects.using(using).bulk_create(
+            [model(task_id=task.id, tag_id=tag_id) for tag_id in tag_directory.ids(added, create=True, using=using).values()],
+            ignore_conflicts=True
+        )
+    return added, removed
+
+
+def tag_tasks(tasks, names, using):
+    """Add the tags `names` to new tasks on `using`, with one INSERT"""
+    if not names or not tasks:
+        return
+    tag_ids = tag_directory.ids(names, create=True, using=using).values()
+    TaskTag.objects.using(using).bulk_create(
+        [TaskTag(task_id=task.id, tag_id=tag_id) for task in tasks for tag_id in tag_ids]
+    )
+
+
+def filter_by_tags(queryset, names, match_all=True):
+    """Tasks of a Task or ArchivedTask queryset with every tag in `names` (or any, unless match_all)"""
+    tag_ids = tag_directory.ids(names)
+    if not tag_ids or (match_all and len(tag_ids) < len(names)):
+        # A tag nobody has used yet
+        return queryset.none()
+
+    tagged = TAG_MODELS[queryset.model].objects.values('task_id')
+    if not match_all:
+        return queryset.filter(id__in=tagged.filter(tag_id__in=tag_ids.values()))
+    for tag_id in tag_ids.values():
+        queryset = queryset.filter(id__in=tagged.filter(tag_id=tag_id))
+    return queryset
+
+
+def tag_counts(model=Task):
+    """{tag name: tasks with it} over every database, for Task or ArchivedTask"""
+    def count(using):
+        return dict(
+            TAG_MODELS[model].objects.using(using).filter(task__deleted_at__isnull=True)
+            .values('tag_id').annotate(count=Count('task_id')).values_list('tag_id', 'count')
+        )
+
+    counts = {}
+    for shard_counts in scatter(count):
+        for tag_id, tag_count in shard_counts.items():
+            counts[tag_id] = counts.get(tag_id, 0) + tag_count
+    names = tag_directory.names(list(counts))
+    return {names[tag_id]: tag_count for tag_id, tag_count in counts.items() if tag_id in names}
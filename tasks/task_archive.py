@@ -0,0 +1,190 @@
+"""
+Hot/cold tiering for completed tasks.
+
+Completed tasks that have not changed for ``TASK_ARCHIVE_AFTER_DAYS`` are moved,
+together with their comments, history and tags, from the hot ``Task`` tables into
+the ``ArchivedTask*`` tables. Rows keep their primary keys, so ids handed out to
+clients stay valid in both tiers and a task can be moved back unchanged when it
+is reopened.
+
+Rows are copied with ``INSERT ... SELECT`` rather than through the ORM so that
+``auto_now``/``auto_now_add`` timestamps, model validation and the Task save
+signals are left untouched by a move.
+
+With sharding enabled both tiers live on the task's shard, and every move
+runs on that shard's connection.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import BooleanField, Value
+from django.utils import timezone
+
+from .models import (
+    Task, TaskComment, TaskHistory, TaskTag,
+    ArchivedTask, ArchivedTaskComment, ArchivedTaskHistory, ArchivedTaskTag,
+)
+from .changes import record_task_changes
+from .sharding import ashard_for_task, shard_aliases, shard_for_task
+
+logger = logging.getLogger(__name__)
+
+# (hot model, cold model, column the rows are selected by)
+TIERS = [
+    (Task, ArchivedTask, 'id'),
+    (TaskComment, ArchivedTaskComment, 'task_id'),
+    (TaskHistory, ArchivedTaskHistory, 'task_id'),
+    (TaskTag, ArchivedTaskTag, 'task_id'),
+]
+
+
+def _copy_rows(source, target, where_column, ids, extra=None, using=None):
+    """Copy the rows of source whose where_column is in ids into target"""
+    connection = connections[using or source.objects.db]
+    qn = connection.ops.quote_name
+    columns = [field.column for field in source._meta.concrete_fields
+               if field.column in {f.column for f in target._meta.concrete_fields}]
+    extra = extra or {}
+
+    insert_columns = ', '.join(qn(column) for column in list(columns) + list(extra))
+    select_columns = ', '.join([qn(column) for column in columns] + ['%s'] * len(extra))
+    placeholders = ', '.join(['%s'] * len(ids))
+    sql = (
+        f'INSERT INTO {qn(target._meta.db_table)} ({insert_columns}) '
+        f'SELECT {select_columns} FROM {qn(source._meta.db_table)} '
+        f'WHERE {qn(where_column)} IN ({placeholders})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(extra.values()) + list(ids))
+
+
+def _move(ids, to_archive, using=None):
+    """Move tasks (and their comments, history and tags) between tiers"""
+    archived_at = timezone.now()
+    for hot, cold, where_column in TIERS:
+        source, target = (hot, cold) if to_archive else (cold, hot)
+        extra = {'archived_at': archived_at} if to_archive and cold is ArchivedTask else None
+        _copy_rows(source, target, where_column, ids, extra, using)
+
+    # Children first, then the tasks themselves
+    for hot, cold, where_column in reversed(TIERS):
+        source = hot if to_archive else cold
+        queryset = source.objects.db_manager(using).filter(**{f'{where_column}__in': ids})
+        queryset._raw_delete(queryset.db)
+
+
+def archive_completed_tasks(older_than_days=None, chunk_size=200):
+    """
+    Move completed tasks last updated more than older_than_days ago to the
+    archive tier, one chunk per transaction and shard. Returns the number moved.
+    """
+    if older_than_days is None:
+        older_than_days = settings.TASK_ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+
+    total = 0
+    for using in shard_aliases():
+        while True:
+            with transaction.atomic(using=using):
+                tasks = list(
+                    Task.objects.using(using).select_for_update()
+                    .filter(status='completed', updated_at__lt=cutoff)
+                    .order_by('updated_at')
+                    .values_list('id', 'assigned_to_id')[:chunk_size]
+                )
+                if not tasks:
+                    break
+                ids = [task_id for task_id, _ in tasks]
+                _move(ids, to_archive=True, using=using)
+                record_task_changes('archived', tasks, using=using)
+            total += len(ids)
+            logger.info(f"Archived {len(ids)} completed tasks (total {total})")
+    return total
+
+
+def restore_task(task_id):
+    """Move an archived task back to the hot tier and return it"""
+    using = shard_for_task(task_id)
+    with transaction.atomic(using=using):
+        assigned_to_id = (
+            ArchivedTask.objects.using(using).select_for_update()
+            .filter(id=task_id).values_list('assigned_to_id', flat=True).first()
+        )
+        if assigned_to_id is None:
+            return Task.objects.using(using).get(id=task_id)
+        _move([task_id], to_archive=False, using=using)
+        record_task_changes('restored', [(task_id, assigned_to_id)], using=using)
+    logger.info(f"Task {task_id} restored from archive")
+    return Task.objects.using(using).get(id=task_id)
+
+
+def merge_tiers(queryset, archived_queryset, sort_by, start, end, fields=None):
+    """
+    Return one page of tasks across both tiers, ordered by sort_by.
+
+    The page is picked with a UNION over just the id and sort column, then the
+    selected rows are loaded from their own tier: as model instances, or as
+    values() dicts of `fields` if given.
+    """
+    sort_field = sort_by.lstrip('-')
+    keys = ('id', sort_field, 'archived')
+    hot_keys = queryset.order_by().annotate(
+        archived=Value(False, output_field=BooleanField())
+    ).values_list(*keys)
+    cold_keys = archived_queryset.order_by().annotate(
+        archived=Value(True, output_field=BooleanField())
+    ).values_list(*keys)
+    page = [
+        (task_id, archived)
+        for task_id, _, archived in hot_keys.union(cold_keys, all=True).order_by(sort_by, 'id')[start:end]
+    ]
+
+    def load(model, using, ids):
+        if fields is None:
+            return model.objects.using(using).select_related('assigned_to').in_bulk(ids)
+        return {row['id']: row for row in model.objects.using(using).filter(id__in=ids).values(*fields)}
+
+    hot = load(Task, queryset.db, [task_id for task_id, archived in page if not archived])
+    cold = load(ArchivedTask, archived_queryset.db, [task_id for task_id, archived in page if archived])
+    return [(cold if archived else hot)[task_id] for task_id, archived in page]
+
+
+def get_task_in_any_tier(task_id, prepare=None):
+    """
+    Fetch a task from the hot tier, falling back to the archive.
+
+    prepare(queryset), if given, shapes the query on either tier (e.g. only()).
+    """
+    using = shard_for_task(task_id)
+    prepare = prepare or (lambda queryset: queryset)
+    try:
+        return prepare(Task.objects.using(using)).get(id=task_id)
+    except Task.DoesNotExist:
+        try:
+            return prepare(ArchivedTask.objects.using(using)).get(id=task_id)
+        except ArchivedTask.DoesNotExist:
+            raise Task.DoesNotExist(f'Task {task_id} does not exist in either tier')
+
+
+async def aget_task_in_any_tier(task_id, prepare=None):
+    """Async version of get_task_in_any_tier()"""
+    using = await ashard_for_task(task_id)
+    prepare = prepare or (lambda queryset: queryset)
+    try:
+        return await prepare(Task.objects.using(using)).aget(id=task_id)
+    except Task.DoesNotExist:
+        try:
+            return await prepare(ArchivedTask.objects.using(using)).aget(id=task_id)
+        except ArchivedTask.DoesNotExist:
+            raise Task.DoesNotExist(f'Task {task_id} does not exist in either tier')
+
+
+def merge_counts(hot_counts, archived_counts):
+    """Add per-key counts from the archive tier to those of the hot tier"""
+    merged = dict(hot_counts)
+    for key, count in archived_counts.items():
+        if count:
+            merged[key] = merged.get(key, 0) + count
+    return merged
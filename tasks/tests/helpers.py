@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tasks import sharding
+from tasks.models import Task, User
+from tasks.user_directory import user_directory
+
+
+def make_user(username, role='user', **kwargs):
+    # No password: tests authenticate with force_authenticate, and hashing one is slow
+    return User.objects.create_user(username=username, role=role, **kwargs)
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def make_task(assigned_to, created_by, **kwargs):
+    kwargs.setdefault('title', 'Task title')
+    kwargs.setdefault('due_date', timezone.now() + timedelta(days=3))
+    return Task.objects.create(assigned_to=assigned_to, created_by=created_by, **kwargs)
+
+
+class ScratchDatabasesTestCase(TransactionTestCase):
+    """
+    Runs with extra scratch SQLite databases, migrated once for the test
+    class, and the settings from scratch_settings(). Transactions really
+    commit, so other threads (e.g. scatter()'s) see the test's data.
+    """
+
+    scratch_aliases = ()
+
+    @classmethod
+    def scratch_settings(cls):
+        return {}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.scratch_dir = tempfile.mkdtemp(prefix='task-tests-')
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        for alias in cls.scratch_aliases:
+            connections.settings[alias] = {
+                **primary,
+                'NAME': str(Path(cls.scratch_dir) / f'{alias}.sqlite3'),
+                'TEST': {**primary['TEST'], 'NAME': None, 'MIRROR': None},
+            }
+            call_command('migrate', database=alias, verbosity=0)
+        cls.overridden_settings = override_settings(**cls.scratch_settings())
+        cls.overridden_settings.enable()
+        cls.databases = {DEFAULT_DB_ALIAS, *cls.scratch_aliases}
+        super().setUpClass()
+
+    def setUp(self):
+        # Flushing between tests deletes users without the signals that update the directory
+        user_directory.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.overridden_settings.disable()
+        # scatter()'s pool threads hold connections to this class's files
+        with sharding._executor_lock:
+            if sharding._executor is not None:
+                sharding._executor.shutdown()
+                sharding._executor = None
+        for alias in cls.scratch_aliases:
+            connections[alias].close()
+            # Later classes reuse the alias: drop the connection to this class's file too
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.scratch_dir, ignore_errors=True)
+
+
+class ShardedTestCase(ScratchDatabasesTestCase):
+    """Runs with TASK_SHARDS set to two scratch databases"""
+
+    shards = ['test_shard1', 'test_shard2']
+    scratch_aliases = shards
+
+    @classmethod
+    def scratch_settings(cls):
+        return {'TASK_SHARDS': cls.shards}
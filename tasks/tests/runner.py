@@ -0,0 +1,19 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests without the web process's job threads: they would contend
+    with the tests for the in-memory database, and tests run the jobs they
+    queue themselves with run_pending().
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.job_settings = override_settings(JOB_WORKERS=0)
+        self.job_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.job_settings.disable()
+        super().teardown_test_environment(**kwargs)
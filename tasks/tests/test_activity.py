@@ -0,0 +1,107 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.activity import activity_event, publish_activity
+from tasks.jobs import run_pending
+from tasks.models import ActivityEntry
+
+from .helpers import client_for, make_task, make_user
+
+
+class ActivityFeedTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.task = make_task(self.alice, self.admin, title='Write the report')
+        run_pending()  # Fans the task's creation out
+
+    def publish(self, count, actor=None, summary='Change'):
+        now = timezone.now()
+        publish_activity([
+            activity_event(self.task.id, (actor or self.admin).id, 'updated', f'{summary} {i}', now + timedelta(seconds=i))
+            for i in range(count)
+        ])
+        run_pending()
+
+    def feed(self, user, query=''):
+        response = client_for(user).get(f'/api/activity/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_events_reach_everyone_interested_but_whoever_did_it(self):
+        self.task.comments.create(author=self.bob, content='Need a hand?')
+        self.publish(1)
+
+        self.assertEqual([entry['summary'] for entry in self.feed(self.alice)['entries']][:1], ['Change 0'])
+        self.assertEqual([entry['summary'] for entry in self.feed(self.bob)['entries']], ['Change 0'])
+        self.assertFalse(ActivityEntry.objects.filter(user_id=self.admin.id, summary='Change 0').exists())
+        entry = self.feed(self.bob)['entries'][0]
+        self.assertEqual((entry['task_title'], entry['actor_username']), ('Write the report', 'boss'))
+
+    def test_feed_pages_newest_first_by_cursor(self):
+        ActivityEntry.objects.all().delete()
+        self.publish(5)
+
+        first = self.feed(self.alice, 'limit=2')
+        second = self.feed(self.alice, f"limit=2&before={first['next_cursor']}")
+        last = self.feed(self.alice, f"limit=2&before={second['next_cursor']}")
+
+        summaries = [entry['summary'] for page in (first, second, last) for entry in page['entries']]
+        self.assertEqual(summaries, [f'Change {i}' for i in reversed(range(5))])
+        self.assertIsNone(last['next_cursor'])
+
+    def test_invalid_cursors_are_refused(self):
+        for query in ('limit=x', 'before=x'):
+            with self.subTest(query=query):
+                self.assertEqual(client_for(self.alice).get(f'/api/activity/?{query}').status_code, 400)
+
+    def test_unread_entries_are_those_after_last_read_id(self):
+        ActivityEntry.objects.all().delete()
+        self.publish(3)
+        client = client_for(self.alice)
+        feed = self.feed(self.alice)
+        self.assertEqual((feed['unread_count'], feed['last_read_id']), (3, 0))
+
+        middle = feed['entries'][1]['id']
+        response = client.post('/api/activity/read/', {'up_to': middle}, format='json')
+
+        self.assertEqual((response.data['last_read_id'], response.data['unread_count']), (middle, 1))
+        feed = self.feed(self.alice)
+        self.assertEqual([entry['unread'] for entry in feed['entries']], [True, False, False])
+        # Never moves back
+        response = client.post('/api/activity/read/', {'up_to': middle - 1}, format='json')
+        self.assertEqual(response.data['last_read_id'], middle)
+
+        response = client.post('/api/activity/read/', {}, format='json')
+
+        self.assertEqual((response.data['last_read_id'], response.data['unread_count']), (feed['entries'][0]['id'], 0))
+        self.publish(1, actor=self.bob, summary='Comment')
+        self.assertEqual(self.feed(self.alice)['unread_count'], 1)
+        # Reading one feed leaves the others unread
+        self.assertEqual(self.feed(self.admin)['unread_count'], 1)
+
+    def test_invalid_up_to_is_refused(self):
+        for up_to in ('5', True, 1.5):
+            with self.subTest(up_to=up_to):
+                response = client_for(self.alice).post('/api/activity/read/', {'up_to': up_to}, format='json')
+                self.assertEqual(response.status_code, 400)
+
+    def test_an_event_published_twice_is_in_a_feed_once(self):
+        ActivityEntry.objects.all().delete()
+        event = activity_event(self.task.id, self.admin.id, 'updated', 'Priority changed')
+
+        publish_activity([dict(event)])
+        publish_activity([dict(event)])
+        run_pending()
+
+        self.assertEqual(self.feed(self.alice)['unread_count'], 1)
+
+    @override_settings(ACTIVITY_FEED_MAX_ENTRIES=3)
+    def test_feeds_keep_their_newest_entries(self):
+        self.publish(5)
+
+        self.assertEqual([entry['summary'] for entry in self.feed(self.alice)['entries']], ['Change 4', 'Change 3', 'Change 2'])
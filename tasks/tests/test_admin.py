@@ -0,0 +1,43 @@
+from django.contrib import admin
+from django.db import connection
+from django.test import RequestFactory, TestCase
+
+from tasks.admin import EstimatedCountPaginator
+from tasks.models import Task, User
+
+from .helpers import make_task, make_user
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    """Changelist counts from the planner's row estimate"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        make_task(self.admin, self.admin)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            for table in (Task._meta.db_table, User._meta.db_table):
+                cursor.execute('DELETE FROM sqlite_stat1 WHERE tbl = %s', [table])
+                cursor.execute("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (%s, NULL, '50000')", [table])
+
+    def count(self, queryset):
+        return EstimatedCountPaginator(queryset, 20).count
+
+    def test_changelists_hiding_soft_deleted_rows_use_the_estimate(self):
+        users = admin.site._registry[User].get_queryset(RequestFactory().get('/admin/tasks/user/'))
+
+        # No COUNT(*): the estimate comes from sqlite_stat1
+        with self.assertNumQueries(2):
+            self.assertEqual(self.count(Task.objects.all()), 50000)
+        self.assertEqual(self.count(users), 50000)
+        self.assertEqual(self.count(Task.all_objects.all()), 50000)
+
+    def test_filtered_changelists_are_counted_exactly(self):
+        self.assertEqual(self.count(Task.objects.filter(status='completed')), 0)
+        self.assertEqual(self.count(Task.all_objects.filter(deleted_at__isnull=False)), 0)
+
+    def test_small_tables_are_counted_exactly(self):
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE sqlite_stat1 SET stat = '5' WHERE tbl = 'tasks_task'")
+
+        self.assertEqual(self.count(Task.objects.all()), 1)
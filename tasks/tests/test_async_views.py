@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.models import Task
+from tasks.task_archive import archive_completed_tasks
+
+from .helpers import ShardedTestCase, client_for, make_task, make_user
+
+
+class AsyncViewTests(TransactionTestCase):
+    """
+    The async views against their sync counterparts. Transactions commit, so
+    fan_out()'s worker threads see the test's data.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+
+    def get(self, user, path):
+        """GET path from the async views and from the sync ones"""
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        return self.client.get(f'/api/async/{path}', **headers), client_for(user).get(f'/api/{path}')
+
+    def test_responses_match_the_sync_views(self):
+        task = make_task(self.user, self.admin, title='Mine')
+        make_task(self.other, self.admin, title='Not mine')
+        task.comments.create(author=self.user, content='On it')
+
+        for user, path in [
+            (self.user, 'tasks/'),
+            (self.admin, 'tasks/?sort_by=title&page_size=1&page=2'),
+            (self.user, f'tasks/{task.id}/'),
+            (self.user, f'tasks/{task.id}/?fields=id,title,comments'),
+            (self.user, 'dashboard/'),
+            (self.admin, 'dashboard/'),
+            (self.admin, 'admin/statistics/'),
+        ]:
+            with self.subTest(path=path):
+                async_response, sync_response = self.get(user, path)
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(async_response.json(), sync_response.json())
+
+    def test_archived_tasks_are_found_when_asked_for(self):
+        task = make_task(self.user, self.admin, status='completed')
+        Task.objects.filter(id=task.id).update(updated_at=timezone.now() - timedelta(days=365))
+        archive_completed_tasks(older_than_days=1)
+
+        hot_only, _ = self.get(self.user, f'tasks/{task.id}/')
+        any_tier, sync_response = self.get(self.user, f'tasks/{task.id}/?include_archived=true')
+
+        self.assertEqual(hot_only.status_code, 404)
+        self.assertEqual(any_tier.status_code, 200)
+        self.assertEqual(any_tier.json(), sync_response.json())
+
+    def test_errors(self):
+        task = make_task(self.other, self.admin)
+
+        self.assertEqual(self.get(self.user, f'tasks/{task.id}/')[0].status_code, 403)
+        self.assertEqual(self.get(self.user, 'tasks/999/')[0].status_code, 404)
+        self.assertEqual(self.get(self.user, 'admin/statistics/')[0].status_code, 403)
+        self.assertEqual(self.client.get('/api/async/tasks/').status_code, 401)
+
+
+class ShardedAsyncViewTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+
+    def test_task_is_looked_up_on_its_shard(self):
+        response = client_for(self.admin).post('/api/tasks/create/', {
+            'title': 'Sharded',
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': self.user.username,
+        }, format='json')
+        task_id = response.data['task']['id']
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+        found = self.client.get(f'/api/async/tasks/{task_id}/', **headers)
+        any_tier = self.client.get(f'/api/async/tasks/{task_id}/?include_archived=true', **headers)
+        missing = self.client.get(f'/api/async/tasks/{task_id + 100}/', **headers)
+
+        self.assertEqual(found.json()['task']['title'], 'Sharded')
+        self.assertEqual(any_tier.json()['task']['title'], 'Sharded')
+        self.assertEqual(missing.status_code, 404)
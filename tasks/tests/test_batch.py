@@ -0,0 +1,106 @@
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.models import Task, TaskComment
+
+from .helpers import client_for, make_task, make_user
+
+
+class BatchTests(TestCase):
+    """POST /api/batch/"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+        self.task = make_task(self.user, self.admin)
+        self.theirs = make_task(self.other, self.admin)
+
+    def batch(self, requests, user=None, **data):
+        response = client_for(user or self.user).post('/api/batch/', {'requests': requests, **data}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_each_sub_request_gets_its_own_status(self):
+        data = self.batch([
+            {'method': 'GET', 'path': f'/api/tasks/{self.task.id}/?fields=id,title'},
+            {'method': 'PATCH', 'path': f'/api/tasks/{self.task.id}/status/', 'body': {'status': 'in_progress'},
+             'headers': {'If-Match': '"1"'}},
+            {'method': 'PATCH', 'path': f'/api/tasks/{self.task.id}/status/', 'body': {'status': 'completed'},
+             'headers': {'If-Match': '"1"'}},
+            {'method': 'GET', 'path': f'/api/tasks/{self.theirs.id}/'},
+            {'method': 'GET', 'path': '/api/tasks/999/'},
+            {'method': 'POST', 'path': f'/api/tasks/{self.task.id}/comments/', 'body': {}},
+        ])
+
+        self.assertTrue(data['success'])
+        self.assertEqual([result['status'] for result in data['results']], [200, 200, 412, 403, 404, 400])
+        first, updated, conflict = data['results'][:3]
+        self.assertEqual(first['headers'], {'ETag': '"1"'})
+        self.assertEqual(first['body']['task'], {'id': self.task.id, 'title': 'Task title'})
+        self.assertEqual(updated['headers'], {'ETag': '"2"'})
+        self.assertEqual(conflict['body']['version'], 2)
+        self.assertEqual(Task.objects.get(id=self.task.id).status, 'in_progress')
+
+    def test_sub_requests_run_as_the_batch_user(self):
+        data = self.batch([
+            {'method': 'GET', 'path': '/api/auth/profile/'},
+            {'method': 'GET', 'path': '/api/tasks/'},
+            {'method': 'GET', 'path': '/api/admin/statistics/'},
+        ])
+
+        profile, tasks, statistics = data['results']
+        self.assertEqual(profile['body']['user']['username'], 'alice')
+        self.assertEqual([task['id'] for task in tasks['body']['tasks']], [self.task.id])
+        self.assertEqual(statistics['status'], 403)
+
+    def test_batch_authenticated_with_a_token(self):
+        response = self.client.post('/api/batch/', {
+            'requests': [{'method': 'GET', 'path': f'/api/tasks/{self.task.id}/'}],
+        }, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        self.assertEqual(response.json()['results'][0]['status'], 200)
+        self.assertEqual(self.client.post('/api/batch/', {}, content_type='application/json').status_code, 401)
+
+    def test_headers_of_the_batch_request_are_not_passed_on(self):
+        response = client_for(self.user).post('/api/batch/', {'requests': [
+            {'method': 'PATCH', 'path': f'/api/tasks/{self.task.id}/status/', 'body': {'status': 'in_progress'}},
+        ]}, format='json', HTTP_IF_MATCH='"7"')
+
+        self.assertEqual(response.data['results'][0]['status'], 200)
+
+    def test_batches_and_async_endpoints_cannot_be_nested(self):
+        data = self.batch([
+            {'method': 'POST', 'path': '/api/batch/', 'body': {'requests': [{'path': '/api/tasks/'}]}},
+            {'method': 'GET', 'path': '/api/async/tasks/'},
+            {'method': 'GET', 'path': '/admin/'},
+        ])
+
+        self.assertEqual([result['status'] for result in data['results']], [404, 400, 404])
+
+    @override_settings(BATCH_MAX_REQUESTS=2)
+    def test_invalid_batches_are_refused(self):
+        client = client_for(self.user)
+        for body in [
+            {'requests': [{'path': '/api/tasks/'}] * 3},
+            {'requests': []},
+            {'requests': 'nope'},
+            {'requests': [{'method': 'TRACE', 'path': '/api/tasks/'}]},
+            {'requests': [{'path': 'api/tasks/'}]},
+            {'requests': [{'path': '/api/tasks/', 'headers': {'If-Match': 1}}]},
+        ]:
+            with self.subTest(body=body):
+                self.assertEqual(client.post('/api/batch/', body, format='json').status_code, 400)
+
+    def test_atomic_batch_rolls_back_at_the_first_failure(self):
+        data = self.batch([
+            {'method': 'POST', 'path': f'/api/tasks/{self.task.id}/comments/', 'body': {'content': 'First'}},
+            {'method': 'PATCH', 'path': f'/api/tasks/{self.task.id}/status/', 'body': {'status': 'in_progress'}},
+            {'method': 'GET', 'path': '/api/tasks/999/'},
+            {'method': 'POST', 'path': f'/api/tasks/{self.task.id}/comments/', 'body': {'content': 'Never'}},
+        ], atomic=True)
+
+        self.assertFalse(data['success'])
+        self.assertEqual([result['status'] for result in data['results']], [201, 200, 404, 424])
+        self.assertFalse(TaskComment.objects.exists())
+        self.assertEqual(Task.objects.get(id=self.task.id).status, 'not_started')
@@ -0,0 +1,88 @@
+from django.test import TestCase, override_settings
+
+from tasks.jobs import run_pending
+from tasks.models import BackgroundJob, BulkUpdateJob, Task, TaskHistory
+
+from .helpers import client_for, make_task, make_user
+
+URL = '/api/admin/tasks/bulk-update/'
+
+
+@override_settings(BULK_UPDATE_CHUNK_SIZE=2)
+class BulkUpdateTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.alice = make_user('alice')
+        self.bob = make_user('bob')
+        self.client = client_for(self.admin)
+        self.open = [make_task(self.alice, self.admin, title=f'Open {i}') for i in range(5)]
+        # Matched, but already as the patch would leave them
+        self.high = make_task(self.alice, self.admin, title='Already high', priority='high')
+        self.others = make_task(self.bob, self.admin, title="Bob's")
+        run_pending()  # Writes the tasks' history
+
+    def versions(self):
+        return dict(Task.objects.values_list('id', 'version'))
+
+    def test_dry_run_counts_without_writing(self):
+        versions = self.versions()
+
+        response = self.client.post(f'{URL}?assigned_to=alice', {'patch': {'priority': 'high'}, 'dry_run': True}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual((response.data['matched'], response.data['to_update'], response.data['skipped']), (6, 5, 1))
+        self.assertEqual(self.versions(), versions)
+        self.assertFalse(BulkUpdateJob.objects.exists())
+        self.assertFalse(BackgroundJob.objects.filter(name='bulk_update_tasks').exists())
+        self.assertFalse(Task.objects.filter(id__in=[task.id for task in self.open], priority='high').exists())
+
+    def test_expected_count_that_no_longer_matches_is_a_conflict(self):
+        response = self.client.post(f'{URL}?assigned_to=alice', {'patch': {'priority': 'high'}, 'expected_count': 4}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['to_update'], 5)
+        self.assertFalse(BulkUpdateJob.objects.exists())
+
+        response = self.client.post(f'{URL}?assigned_to=alice', {'patch': {'priority': 'high'}, 'expected_count': 5}, format='json')
+
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(BulkUpdateJob.objects.get(id=response.data['job_id']).matched, 5)
+
+    def test_each_updated_task_gets_one_version_bump(self):
+        versions = self.versions()
+
+        response = self.client.post(f'{URL}?assigned_to=alice', {'patch': {'priority': 'high'}}, format='json')
+        run_pending()
+
+        job = BulkUpdateJob.objects.get(id=response.data['job_id'])
+        self.assertEqual((job.status, job.updated_rows), ('completed', 5))
+        # In chunks of two: every chunk bumps its own tasks once
+        for task in self.open:
+            self.assertEqual(self.versions()[task.id], versions[task.id] + 1)
+        self.assertEqual(self.versions()[self.high.id], versions[self.high.id])
+        self.assertEqual(self.versions()[self.others.id], versions[self.others.id])
+        self.assertEqual(
+            TaskHistory.objects.filter(action='updated', description='Priority changed from medium to high').count(), 5
+        )
+
+    def test_tasks_that_cannot_move_to_the_new_status_are_skipped(self):
+        Task.objects.filter(id=self.open[0].id).update(status='completed')
+        versions = self.versions()
+
+        response = self.client.post(f'{URL}?assigned_to=alice', {'patch': {'status': 'not_started'}}, format='json')
+        run_pending()
+
+        self.assertEqual((response.data['matched'], response.data['to_update']), (6, 0))
+        self.assertEqual(self.versions(), versions)
+        self.assertEqual(Task.objects.get(id=self.open[0].id).status, 'completed')
+
+    def test_reassignment_is_recorded_in_the_history(self):
+        response = self.client.post(f'{URL}?assigned_to=alice', {'patch': {'assigned_to_username': 'bob'}}, format='json')
+        run_pending()
+
+        self.assertEqual(response.data['to_update'], 6)
+        self.assertEqual(Task.objects.filter(assigned_to=self.bob).count(), 7)
+        self.assertEqual(
+            TaskHistory.objects.filter(action='assigned', description='Task reassigned from alice to bob').count(), 6
+        )
@@ -0,0 +1,132 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.changes import check_change_log_ordering, prune_task_changes, record_task_changes
+from tasks.models import TaskChange
+
+from .helpers import client_for, make_task, make_user
+
+
+class ChangeFeedTests(TestCase):
+    """Incremental sync through /api/tasks/changes/"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+        self.client = client_for(self.user)
+
+    def start(self, client=None):
+        return (client or self.client).get('/api/tasks/changes/').data['sync_token']
+
+    def changes(self, token, client=None, **params):
+        query = '&'.join(f'{name}={value}' for name, value in {'sync_token': token, **params}.items())
+        return (client or self.client).get(f'/api/tasks/changes/?{query}')
+
+    def test_starting_returns_a_token_and_no_changes(self):
+        make_task(self.user, self.admin)
+
+        response = self.client.get('/api/tasks/changes/')
+
+        self.assertEqual(response.data['changes'], [])
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(self.changes(response.data['sync_token']).data['changes'], [])
+
+    def test_new_and_changed_tasks_come_back_once_with_their_state(self):
+        token = self.start()
+        first = make_task(self.user, self.admin, title='First')
+        second = make_task(self.user, self.admin, title='Second')
+        first.status = 'in_progress'
+        first.save()
+        make_task(self.other, self.admin, title='Not mine')
+
+        response = self.changes(token)
+
+        self.assertEqual([change['id'] for change in response.data['changes']], [second.id, first.id])
+        self.assertEqual(response.data['changes'][1]['task']['status'], 'in_progress')
+        self.assertEqual(self.changes(response.data['sync_token']).data['changes'], [])
+
+    def test_reassigned_task_is_a_tombstone_for_the_previous_assignee(self):
+        task = make_task(self.user, self.admin)
+        token, other_token = self.start(), self.start(client_for(self.other))
+        task.assigned_to = self.other
+        task.save()
+
+        mine = self.changes(token).data['changes']
+        theirs = self.changes(other_token, client=client_for(self.other)).data['changes']
+
+        self.assertEqual(mine, [{'id': task.id, 'deleted': True}])
+        self.assertEqual([change['id'] for change in theirs], [task.id])
+        self.assertFalse(theirs[0]['deleted'])
+
+    def test_deleted_task_is_a_tombstone(self):
+        task = make_task(self.user, self.admin)
+        token = self.start()
+
+        client_for(self.admin).delete(f'/api/tasks/{task.id}/delete/')
+
+        self.assertEqual(self.changes(token).data['changes'], [{'id': task.id, 'deleted': True}])
+
+    def test_pages_through_changes_with_has_more(self):
+        token = self.start()
+        tasks = [make_task(self.user, self.admin, title=f'Task {i}') for i in range(5)]
+
+        seen = []
+        while True:
+            response = self.changes(token, limit=2)
+            seen += [change['id'] for change in response.data['changes']]
+            token = response.data['sync_token']
+            if not response.data['has_more']:
+                break
+
+        self.assertEqual(seen, [task.id for task in tasks])
+
+    def test_admins_see_everyones_changes(self):
+        admin_client = client_for(self.admin)
+        token = self.start(admin_client)
+        tasks = [make_task(self.user, self.admin), make_task(self.other, self.admin)]
+
+        response = self.changes(token, client=admin_client)
+
+        self.assertEqual([change['id'] for change in response.data['changes']], [task.id for task in tasks])
+
+    def test_token_of_another_user_is_refused(self):
+        token = self.start(client_for(self.other))
+
+        self.assertEqual(self.changes(token).status_code, 400)
+        self.assertEqual(self.changes(token + 'x', client=client_for(self.other)).status_code, 400)
+
+    def test_token_expires_when_the_role_changes(self):
+        token = self.start()
+        self.user.role = 'admin'
+        self.user.save()
+
+        self.assertEqual(self.changes(token).status_code, 410)
+
+    def test_prune_deletes_old_entries(self):
+        old, new = make_task(self.user, self.admin), make_task(self.user, self.admin)
+        TaskChange.objects.filter(task_id=old.id).update(changed_at=timezone.now() - timedelta(days=60))
+
+        self.assertEqual(prune_task_changes(days=30), 1)
+        self.assertEqual(list(TaskChange.objects.values_list('task_id', flat=True)), [new.id])
+
+
+class ChangeLogOrderingTests(TestCase):
+    """Engines on which entries may commit out of sequence order are refused"""
+
+    def test_sqlite_passes_the_check(self):
+        self.assertEqual(check_change_log_ordering(None), [])
+
+    def test_other_engines_fail_the_check_and_cannot_record(self):
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            errors = check_change_log_ordering(None)
+            with self.assertRaises(ImproperlyConfigured):
+                record_task_changes('updated', [(1, 1)])
+
+        self.assertEqual([error.id for error in errors], ['tasks.E001'])
+        self.assertFalse(TaskChange.objects.exists())
@@ -0,0 +1,183 @@
+from datetime import timedelta
+
+from django.contrib.admin.models import LogEntry
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.deletion import run_deletion_job, schedule_task_deletion, schedule_user_deletion
+from tasks.jobs import run_pending
+from tasks.models import (
+    BackgroundJob, BulkUpdateJob, DeletionJob, RecurrenceRule, Task, TaskComment, TaskHistory,
+    TaskVersionConflict, User, WebhookSubscription,
+)
+from tasks.sharding import shard_for_task
+
+from .helpers import ShardedTestCase, client_for, make_task, make_user
+
+
+@override_settings(DELETION_CHUNK_SIZE=2)
+class TaskDeletionTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.task = make_task(self.user, self.admin)
+        for i in range(3):
+            self.task.comments.create(author=self.user, content=f'Comment {i}')
+        run_pending()  # Writes the task's history
+
+    def test_deleted_task_is_hidden_at_once_and_purged_in_the_background(self):
+        response = client_for(self.admin).delete(f'/api/tasks/{self.task.id}/delete/')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Task.objects.filter(id=self.task.id).exists())
+        self.assertEqual(client_for(self.user).get(f'/api/tasks/{self.task.id}/').status_code, 404)
+        self.assertTrue(TaskComment.objects.filter(task_id=self.task.id).exists())
+
+        run_pending()
+
+        job = DeletionJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.progress['comments'], 3)
+        self.assertFalse(Task.all_objects.filter(id=self.task.id).exists())
+        self.assertFalse(TaskComment.objects.filter(task_id=self.task.id).exists())
+        self.assertFalse(TaskHistory.objects.filter(task_id=self.task.id).exists())
+
+    def test_version_conflict_leaves_no_job(self):
+        with self.assertRaises(TaskVersionConflict):
+            schedule_task_deletion(self.task, self.admin, version=self.task.version + 1)
+
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())
+        self.assertFalse(DeletionJob.objects.exists())
+        self.assertFalse(BackgroundJob.objects.filter(name='purge_deleted').exists())
+
+    def test_job_for_a_task_that_was_never_hidden_fails_without_purging(self):
+        job = DeletionJob.objects.create(target_type='task', target_id=self.task.id, requested_by=self.admin)
+
+        job = run_deletion_job(job.id)
+
+        self.assertEqual((job.status, job.error), ('failed', 'Task was not deleted'))
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())
+        self.assertEqual(TaskComment.objects.filter(task_id=self.task.id).count(), 3)
+
+    def test_missing_job_row_is_recreated_by_the_purge(self):
+        schedule_task_deletion(self.task, self.admin)
+        # As if the primary's transaction had rolled back after the task's committed
+        DeletionJob.objects.all().delete()
+
+        run_pending()
+
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.target_type, job.target_id, job.status), ('task', self.task.id, 'completed'))
+        self.assertFalse(Task.all_objects.filter(id=self.task.id).exists())
+
+
+@override_settings(DELETION_CHUNK_SIZE=2)
+class UserDeletionTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice', role='admin')
+        self.owned = [make_task(self.user, self.admin), make_task(self.admin, self.user)]
+        self.kept = make_task(self.admin, self.admin)
+        starts_at = timezone.now() + timedelta(days=1)
+        for _ in range(3):
+            RecurrenceRule.objects.create(
+                title='Standup', assigned_to=self.user, created_by=self.admin,
+                frequency='daily', starts_at=starts_at,
+            )
+        RecurrenceRule.objects.create(
+            title='Review', assigned_to=self.admin, created_by=self.user, frequency='weekly', starts_at=starts_at,
+        )
+        self.other_rule = RecurrenceRule.objects.create(
+            title='Report', assigned_to=self.admin, created_by=self.admin, frequency='monthly', starts_at=starts_at,
+        )
+        LogEntry.objects.create(user=self.user, action_flag=1, object_repr='Something')
+        self.bulk_job = BulkUpdateJob.objects.create(requested_by=self.user)
+        self.webhook = WebhookSubscription.objects.create(url='https://example.com/hook', created_by=self.user)
+        self.earlier_deletion = DeletionJob.objects.create(target_type='task', target_id=999, requested_by=self.user)
+        run_pending()
+
+    def test_deleted_user_is_hidden_at_once(self):
+        response = client_for(self.admin).delete(f'/api/admin/users/{self.user.id}/delete/')
+
+        self.assertEqual(response.status_code, 202)
+        user = User.objects.get(id=self.user.id)
+        self.assertIsNotNone(user.deleted_at)
+        self.assertFalse(user.is_active)
+        self.assertFalse(Task.objects.filter(id__in=[task.id for task in self.owned]).exists())
+        self.assertEqual(Task.all_objects.filter(id__in=[task.id for task in self.owned]).count(), 2)
+
+    def test_purge_removes_what_refers_to_the_user_in_chunks(self):
+        job = schedule_user_deletion(self.user, self.admin)
+
+        run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed', job.error)
+        self.assertEqual(job.progress['recurrence_rules'], 4)
+        self.assertEqual(job.progress['admin_log'], 1)
+        # Nothing was left for deleting the user to cascade to
+        self.assertEqual(job.progress['users'], 1)
+        self.assertFalse(User.objects.filter(id=self.user.id).exists())
+        self.assertFalse(Task.all_objects.filter(id__in=[task.id for task in self.owned]).exists())
+        self.assertEqual(list(RecurrenceRule.objects.all()), [self.other_rule])
+        self.assertFalse(LogEntry.objects.exists())
+        self.assertTrue(Task.objects.filter(id=self.kept.id).exists())
+        # SET_NULL references are cleared, not deleted
+        for obj in (self.bulk_job, self.webhook, self.earlier_deletion):
+            obj.refresh_from_db()
+        self.assertIsNone(self.bulk_job.requested_by_id)
+        self.assertIsNone(self.webhook.created_by_id)
+        self.assertIsNone(self.earlier_deletion.requested_by_id)
+        self.assertEqual(job.deleted_rows, sum(
+            count for label, count in job.progress.items()
+            if label not in ('deletion_jobs', 'bulk_update_jobs', 'webhook_subscriptions')
+        ))
+
+
+class ShardedDeletionTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+
+    def create_task(self, title):
+        response = client_for(self.admin).post('/api/tasks/create/', {
+            'title': title,
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': self.user.username,
+        }, format='json')
+        return response.data['task']['id']
+
+    def test_task_is_hidden_and_purged_on_its_shard(self):
+        task_id = self.create_task('Sharded')
+        client = client_for(self.admin)
+
+        response = client.delete(f'/api/tasks/{task_id}/delete/')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(client.get(f'/api/tasks/{task_id}/').status_code, 404)
+        # The purge is queued on the task's shard, with the change that hid it
+        self.assertTrue(BackgroundJob.objects.using(shard_for_task(task_id)).filter(name='purge_deleted').exists())
+
+        run_pending()
+
+        self.assertEqual(DeletionJob.objects.get(id=response.data['job_id']).status, 'completed')
+        for shard in self.shards:
+            self.assertFalse(Task.all_objects.using(shard).filter(id=task_id).exists())
+
+    def test_user_is_purged_from_every_shard(self):
+        task_ids = [self.create_task(f'Task {i}') for i in range(4)]
+
+        job = schedule_user_deletion(self.user, self.admin)
+        for shard in self.shards:
+            self.assertFalse(Task.objects.using(shard).filter(id__in=task_ids).exists())
+        run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'completed', job.error)
+        self.assertEqual(job.progress['tasks'], 4)
+        for using in ['default', *self.shards]:
+            self.assertFalse(User.objects.using(using).filter(id=self.user.id).exists())
@@ -0,0 +1,130 @@
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tasks.events import ChangeHub
+from tasks.user_directory import user_directory
+
+from .helpers import client_for, make_task, make_user
+
+
+@override_settings(TASK_EVENTS_POLL_SECONDS=0.05, TASK_EVENTS_MAX_SECONDS=0.5)
+class TaskEventsTests(TransactionTestCase):
+    """
+    The event stream, read through the ASGI test client until it closes
+    after TASK_EVENTS_MAX_SECONDS. Transactions commit, as the stream reads
+    the change log from worker threads.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Flushing between tests deletes users without the signals that update the directory
+        user_directory.clear()
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+        self.task = make_task(self.user, self.admin, title='Mine')
+
+    def sync_token(self):
+        return client_for(self.user).get('/api/tasks/changes/').data['sync_token']
+
+    async def read_events(self, user, last_event_id):
+        """The (id, event, data) of each event in the stream"""
+        response = await self.async_client.get('/api/async/events/', headers={
+            'Authorization': f'Bearer {AccessToken.for_user(user)}',
+            'Last-Event-ID': last_event_id,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        events = []
+        for message in body.split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in message.splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+        return events
+
+    def change_tasks(self):
+        client = client_for(self.user)
+        client.patch(f'/api/tasks/{self.task.id}/status/', {'status': 'in_progress'}, format='json')
+        client.post(f'/api/tasks/{self.task.id}/comments/', {'content': 'On it'}, format='json')
+        make_task(self.other, self.admin, title='Not mine')
+
+    async def test_stream_resumes_from_last_event_id(self):
+        token = await sync_to_async(self.sync_token)()
+        await sync_to_async(self.change_tasks)()
+
+        events = await self.read_events(self.user, token)
+
+        self.assertEqual([(event, data['id']) for _, event, data in events], [
+            ('task.status_changed', self.task.id),
+            ('task.commented', self.task.id),
+        ])
+        self.assertEqual(events[1][2]['task']['status'], 'in_progress')
+        self.assertFalse(events[1][2]['deleted'])
+
+        # From the first event's id on, only the second one is left
+        resumed = await self.read_events(self.user, events[0][0])
+        self.assertEqual([event for _, event, _ in resumed], ['task.commented'])
+
+    @override_settings(TASK_EVENTS_POLL_SECONDS=0.2, TASK_EVENTS_MAX_SECONDS=1)
+    async def test_changes_made_while_connected_are_pushed(self):
+        token = await sync_to_async(self.sync_token)()
+        poll = ChangeHub.poll
+        polls = []
+
+        async def change_then_poll(hub):
+            # Changed from the hub's first poll: the in-memory test database
+            # refuses reads while another connection writes
+            if not polls:
+                await sync_to_async(self.change_tasks)()
+            polls.append(hub)
+            await poll(hub)
+
+        with mock.patch.object(ChangeHub, 'poll', change_then_poll):
+            events = await self.read_events(self.user, token)
+
+        self.assertEqual([event for _, event, _ in events], ['task.status_changed', 'task.commented'])
+        self.assertEqual(events[1][2]['task']['status'], 'in_progress')
+
+    @override_settings(TASK_EVENTS_MAX_SECONDS=3)
+    async def test_streams_catch_up_at_once_when_the_hub_fails(self):
+        token = await sync_to_async(self.sync_token)()
+        poll = ChangeHub.poll
+        failed = []
+
+        async def fail_once(hub):
+            if not failed:
+                failed.append(True)
+                await sync_to_async(self.change_tasks)()
+                raise RuntimeError('Failed on purpose')
+            await poll(hub)
+
+        with mock.patch.object(ChangeHub, 'poll', fail_once):
+            events = await self.read_events(self.user, token)
+
+        self.assertEqual(failed, [True])
+        # Not left waiting for the next heartbeat, after the stream has closed
+        self.assertEqual([event for _, event, _ in events], ['task.status_changed', 'task.commented'])
+
+    async def test_other_users_tasks_are_left_out(self):
+        token = await sync_to_async(self.sync_token)()
+        await sync_to_async(make_task)(self.other, self.admin, title='Theirs')
+
+        self.assertEqual(await self.read_events(self.user, token), [])
+
+    async def test_invalid_tokens_are_refused(self):
+        response = await self.async_client.get('/api/async/events/', headers={
+            'Authorization': f'Bearer {AccessToken.for_user(self.user)}',
+            'Last-Event-ID': 'nope',
+        })
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_streams_need_asgi(self):
+        response = self.client.get('/api/async/events/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+        self.assertEqual(response.status_code, 501)
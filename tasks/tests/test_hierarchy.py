@@ -0,0 +1,235 @@
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.hierarchy import (
+    HierarchyError, add_blocker, blocked_task_ids, open_blocker_ids, parent_id_of, remove_blocker, set_parent,
+    subtask_progress, unlink_tasks,
+)
+from tasks.models import BlockerPath, SubtaskPath, Task
+from tasks.sharding import shard_for_user
+
+from .helpers import ShardedTestCase, client_for, make_task, make_user
+
+
+class HierarchyTestCase(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+
+    def make_tasks(self, count):
+        return [make_task(self.user, self.admin, title=f'Task {i}').id for i in range(count)]
+
+
+class SubtaskTests(HierarchyTestCase):
+    """The subtask closure table"""
+
+    def closure(self, parents):
+        """(ancestor, descendant) -> depth for a child -> parent map"""
+        expected = {}
+        for task_id in parents:
+            ancestor_id, depth = parents[task_id], 1
+            while ancestor_id is not None:
+                expected[ancestor_id, task_id] = depth
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        return expected
+
+    def stored_closure(self):
+        return {
+            (ancestor_id, descendant_id): depth
+            for ancestor_id, descendant_id, depth in SubtaskPath.objects.values_list('ancestor_id', 'descendant_id', 'depth')
+        }
+
+    def test_closure_matches_the_tree_after_random_moves(self):
+        task_ids = self.make_tasks(12)
+        parents = dict.fromkeys(task_ids)
+        rng = random.Random(50)
+        for _ in range(80):
+            task_id = rng.choice(task_ids)
+            parent_id = rng.choice(task_ids + [None])
+            try:
+                set_parent(task_id, parent_id)
+            except HierarchyError:
+                # Refused exactly when it would close a cycle
+                ancestor_id = parent_id
+                while ancestor_id is not None and ancestor_id != task_id:
+                    ancestor_id = parents[ancestor_id]
+                self.assertEqual(ancestor_id, task_id)
+                continue
+            parents[task_id] = parent_id
+            self.assertEqual(self.stored_closure(), self.closure(parents))
+        for task_id in task_ids:
+            self.assertEqual(parent_id_of(task_id), parents[task_id])
+
+    def test_cycles_are_refused(self):
+        epic, story, subtask = self.make_tasks(3)
+        set_parent(story, epic)
+        set_parent(subtask, story)
+
+        with self.assertRaises(HierarchyError):
+            set_parent(epic, subtask)
+        with self.assertRaises(HierarchyError):
+            set_parent(epic, epic)
+
+    def test_progress_counts_every_level(self):
+        epic, story, first, second = self.make_tasks(4)
+        set_parent(story, epic)
+        set_parent(first, story)
+        set_parent(second, story)
+        Task.objects.filter(id__in=[first, second]).update(status='completed')
+
+        self.assertEqual(subtask_progress(epic), {'total': 3, 'completed': 2, 'percent': 66.7})
+        self.assertEqual(subtask_progress(first), {'total': 0, 'completed': 0, 'percent': None})
+
+    def test_unlinked_tasks_leave_their_subtasks_top_level(self):
+        epic, story, subtask = self.make_tasks(3)
+        set_parent(story, epic)
+        set_parent(subtask, story)
+
+        unlink_tasks([story])
+
+        self.assertIsNone(parent_id_of(subtask))
+        self.assertFalse(SubtaskPath.objects.filter(ancestor_id=epic).exists())
+        self.assertFalse(SubtaskPath.objects.filter(descendant_id=story).exists())
+
+    def test_subtasks_endpoint(self):
+        epic, story, subtask = self.make_tasks(3)
+        client = client_for(self.admin)
+        client.patch(f'/api/tasks/{story}/parent/', {'parent_id': epic}, format='json')
+        client.patch(f'/api/tasks/{subtask}/parent/', {'parent_id': story}, format='json')
+
+        response = client.get(f'/api/tasks/{epic}/subtasks/')
+        children = client.get(f'/api/tasks/{epic}/subtasks/?depth=1')
+        cycle = client.patch(f'/api/tasks/{epic}/parent/', {'parent_id': subtask}, format='json')
+
+        self.assertEqual([row['id'] for row in response.data['subtasks']], [story, subtask])
+        self.assertEqual([row['id'] for row in children.data['subtasks']], [story])
+        self.assertEqual(response.data['progress']['total'], 2)
+        self.assertEqual(cycle.status_code, 400)
+
+
+class BlockerTests(HierarchyTestCase):
+    """The blocker closure table, with chain counts"""
+
+    def chains(self, links):
+        """(blocker, blocked) -> number of chains of links between them"""
+        blockers_of = {}
+        for blocked_id, blocker_id in links:
+            blockers_of.setdefault(blocked_id, []).append(blocker_id)
+        expected = Counter()
+
+        def walk(blocked_id, via_id):
+            for blocker_id in blockers_of.get(via_id, []):
+                expected[blocker_id, blocked_id] += 1
+                walk(blocked_id, blocker_id)
+        for blocked_id in blockers_of:
+            walk(blocked_id, blocked_id)
+        return dict(expected)
+
+    def stored_chains(self):
+        return {
+            (blocker_id, blocked_id): paths
+            for blocker_id, blocked_id, paths in BlockerPath.objects.values_list('blocker_id', 'blocked_id', 'paths')
+        }
+
+    def test_closure_matches_the_links_after_random_changes(self):
+        task_ids = self.make_tasks(8)
+        links = set()
+        rng = random.Random(50)
+        for _ in range(120):
+            task_id, blocker_id = rng.sample(task_ids, 2)
+            if (task_id, blocker_id) in links and rng.random() < 0.5:
+                self.assertTrue(remove_blocker(task_id, blocker_id))
+                links.discard((task_id, blocker_id))
+            else:
+                try:
+                    add_blocker(task_id, blocker_id)
+                except HierarchyError:
+                    # Refused exactly when the blocker is already blocked by the task
+                    self.assertIn((task_id, blocker_id), self.chains(links))
+                    continue
+                links.add((task_id, blocker_id))
+            self.assertEqual(self.stored_chains(), self.chains(links))
+        direct = set(BlockerPath.objects.filter(is_direct=True).values_list('blocked_id', 'blocker_id'))
+        self.assertEqual(direct, links)
+
+    def test_open_blockers_through_a_chain(self):
+        first, second, third = self.make_tasks(3)
+        add_blocker(second, first)
+        add_blocker(third, second)
+
+        self.assertEqual(open_blocker_ids(third), {first, second})
+        Task.objects.filter(id=first).update(status='completed')
+        self.assertEqual(open_blocker_ids(third), {second})
+        self.assertEqual(blocked_task_ids([first, second, third]), {third})
+
+    def test_adding_a_link_twice_and_removing_a_missing_one(self):
+        first, second = self.make_tasks(2)
+
+        self.assertTrue(add_blocker(second, first))
+        self.assertFalse(add_blocker(second, first))
+        self.assertTrue(remove_blocker(second, first))
+        self.assertFalse(remove_blocker(second, first))
+        self.assertFalse(BlockerPath.objects.exists())
+
+    def test_blocked_task_cannot_be_completed(self):
+        blocker, blocked = self.make_tasks(2)
+        client = client_for(self.admin)
+        self.assertEqual(
+            client.post(f'/api/tasks/{blocked}/blockers/add/', {'blocked_by': blocker}, format='json').status_code, 201
+        )
+
+        refused = client.patch(f'/api/tasks/{blocked}/status/', {'status': 'completed'}, format='json', HTTP_IF_MATCH='*')
+        client.patch(f'/api/tasks/{blocker}/status/', {'status': 'completed'}, format='json', HTTP_IF_MATCH='*')
+        allowed = client.patch(f'/api/tasks/{blocked}/status/', {'status': 'completed'}, format='json', HTTP_IF_MATCH='*')
+
+        self.assertEqual(refused.status_code, 400)
+        self.assertEqual(allowed.status_code, 200, allowed.data)
+
+    def test_unlinked_tasks_drop_their_chains(self):
+        first, second, third = self.make_tasks(3)
+        add_blocker(second, first)
+        add_blocker(third, second)
+
+        unlink_tasks([second])
+
+        self.assertFalse(BlockerPath.objects.exists())
+
+
+class ShardedHierarchyTests(ShardedTestCase):
+    """Trees and blockers whose tasks are on different shards"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('boss', role='admin')
+        self.users = [make_user('alice'), make_user('bob')]
+        self.client = client_for(self.admin)
+        self.assertNotEqual(shard_for_user(self.users[0]), shard_for_user(self.users[1]))
+
+    def create_task(self, user):
+        response = self.client.post('/api/tasks/create/', {
+            'title': f'Task of {user.username}',
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': user.username,
+        }, format='json')
+        return response.data['task']['id']
+
+    def test_progress_and_blockers_across_shards(self):
+        epic = self.create_task(self.users[0])
+        subtasks = [self.create_task(user) for user in self.users]
+        for subtask in subtasks:
+            set_parent(subtask, epic)
+        add_blocker(epic, subtasks[1])
+        Task.objects.using(shard_for_user(self.users[0])).filter(id=subtasks[0]).update(status='completed')
+
+        response = self.client.get(f'/api/tasks/{epic}/subtasks/')
+        refused = self.client.patch(f'/api/tasks/{epic}/status/', {'status': 'completed'}, format='json', HTTP_IF_MATCH='*')
+
+        self.assertEqual([row['id'] for row in response.data['subtasks']], subtasks)
+        self.assertEqual(response.data['progress'], {'total': 2, 'completed': 1, 'percent': 50.0})
+        self.assertEqual(open_blocker_ids(epic), {subtasks[1]})
+        self.assertEqual(refused.status_code, 400)
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from tasks.history_archive import (
+    archive_chunk, archive_history, archive_lock, get_archived_history, get_task_history, load_index,
+    segment_key, task_ids_path,
+)
+from tasks.jobs import run_pending
+from tasks.models import TaskHistory
+
+from .helpers import client_for, make_task, make_user
+
+
+class ArchiveDirMixin:
+    """Archives into a scratch directory"""
+
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.mkdtemp(prefix='history-archive-')
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        overridden = override_settings(HISTORY_ARCHIVE_DIR=self.archive_dir)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.old = timezone.now() - timedelta(days=400)
+
+    def make_old_task(self, title='Task title'):
+        task = make_task(self.user, self.admin, title=title)
+        run_pending()  # Writes the task's history
+        TaskHistory.objects.filter(task=task).update(timestamp=self.old)
+        return task
+
+    def sidecar(self):
+        with open(os.path.join(self.archive_dir, task_ids_path(segment_key(self.old)))) as fh:
+            return [int(line) for line in fh]
+
+
+class HistoryArchiveTests(ArchiveDirMixin, TestCase):
+
+    def test_archived_rows_are_found_through_the_sidecar(self):
+        first, second = self.make_old_task('First'), self.make_old_task('Second')
+        other = make_task(self.user, self.admin)
+
+        self.assertEqual(archive_history(older_than_days=30, chunk_size=1), 2)
+
+        self.assertEqual(sorted(self.sidecar()), [first.id, second.id])
+        meta = load_index()['segments'][segment_key(self.old)]
+        self.assertEqual(meta['rows'], 2)
+        self.assertNotIn('task_ids', meta)
+        self.assertEqual([entry['action'] for entry in get_archived_history(first.id)], ['created'])
+        self.assertEqual(get_archived_history(other.id), [])
+        self.assertEqual(len(get_task_history(second)), 1)
+        self.assertFalse(TaskHistory.objects.filter(task__in=[first, second]).exists())
+
+    def test_task_ids_in_an_older_index_are_read_and_moved_to_the_sidecar(self):
+        first = self.make_old_task('First')
+        archive_history(older_than_days=30)
+        # As older versions wrote it: the ids in the index, no sidecar
+        key = segment_key(self.old)
+        os.remove(os.path.join(self.archive_dir, task_ids_path(key)))
+        index_path = os.path.join(self.archive_dir, 'index.json')
+        with open(index_path) as fh:
+            index = json.load(fh)
+        index['segments'][key]['task_ids'] = [first.id]
+        with open(index_path, 'w') as fh:
+            json.dump(index, fh)
+
+        self.assertEqual(len(get_archived_history(first.id)), 1)
+
+        second = self.make_old_task('Second')
+        archive_history(older_than_days=30)
+
+        self.assertEqual(sorted(self.sidecar()), [first.id, second.id])
+        self.assertNotIn('task_ids', load_index()['segments'][key])
+        self.assertEqual(len(get_archived_history(first.id)), 1)
+
+    def test_history_endpoint_ignores_invalid_page_parameters(self):
+        task = self.make_old_task()
+        client = client_for(self.admin)
+
+        for query in ('page=x', 'page_size=x', 'page=0&page_size=-5'):
+            with self.subTest(query=query):
+                response = client.get(f'/api/tasks/{task.id}/history/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['history']), 1)
+
+
+class ArchiveLockTests(ArchiveDirMixin, TransactionTestCase):
+
+    def test_archivers_wait_for_the_lock(self):
+        task = self.make_old_task()
+        done = threading.Event()
+
+        def archive():
+            try:
+                archive_chunk(timezone.now(), 100)
+                done.set()
+            finally:
+                connections.close_all()
+
+        with archive_lock():
+            thread = threading.Thread(target=archive)
+            thread.start()
+            self.assertFalse(done.wait(0.3))
+            self.assertEqual(load_index()['segments'], {})
+        thread.join(10)
+
+        self.assertTrue(done.is_set())
+        self.assertEqual(self.sidecar(), [task.id])
@@ -0,0 +1,154 @@
+import threading
+from datetime import timedelta
+
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from tasks.idempotency import idempotent, prune_idempotency_keys
+from tasks.models import IdempotencyKey, Task
+
+from .helpers import client_for, make_user
+
+
+class IdempotencyKeyTests(TestCase):
+    """Idempotency-Key on task creation"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.assignee = make_user('alice')
+        self.client = client_for(self.admin)
+        # The same body every time, as a retry sends
+        self.due_date = (timezone.now() + timedelta(days=3)).isoformat()
+
+    def create_task(self, key, title='Write the report', client=None, **data):
+        return (client or self.client).post('/api/tasks/create/', {
+            'title': title,
+            'due_date': self.due_date,
+            'assigned_to_username': self.assignee.username,
+            **data,
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_first_response(self):
+        first = self.create_task('create-1')
+        retry = self.create_task('create-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertFalse(first.has_header('Idempotent-Replayed'))
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_reusing_a_key_for_another_request_is_refused(self):
+        self.create_task('create-1')
+
+        response = self.create_task('create-1', title='Something else')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        other_admin = make_user('other', role='admin')
+        self.create_task('create-1')
+
+        response = self.create_task('create-1', client=client_for(other_admin))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_failed_request_releases_its_key(self):
+        failed = self.create_task('create-1', title='')
+        fixed = self.create_task('create-1')
+
+        self.assertEqual(failed.status_code, 400)
+        self.assertEqual(fixed.status_code, 201)
+        self.assertFalse(fixed.has_header('Idempotent-Replayed'))
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_request_still_in_progress_gets_409(self):
+        first = self.create_task('create-1')
+        IdempotencyKey.objects.filter(key='create-1').update(status_code=None, response=None)
+
+        response = self.create_task('create-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_abandoned_key_is_taken_over(self):
+        self.create_task('create-1')
+        IdempotencyKey.objects.filter(key='create-1').update(
+            status_code=None, response=None, locked_at=timezone.now() - timedelta(hours=1)
+        )
+
+        response = self.create_task('create-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_overlong_key_is_rejected(self):
+        self.assertEqual(self.create_task('k' * 256).status_code, 400)
+
+    def test_requests_without_a_key_are_not_recorded(self):
+        self.client.post('/api/tasks/create/', {
+            'title': 'No key',
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': self.assignee.username,
+        }, format='json')
+
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def test_prune_deletes_expired_keys(self):
+        self.create_task('old')
+        self.create_task('new', title='Another')
+        IdempotencyKey.objects.filter(key='old').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(prune_idempotency_keys(), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class ConcurrentRetryTests(TransactionTestCase):
+    """A retry that arrives while the first request is still running"""
+
+    def test_retry_waits_for_the_running_request_and_replays_it(self):
+        user = make_user('alice')
+        started, proceed = threading.Event(), threading.Event()
+        calls = []
+
+        @api_view(['POST'])
+        @idempotent
+        def view(request):
+            calls.append(request.data)
+            started.set()
+            proceed.wait(5)
+            return Response({'success': True, 'call': len(calls)}, status=201)
+
+        def post():
+            request = APIRequestFactory().post('/write/', {'a': 1}, format='json', HTTP_IDEMPOTENCY_KEY='slow')
+            force_authenticate(request, user)
+            try:
+                return view(request)
+            finally:
+                connections.close_all()
+
+        responses = {}
+        first = threading.Thread(target=lambda: responses.setdefault('first', post()))
+        first.start()
+        self.assertTrue(started.wait(5))
+        retry = threading.Thread(target=lambda: responses.setdefault('retry', post()))
+        retry.start()
+        proceed.set()
+        first.join(10)
+        retry.join(10)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(responses['first'].data, {'success': True, 'call': 1})
+        self.assertEqual(responses['retry'].status_code, 201)
+        self.assertEqual(responses['retry'].data, responses['first'].data)
+        self.assertEqual(responses['retry']['Idempotent-Replayed'], 'true')
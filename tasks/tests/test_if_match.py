@@ -0,0 +1,60 @@
+from django.test import TestCase, override_settings
+
+from tasks.models import Task
+
+from .helpers import client_for, make_task, make_user
+
+
+class IfMatchTests(TestCase):
+    """Optimistic concurrency on task writes"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.task = make_task(self.user, self.admin)
+        self.client = client_for(self.user)
+
+    def set_status(self, new_status, **headers):
+        return self.client.patch(f'/api/tasks/{self.task.id}/status/', {'status': new_status}, format='json', **headers)
+
+    def test_reads_and_writes_return_the_version_as_etag(self):
+        response = self.client.get(f'/api/tasks/{self.task.id}/')
+        self.assertEqual(response['ETag'], '"1"')
+
+        response = self.set_status('in_progress', HTTP_IF_MATCH=response['ETag'])
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(response.data['task']['version'], 2)
+
+    def test_out_of_date_version_is_refused(self):
+        Task.objects.filter(id=self.task.id).update(version=3)
+
+        for headers in ({'HTTP_IF_MATCH': '"1"'}, {'HTTP_IF_MATCH': 'W/"3"'}):
+            with self.subTest(**headers):
+                response = self.set_status('in_progress', **headers)
+                self.assertEqual(response.status_code, 412)
+                self.assertEqual(response['ETag'], '"3"')
+                self.assertEqual(response.data['version'], 3)
+        self.assertEqual(Task.objects.get(id=self.task.id).status, 'not_started')
+
+        update = client_for(self.admin).patch(
+            f'/api/tasks/{self.task.id}/update/', {'title': 'Renamed'}, format='json', HTTP_IF_MATCH='"1"'
+        )
+        delete = client_for(self.admin).delete(f'/api/tasks/{self.task.id}/delete/', HTTP_IF_MATCH='"1"')
+        self.assertEqual((update.status_code, delete.status_code), (412, 412))
+        self.assertTrue(Task.objects.filter(id=self.task.id, title='Task title').exists())
+
+    def test_if_match_is_optional_by_default(self):
+        self.assertEqual(self.set_status('in_progress').status_code, 200)
+        self.assertEqual(self.set_status('completed', HTTP_IF_MATCH='*').status_code, 200)
+
+    @override_settings(TASK_REQUIRE_IF_MATCH=True)
+    def test_if_match_can_be_required(self):
+        response = self.set_status('in_progress')
+
+        self.assertEqual(response.status_code, 428)
+        self.assertEqual(Task.objects.get(id=self.task.id).status, 'not_started')
+        delete = client_for(self.admin).delete(f'/api/tasks/{self.task.id}/delete/')
+        # Deleting doesn't overwrite anyone's changes
+        self.assertEqual(delete.status_code, 202)
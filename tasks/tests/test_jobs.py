@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from tasks import jobs
+from tasks.jobs import enqueue, job_handler, run_pending
+from tasks.models import BackgroundJob, TaskHistory
+from tasks.user_directory import user_directory
+
+from .helpers import client_for, make_user
+
+calls = []
+
+
+@job_handler('tests.flaky')
+def flaky(payloads):
+    calls.append(payloads)
+    if payloads[0].get('fail'):
+        raise RuntimeError('Failed on purpose')
+
+
+@override_settings(JOB_WORKERS=1)
+class JobWorkerTests(TransactionTestCase):
+    """The web process's job threads, as deployments run them"""
+
+    def setUp(self):
+        super().setUp()
+        # Flushing between tests deletes users without the signals that update the directory
+        user_directory.clear()
+        self.addCleanup(self.stop_workers)
+
+    def stop_workers(self):
+        if jobs._executor is not None:
+            jobs._executor.shutdown()
+            jobs._executor = None
+
+    def wait_for_workers(self):
+        # One thread: this runs once the drains queued before it are done
+        jobs._executor.submit(lambda: None).result(10)
+
+    def test_side_effects_of_a_request_are_run_in_the_background(self):
+        admin, user = make_user('boss', role='admin'), make_user('alice')
+
+        response = client_for(admin).post('/api/tasks/create/', {
+            'title': 'Write the report',
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': user.username,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.wait_for_workers()
+
+        task_id = response.data['task']['id']
+        self.assertTrue(TaskHistory.objects.filter(task_id=task_id, action='created').exists())
+        self.assertFalse(BackgroundJob.objects.exclude(status='completed').exists())
+
+
+@override_settings(JOB_RETRY_BACKOFF_SECONDS=0)
+class RunPendingTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_failed_jobs_are_retried_then_marked_failed(self):
+        enqueue('tests.flaky', {'fail': True})
+
+        run_pending()
+
+        job = BackgroundJob.objects.get(name='tests.flaky')
+        self.assertEqual((job.status, job.attempts), ('failed', job.max_attempts))
+        self.assertEqual(len(calls), job.max_attempts)
+        self.assertEqual(job.last_error, 'Failed on purpose')
+
+    def test_jobs_wait_for_their_delay(self):
+        enqueue('tests.flaky', {}, delay=60)
+
+        self.assertEqual(run_pending(), 0)
+        BackgroundJob.objects.update(run_after=timezone.now())
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(calls, [[{}]])
@@ -0,0 +1,185 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from tasks.jobs import run_pending
+from tasks.models import ArchivedTask, RecurrenceRule, Task, TaskHistory, User
+from tasks.recurrence import materialize_due_rules
+from tasks.task_archive import archive_completed_tasks
+
+from .helpers import client_for, make_user
+
+
+class DueDateTests(SimpleTestCase):
+    """RecurrenceRule.due_date_of"""
+
+    def rule(self, **kwargs):
+        kwargs.setdefault('starts_at', datetime(2027, 1, 31, 9, tzinfo=dt_timezone.utc))
+        return RecurrenceRule(title='Rule', assigned_to=User(pk=1), created_by=User(pk=1), **kwargs)
+
+    def dates(self, rule, count=4):
+        return [due_date and due_date.date().isoformat() for due_date in map(rule.due_date_of, range(count))]
+
+    def test_daily_and_weekly_intervals(self):
+        self.assertEqual(
+            self.dates(self.rule(frequency='daily', interval=2)),
+            ['2027-01-31', '2027-02-02', '2027-02-04', '2027-02-06']
+        )
+        self.assertEqual(
+            self.dates(self.rule(frequency='weekly')),
+            ['2027-01-31', '2027-02-07', '2027-02-14', '2027-02-21']
+        )
+
+    def test_monthly_stays_on_the_last_day_of_short_months(self):
+        self.assertEqual(
+            self.dates(self.rule(frequency='monthly')),
+            ['2027-01-31', '2027-02-28', '2027-03-31', '2027-04-30']
+        )
+
+    def test_count_and_until_end_the_rule(self):
+        self.assertEqual(self.dates(self.rule(frequency='daily', count=2)), ['2027-01-31', '2027-02-01', None, None])
+        until = datetime(2027, 2, 1, 12, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.dates(self.rule(frequency='daily', until=until)), ['2027-01-31', '2027-02-01', None, None])
+
+
+@override_settings(RECURRENCE_HORIZON_DAYS=14)
+class MaterializationTests(TestCase):
+    """Occurrences made ahead of their due date"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+
+    def make_rule(self, starts_in=timedelta(hours=2), **kwargs):
+        starts_at = timezone.now() + starts_in
+        kwargs.setdefault('frequency', 'daily')
+        return RecurrenceRule.objects.create(
+            title='Standup', assigned_to=self.user, created_by=self.admin,
+            starts_at=starts_at, next_due_date=starts_at, **kwargs
+        )
+
+    def occurrences(self, rule):
+        return list(Task.objects.filter(recurrence_rule_id=rule.id).order_by('occurrence').values_list('occurrence', flat=True))
+
+    def test_creating_a_recurring_task_materializes_its_occurrences(self):
+        response = client_for(self.admin).post('/api/tasks/create/', {
+            'title': 'Standup',
+            'due_date': (timezone.now() + timedelta(hours=2)).isoformat(),
+            'assigned_to_username': self.user.username,
+            'recurrence': {'frequency': 'daily', 'count': 5},
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        run_pending()
+
+        rule = RecurrenceRule.objects.get()
+        self.assertEqual(self.occurrences(rule), [0, 1, 2, 3, 4])
+        self.assertEqual(rule.materialized_count, 5)
+        self.assertFalse(rule.is_active)
+        created = TaskHistory.objects.filter(task__recurrence_rule_id=rule.id, action='created')
+        self.assertEqual(created.values('task_id').distinct().count(), 5)
+
+    def test_only_occurrences_within_the_horizon_are_made(self):
+        rule = self.make_rule(frequency='weekly')
+
+        created, more = materialize_due_rules()
+
+        rule.refresh_from_db()
+        self.assertEqual((created, more), (2, False))
+        self.assertEqual(self.occurrences(rule), [0, 1])
+        self.assertEqual(rule.next_due_date, rule.due_date_of(2))
+        self.assertTrue(rule.is_active)
+
+    def test_rules_beyond_the_horizon_are_left_alone(self):
+        rule = self.make_rule(starts_in=timedelta(days=30))
+
+        self.assertEqual(materialize_due_rules(), (0, False))
+        self.assertEqual(self.occurrences(rule), [])
+
+    def test_running_again_does_not_duplicate_occurrences(self):
+        rule = self.make_rule(count=3)
+        materialize_due_rules()
+        RecurrenceRule.objects.filter(id=rule.id).update(
+            materialized_count=0, next_due_date=rule.starts_at, is_active=True
+        )
+
+        self.assertEqual(materialize_due_rules(), (0, False))
+        self.assertEqual(self.occurrences(rule), [0, 1, 2])
+
+    def test_archived_occurrences_are_not_made_again(self):
+        rule = self.make_rule(count=2)
+        materialize_due_rules()
+        Task.objects.filter(recurrence_rule_id=rule.id).update(
+            status='completed', updated_at=timezone.now() - timedelta(days=365)
+        )
+        archive_completed_tasks(older_than_days=1)
+        RecurrenceRule.objects.filter(id=rule.id).update(
+            materialized_count=0, next_due_date=rule.starts_at, is_active=True
+        )
+
+        self.assertEqual(materialize_due_rules(), (0, False))
+        self.assertEqual(self.occurrences(rule), [])
+        self.assertEqual(
+            sorted(ArchivedTask.objects.filter(recurrence_rule_id=rule.id).values_list('occurrence', flat=True)),
+            [0, 1]
+        )
+
+    def test_past_occurrences_are_skipped(self):
+        rule = self.make_rule(starts_in=-timedelta(days=2, hours=1), count=4)
+
+        materialize_due_rules()
+
+        self.assertEqual(self.occurrences(rule), [3])
+
+    def test_inactive_assignees_get_no_occurrences(self):
+        rule = self.make_rule(count=3)
+        self.user.is_active = False
+        self.user.save()
+
+        materialize_due_rules()
+
+        rule.refresh_from_db()
+        self.assertEqual(self.occurrences(rule), [])
+        self.assertFalse(rule.is_active)
+
+    def test_a_run_takes_a_limited_number_of_rules(self):
+        rules = [self.make_rule(count=1) for _ in range(3)]
+
+        self.assertEqual(materialize_due_rules(limit=2), (2, True))
+        self.assertEqual(materialize_due_rules(limit=2), (1, False))
+        self.assertEqual(sum(len(self.occurrences(rule)) for rule in rules), 3)
+
+    def test_occurrences_get_the_rules_tags(self):
+        rule = self.make_rule(count=1, tags=['ops'])
+
+        materialize_due_rules()
+
+        task = Task.objects.get(recurrence_rule_id=rule.id)
+        self.assertEqual(list(task.tags.values_list('name', flat=True)), ['ops'])
+
+
+class RecurrenceListTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        for title in ('First', 'Second', 'Third'):
+            RecurrenceRule.objects.create(
+                title=title, assigned_to=self.admin, created_by=self.admin,
+                frequency='daily', starts_at=timezone.now() + timedelta(days=1),
+            )
+
+    def test_invalid_page_parameters_fall_back_to_the_defaults(self):
+        client = client_for(self.admin)
+
+        for query, page, page_size, count in [
+            ('page=x', 1, 20, 3),
+            ('page_size=x', 1, 20, 3),
+            ('page=0&page_size=-5', 1, 1, 1),
+            ('page=2&page_size=2', 2, 2, 1),
+        ]:
+            with self.subTest(query=query):
+                response = client.get(f'/api/admin/recurrences/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual((response.data['page'], response.data['page_size']), (page, page_size))
+                self.assertEqual(len(response.data['recurrences']), count)
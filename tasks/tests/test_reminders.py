@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.reminders import ReminderScheduler, reminder_sink
+
+from .helpers import make_task, make_user
+
+sent = []
+
+
+@reminder_sink('tests.record')
+def record(reminders):
+    sent.append([(reminder['id'], reminder['due_date']) for reminder in reminders])
+
+
+@override_settings(REMINDER_SINKS=['tests.record'], REMINDER_LEAD_HOURS=24, REMINDER_LOOKAHEAD_SECONDS=7200)
+class ReminderSchedulerTests(TestCase):
+
+    def setUp(self):
+        sent.clear()
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.now = timezone.now()
+
+    def make_task(self, due_in, **kwargs):
+        """A task due `due_in` after the reminder lead, so its reminder is due `due_in` from now"""
+        return make_task(self.user, self.admin, due_date=self.now + timedelta(hours=24) + due_in, **kwargs)
+
+    def at(self, minutes):
+        return self.now + timedelta(minutes=minutes)
+
+    def test_reminders_go_out_in_due_date_order(self):
+        third = self.make_task(timedelta(minutes=30))
+        first = self.make_task(timedelta(minutes=10))
+        second = self.make_task(timedelta(minutes=20))
+        scheduler = ReminderScheduler()
+
+        self.assertEqual(scheduler.tick(self.at(0)), [])
+        self.assertEqual(len(scheduler), 3)
+        sent_by_minute = [[reminder['id'] for reminder in scheduler.tick(self.at(minute))] for minute in (15, 25, 35)]
+
+        self.assertEqual(sent_by_minute, [[first.id], [second.id], [third.id]])
+        # Several due at once are sent together, soonest first
+        later = [self.make_task(timedelta(minutes=minutes)) for minutes in (50, 45, 40)]
+        reminders = scheduler.tick(self.at(55))
+        self.assertEqual([reminder['id'] for reminder in reminders], [task.id for task in reversed(later)])
+
+    def test_rescheduled_task_is_reminded_for_its_new_due_date(self):
+        postponed = self.make_task(timedelta(minutes=10))
+        brought_forward = self.make_task(timedelta(hours=5))
+        scheduler = ReminderScheduler()
+        scheduler.tick(self.at(0))
+
+        postponed.due_date += timedelta(hours=3)
+        postponed.save()
+        brought_forward.due_date -= timedelta(hours=5) - timedelta(minutes=20)
+        brought_forward.save()
+
+        # The postponed task's old heap entry is skipped, the other's new one is sent
+        self.assertEqual(scheduler.tick(self.at(15)), [])
+        self.assertEqual([reminder['id'] for reminder in scheduler.tick(self.at(25))], [brought_forward.id])
+        self.assertEqual(scheduler.tick(self.at(60 * 3 + 5)), [])
+        reminders = scheduler.tick(self.at(60 * 3 + 15))
+        self.assertEqual([(reminder['id'], reminder['due_date']) for reminder in reminders], [(postponed.id, postponed.due_date)])
+        self.assertEqual(sent, [[(brought_forward.id, brought_forward.due_date)], [(postponed.id, postponed.due_date)]])
+
+    def test_reminder_is_sent_once(self):
+        task = self.make_task(timedelta(minutes=10))
+        scheduler, other = ReminderScheduler(), ReminderScheduler()
+        scheduler.tick(self.at(0))
+        other.tick(self.at(0))
+
+        self.assertEqual(len(scheduler.tick(self.at(15))), 1)
+        # Another scheduler, or one restarted from the checkpoint, finds it sent already
+        self.assertEqual(other.tick(self.at(15)), [])
+        restarted = ReminderScheduler()
+        self.assertEqual(restarted.tick(self.at(16)), [])
+        self.assertEqual(Task.objects.get(id=task.id).reminder_sent_for, task.due_date)
+        self.assertEqual(len(sent), 1)
+
+        # Nor is it when a copy loaded before the reminder went out is saved
+        task.title = 'Renamed'
+        task.save()
+        self.assertEqual(Task.objects.get(id=task.id).reminder_sent_for, task.due_date)
+        self.assertEqual(scheduler.tick(self.at(17)), [])
+        self.assertEqual(len(sent), 1)
+
+    def test_closed_tasks_are_not_reminded(self):
+        task = self.make_task(timedelta(minutes=10))
+        scheduler = ReminderScheduler()
+        scheduler.tick(self.at(0))
+
+        task.status = 'completed'
+        task.save()
+
+        self.assertEqual(scheduler.tick(self.at(15)), [])
+        self.assertEqual(sent, [])
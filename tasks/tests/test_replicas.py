@@ -0,0 +1,99 @@
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, override_settings
+
+from tasks.models import Task, User
+from tasks.replicas import PrimaryReplicaRouter, is_pinned_to_primary, pin_to_primary, use_replica
+
+from .helpers import ScratchDatabasesTestCase, client_for, make_task, make_user
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a', 'replica_b'], READ_YOUR_WRITES_SECONDS=10)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.user = User(pk=1, username='reader')
+
+    def request(self):
+        return type('Request', (), {'user': self.user})()
+
+    def read_alias(self):
+        return self.router.db_for_read(Task)
+
+    def test_reads_go_to_the_primary_outside_replica_views(self):
+        self.assertEqual(self.read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_replica_views_read_from_a_replica(self):
+        view = use_replica(lambda request: self.read_alias())
+
+        self.assertIn(view(self.request()), ['replica_a', 'replica_b'])
+        self.assertEqual(self.read_alias(), DEFAULT_DB_ALIAS)
+
+    def test_async_replica_views_read_from_a_replica(self):
+        async def view(request):
+            return self.read_alias()
+
+        self.assertIn(async_to_sync(use_replica(view))(self.request()), ['replica_a', 'replica_b'])
+
+    def test_pinned_users_read_from_the_primary(self):
+        pin_to_primary(self.user)
+        view = use_replica(lambda request: self.read_alias())
+
+        self.assertTrue(is_pinned_to_primary(self.user))
+        self.assertEqual(view(self.request()), DEFAULT_DB_ALIAS)
+
+    def test_writes_and_migrations_go_to_the_primary(self):
+        view = use_replica(lambda request: self.router.db_for_write(Task))
+
+        self.assertEqual(view(self.request()), DEFAULT_DB_ALIAS)
+        self.assertFalse(self.router.allow_migrate('replica_a', 'tasks'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'tasks'))
+
+
+class ReadYourWritesTests(ScratchDatabasesTestCase):
+    """A lagging replica behind the API: it holds only what the test puts on it"""
+
+    scratch_aliases = ('test_replica',)
+
+    @classmethod
+    def scratch_settings(cls):
+        return {'DATABASE_REPLICAS': list(cls.scratch_aliases)}
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        # Flushing skips the replica, whose tables the router keeps from migrating
+        User._base_manager.using('test_replica').all().delete()
+        for user in (self.admin, self.user):
+            user.save(using='test_replica')
+        self.task = make_task(self.user, self.admin, title='Only on the primary')
+        self.client = client_for(self.user)
+
+    def task_ids(self):
+        return [task['id'] for task in self.client.get('/api/tasks/').data['tasks']]
+
+    def test_reads_come_from_the_replica(self):
+        self.assertEqual(self.task_ids(), [])
+
+    def test_users_read_their_own_writes_from_the_primary(self):
+        response = self.client.patch(
+            f'/api/tasks/{self.task.id}/status/', {'status': 'in_progress'}, format='json', HTTP_IF_MATCH='*'
+        )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(is_pinned_to_primary(self.user))
+        self.assertEqual(self.task_ids(), [self.task.id])
+        self.assertEqual(client_for(self.admin).get('/api/tasks/').data['tasks'], [])
+
+    def test_failed_writes_do_not_pin(self):
+        response = self.client.patch(
+            f'/api/tasks/{self.task.id}/status/', {'status': 'bogus'}, format='json', HTTP_IF_MATCH='*'
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(is_pinned_to_primary(self.user))
@@ -0,0 +1,162 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import ArchivedTask, Task
+from tasks.serializers import (
+    TaskCommentSerializer, TaskListRowSerializer, TaskListSerializer, TaskSerializer, TaskUserSerializer,
+)
+from tasks.task_archive import archive_completed_tasks
+from tasks.user_directory import user_directory
+
+from .helpers import make_task, make_user
+
+
+class UsernameListTests(TestCase):
+    """Usernames of a list are looked up in one query"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.users = [make_user(f'user{i}') for i in range(5)]
+        self.tasks = [make_task(user, self.admin, title=f'Task of {user.username}') for user in self.users]
+        user_directory.clear()
+
+    def test_list_looks_users_up_once(self):
+        tasks = list(Task.objects.order_by('id'))
+
+        with self.assertNumQueries(1):
+            data = TaskListSerializer(tasks, many=True).data
+
+        self.assertEqual([row['assigned_to_username'] for row in data], [user.username for user in self.users])
+
+    def test_nested_comments_look_their_authors_up_once(self):
+        task = self.tasks[0]
+        for user in self.users:
+            task.comments.create(author=user, content=f'From {user.username}')
+        comments = list(task.comments.order_by('id'))
+
+        with self.assertNumQueries(1):
+            data = TaskCommentSerializer(comments, many=True).data
+        task_data = TaskSerializer(Task.objects.prefetch_related('comments').get(id=task.id), context={'history': []}).data
+
+        self.assertEqual([row['author_username'] for row in data], [user.username for user in self.users])
+        self.assertEqual(sorted(row['author_username'] for row in task_data['comments']), [user.username for user in self.users])
+
+    def test_unknown_users_are_none(self):
+        task = self.tasks[0]
+        task.assigned_to_id = 999
+
+        self.assertIsNone(TaskListSerializer([task], many=True).data[0]['assigned_to_username'])
+
+
+class TaskListRowSerializerTests(TestCase):
+    """The values() fast path against the DRF serializer it stands in for"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin', first_name='Big')
+        self.user = make_user('alice')
+        make_task(self.user, self.admin, title='Due soon', priority='high')
+        overdue = make_task(self.user, self.admin, title='Overdue')
+        Task.objects.filter(id=overdue.id).update(due_date=timezone.now() - timedelta(days=2, hours=1))
+        make_task(self.admin, self.user, title='Done', status='completed')
+        archived = make_task(self.user, self.admin, title='Archived', status='completed')
+        Task.objects.filter(id=archived.id).update(updated_at=timezone.now() - timedelta(days=365))
+        archive_completed_tasks(older_than_days=1)
+
+    def instances(self):
+        return list(Task.objects.order_by('id')) + list(ArchivedTask.objects.order_by('id'))
+
+    def rows(self, fields=None, expand=()):
+        columns = TaskListRowSerializer.columns(fields, expand)
+        return (
+            list(Task.objects.order_by('id').values(*columns))
+            + list(ArchivedTask.objects.order_by('id').values(*columns))
+        )
+
+    def expected(self, fields=None, expand=()):
+        """TaskListSerializer's output, narrowed and expanded as SparseFieldsMixin does it"""
+        expected = []
+        for task, row in zip(self.instances(), TaskListSerializer(self.instances(), many=True).data):
+            row = {name: value for name, value in row.items() if fields is None or name in fields}
+            for name in expand:
+                row[name] = TaskUserSerializer(getattr(task, name)).data
+            expected.append(row)
+        return expected
+
+    def test_rows_match_the_model_serializer_on_both_tiers(self):
+        data = TaskListRowSerializer(self.rows()).data
+
+        self.assertEqual(len(data), 4)
+        self.assertEqual(data, self.expected())
+        self.assertEqual([row['is_overdue'] for row in data], [False, True, False, False])
+
+    def test_fields_and_expand(self):
+        for fields, expand in [
+            (['id', 'title'], ()),
+            (['id', 'is_overdue', 'days_until_due'], ()),
+            (['assigned_to_username'], ['assigned_to']),
+            (None, ['assigned_to', 'created_by']),
+        ]:
+            with self.subTest(fields=fields, expand=expand):
+                data = TaskListRowSerializer(self.rows(fields, expand), fields=fields, expand=expand).data
+                self.assertEqual(data, self.expected(fields, expand))
+
+    def test_columns_are_only_those_the_fields_read(self):
+        self.assertEqual(TaskListRowSerializer.columns(['title']), ['title'])
+        self.assertEqual(TaskListRowSerializer.columns(['is_overdue', 'days_until_due']), ['due_date', 'status'])
+        self.assertEqual(
+            TaskListRowSerializer.columns(['id'], ['created_by']),
+            ['id', 'created_by__id', 'created_by__username', 'created_by__first_name', 'created_by__last_name']
+        )
+
+
+class SparseTaskSerializerTests(TestCase):
+    """TaskSerializer with fields= and expand=, and the queries optimize() shapes for it"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin', first_name='Big')
+        self.user = make_user('alice')
+        self.task = make_task(self.user, self.admin, title='Write the report')
+
+    def only(self, *args, **kwargs):
+        loaded, deferred = TaskSerializer.optimize(Task.objects.all(), *args, **kwargs).query.deferred_loading
+        self.assertFalse(deferred)
+        return set(loaded)
+
+    def test_fields_are_pruned(self):
+        data = TaskSerializer(self.task, fields=['id', 'title', 'assigned_to_username']).data
+
+        self.assertEqual(data, {'id': self.task.id, 'title': 'Write the report', 'assigned_to_username': 'alice'})
+
+    def test_expanded_relations_are_nested_users(self):
+        data = TaskSerializer(self.task, fields=['id'], expand=['created_by']).data
+
+        self.assertEqual(data, {
+            'id': self.task.id,
+            'created_by': {'id': self.admin.id, 'username': 'boss', 'first_name': 'Big', 'last_name': ''},
+        })
+        self.assertEqual(TaskSerializer(self.task, context={'history': []}).data['created_by'], self.admin.id)
+
+    def test_optimize_loads_only_the_columns_the_fields_read(self):
+        self.assertEqual(self.only(['id', 'title']), {'id', 'title'})
+        self.assertEqual(self.only(['is_overdue', 'assigned_to_username']), {'id', 'due_date', 'status', 'assigned_to'})
+        self.assertEqual(self.only(['title'], also=['assigned_to', 'version']), {'id', 'title', 'assigned_to', 'version'})
+        self.assertEqual(self.only(['tags', 'history']), {'id'})
+        self.assertEqual(
+            self.only(['id'], ['assigned_to']),
+            {'id', 'assigned_to', 'assigned_to__id', 'assigned_to__username', 'assigned_to__first_name', 'assigned_to__last_name'}
+        )
+
+    def test_optimized_query_serializes_without_more_queries(self):
+        fields, expand = ['id', 'title', 'comments'], ['assigned_to']
+        self.task.comments.create(author=self.user, content='On it')
+        user_directory.clear()
+
+        # The task (with its assignee joined) and its comments, then the authors' usernames
+        with self.assertNumQueries(3):
+            task = TaskSerializer.optimize(Task.objects.all(), fields, expand).get(id=self.task.id)
+            data = TaskSerializer(task, fields=fields, expand=expand).data
+
+        self.assertEqual(data['assigned_to']['username'], 'alice')
+        self.assertEqual([comment['author_username'] for comment in data['comments']], ['alice'])
@@ -0,0 +1,116 @@
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from tasks.models import Task, TaskComment, TaskHistory, TaskLocation, User
+from tasks.sharding import gather_page, shard_for_task, shard_for_user, sum_counts
+
+from .helpers import ShardedTestCase, client_for, make_user
+
+
+class SumCountsTests(SimpleTestCase):
+
+    def test_adds_nested_counts_key_by_key(self):
+        total = sum_counts([
+            {'total': 2, 'by_status': {'completed': 1, 'in_progress': 1}},
+            {'total': 3, 'by_status': {'completed': 2, 'not_started': 1}},
+        ])
+        self.assertEqual(total, {'total': 5, 'by_status': {'completed': 3, 'in_progress': 1, 'not_started': 1}})
+
+
+class ShardingTests(ShardedTestCase):
+    """Tasks spread over shards by assignee, behind the API"""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('boss', role='admin')
+        self.users = [make_user(f'user{i}') for i in range(4)]
+        self.admin_client = client_for(self.admin)
+
+    def create_task(self, user, title, **data):
+        response = self.admin_client.post('/api/tasks/create/', {
+            'title': title,
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': user.username,
+            **data,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['task']['id']
+
+    def test_users_are_copied_to_every_shard(self):
+        for alias in self.shards:
+            self.assertEqual(User.objects.using(alias).count(), User.objects.using(DEFAULT_DB_ALIAS).count())
+
+    def test_tasks_live_on_their_assignees_shard(self):
+        task_ids = [self.create_task(user, f'Task {i}') for i, user in enumerate(self.users)]
+
+        self.assertEqual(len(set(task_ids)), len(task_ids))
+        for task_id, user in zip(task_ids, self.users):
+            shard = shard_for_user(user)
+            self.assertEqual(shard_for_task(task_id), shard)
+            self.assertEqual(TaskLocation.objects.get(id=task_id).shard, shard)
+            self.assertTrue(Task.objects.using(shard).filter(id=task_id, assigned_to=user).exists())
+        self.assertFalse(Task.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual({shard_for_user(user) for user in self.users}, set(self.shards))
+
+    def test_users_see_only_their_own_tasks(self):
+        own = self.create_task(self.users[0], 'Mine')
+        other = self.create_task(self.users[1], 'Theirs')
+        client = client_for(self.users[0])
+
+        response = client.get('/api/tasks/')
+        self.assertEqual([task['id'] for task in response.data['tasks']], [own])
+        self.assertEqual(client.get(f'/api/tasks/{other}/').status_code, 403)
+
+    def test_admin_list_merges_shards_in_order(self):
+        for i in range(8):
+            self.create_task(self.users[i % 4], f'Task {i:02d}')
+
+        first = self.admin_client.get('/api/tasks/?sort_by=title&page_size=3').data
+        second = self.admin_client.get('/api/tasks/?sort_by=title&page_size=3&page=2').data
+        descending = self.admin_client.get('/api/tasks/?sort_by=-title&page_size=3').data
+
+        self.assertEqual(first['count'], 8)
+        self.assertEqual([task['title'] for task in first['tasks']], ['Task 00', 'Task 01', 'Task 02'])
+        self.assertEqual([task['title'] for task in second['tasks']], ['Task 03', 'Task 04', 'Task 05'])
+        self.assertEqual([task['title'] for task in descending['tasks']], ['Task 07', 'Task 06', 'Task 05'])
+
+    def test_gather_page_merges_per_shard_results(self):
+        rows = {
+            self.shards[0]: [{'id': 1, 'title': 'a'}, {'id': 4, 'title': 'c'}],
+            self.shards[1]: [{'id': 2, 'title': 'a'}, {'id': 3, 'title': 'b'}],
+        }
+
+        page = gather_page(lambda alias, start, end: rows[alias][start:end], 'title', 1, 3)
+
+        self.assertEqual([row['id'] for row in page], [2, 3])
+
+    def test_statistics_add_up_over_shards(self):
+        for i, user in enumerate(self.users):
+            self.create_task(user, f'Task {i}', priority='high' if i % 2 else 'low')
+
+        statistics = self.admin_client.get('/api/admin/statistics/').data['statistics']
+
+        self.assertEqual(statistics['total_tasks'], 4)
+        self.assertEqual(statistics['tasks_by_priority'], {'high': 2, 'low': 2})
+
+    def test_reassigning_moves_the_task_to_the_new_shard(self):
+        source_user, target_user = self.users[0], self.users[1]
+        source, target = shard_for_user(source_user), shard_for_user(target_user)
+        self.assertNotEqual(source, target)
+        task_id = self.create_task(source_user, 'Moving')
+        client_for(source_user).post(f'/api/tasks/{task_id}/comments/', {'content': 'Before the move'}, format='json')
+
+        response = self.admin_client.patch(
+            f'/api/tasks/{task_id}/update/', {'assigned_to': target_user.id}, format='json', HTTP_IF_MATCH='*'
+        )
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(Task.objects.using(source).filter(id=task_id).exists())
+        self.assertTrue(Task.objects.using(target).filter(id=task_id, assigned_to=target_user).exists())
+        self.assertEqual(shard_for_task(task_id), target)
+        self.assertEqual(TaskComment.objects.using(target).filter(task_id=task_id).count(), 1)
+        self.assertFalse(TaskHistory.objects.using(source).filter(task_id=task_id).exists())
+        self.assertEqual(client_for(target_user).get(f'/api/tasks/{task_id}/').status_code, 200)
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import SimpleTestCase
+
+from tasks.management.commands.sqlite_stress import Command as StressCommand
+
+TUNED_OPTIONS = {
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'busy_timeout': 5000,
+        'synchronous': 'NORMAL',
+    },
+    'serialize_writes': True,
+}
+
+
+class TunedSQLiteBackendTests(SimpleTestCase):
+    """The tuned SQLite backend from db_backends/sqlite3"""
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def open_database(self, name):
+        """Register a scratch database on the tuned backend and return its alias and path"""
+        alias = f'sqlite_test_{name}'
+        path = os.path.join(self.workdir.name, f'{name}.sqlite3')
+        settings_dict = dict(connections[DEFAULT_DB_ALIAS].settings_dict)
+        settings_dict.update({'ENGINE': settings.SQLITE_ENGINE, 'NAME': path, 'OPTIONS': TUNED_OPTIONS, 'TEST': {}})
+        connections.settings[alias] = settings_dict
+
+        def close():
+            connections[alias].close()
+            del connections.settings[alias]
+        self.addCleanup(close)
+        return alias, path
+
+    def journal_mode(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute('PRAGMA journal_mode').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_connecting_does_not_change_the_journal_mode(self):
+        alias, path = self.open_database('untouched')
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        connections[alias].close()
+        
+        self.assertEqual(self.journal_mode(path), 'delete')
+
+    def test_apply_persistent_pragmas_switches_to_wal(self):
+        alias, path = self.open_database('wal')
+        
+        self.assertEqual(connections[alias].apply_persistent_pragmas(), {'journal_mode': 'wal'})
+        connections[alias].close()
+        self.assertEqual(self.journal_mode(path), 'wal')
+
+    def test_concurrent_writers_never_see_database_is_locked(self):
+        path = os.path.join(self.workdir.name, 'stress.sqlite3')
+        options = {'writers': 8, 'readers': 2, 'ops': 25, 'busy_timeout': 5000}
+        result = StressCommand().run_profile('tuned', settings.SQLITE_ENGINE, TUNED_OPTIONS, path, options)
+        
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['committed'], 8 * 25)
+
+    def test_transactions_over_two_databases_in_opposite_orders_do_not_deadlock(self):
+        primary, _ = self.open_database('primary')
+        shard, _ = self.open_database('shard')
+        for alias in (primary, shard):
+            with connections[alias].cursor() as cursor:
+                cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+            connections[alias].close()
+        first_holds_its_database = threading.Event()
+        errors = []
+
+        def write(aliases, before_second=lambda: None):
+            try:
+                with transaction.atomic(using=aliases[0]):
+                    connections[aliases[0]].cursor().execute('INSERT INTO item DEFAULT VALUES')
+                    before_second()
+                    with transaction.atomic(using=aliases[1]):
+                        connections[aliases[1]].cursor().execute('INSERT INTO item DEFAULT VALUES')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        def let_the_other_start():
+            first_holds_its_database.set()
+            other.join(0.2)
+
+        # As in_task_transaction (shard) -> move_task (primary) against
+        # a primary transaction that writes to the task's shard
+        one = threading.Thread(target=write, args=([shard, primary], let_the_other_start))
+        other = threading.Thread(target=lambda: first_holds_its_database.wait(5) and write([primary, shard]))
+        one.start()
+        other.start()
+        one.join(10)
+        other.join(10)
+
+        self.assertEqual(errors, [])
+        for alias in (primary, shard):
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM item')
+                self.assertEqual(cursor.fetchone()[0], 2)
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.jobs import run_pending
+from tasks.models import Tag, TaskHistory, TaskTag
+from tasks.tags import MAX_TAGS_PER_TASK, normalize_tag_names, set_task_tags, tags_of
+
+from .helpers import client_for, make_task, make_user
+
+
+class NormalizeTagNamesTests(TestCase):
+
+    def test_names_are_stripped_lower_cased_and_deduplicated(self):
+        self.assertEqual(normalize_tag_names([' Bug', 'backend', 'BUG', 'front-end_2']), ['bug', 'backend', 'front-end_2'])
+
+    def test_invalid_names_are_refused(self):
+        for names in (['has space'], ['-leading'], ['x' * 100], [''], [3], [f'tag{i}' for i in range(MAX_TAGS_PER_TASK + 1)]):
+            with self.subTest(names=names):
+                with self.assertRaises(ValueError):
+                    normalize_tag_names(names)
+
+
+class TaskTagsTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.client = client_for(self.admin)
+
+    def create_task(self, title, tags):
+        response = self.client.post('/api/tasks/create/', {
+            'title': title,
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': self.user.username,
+            'tags': tags,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['task']['id']
+
+    def listed(self, query):
+        response = self.client.get(f'/api/tasks/?{query}')
+        self.assertEqual(response.status_code, 200, response.data)
+        return sorted(task['id'] for task in response.data['tasks'])
+
+    def test_tags_are_normalized_when_written(self):
+        task_id = self.create_task('Fix it', ['Bug', ' bug ', 'Backend'])
+
+        self.assertEqual(self.client.get(f'/api/tasks/{task_id}/').data['task']['tags'], ['backend', 'bug'])
+        self.assertEqual(Tag.objects.count(), 2)
+        response = self.client.patch(f'/api/tasks/{task_id}/update/', {'tags': ['no spaces please']}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/tasks/{task_id}/update/', {'tags': 'bug'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_replaces_the_tags(self):
+        task_id = self.create_task('Fix it', ['bug', 'backend'])
+
+        response = self.client.patch(f'/api/tasks/{task_id}/update/', {'tags': ['bug', 'Frontend']}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['task']['tags'], ['bug', 'frontend'])
+        self.assertEqual(TaskTag.objects.filter(task_id=task_id).count(), 2)
+        run_pending()  # Writes the task's history
+        self.assertTrue(TaskHistory.objects.filter(task_id=task_id, description='Tags changed: +frontend -backend').exists())
+        # Left alone when not given, cleared by an empty list
+        response = self.client.patch(f'/api/tasks/{task_id}/update/', {'priority': 'high'}, format='json')
+        self.assertEqual(response.data['task']['tags'], ['bug', 'frontend'])
+        response = self.client.patch(f'/api/tasks/{task_id}/update/', {'tags': []}, format='json')
+        self.assertEqual(response.data['task']['tags'], [])
+        self.assertFalse(TaskTag.objects.filter(task_id=task_id).exists())
+
+    def test_set_task_tags_reports_what_changed(self):
+        task = make_task(self.user, self.admin)
+
+        self.assertEqual(set_task_tags(task, ['a', 'b']), (['a', 'b'], []))
+        self.assertEqual(set_task_tags(task, ['b', 'c']), (['c'], ['a']))
+        self.assertEqual(set_task_tags(task, ['b', 'c']), ([], []))
+        self.assertEqual(tags_of([task]), {task.id: ['b', 'c']})
+
+    def test_list_filters_by_every_tag_or_any_tag(self):
+        both = self.create_task('Both', ['bug', 'backend'])
+        bug = self.create_task('Bug', ['bug'])
+        frontend = self.create_task('Frontend', ['frontend'])
+        self.create_task('Untagged', [])
+
+        self.assertEqual(self.listed('tags=bug'), [both, bug])
+        self.assertEqual(self.listed('tags=bug,backend'), [both])
+        self.assertEqual(self.listed('tags=BUG, Backend'), [both])
+        self.assertEqual(self.listed('any_tags=backend,frontend'), [both, frontend])
+        self.assertEqual(self.listed('tags=bug&any_tags=backend,frontend'), [both])
+        # Tags nobody has used match nothing
+        self.assertEqual(self.listed('tags=bug,unused'), [])
+        self.assertEqual(self.listed('any_tags=unused'), [])
+        self.assertEqual(self.listed('any_tags=unused,frontend'), [frontend])
+        self.assertEqual(self.client.get('/api/tasks/?tags=no%20spaces').status_code, 400)
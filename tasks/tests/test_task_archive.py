@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from tasks.models import ArchivedTask, ArchivedTaskComment, Task, TaskComment
+from tasks.task_archive import archive_completed_tasks, restore_task
+
+from .helpers import client_for, make_task, make_user
+
+
+class TaskArchiveTests(TestCase):
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.task = make_task(self.user, self.admin, status='completed')
+
+    def archive(self, **fields):
+        Task.objects.filter(id=self.task.id).update(updated_at=timezone.now() - timedelta(days=365), **fields)
+        self.assertEqual(archive_completed_tasks(older_than_days=1), 1)
+
+    def test_reminder_and_recurrence_columns_survive_a_round_trip(self):
+        reminded = self.task.due_date
+        self.archive(reminder_sent_for=reminded, recurrence_rule_id=7, occurrence=3)
+
+        archived = ArchivedTask.objects.get(id=self.task.id)
+        self.assertEqual((archived.reminder_sent_for, archived.recurrence_rule_id, archived.occurrence), (reminded, 7, 3))
+
+        task = restore_task(self.task.id)
+        self.assertEqual((task.reminder_sent_for, task.recurrence_rule_id, task.occurrence), (reminded, 7, 3))
+
+    def test_commenting_on_an_archived_task_moves_it_back(self):
+        self.task.comments.create(author=self.user, content='Done')
+        self.archive()
+
+        response = client_for(self.user).post(f'/api/tasks/{self.task.id}/comments/', {
+            'content': 'One more thing',
+        }, format='json', HTTP_IF_MATCH='*')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(Task.objects.filter(id=self.task.id).exists())
+        self.assertFalse(ArchivedTask.objects.filter(id=self.task.id).exists())
+        self.assertFalse(ArchivedTaskComment.objects.filter(task_id=self.task.id).exists())
+        self.assertEqual(
+            sorted(TaskComment.objects.filter(task_id=self.task.id).values_list('content', flat=True)),
+            ['Done', 'One more thing']
+        )
+
+    def test_invalid_comments_leave_an_archived_task_archived(self):
+        self.archive()
+
+        response = client_for(self.user).post(f'/api/tasks/{self.task.id}/comments/', {}, format='json', HTTP_IF_MATCH='*')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(ArchivedTask.objects.filter(id=self.task.id).exists())
+
+    def test_comments_on_other_users_archived_tasks_are_refused(self):
+        self.archive()
+
+        response = client_for(make_user('bob')).post(f'/api/tasks/{self.task.id}/comments/', {
+            'content': 'Hi',
+        }, format='json', HTTP_IF_MATCH='*')
+
+        self.assertEqual(response.status_code, 403)
+        self.assertTrue(ArchivedTask.objects.filter(id=self.task.id).exists())
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks.models import Task
+from tasks.sharding import shard_for_task, shard_for_user
+from tasks.task_archive import archive_completed_tasks
+
+from .helpers import ShardedTestCase, client_for, make_task, make_user
+
+
+class TaskBatchTests(TestCase):
+    """GET /api/tasks/batch/"""
+
+    def setUp(self):
+        self.admin = make_user('boss', role='admin')
+        self.user = make_user('alice')
+        self.other = make_user('bob')
+        self.mine = [make_task(self.user, self.admin, title=f'Mine {i}') for i in range(3)]
+        self.theirs = make_task(self.other, self.admin, title='Theirs')
+
+    def get(self, ids, user=None, **params):
+        query = '&'.join([f'ids={",".join(map(str, ids))}'] + [f'{key}={value}' for key, value in params.items()])
+        return client_for(user or self.user).get(f'/api/tasks/batch/?{query}')
+
+    def test_results_follow_the_requested_order_with_markers(self):
+        ids = [self.mine[2].id, 999, self.theirs.id, self.mine[0].id, self.mine[2].id]
+
+        response = self.get(ids)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(list(results), [self.mine[2].id, 999, self.theirs.id, self.mine[0].id])
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(results[999], {'status': 404, 'message': 'Task not found'})
+        self.assertEqual(results[self.theirs.id], {'status': 403, 'message': 'Permission denied'})
+        self.assertEqual(results[self.mine[2].id]['status'], 200)
+        self.assertEqual(results[self.mine[2].id]['task']['title'], 'Mine 2')
+
+    def test_admins_see_every_task(self):
+        response = self.get([self.mine[0].id, self.theirs.id], user=self.admin)
+
+        self.assertEqual([result['status'] for result in response.data['results'].values()], [200, 200])
+
+    def test_fields_and_expand(self):
+        response = self.get([self.mine[0].id], fields='id,title', expand='assigned_to')
+
+        self.assertEqual(response.data['results'][self.mine[0].id]['task'], {
+            'id': self.mine[0].id,
+            'title': 'Mine 0',
+            'assigned_to': {'id': self.user.id, 'username': 'alice', 'first_name': '', 'last_name': ''},
+        })
+
+    def test_archived_tasks_only_when_asked_for(self):
+        task = make_task(self.user, self.admin, status='completed')
+        Task.objects.filter(id=task.id).update(updated_at=timezone.now() - timedelta(days=365))
+        archive_completed_tasks(older_than_days=1)
+
+        hot_only = self.get([task.id])
+        any_tier = self.get([task.id], include_archived='true')
+
+        self.assertEqual(hot_only.data['results'][task.id]['status'], 404)
+        self.assertEqual(any_tier.data['results'][task.id]['status'], 200)
+
+    @override_settings(TASK_BATCH_MAX_IDS=2)
+    def test_invalid_requests(self):
+        self.assertEqual(self.get([1, 2, 3]).status_code, 400)
+        self.assertEqual(client_for(self.user).get('/api/tasks/batch/?ids=1,x').status_code, 400)
+        self.assertEqual(client_for(self.user).get('/api/tasks/batch/').status_code, 400)
+        self.assertEqual(self.get([1], fields='nope').status_code, 400)
+
+
+class ShardedTaskBatchTests(ShardedTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = make_user('boss', role='admin')
+        # Users until one lands on each shard
+        self.users = {}
+        for i in range(20):
+            user = make_user(f'user{i}')
+            self.users.setdefault(shard_for_user(user.id), user)
+            if len(self.users) == len(self.shards):
+                break
+
+    def create_task(self, user):
+        response = client_for(self.admin).post('/api/tasks/create/', {
+            'title': f'Task of {user.username}',
+            'due_date': (timezone.now() + timedelta(days=3)).isoformat(),
+            'assigned_to_username': user.username,
+        }, format='json')
+        return response.data['task']['id']
+
+    def test_tasks_are_gathered_from_every_shard(self):
+        task_ids = [self.create_task(user) for user in self.users.values() for _ in range(2)]
+        self.assertEqual({shard_for_task(task_id) for task_id in task_ids}, set(self.shards))
+        ids = list(reversed(task_ids)) + [10_000]
+
+        response = client_for(self.admin).get(f'/api/tasks/batch/?ids={",".join(map(str, ids))}&fields=id,title')
+
+        results = response.data['results']
+        self.assertEqual(list(results), ids)
+        self.assertEqual(response.data['count'], len(task_ids))
+        self.assertEqual([results[task_id]['task']['id'] for task_id in task_ids], task_ids)
+        self.assertEqual(results[10_000]['status'], 404)
@@ -0,0 +1,269 @@
+import hashlib
+import hmac
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tasks import webhooks
+from tasks.models import WebhookDeadLetter, WebhookEvent, WebhookSubscription
+
+from .helpers import client_for, make_user
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Records each POST and answers with the server's next status code"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        with server.lock:
+            status_code = server.statuses.pop(0) if server.statuses else 200
+            server.requests.append({
+                'headers': dict(self.headers),
+                'body': body,
+                'connection': self.client_address,
+            })
+            drop = server.drop_after_response
+        self.send_response(status_code)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        # Close a kept-alive connection without telling the client, like an idle timeout
+        self.close_connection = drop
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.statuses = []
+        self.drop_after_response = False
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}/hook'
+
+
+@override_settings(
+    WEBHOOK_BATCH_SIZE=100,
+    WEBHOOK_TIMEOUT_SECONDS=5,
+    WEBHOOK_MAX_ATTEMPTS=3,
+    WEBHOOK_RETRY_BACKOFF_SECONDS=30,
+    WEBHOOK_RETRY_MAX_DELAY_SECONDS=3600,
+)
+class WebhookDeliveryTests(TestCase):
+    """Delivery of outbox events to an endpoint, against a local HTTP server"""
+
+    def setUp(self):
+        self.server = StubServer()
+        thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        thread.start()
+        self.addCleanup(self.stop_server)
+        self.subscription = WebhookSubscription.objects.create(
+            url=self.server.url,
+            event_types=['task.updated'],
+        )
+
+    def stop_server(self):
+        # Kept-alive connections of this thread point at this server
+        for key in list(webhooks._local.__dict__.get('connections', {})):
+            webhooks._drop_connection(key)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def queue_events(self, count, subscription=None):
+        return [
+            WebhookEvent.objects.create(
+                subscription=subscription or self.subscription,
+                event_id=f'event{i:027d}',
+                event_type='task.updated',
+                payload={'id': f'event{i:027d}', 'type': 'task.updated', 'data': {'task_id': i}},
+            )
+            for i in range(count)
+        ]
+
+    def make_due(self):
+        WebhookEvent.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+    def test_deliver_signs_the_body(self):
+        events = self.queue_events(2)
+
+        self.assertIsNone(webhooks.deliver(self.subscription, events))
+
+        request, = self.server.requests
+        headers, body = request['headers'], request['body']
+        timestamp = headers['X-Webhook-Timestamp']
+        expected = hmac.new(
+            self.subscription.secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256
+        ).hexdigest()
+        self.assertEqual(headers['X-Webhook-Signature'], f'sha256={expected}')
+        payload = json.loads(body)
+        self.assertEqual(payload['delivery_id'], headers['X-Webhook-Id'])
+        self.assertEqual(payload['events'], [event.payload for event in events])
+
+    def test_signature_changes_with_the_secret(self):
+        self.assertNotEqual(webhooks.sign('one', '1', b'{}'), webhooks.sign('two', '1', b'{}'))
+
+    @override_settings(WEBHOOK_BATCH_SIZE=2)
+    def test_dispatch_batches_events_per_subscription(self):
+        other = WebhookSubscription.objects.create(url=self.server.url, event_types=['task.updated'])
+        self.queue_events(5)
+        self.queue_events(1, subscription=other)
+
+        self.assertEqual(webhooks.dispatch_due(), 6)
+
+        batch_sizes = sorted(len(json.loads(request['body'])['events']) for request in self.server.requests)
+        self.assertEqual(batch_sizes, [1, 1, 2, 2])
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.subscription.refresh_from_db()
+        self.assertIsNotNone(self.subscription.last_success_at)
+
+    @override_settings(WEBHOOK_BATCH_SIZE=1)
+    def test_dispatch_reuses_the_connection(self):
+        self.queue_events(3)
+
+        webhooks.dispatch_due()
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(len({request['connection'] for request in self.server.requests}), 1)
+
+    def test_dropped_kept_alive_connection_is_reopened(self):
+        self.server.drop_after_response = True
+        self.queue_events(1)
+        webhooks.dispatch_due()
+        self.queue_events(1)
+
+        self.assertEqual(webhooks.dispatch_due(), 1)
+
+        connections = [request['connection'] for request in self.server.requests]
+        self.assertEqual(len(connections), 2)
+        self.assertNotEqual(connections[0], connections[1])
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.server.statuses = [500, 503]
+        event, = self.queue_events(1)
+
+        started = timezone.now()
+        self.assertEqual(webhooks.dispatch_due(), 0)
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, 'HTTP 500')
+        self.assertEqual(event.claimed_by, '')
+        self.assertGreaterEqual(event.next_attempt_at, started + timedelta(seconds=30))
+
+        # Not due yet: nothing is sent
+        webhooks.dispatch_due()
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.make_due()
+        started = timezone.now()
+        webhooks.dispatch_due()
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 2)
+        self.assertGreaterEqual(event.next_attempt_at, started + timedelta(seconds=60))
+        self.assertLess(event.next_attempt_at, started + timedelta(seconds=90))
+
+        self.make_due()
+        self.assertEqual(webhooks.dispatch_due(), 1)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_retry_delay_doubles_up_to_the_maximum(self):
+        self.assertEqual([webhooks.retry_delay(n) for n in (1, 2, 3)], [30, 60, 120])
+        self.assertEqual(webhooks.retry_delay(20), 3600)
+
+    def test_unreachable_endpoint_is_a_failure(self):
+        self.subscription.url = 'http://127.0.0.1:1/hook'
+        self.subscription.save()
+        event, = self.queue_events(1)
+
+        webhooks.dispatch_due()
+
+        event.refresh_from_db()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn('ConnectionRefusedError', event.last_error)
+
+    def test_events_are_dead_lettered_after_max_attempts(self):
+        self.server.statuses = [500, 500, 500]
+        event, = self.queue_events(1)
+
+        for _ in range(3):
+            self.make_due()
+            webhooks.dispatch_due()
+
+        self.assertFalse(WebhookEvent.objects.exists())
+        letter, = WebhookDeadLetter.objects.all()
+        self.assertEqual(letter.event_id, event.event_id)
+        self.assertEqual(letter.payload, event.payload)
+        self.assertEqual(letter.attempts, 3)
+        self.assertEqual(letter.last_error, 'HTTP 500')
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.last_error, 'HTTP 500')
+
+    def test_failed_batch_is_claimed_by_no_one(self):
+        events = self.queue_events(3)
+
+        webhooks._failed(self.subscription, events, 'HTTP 500', timezone.now())
+
+        self.assertEqual(set(WebhookEvent.objects.values_list('attempts', 'claimed_by')), {(1, '')})
+
+    def test_redeliver_dead_letters(self):
+        self.server.statuses = [500, 500, 500]
+        self.queue_events(2)
+        for _ in range(3):
+            self.make_due()
+            webhooks.dispatch_due()
+        first, second = WebhookDeadLetter.objects.order_by('id')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(webhooks.redeliver_dead_letters(self.subscription, ids=[first.id]), 1)
+
+        event, = WebhookEvent.objects.all()
+        self.assertEqual((event.event_id, event.attempts), (first.event_id, 0))
+        self.assertEqual(list(WebhookDeadLetter.objects.values_list('id', flat=True)), [second.id])
+
+        self.assertEqual(webhooks.dispatch_due(), 1)
+        delivered = json.loads(self.server.requests[-1]['body'])['events']
+        self.assertEqual([e['id'] for e in delivered], [first.event_id])
+
+        self.assertEqual(webhooks.redeliver_dead_letters(self.subscription), 1)
+        self.assertFalse(WebhookDeadLetter.objects.exists())
+
+
+class DeadLetterListTests(TestCase):
+
+    def setUp(self):
+        self.client = client_for(make_user('boss', role='admin'))
+        self.subscription = WebhookSubscription.objects.create(url='https://example.com/hook', event_types=['task.updated'])
+        for i in range(3):
+            WebhookDeadLetter.objects.create(
+                subscription=self.subscription,
+                event_id=f'event{i:027d}',
+                event_type='task.updated',
+                payload={},
+                created_at=timezone.now(),
+                attempts=3,
+            )
+
+    def test_invalid_page_parameters_fall_back_to_the_defaults(self):
+        for query, page, page_size, count in [
+            ('page=x', 1, 20, 3),
+            ('page_size=x', 1, 20, 3),
+            ('page=0&page_size=-5', 1, 1, 1),
+            ('page=2&page_size=2', 2, 2, 1),
+        ]:
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/admin/webhooks/{self.subscription.id}/dead-letters/?{query}')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual((response.data['page'], response.data['page_size']), (page, page_size))
+                self.assertEqual(len(response.data['dead_letters']), count)
@@ -2,7 +2,7 @@
 URL patterns for tasks app
 """
 from django.urls import path
-from . import views
+from . import async_views, events, views
 
 app_name = 'tasks'
 
@@ -19,6 +19,8 @@ urlpatterns = [
     # Task endpoints
     path('tasks/', views.list_tasks, name='list_tasks'),
     path('tasks/create/', views.create_task, name='create_task'),
+    path('tasks/batch/', views.get_tasks_batch, name='get_tasks_batch'),
+    path('tasks/changes/', views.get_task_changes, name='task_changes'),
     path('tasks/<int:task_id>/', views.get_task, name='get_task'),
     path('tasks/<int:task_id>/update/', views.update_task, name='update_task'),
     path('tasks/<int:task_id>/delete/', views.delete_task, name='delete_task'),
@@ -27,10 +29,55 @@ urlpatterns = [
     # Task comments
     path('tasks/<int:task_id>/comments/', views.add_task_comment, name='add_task_comment'),
     
+    # Subtasks and blockers
+    path('tasks/<int:task_id>/parent/', views.set_task_parent, name='set_task_parent'),
+    path('tasks/<int:task_id>/subtasks/', views.get_task_subtasks, name='task_subtasks'),
+    path('tasks/<int:task_id>/blockers/', views.get_task_blockers, name='task_blockers'),
+    path('tasks/<int:task_id>/blockers/add/', views.add_task_blocker, name='add_task_blocker'),
+    path('tasks/<int:task_id>/blockers/<int:blocker_id>/delete/', views.remove_task_blocker, name='remove_task_blocker'),
+    
+    # Task history (database and archive)
+    path('tasks/<int:task_id>/history/', views.get_task_history, name='task_history'),
+    
+    # Activity feed
+    path('activity/', views.get_activity_feed, name='activity_feed'),
+    path('activity/read/', views.mark_activity_read, name='mark_activity_read'),
+    
     # Dashboard and utility endpoints
     path('dashboard/', views.get_dashboard, name='dashboard'),
     
     # Admin endpoints
     path('admin/users/', views.get_all_users, name='all_users'),
     path('admin/statistics/', views.get_task_statistics, name='task_statistics'),
+    path('admin/users/<int:user_id>/delete/', views.delete_user, name='delete_user'),
+    path('admin/tasks/bulk-update/', views.bulk_update_tasks, name='bulk_update_tasks'),
+    path('admin/bulk-updates/<int:job_id>/', views.get_bulk_update_job, name='bulk_update_job'),
+    path('admin/deletions/<int:job_id>/', views.get_deletion_job, name='deletion_job'),
+    path('admin/webhooks/', views.list_webhooks, name='webhooks'),
+    path('admin/webhooks/create/', views.create_webhook, name='create_webhook'),
+    path('admin/webhooks/<int:webhook_id>/', views.get_webhook, name='webhook'),
+    path('admin/webhooks/<int:webhook_id>/update/', views.update_webhook, name='update_webhook'),
+    path('admin/webhooks/<int:webhook_id>/delete/', views.delete_webhook, name='delete_webhook'),
+    path('admin/webhooks/<int:webhook_id>/dead-letters/', views.get_webhook_dead_letters, name='webhook_dead_letters'),
+    path(
+        'admin/webhooks/<int:webhook_id>/dead-letters/redeliver/',
+        views.redeliver_webhook_dead_letters,
+        name='redeliver_webhook_dead_letters'
+    ),
+    path('admin/recurrences/', views.list_recurrences, name='recurrences'),
+    path('admin/recurrences/<int:rule_id>/', views.get_recurrence, name='recurrence'),
+    path('admin/recurrences/<int:rule_id>/update/', views.update_recurrence, name='update_recurrence'),
+    path('admin/recurrences/<int:rule_id>/delete/', views.delete_recurrence, name='delete_recurrence'),
+    path('admin/jobs/', views.get_background_jobs, name='background_jobs'),
+    path('admin/jobs/<int:job_id>/', views.get_background_job, name='background_job'),
+    
+    # Many requests in one round trip
+    path('batch/', views.batch, name='batch'),
+    
+    # Async read endpoints (for ASGI deployments)
+    path('async/tasks/', async_views.list_tasks, name='async_list_tasks'),
+    path('async/tasks/<int:task_id>/', async_views.get_task, name='async_get_task'),
+    path('async/dashboard/', async_views.get_dashboard, name='async_dashboard'),
+    path('async/admin/statistics/', async_views.get_task_statistics, name='async_task_statistics'),
+    path('async/events/', events.task_events, name='task_events'),
 ]
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""
+In-process directory of users: username <-> id, is_active and role.
+
+Task lists, task details, comments and history show usernames, and task
+creation, the assigned_to filter and bulk updates resolve usernames to
+users. Instead of a join or a query for each, they ask ``user_directory``,
+which keeps the ``USER_DIRECTORY_SIZE`` most recently used users of the
+process in memory and loads the ones it doesn't have from the primary, in
+one query for many.
+
+Entries are dropped when a user is saved or deleted in this process (see
+tasks/signals.py), and are reloaded after ``USER_DIRECTORY_TTL_SECONDS``
+either way, which bounds how long other processes serve a change made
+elsewhere. Unknown usernames are not remembered, so new users are found at
+once.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import User
+
+UserEntry = namedtuple('UserEntry', ['id', 'username', 'is_active', 'role'])
+
+
+class UserDirectory:
+    """LRU map of user id -> UserEntry, with a username index"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._ids_by_username = {}
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a load that raced one isn't kept
+        self._generation = 0
+
+    def _cached(self, user_id):
+        """The entry for user_id if cached and fresh; call with the lock held"""
+        cached = self._entries.get(user_id)
+        if cached is None:
+            return None
+        entry, loaded_at = cached
+        if time.monotonic() - loaded_at > settings.USER_DIRECTORY_TTL_SECONDS:
+            self._remove(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _remove(self, user_id):
+        cached = self._entries.pop(user_id, None)
+        if cached is not None and self._ids_by_username.get(cached[0].username) == user_id:
+            del self._ids_by_username[cached[0].username]
+
+    def _load(self, **lookup):
+        """Load users from the primary and cache them. Returns {id: entry}."""
+        with self._lock:
+            generation = self._generation
+        entries = {
+            row[0]: UserEntry(*row)
+            for row in User.objects.using(DEFAULT_DB_ALIAS).filter(**lookup)
+            .values_list('id', 'username', 'is_active', 'role')
+        }
+        now = time.monotonic()
+        with self._lock:
+            if generation == self._generation:
+                for entry in entries.values():
+                    self._remove(entry.id)
+                    self._entries[entry.id] = (entry, now)
+                    self._ids_by_username[entry.username] = entry.id
+                while len(self._entries) > settings.USER_DIRECTORY_SIZE:
+                    self._remove(next(iter(self._entries)))
+        return entries
+
+    def get(self, user_id):
+        """The entry of a user id, or None if there is no such user"""
+        if user_id is None:
+            return None
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, user_ids):
+        """{id: entry} for the user ids that exist, loading the missing ones in one query"""
+        found = {}
+        with self._lock:
+            for user_id in set(user_ids):
+                entry = self._cached(user_id)
+                if entry is not None:
+                    found[user_id] = entry
+        missing = set(user_ids) - set(found) - {None}
+        if missing:
+            found.update(self._load(id__in=missing))
+        return found
+
+    def find(self, username):
+        """The entry of a username, or None if there is no such user"""
+        with self._lock:
+            user_id = self._ids_by_username.get(username)
+            entry = self._cached(user_id) if user_id is not None else None
+        if entry is not None and entry.username == username:
+            return entry
+        return next(iter(self._load(username=username).values()), None)
+
+    def username(self, user_id):
+        entry = self.get(user_id)
+        return entry.username if entry is not None else None
+
+    def invalidate(self, user_id):
+        """Forget a user, e.g. after it was changed"""
+        with self._lock:
+            self._generation += 1
+            self._remove(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._ids_by_username.clear()
+
+
+user_directory = UserDirectory()
+
+
+def user_instance(entry):
+    """
+    A User for an entry, e.g. to assign a task to, without a query. Fields
+    other than the entry's are loaded from the database if accessed.
+    """
+    return User.from_db(DEFAULT_DB_ALIAS, list(UserEntry._fields), list(entry))
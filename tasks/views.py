@@ -3,20 +3,53 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
-from django.db.models import Q, Count
-from django.db import transaction
+from django.conf import settings
+from django.db.models import Count
+from django.db import DEFAULT_DB_ALIAS, transaction
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django.utils.http import parse_etags, quote_etag
+from functools import wraps
 import logging
 
-from .models import Task, User, TaskComment, TaskHistory
+from .models import (
+    Task, User, ArchivedTask, DeletionJob, BackgroundJob, BulkUpdateJob,
+    TaskVersionConflict, WebhookSubscription, RecurrenceRule,
+)
 from .serializers import (
     UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer,
-    TaskSerializer, TaskCreateSerializer, TaskListSerializer, 
-    TaskStatusUpdateSerializer, BulkStatusUpdateSerializer,
-    TaskCommentSerializer
+    TaskSerializer, TaskCreateSerializer, TaskListSerializer, TaskListRowSerializer,
+    TaskStatusUpdateSerializer, BulkStatusUpdateSerializer, BulkTaskPatchSerializer,
+    TaskCommentSerializer, DeletionJobSerializer, BulkUpdateJobSerializer, BackgroundJobSerializer,
+    ActivityEntrySerializer, WebhookSubscriptionSerializer, WebhookDeadLetterSerializer,
+    RecurrenceRuleSerializer, TaskParentSerializer, TaskBlockerSerializer,
 )
 from .permissions import IsAdminUser, IsAdminOrTaskOwner, CanUpdateTask
+from .history_archive import get_task_history as get_full_task_history, get_tasks_history
+from .activity import mark_feed_read, read_feed, unread_count
+from .task_archive import get_task_in_any_tier, merge_counts, merge_tiers, restore_task
+from .deletion import schedule_task_deletion, schedule_user_deletion
+from .bulk_update import count_bulk_update, schedule_bulk_update
+from .filters import FILTER_PARAMS, TaskFilterError, apply_task_filters
+from .hierarchy import (
+    HierarchyError, add_blocker, blocker_rows, direct_blocker_ids, parent_id_of, remove_blocker, set_parent,
+    subtask_progress, subtask_rows,
+)
+from .batch import BatchError, parse_sub_requests, run_batch
+from .changes import (
+    ExpiredSyncToken, InvalidSyncToken, current_cursors, current_task_rows, make_sync_token, parse_sync_token,
+    read_changes,
+)
+from .idempotency import idempotent
+from .jobs import job_databases, job_summary, latest_jobs
+from .recurrence import schedule_materialization
+from .replicas import use_replica
+from .side_effects import record_history
+from .tags import tag_counts, tags_of
+from .webhooks import redeliver_dead_letters
+from .sharding import (
+    count_on_shards, gather_page, move_task, scatter, shard_for_task, shard_for_user, shards_for_tasks,
+    sum_counts,
+)
 
 logger = logging.getLogger(__name__)
 # API Info View
@@ -37,11 +70,21 @@ def api_info(request):
                 'list': '/api/v1/tasks/',
                 'create': '/api/v1/tasks/create/',
                 'detail': '/api/v1/tasks/{id}/',
+                'history': '/api/v1/tasks/{id}/history/',
+                'subtasks': '/api/v1/tasks/{id}/subtasks/',
+                'blockers': '/api/v1/tasks/{id}/blockers/',
+                'changes': '/api/v1/tasks/changes/',
             },
             'dashboard': '/api/v1/dashboard/',
+            'activity': '/api/v1/activity/',
+            'events': '/api/v1/async/events/',
+            'batch': '/api/v1/batch/',
             'admin': {
                 'users': '/api/v1/admin/users/',
                 'statistics': '/api/v1/admin/statistics/',
+                'bulk_update': '/api/v1/admin/tasks/bulk-update/',
+                'webhooks': '/api/v1/admin/webhooks/',
+                'recurrences': '/api/v1/admin/recurrences/',
             }
         }
     })
@@ -115,6 +158,7 @@ def profile(request):
 
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def update_profile(request):
     """Update user profile"""
     serializer = UserProfileSerializer(
@@ -140,25 +184,25 @@ def update_profile(request):
 # Task Views
 @api_view(['POST'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
 def create_task(request):
     """Create a new task (Admin only)"""
     serializer = TaskCreateSerializer(data=request.data, context={'request': request})
     
     if serializer.is_valid():
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=shard_for_user(serializer.validated_data['assigned_to_username'])):
                 task = serializer.save()
                 
-                # Create history entry
-                TaskHistory.objects.create(
-                    task=task,
-                    user=request.user,
-                    action='created',
-                    description=f'Task created and assigned to {task.assigned_to.username}'
+                # Create history entry (in the background, once committed)
+                record_history(
+                    task,
+                    request.user,
+                    'created',
+                    f'Task created and assigned to {task.assigned_to.username}',
+                    log_message=f"Task {task.id} created by {request.user.username}"
                 )
                 
-                logger.info(f"Task {task.id} created by {request.user.username}")
-                
                 return Response({
                     'success': True,
                     'message': 'Task created successfully',
@@ -180,88 +224,85 @@ def create_task(request):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def list_tasks(request):
-    """List tasks with filtering and pagination"""
-    # Base queryset depends on user role
-    if request.user.is_admin():
-        queryset = Task.objects.all()
-    else:
-        queryset = Task.objects.filter(assigned_to=request.user)
+def requested_fields(request, available, expandable):
+    """
+    Parse the ?fields= and ?expand= query parameters against the names an
+    endpoint supports.
     
-    # Apply filters
-    status_filter = request.GET.get('status')
-    if status_filter:
-        queryset = queryset.filter(status=status_filter)
+    Returns (fields, expand, None), where fields is None when not given, or
+    (None, None, error response) for unknown names.
+    """
+    def parse(param):
+        value = request.GET.get(param)
+        if not value:
+            return None
+        return [name.strip() for name in value.split(',') if name.strip()]
     
-    priority_filter = request.GET.get('priority')
-    if priority_filter:
-        queryset = queryset.filter(priority=priority_filter)
+    fields = parse('fields')
+    expand = parse('expand') or []
     
-    # Date filtering
-    due_date_filter = request.GET.get('due_date')
-    if due_date_filter:
-        try:
-            due_date = datetime.strptime(due_date_filter, '%Y-%m-%d').date()
-            queryset = queryset.filter(due_date__date=due_date)
-        except ValueError:
-            return Response({
-                'success': False,
-                'message': 'Invalid date format. Use YYYY-MM-DD'
-            }, status=status.HTTP_400_BAD_REQUEST)
+    errors = {}
+    unknown = [name for name in fields or [] if name not in available]
+    if unknown:
+        errors['fields'] = f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}"
+    unknown = [name for name in expand if name not in expandable]
+    if unknown:
+        errors['expand'] = f"Cannot expand: {', '.join(unknown)}. Expandable: {', '.join(expandable)}"
+    if errors:
+        return None, None, Response({
+            'success': False,
+            'message': 'Invalid fields or expand parameter',
+            'errors': errors
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Date range filtering
-    due_date_from = request.GET.get('due_date_from')
-    due_date_to = request.GET.get('due_date_to')
+    return fields, expand, None
+
+
+def filter_tasks(request, queryset):
+    """
+    Apply the list_tasks query parameters to a task queryset.
     
-    if due_date_from:
-        try:
-            from_date = datetime.strptime(due_date_from, '%Y-%m-%d')
-            queryset = queryset.filter(due_date__gte=from_date)
-        except ValueError:
-            return Response({
-                'success': False,
-                'message': 'Invalid due_date_from format. Use YYYY-MM-DD'
-            }, status=status.HTTP_400_BAD_REQUEST)
+    Returns (queryset, None), or (None, error response) for invalid parameters.
+    """
+    try:
+        return apply_task_filters(queryset, request.GET, is_admin=request.user.is_admin()), None
+    except TaskFilterError as e:
+        return None, Response({
+            'success': False,
+            'message': str(e)
+        }, status=e.status_code)
+
+
+def plan_task_list(request):
+    """
+    Work out the queries behind list_tasks.
     
-    if due_date_to:
-        try:
-            to_date = datetime.strptime(due_date_to, '%Y-%m-%d')
-            to_date = to_date.replace(hour=23, minute=59, second=59)
-            queryset = queryset.filter(due_date__lte=to_date)
-        except ValueError:
-            return Response({
-                'success': False,
-                'message': 'Invalid due_date_to format. Use YYYY-MM-DD'
-            }, status=status.HTTP_400_BAD_REQUEST)
+    Returns (plan, None), or (None, error response) for invalid parameters.
+    The plan holds the page parameters, the requested fields and
+    expansions, and two independent callables, 'count' and 'fetch', that
+    run the count and page queries. 'fetch' returns values() rows for
+    TaskListRowSerializer.
+    """
+    fields, expand, error_response = requested_fields(
+        request, TaskListRowSerializer.output_fields, TaskListRowSerializer.expandable_fields
+    )
+    if error_response is not None:
+        return None, error_response
     
-    # Overdue filter
-    overdue_filter = request.GET.get('overdue')
-    if overdue_filter and overdue_filter.lower() == 'true':
-        queryset = queryset.filter(
-            due_date__lt=timezone.now(),
-            status__in=['not_started', 'in_progress']
-        )
+    include_archived = request.GET.get('include_archived', '').lower() == 'true'
     
-    # Search functionality
-    search = request.GET.get('search')
-    if search:
-        queryset = queryset.filter(
-            Q(title__icontains=search) | Q(description__icontains=search)
-        )
+    # Base queryset depends on user role; the shard is picked below
+    if request.user.is_admin():
+        queryset = Task.objects.all()
+        archived_queryset = ArchivedTask.objects.all()
+    else:
+        queryset = Task.objects.filter(assigned_to=request.user)
+        archived_queryset = ArchivedTask.objects.filter(assigned_to=request.user)
     
-    # Assigned user filter (admin only)
-    assigned_to_filter = request.GET.get('assigned_to')
-    if assigned_to_filter and request.user.is_admin():
-        try:
-            assigned_user = User.objects.get(username=assigned_to_filter)
-            queryset = queryset.filter(assigned_to=assigned_user)
-        except User.DoesNotExist:
-            return Response({
-                'success': False,
-                'message': 'Assigned user not found'
-            }, status=status.HTTP_404_NOT_FOUND)
+    # Apply filters
+    queryset, error_response = filter_tasks(request, queryset)
+    if error_response is not None:
+        return None, error_response
     
     # Sorting
     sort_by = request.GET.get('sort_by', '-created_at')
@@ -270,8 +311,12 @@ def list_tasks(request):
         'status', '-status', 'priority', '-priority',
         'created_at', '-created_at'
     ]
-    if sort_by in valid_sort_fields:
-        queryset = queryset.order_by(sort_by)
+    if sort_by not in valid_sort_fields:
+        sort_by = '-created_at'
+    queryset = queryset.order_by(sort_by, 'id')
+    # Only the requested columns, plus the id and sort key for merging shards and tiers
+    row_fields = TaskListRowSerializer.columns(fields, expand)
+    row_fields += [column for column in ('id', sort_by.lstrip('-')) if column not in row_fields]
     
     # Pagination
     page_size = min(int(request.GET.get('page_size', 20)), 100)  # Max 100 items
@@ -280,40 +325,113 @@ def list_tasks(request):
     start = (page - 1) * page_size
     end = start + page_size
     
-    total_count = queryset.count()
-    tasks = queryset[start:end]
+    if include_archived:
+        archived_queryset, error_response = filter_tasks(request, archived_queryset)
+        if error_response is not None:
+            return None, error_response
+        
+        def count_tasks(using):
+            return queryset.using(using).count() + archived_queryset.using(using).count()
+        
+        def fetch_tasks(using, start, end):
+            return merge_tiers(
+                queryset.using(using), archived_queryset.using(using), sort_by, start, end, fields=row_fields
+            )
+    else:
+        def count_tasks(using):
+            return queryset.using(using).count()
+        
+        def fetch_tasks(using, start, end):
+            return list(queryset.using(using).values(*row_fields)[start:end])
     
-    serializer = TaskListSerializer(tasks, many=True)
+    if request.user.is_admin():
+        # Admins see every shard: query them in parallel and merge
+        def count():
+            return sum(scatter(count_tasks))
+        
+        def fetch():
+            return gather_page(fetch_tasks, sort_by, start, end)
+    else:
+        # A user's tasks all live on their own shard
+        shard = shard_for_user(request.user)
+        
+        def count():
+            return count_tasks(shard)
+        
+        def fetch():
+            return fetch_tasks(shard, start, end)
     
-    return Response({
-        'success': True,
-        'count': total_count,
+    return {
         'page': page,
         'page_size': page_size,
-        'total_pages': (total_count + page_size - 1) // page_size,
-        'tasks': serializer.data
-    })
+        'fields': fields,
+        'expand': expand,
+        'count': count,
+        'fetch': fetch
+    }, None
+
+
+def task_list_response(plan, total_count, tasks_data):
+    """Response body of list_tasks"""
+    return {
+        'success': True,
+        'count': total_count,
+        'page': plan['page'],
+        'page_size': plan['page_size'],
+        'total_pages': (total_count + plan['page_size'] - 1) // plan['page_size'],
+        'tasks': tasks_data
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def list_tasks(request):
+    """List tasks with filtering and pagination"""
+    plan, error_response = plan_task_list(request)
+    if error_response is not None:
+        return error_response
+    
+    total_count = plan['count']()
+    serializer = TaskListRowSerializer(plan['fetch'](), fields=plan['fields'], expand=plan['expand'])
+    
+    return Response(task_list_response(plan, total_count, serializer.data))
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@use_replica
 def get_task(request, task_id):
     """Get a specific task"""
+    fields, expand, error_response = requested_fields(
+        request, TaskSerializer.Meta.fields, TaskSerializer.expandable_fields
+    )
+    if error_response is not None:
+        return error_response
+    
+    include_archived = request.GET.get('include_archived', '').lower() == 'true'
     try:
-        task = Task.objects.get(id=task_id)
+        # Fetch only what the requested fields need
+        def optimize(queryset):
+            return TaskSerializer.optimize(queryset, fields, expand, also=['assigned_to', 'version'])
+        
+        if include_archived:
+            task = get_task_in_any_tier(task_id, prepare=optimize)
+        else:
+            task = optimize(Task.objects.using(shard_for_task(task_id))).get(id=task_id)
         
         # Check permissions
-        if not request.user.is_admin() and task.assigned_to != request.user:
+        if not request.user.is_admin() and task.assigned_to_id != request.user.id:
             return Response({
                 'success': False,
                 'message': 'Permission denied'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        serializer = TaskSerializer(task)
+        serializer = TaskSerializer(task, fields=fields, expand=expand)
         return Response({
             'success': True,
             'task': serializer.data
-        })
+        }, headers={'ETag': task_etag(task)})
     
     except Task.DoesNotExist:
         return Response({
@@ -322,13 +440,259 @@ def get_task(request, task_id):
         }, status=status.HTTP_404_NOT_FOUND)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def get_tasks_batch(request):
+    """
+    Get many tasks by id in one request: ?ids=1,2,3 (up to TASK_BATCH_MAX_IDS).
+    
+    Each id in 'results' maps to the task, or to the 404/403 get_task would
+    have returned for it. Accepts include_archived, fields and expand like
+    get_task.
+    """
+    try:
+        task_ids = list(dict.fromkeys(
+            int(task_id) for task_id in request.GET.get('ids', '').split(',') if task_id.strip()
+        ))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'ids must be a comma-separated list of task ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not task_ids:
+        return Response({
+            'success': False,
+            'message': 'ids is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(task_ids) > settings.TASK_BATCH_MAX_IDS:
+        return Response({
+            'success': False,
+            'message': f'At most {settings.TASK_BATCH_MAX_IDS} ids per request'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    fields, expand, error_response = requested_fields(
+        request, TaskSerializer.Meta.fields, TaskSerializer.expandable_fields
+    )
+    if error_response is not None:
+        return error_response
+    include_archived = request.GET.get('include_archived', '').lower() == 'true'
+    
+    # One query per shard (and tier) holding any of the tasks
+    by_shard = {}
+    for task_id, using in shards_for_tasks(task_ids).items():
+        by_shard.setdefault(using, []).append(task_id)
+    
+    def optimize(queryset):
+        # The assignee for the permission checks below
+        return TaskSerializer.optimize(queryset, fields, expand, also=['assigned_to'])
+    
+    def load(using):
+        ids = by_shard.get(using)
+        if not ids:
+            return []
+        tasks = list(optimize(Task.objects.using(using)).filter(id__in=ids))
+        missing = set(ids) - {task.id for task in tasks}
+        if include_archived and missing:
+            tasks += optimize(ArchivedTask.objects.using(using)).filter(id__in=missing)
+        return tasks
+    
+    tasks = {task.id: task for shard_tasks in scatter(load) for task in shard_tasks}
+    
+    # Same visibility rules as get_task
+    visible = [
+        tasks[task_id] for task_id in task_ids
+        if task_id in tasks and (request.user.is_admin() or tasks[task_id].assigned_to_id == request.user.id)
+    ]
+    context = {}
+    if fields is None or 'history' in fields:
+        context['histories'] = get_tasks_history(visible)
+    if fields is None or 'tags' in fields:
+        context['tags'] = tags_of(visible)
+    data = TaskSerializer(visible, many=True, fields=fields, expand=expand, context=context).data
+    serialized = {task.id: task_data for task, task_data in zip(visible, data)}
+    
+    results = {}
+    for task_id in task_ids:
+        if task_id not in tasks:
+            results[task_id] = {'status': status.HTTP_404_NOT_FOUND, 'message': 'Task not found'}
+        elif task_id not in serialized:
+            results[task_id] = {'status': status.HTTP_403_FORBIDDEN, 'message': 'Permission denied'}
+        else:
+            results[task_id] = {'status': status.HTTP_200_OK, 'task': serialized[task_id]}
+    
+    return Response({
+        'success': True,
+        'count': len(serialized),
+        'results': results
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def get_task_changes(request):
+    """
+    Tasks created, updated or removed from your task list since ?sync_token=
+    (see tasks/changes.py).
+    
+    Without a token, returns one for the current state and no changes: take
+    it before loading the task list, then pass each response's sync_token to
+    the next call. Changed tasks come back as list_tasks rows (fields and
+    expand work as there), tasks no longer in the list as tombstones.
+    """
+    fields, expand, error_response = requested_fields(
+        request, TaskListRowSerializer.output_fields, TaskListRowSerializer.expandable_fields
+    )
+    if error_response is not None:
+        return error_response
+    try:
+        limit = min(int(request.GET.get('limit', 100)), settings.TASK_CHANGES_MAX_LIMIT)
+    except ValueError:
+        limit = 100
+    
+    token = request.GET.get('sync_token')
+    if not token:
+        return Response({
+            'success': True,
+            'sync_token': make_sync_token(request.user, current_cursors(request.user)),
+            'has_more': False,
+            'changes': []
+        })
+    
+    try:
+        cursors = parse_sync_token(request.user, token)
+    except ExpiredSyncToken as e:
+        return Response({
+            'success': False,
+            'message': f'{e}; reload the task list and start again without a sync_token'
+        }, status=status.HTTP_410_GONE)
+    except InvalidSyncToken as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    entries, cursors, has_more = read_changes(request.user, cursors, max(limit, 1))
+    
+    # Each task once, where it last changed
+    task_ids = list(dict.fromkeys(entry['task_id'] for entry in reversed(entries)))[::-1]
+    
+    # Their current state
+    columns = TaskListRowSerializer.columns(fields, expand)
+    columns += [column for column in ('id', 'assigned_to_id') if column not in columns]
+    rows = current_task_rows(task_ids, columns)
+    visible = [
+        rows[task_id] for task_id in task_ids
+        if task_id in rows and (request.user.is_admin() or rows[task_id]['assigned_to_id'] == request.user.id)
+    ]
+    data = dict(zip(
+        [row['id'] for row in visible],
+        TaskListRowSerializer(visible, fields=fields, expand=expand).data
+    ))
+    
+    return Response({
+        'success': True,
+        'sync_token': make_sync_token(request.user, cursors),
+        'has_more': has_more,
+        'changes': [
+            {'id': task_id, 'deleted': False, 'task': data[task_id]} if task_id in data
+            else {'id': task_id, 'deleted': True}
+            for task_id in task_ids
+        ]
+    })
+
+
+def in_task_transaction(view):
+    """
+    Run a task update in one transaction on the task's shard, rolled back if
+    the update fails, so a task reopened from the archive goes back to it.
+    """
+    @wraps(view)
+    def wrapper(request, task_id, *args, **kwargs):
+        try:
+            using = shard_for_task(task_id)
+        except Task.DoesNotExist:
+            return view(request, task_id, *args, **kwargs)
+        with transaction.atomic(using=using):
+            response = view(request, task_id, *args, **kwargs)
+            if response.status_code >= 400:
+                transaction.set_rollback(True, using=using)
+        return response
+    return wrapper
+
+
+def reopen_archived_task(request, task_id):
+    """
+    Move an archived task back to the hot tier when the request reopens it.
+    
+    Returns the restored task, or None if there is nothing to reopen. Only
+    call it from a view wrapped in in_task_transaction.
+    """
+    if request.data.get('status') != 'in_progress':
+        return None
+    try:
+        archived = ArchivedTask.objects.using(shard_for_task(task_id)).filter(id=task_id).first()
+    except Task.DoesNotExist:
+        return None
+    if archived is None:
+        return None
+    if not request.user.is_admin() and archived.assigned_to_id != request.user.id:
+        return None
+    return restore_task(task_id)
+
+
+def task_etag(task):
+    """The ETag of a task: its version, so it changes with every write"""
+    return quote_etag(str(task.version))
+
+
+def check_if_match(request, task, required=True):
+    """
+    Check the request's If-Match against the task's version. Returns an error
+    response (428 without the header, 412 when the task has changed since the
+    client read it) or None if the write can go ahead.
+    """
+    header = request.META.get('HTTP_IF_MATCH')
+    if header is None:
+        if required and settings.TASK_REQUIRE_IF_MATCH:
+            return Response({
+                'success': False,
+                'message': 'If-Match header is required; send the ETag the task was read with'
+            }, status=status.HTTP_428_PRECONDITION_REQUIRED)
+        return None
+    
+    # Weak tags never match: a write needs the exact version
+    etags = parse_etags(header)
+    if etags == ['*'] or task_etag(task) in etags:
+        return None
+    return version_conflict_response(task.version)
+
+
+def version_conflict_response(version):
+    return Response({
+        'success': False,
+        'message': 'Task has been changed by someone else; reload it and try again',
+        'version': version
+    }, status=status.HTTP_412_PRECONDITION_FAILED, headers={'ETag': quote_etag(str(version))})
+
+
+def current_version(task):
+    """The version of the task in the database, after a conflicting write"""
+    return type(task).all_objects.using(task._state.db).filter(id=task.id).values_list('version', flat=True).first()
+
+
 @api_view(['PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
+@idempotent
+@in_task_transaction
 def update_task(request, task_id):
     """Update a task"""
     try:
-        task = Task.objects.get(id=task_id)
+        task = Task.objects.using(shard_for_task(task_id)).get(id=task_id)
     except Task.DoesNotExist:
+        task = reopen_archived_task(request, task_id)
+    if task is None:
         return Response({
             'success': False,
             'message': 'Task not found'
@@ -351,20 +715,41 @@ def update_task(request, task_id):
                 'message': 'Regular users can only update task status'
             }, status=status.HTTP_403_FORBIDDEN)
     
+    error_response = check_if_match(request, task)
+    if error_response is not None:
+        return error_response
+    
     serializer = TaskSerializer(task, data=request.data, partial=True)
     if serializer.is_valid():
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=task._state.db):
                 old_status = task.status
                 updated_task = serializer.save()
                 
+                # Reassigned to a user on another shard: the task follows them
+                new_shard = shard_for_user(updated_task.assigned_to_id)
+                if new_shard is not None and new_shard != updated_task._state.db:
+                    updated_task = move_task(updated_task, new_shard)
+                
                 # Create history entry if status changed
                 if 'status' in request.data and old_status != updated_task.status:
-                    TaskHistory.objects.create(
-                        task=updated_task,
-                        user=request.user,
-                        action='status_changed',
-                        description=f'Status changed from {old_status} to {updated_task.status}'
+                    record_history(
+                        updated_task,
+                        request.user,
+                        'status_changed',
+                        f'Status changed from {old_status} to {updated_task.status}',
+                        using=task._state.db
+                    )
+                
+                added, removed = serializer.tag_changes
+                if added or removed:
+                    changes = [f'+{name}' for name in added] + [f'-{name}' for name in removed]
+                    record_history(
+                        updated_task,
+                        request.user,
+                        'updated',
+                        f"Tags changed: {' '.join(changes)}",
+                        using=task._state.db
                     )
                 
                 logger.info(f"Task {task.id} updated by {request.user.username}")
@@ -373,8 +758,11 @@ def update_task(request, task_id):
                     'success': True,
                     'message': 'Task updated successfully',
                     'task': TaskSerializer(updated_task).data
-                })
+                }, headers={'ETag': task_etag(updated_task)})
         
+        except TaskVersionConflict:
+            # Saved by someone else between reading the task and writing it
+            return version_conflict_response(current_version(task))
         except Exception as e:
             logger.error(f"Error updating task: {e}")
             return Response({
@@ -392,20 +780,28 @@ def update_task(request, task_id):
 
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
 def delete_task(request, task_id):
     """Delete a task (Admin only)"""
     try:
-        task = Task.objects.get(id=task_id)
-        task_title = task.title
-        task.delete()
+        task = get_task_in_any_tier(task_id)
+        # If-Match is optional here: deleting doesn't overwrite anyone's changes
+        error_response = check_if_match(request, task, required=False)
+        if error_response is not None:
+            return error_response
+        expected_version = task.version if 'HTTP_IF_MATCH' in request.META else None
+        job = schedule_task_deletion(task, request.user, version=expected_version)
         
-        logger.info(f"Task {task_id} ({task_title}) deleted by {request.user.username}")
+        logger.info(f"Task {task_id} ({task.title}) deleted by {request.user.username}, purge job {job.id}")
         
         return Response({
             'success': True,
-            'message': 'Task deleted successfully'
-        }, status=status.HTTP_204_NO_CONTENT)
+            'message': 'Task deleted; dependent data is being purged',
+            'job_id': job.id
+        }, status=status.HTTP_202_ACCEPTED)
     
+    except TaskVersionConflict:
+        return version_conflict_response(current_version(task))
     except Task.DoesNotExist:
         return Response({
             'success': False,
@@ -415,11 +811,15 @@ def delete_task(request, task_id):
 
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
+@idempotent
+@in_task_transaction
 def update_task_status(request, task_id):
     """Update task status with validation"""
     try:
-        task = Task.objects.get(id=task_id)
+        task = Task.objects.using(shard_for_task(task_id)).get(id=task_id)
     except Task.DoesNotExist:
+        task = reopen_archived_task(request, task_id)
+    if task is None:
         return Response({
             'success': False,
             'message': 'Task not found'
@@ -432,6 +832,10 @@ def update_task_status(request, task_id):
             'message': 'Permission denied'
         }, status=status.HTTP_403_FORBIDDEN)
     
+    error_response = check_if_match(request, task)
+    if error_response is not None:
+        return error_response
+    
     serializer = TaskStatusUpdateSerializer(
         data=request.data, 
         context={'task': task, 'request': request}
@@ -452,26 +856,27 @@ def update_task_status(request, task_id):
             }, status=status.HTTP_403_FORBIDDEN)
         
         try:
-            with transaction.atomic():
+            with transaction.atomic(using=task._state.db):
                 task.status = new_status
                 task.save()
                 
-                # Create history entry
-                TaskHistory.objects.create(
-                    task=task,
-                    user=request.user,
-                    action='status_changed',
-                    description=f'Status changed from {old_status} to {new_status}'
+                # Create history entry (in the background, once committed)
+                record_history(
+                    task,
+                    request.user,
+                    'status_changed',
+                    f'Status changed from {old_status} to {new_status}',
+                    log_message=f"Task {task.id} status changed from {old_status} to {new_status} by {request.user.username}"
                 )
                 
-                logger.info(f"Task {task.id} status changed from {old_status} to {new_status} by {request.user.username}")
-                
                 return Response({
                     'success': True,
                     'message': f'Task status updated from {old_status} to {new_status}',
                     'task': TaskSerializer(task).data
-                })
+                }, headers={'ETag': task_etag(task)})
         
+        except TaskVersionConflict:
+            return version_conflict_response(current_version(task))
         except Exception as e:
             logger.error(f"Error updating task status: {e}")
             return Response({
@@ -487,99 +892,146 @@ def update_task_status(request, task_id):
     }, status=status.HTTP_400_BAD_REQUEST)
 
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_dashboard(request):
-    """Get dashboard data for the current user"""
-    user = request.user
+def run_queries(queries):
+    """Run a name -> callable mapping of queries one after another"""
+    return {name: query() for name, query in queries.items()}
+
+
+def dashboard_queries(user):
+    """The independent queries behind get_dashboard, as name -> callable"""
+    open_statuses = ['not_started', 'in_progress']
+    
+    # The user's own tasks all live on one shard
+    shard = shard_for_user(user)
+    my_tasks = Task.objects.using(shard).filter(assigned_to=user)
+    my_archived_tasks = ArchivedTask.objects.using(shard).filter(assigned_to=user)
+    
+    queries = {
+        'my_archived': my_archived_tasks.count,
+        'my_total': my_tasks.count,
+        'my_not_started': my_tasks.filter(status='not_started').count,
+        'my_in_progress': my_tasks.filter(status='in_progress').count,
+        'my_completed': my_tasks.filter(status='completed').count,
+        'my_overdue': my_tasks.filter(due_date__lt=timezone.now(), status__in=open_statuses).count,
+    }
     
     if user.is_admin():
-        # Admin dashboard
-        total_tasks = Task.objects.count()
-        my_tasks = Task.objects.filter(assigned_to=user)
-        
-        dashboard_data = {
-            'user_info': {
-                'username': user.username,
-                'role': user.role,
-                'is_admin': True
-            },
-            'overview': {
-                'total_tasks': total_tasks,
-                'my_tasks_count': my_tasks.count(),
-                'overdue_tasks': Task.objects.filter(
-                    due_date__lt=timezone.now(),
-                    status__in=['not_started', 'in_progress']
-                ).count(),
-                'completed_today': Task.objects.filter(
-                    status='completed',
-                    updated_at__date=timezone.now().date()
-                ).count()
-            },
-            'task_distribution': dict(
-                Task.objects.values('status').annotate(
+        def task_distribution():
+            return sum_counts(scatter(lambda using: dict(
+                Task.objects.using(using).values('status').annotate(
                     count=Count('status')
                 ).values_list('status', 'count')
-            ),
-            'recent_tasks': TaskListSerializer(
-                Task.objects.order_by('-created_at')[:5], 
+            )))
+        
+        def recent_tasks():
+            return TaskListSerializer(
+                gather_page(
+                    lambda using, start, end: (
+                        Task.objects.using(using).order_by('-created_at', 'id')[start:end]
+                    ),
+                    '-created_at', 0, 5
+                ),
                 many=True
-            ).data,
-            'my_tasks': {
-                'not_started': my_tasks.filter(status='not_started').count(),
-                'in_progress': my_tasks.filter(status='in_progress').count(),
-                'completed': my_tasks.filter(status='completed').count(),
-                'overdue': my_tasks.filter(
-                    due_date__lt=timezone.now(),
-                    status__in=['not_started', 'in_progress']
-                ).count()
-            }
-        }
+            ).data
+        
+        queries.update({
+            'total': lambda: count_on_shards(Task.objects.all()),
+            'archived': lambda: count_on_shards(ArchivedTask.objects.all()),
+            'overdue': lambda: count_on_shards(
+                Task.objects.filter(due_date__lt=timezone.now(), status__in=open_statuses)
+            ),
+            'completed_today': lambda: count_on_shards(
+                Task.objects.filter(status='completed', updated_at__date=timezone.now().date())
+            ),
+            'task_distribution': task_distribution,
+            'recent_tasks': recent_tasks,
+        })
     else:
-        # Regular user dashboard
-        my_tasks = Task.objects.filter(assigned_to=user)
+        def upcoming_tasks():
+            return TaskListSerializer(
+                my_tasks.filter(
+                    due_date__gte=timezone.now(),
+                    status__in=open_statuses
+                ).order_by('due_date')[:5], 
+                many=True
+            ).data
         
-        dashboard_data = {
+        def recent_completed():
+            recent = list(my_tasks.filter(status='completed').order_by('-updated_at')[:3])
+            if len(recent) < 3:
+                recent += list(my_archived_tasks.order_by('-updated_at')[:3 - len(recent)])
+            return TaskListSerializer(recent, many=True).data
+        
+        queries.update({
+            'upcoming_tasks': upcoming_tasks,
+            'recent_completed': recent_completed,
+        })
+    return queries
+
+
+def build_dashboard(user, results):
+    """Assemble get_dashboard's data from the results of dashboard_queries"""
+    my_tasks = {
+        'not_started': results['my_not_started'],
+        'in_progress': results['my_in_progress'],
+        'completed': results['my_completed'] + results['my_archived'],
+        'overdue': results['my_overdue']
+    }
+    
+    if user.is_admin():
+        # Admin dashboard
+        return {
             'user_info': {
                 'username': user.username,
                 'role': user.role,
-                'is_admin': False
+                'is_admin': True
             },
-            'my_tasks': {
-                'total': my_tasks.count(),
-                'not_started': my_tasks.filter(status='not_started').count(),
-                'in_progress': my_tasks.filter(status='in_progress').count(),
-                'completed': my_tasks.filter(status='completed').count(),
-                'overdue': my_tasks.filter(
-                    due_date__lt=timezone.now(),
-                    status__in=['not_started', 'in_progress']
-                ).count()
+            'overview': {
+                'total_tasks': results['total'] + results['archived'],
+                'my_tasks_count': results['my_total'] + results['my_archived'],
+                'overdue_tasks': results['overdue'],
+                'completed_today': results['completed_today']
             },
-            'upcoming_tasks': TaskListSerializer(
-                my_tasks.filter(
-                    due_date__gte=timezone.now(),
-                    status__in=['not_started', 'in_progress']
-                ).order_by('due_date')[:5], 
-                many=True
-            ).data,
-            'recent_completed': TaskListSerializer(
-                my_tasks.filter(status='completed').order_by('-updated_at')[:3], 
-                many=True
-            ).data
+            'task_distribution': merge_counts(
+                results['task_distribution'],
+                {'completed': results['archived']}
+            ),
+            'recent_tasks': results['recent_tasks'],
+            'my_tasks': my_tasks
         }
     
+    # Regular user dashboard
+    return {
+        'user_info': {
+            'username': user.username,
+            'role': user.role,
+            'is_admin': False
+        },
+        'my_tasks': {'total': results['my_total'] + results['my_archived'], **my_tasks},
+        'upcoming_tasks': results['upcoming_tasks'],
+        'recent_completed': results['recent_completed']
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def get_dashboard(request):
+    """Get dashboard data for the current user"""
+    results = run_queries(dashboard_queries(request.user))
     return Response({
         'success': True,
-        'dashboard': dashboard_data
+        'dashboard': build_dashboard(request.user, results)
     })
 
 
 # Admin Views
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
+@use_replica
 def get_all_users(request):
     """Get all users (Admin only)"""
-    users = User.objects.all()
+    users = User.objects.filter(deleted_at__isnull=True)
     serializer = UserProfileSerializer(users, many=True)
     return Response({
         'success': True,
@@ -587,65 +1039,859 @@ def get_all_users(request):
     })
 
 
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def delete_user(request, user_id):
+    """Delete a user and everything they own (Admin only)"""
+    try:
+        user = User.objects.get(id=user_id, deleted_at__isnull=True)
+    except User.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'User not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if user == request.user:
+        return Response({
+            'success': False,
+            'message': 'You cannot delete your own account'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    job = schedule_user_deletion(user, request.user)
+    
+    logger.info(f"User {user.username} deleted by {request.user.username}, purge job {job.id}")
+    
+    return Response({
+        'success': True,
+        'message': 'User deleted; dependent data is being purged',
+        'job_id': job.id
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsAdminUser])
-def get_task_statistics(request):
-    """Get task statistics (Admin only)"""
-    stats = {
-        'total_tasks': Task.objects.count(),
-        'tasks_by_status': dict(
-            Task.objects.values('status').annotate(count=Count('status')).values_list('status', 'count')
-        ),
-        'tasks_by_priority': dict(
-            Task.objects.values('priority').annotate(count=Count('priority')).values_list('priority', 'count')
-        ),
-        'overdue_tasks': Task.objects.filter(
-            due_date__lt=timezone.now(),
-            status__in=['not_started', 'in_progress']
-        ).count(),
-        'completed_tasks': Task.objects.filter(status='completed').count(),
-        'total_users': User.objects.count(),
-        'admin_users': User.objects.filter(role='admin').count(),
-        'active_users': User.objects.filter(is_active=True).count(),
-    }
+def get_deletion_job(request, job_id):
+    """Get the progress of a background deletion (Admin only)"""
+    try:
+        job = DeletionJob.objects.get(id=job_id)
+    except DeletionJob.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'Deletion job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
     
     return Response({
         'success': True,
-        'statistics': stats
+        'job': DeletionJobSerializer(job).data
     })
 
 
-# Task Comments
 @api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def add_task_comment(request, task_id):
-    """Add a comment to a task"""
-    try:
-        task = Task.objects.get(id=task_id)
-    except Task.DoesNotExist:
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def bulk_update_tasks(request):
+    """
+    Update every task matching the list_tasks filters in the query string
+    (Admin only; see tasks/bulk_update.py).
+    
+    Body: {"patch": {"status", "priority", "assigned_to_username", "due_date"},
+    "dry_run": false, "expected_count": null}. A dry run only counts the
+    tasks; expected_count, if given, must still match the count.
+    """
+    serializer = BulkTaskPatchSerializer(data=request.data.get('patch') or {})
+    if not serializer.is_valid():
         return Response({
             'success': False,
-            'message': 'Task not found'
-        }, status=status.HTTP_404_NOT_FOUND)
+            'message': 'Invalid patch',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
     
-    # Check permissions
-    if not request.user.is_admin() and task.assigned_to != request.user:
+    filters = {name: request.GET[name] for name in FILTER_PARAMS if request.GET.get(name)}
+    patch = serializer.to_patch()
+    try:
+        matched, to_update = count_bulk_update(filters, patch)
+    except TaskFilterError as e:
         return Response({
             'success': False,
-            'message': 'Permission denied'
-        }, status=status.HTTP_403_FORBIDDEN)
+            'message': str(e)
+        }, status=e.status_code)
     
-    serializer = TaskCommentSerializer(data=request.data)
-    if serializer.is_valid():
-        comment = serializer.save(task=task, author=request.user)
+    counts = {
+        'matched': matched,
+        'to_update': to_update,
+        # Already as patched, or in a status that can't change to the new one
+        'skipped': matched - to_update
+    }
+    if request.data.get('dry_run'):
         return Response({
             'success': True,
-            'message': 'Comment added successfully',
-            'comment': TaskCommentSerializer(comment).data
-        }, status=status.HTTP_201_CREATED)
+            'message': f'{to_update} of {matched} matching tasks would be updated',
+            **counts
+        })
+    
+    expected_count = request.data.get('expected_count')
+    if expected_count is not None and expected_count != to_update:
+        return Response({
+            'success': False,
+            'message': f'Expected {expected_count} tasks to update, found {to_update}; run the dry run again',
+            **counts
+        }, status=status.HTTP_409_CONFLICT)
+    
+    job = schedule_bulk_update(filters, patch, request.user, to_update)
+    logger.info(f"Bulk update {job.id} of {to_update} tasks requested by {request.user.username}: {patch}")
+    
+    return Response({
+        'success': True,
+        'message': f'Updating {to_update} tasks in the background',
+        'job_id': job.id,
+        **counts
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_bulk_update_job(request, job_id):
+    """Get the progress of a bulk update (Admin only)"""
+    try:
+        job = BulkUpdateJob.objects.get(id=job_id)
+    except BulkUpdateJob.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'Bulk update job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'job': BulkUpdateJobSerializer(job).data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_background_jobs(request):
+    """Background job queue status, with the latest jobs of every database (Admin only)"""
+    filters = {}
+    
+    status_filter = request.GET.get('status')
+    if status_filter:
+        filters['status'] = status_filter
+    
+    name_filter = request.GET.get('name')
+    if name_filter:
+        filters['name'] = name_filter
+    
+    return Response({
+        'success': True,
+        'summary': job_summary(),
+        'jobs': BackgroundJobSerializer(latest_jobs(50, **filters), many=True).data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_background_job(request, job_id):
+    """Get the status of a background job; ?database= for a shard's job (Admin only)"""
+    database = request.GET.get('database', DEFAULT_DB_ALIAS)
+    if database not in job_databases():
+        return Response({
+            'success': False,
+            'message': f'database must be one of {", ".join(job_databases())}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        job = BackgroundJob.objects.using(database).get(id=job_id)
+    except BackgroundJob.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'Background job not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'success': True,
+        'job': BackgroundJobSerializer(job).data
+    })
+
+
+# Webhooks
+def get_webhook_or_404(webhook_id):
+    """(subscription, None) or (None, 404 response)"""
+    try:
+        return WebhookSubscription.objects.get(id=webhook_id), None
+    except WebhookSubscription.DoesNotExist:
+        return None, Response({
+            'success': False,
+            'message': 'Webhook not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def list_webhooks(request):
+    """List webhook subscriptions (Admin only)"""
+    webhooks = WebhookSubscription.objects.all()
+    return Response({
+        'success': True,
+        'webhooks': WebhookSubscriptionSerializer(webhooks, many=True).data
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def create_webhook(request):
+    """
+    Subscribe an endpoint to task events (Admin only). Body: {"url", "event_types"},
+    optionally "secret"; the secret deliveries are signed with is returned once, here.
+    """
+    serializer = WebhookSubscriptionSerializer(data=request.data)
+    if serializer.is_valid():
+        webhook = serializer.save(created_by=request.user)
+        logger.info(f"Webhook {webhook.id} to {webhook.url} created by {request.user.username}")
+        return Response({
+            'success': True,
+            'message': 'Webhook created successfully',
+            'webhook': WebhookSubscriptionSerializer(webhook).data,
+            'secret': webhook.secret
+        }, status=status.HTTP_201_CREATED)
+    
+    return Response({
+        'success': False,
+        'message': 'Invalid webhook data',
+        'errors': serializer.errors
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_webhook(request, webhook_id):
+    """Get a webhook subscription and its delivery backlog (Admin only)"""
+    webhook, error_response = get_webhook_or_404(webhook_id)
+    if error_response is not None:
+        return error_response
+    
+    return Response({
+        'success': True,
+        'webhook': WebhookSubscriptionSerializer(webhook).data,
+        'pending_events': webhook.pending_events.count(),
+        'dead_letters': webhook.dead_letters.count()
+    })
+
+
+@api_view(['PUT', 'PATCH'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def update_webhook(request, webhook_id):
+    """Change a webhook's URL, event types, secret or is_active (Admin only)"""
+    webhook, error_response = get_webhook_or_404(webhook_id)
+    if error_response is not None:
+        return error_response
+    
+    serializer = WebhookSubscriptionSerializer(webhook, data=request.data, partial=request.method == 'PATCH')
+    if serializer.is_valid():
+        webhook = serializer.save()
+        logger.info(f"Webhook {webhook.id} updated by {request.user.username}")
+        return Response({
+            'success': True,
+            'message': 'Webhook updated successfully',
+            'webhook': WebhookSubscriptionSerializer(webhook).data
+        })
+    
+    return Response({
+        'success': False,
+        'message': 'Invalid webhook data',
+        'errors': serializer.errors
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def delete_webhook(request, webhook_id):
+    """Delete a webhook subscription and its undelivered events (Admin only)"""
+    webhook, error_response = get_webhook_or_404(webhook_id)
+    if error_response is not None:
+        return error_response
+    
+    webhook.delete()
+    logger.info(f"Webhook {webhook_id} deleted by {request.user.username}")
+    
+    return Response({
+        'success': True,
+        'message': 'Webhook deleted successfully'
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_webhook_dead_letters(request, webhook_id):
+    """Events a webhook's endpoint kept failing to accept, newest first (Admin only)"""
+    webhook, error_response = get_webhook_or_404(webhook_id)
+    if error_response is not None:
+        return error_response
+    
+    try:
+        page_size = max(min(int(request.GET.get('page_size', 20)), 100), 1)
+    except ValueError:
+        page_size = 20
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    start = (page - 1) * page_size
+    letters = list(webhook.dead_letters.all()[start:start + page_size + 1])
+    
+    return Response({
+        'success': True,
+        'page': page,
+        'page_size': page_size,
+        'has_next': len(letters) > page_size,
+        'dead_letters': WebhookDeadLetterSerializer(letters[:page_size], many=True).data
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def redeliver_webhook_dead_letters(request, webhook_id):
+    """Queue a webhook's dead letters (those in "ids", or all) for delivery again (Admin only)"""
+    webhook, error_response = get_webhook_or_404(webhook_id)
+    if error_response is not None:
+        return error_response
+    
+    ids = request.data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+        return Response({
+            'success': False,
+            'message': 'ids must be a list of dead letter ids'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    requeued = redeliver_dead_letters(webhook, ids)
+    logger.info(f"{requeued} dead letters of webhook {webhook.id} requeued by {request.user.username}")
+    
+    return Response({
+        'success': True,
+        'message': f'{requeued} events queued for delivery',
+        'requeued': requeued
+    })
+
+
+def get_recurrence_or_404(rule_id):
+    """(rule, None) or (None, 404 response)"""
+    try:
+        return RecurrenceRule.objects.get(id=rule_id), None
+    except RecurrenceRule.DoesNotExist:
+        return None, Response({
+            'success': False,
+            'message': 'Recurrence rule not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def list_recurrences(request):
+    """List recurrence rules, newest first; ?active=true|false filters them (Admin only)"""
+    rules = RecurrenceRule.objects.all()
+    active = request.GET.get('active')
+    if active is not None:
+        rules = rules.filter(is_active=active.lower() == 'true')
+    
+    try:
+        page_size = max(min(int(request.GET.get('page_size', 20)), 100), 1)
+    except ValueError:
+        page_size = 20
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    start = (page - 1) * page_size
+    rules = list(rules[start:start + page_size + 1])
+    
+    return Response({
+        'success': True,
+        'page': page,
+        'page_size': page_size,
+        'has_next': len(rules) > page_size,
+        'recurrences': RecurrenceRuleSerializer(rules[:page_size], many=True).data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+def get_recurrence(request, rule_id):
+    """Get a recurrence rule (Admin only)"""
+    rule, error_response = get_recurrence_or_404(rule_id)
+    if error_response is not None:
+        return error_response
+    
+    return Response({
+        'success': True,
+        'recurrence': RecurrenceRuleSerializer(rule).data
+    })
+
+
+@api_view(['PUT', 'PATCH'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def update_recurrence(request, rule_id):
+    """
+    Change a recurrence rule's title, description, priority, until, count or
+    is_active (Admin only). Occurrences already made are left as they are.
+    """
+    rule, error_response = get_recurrence_or_404(rule_id)
+    if error_response is not None:
+        return error_response
+    
+    serializer = RecurrenceRuleSerializer(rule, data=request.data, partial=request.method == 'PATCH')
+    if serializer.is_valid():
+        rule = serializer.save()
+        if rule.is_active:
+            schedule_materialization()
+        logger.info(f"Recurrence rule {rule.id} updated by {request.user.username}")
+        return Response({
+            'success': True,
+            'message': 'Recurrence rule updated successfully',
+            'recurrence': RecurrenceRuleSerializer(rule).data
+        })
+    
+    return Response({
+        'success': False,
+        'message': 'Invalid recurrence rule data',
+        'errors': serializer.errors
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def delete_recurrence(request, rule_id):
+    """Delete a recurrence rule; the occurrences already made are kept (Admin only)"""
+    rule, error_response = get_recurrence_or_404(rule_id)
+    if error_response is not None:
+        return error_response
+    
+    rule.delete()
+    logger.info(f"Recurrence rule {rule_id} deleted by {request.user.username}")
+    
+    return Response({
+        'success': True,
+        'message': 'Recurrence rule deleted successfully'
+    })
+
+
+def statistics_queries():
+    """The independent queries behind get_task_statistics, as name -> callable"""
+    def counts_by(model, field):
+        # Added up across shards
+        return lambda: sum_counts(scatter(lambda using: dict(
+            model.objects.using(using).values(field).annotate(count=Count(field)).values_list(field, 'count')
+        )))
+    
+    return {
+        'total': lambda: count_on_shards(Task.objects.all()),
+        'archived': lambda: count_on_shards(ArchivedTask.objects.all()),
+        'by_status': counts_by(Task, 'status'),
+        'by_priority': counts_by(Task, 'priority'),
+        'archived_by_priority': counts_by(ArchivedTask, 'priority'),
+        'by_tag': lambda: tag_counts(Task),
+        'archived_by_tag': lambda: tag_counts(ArchivedTask),
+        'overdue': lambda: count_on_shards(Task.objects.filter(
+            due_date__lt=timezone.now(),
+            status__in=['not_started', 'in_progress']
+        )),
+        'completed': lambda: count_on_shards(Task.objects.filter(status='completed')),
+        # Users live on the primary
+        'total_users': User.objects.filter(deleted_at__isnull=True).count,
+        'admin_users': User.objects.filter(role='admin', deleted_at__isnull=True).count,
+        'active_users': User.objects.filter(is_active=True).count,
+    }
+
+
+def build_statistics(results):
+    """Assemble get_task_statistics' data from the results of statistics_queries"""
+    return {
+        'total_tasks': results['total'] + results['archived'],
+        'tasks_by_status': merge_counts(results['by_status'], {'completed': results['archived']}),
+        'tasks_by_priority': merge_counts(results['by_priority'], results['archived_by_priority']),
+        'tasks_by_tag': merge_counts(results['by_tag'], results['archived_by_tag']),
+        'overdue_tasks': results['overdue'],
+        'completed_tasks': results['completed'] + results['archived'],
+        'total_users': results['total_users'],
+        'admin_users': results['admin_users'],
+        'active_users': results['active_users'],
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@use_replica
+def get_task_statistics(request):
+    """Get task statistics (Admin only)"""
+    stats = build_statistics(run_queries(statistics_queries()))
+    
+    return Response({
+        'success': True,
+        'statistics': stats
+    })
+
+
+# Task Comments
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def add_task_comment(request, task_id):
+    """Add a comment to a task; commenting on an archived task moves it back to the hot tier"""
+    try:
+        task = get_task_in_any_tier(task_id)
+    except Task.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'Task not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Check permissions
+    if not request.user.is_admin() and task.assigned_to != request.user:
+        return Response({
+            'success': False,
+            'message': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = TaskCommentSerializer(data=request.data)
+    if serializer.is_valid():
+        if isinstance(task, ArchivedTask):
+            # The archive tier is read-only; the next archive run moves the task back, comment and all
+            task = restore_task(task_id)
+        comment = serializer.save(task=task, author=request.user)
+        return Response({
+            'success': True,
+            'message': 'Comment added successfully',
+            'comment': TaskCommentSerializer(comment).data
+        }, status=status.HTTP_201_CREATED)
     
     return Response({
         'success': False,
         'message': 'Invalid comment data',
         'errors': serializer.errors
-    }, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def get_task_history(request, task_id):
+    """Get paginated task history, including archived entries"""
+    try:
+        task = get_task_in_any_tier(task_id)
+    except Task.DoesNotExist:
+        return Response({
+            'success': False,
+            'message': 'Task not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    # Check permissions
+    if not request.user.is_admin() and task.assigned_to != request.user:
+        return Response({
+            'success': False,
+            'message': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    
+    # Pagination
+    try:
+        page_size = max(min(int(request.GET.get('page_size', 20)), 100), 1)  # Max 100 items
+    except ValueError:
+        page_size = 20
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    
+    start = (page - 1) * page_size
+    end = start + page_size
+    
+    # Fetch one extra entry to know whether another page exists
+    entries = get_full_task_history(task, limit=end + 1)
+    
+    return Response({
+        'success': True,
+        'page': page,
+        'page_size': page_size,
+        'has_next': len(entries) > end,
+        'history': entries[start:end]
+    })
+
+
+# Subtasks and blockers
+def get_visible_task_or_error(request, task_id):
+    """(task, None), or (None, the 404/403 response get_task gives for it)"""
+    try:
+        task = Task.objects.using(shard_for_task(task_id)).get(id=task_id)
+    except Task.DoesNotExist:
+        return None, Response({
+            'success': False,
+            'message': 'Task not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if not request.user.is_admin() and task.assigned_to_id != request.user.id:
+        return None, Response({
+            'success': False,
+            'message': 'Permission denied'
+        }, status=status.HTTP_403_FORBIDDEN)
+    return task, None
+
+
+def visible_task_rows(request, rows):
+    """List rows of the tasks the user may see"""
+    if request.user.is_admin():
+        return rows
+    return [row for row in rows if row['assigned_to_id'] == request.user.id]
+
+
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def set_task_parent(request, task_id):
+    """Make a task a subtask of {"parent_id": id}, or top-level with null (Admin only)"""
+    task, error_response = get_visible_task_or_error(request, task_id)
+    if error_response is not None:
+        return error_response
+    
+    serializer = TaskParentSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Invalid parent data',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    parent_id = serializer.validated_data['parent_id']
+    try:
+        previous_id = set_parent(task.id, parent_id)
+    except HierarchyError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if previous_id != parent_id:
+        record_history(
+            task,
+            request.user,
+            'updated',
+            f'Made a subtask of task {parent_id}' if parent_id is not None else 'Made a top-level task',
+            log_message=f"Task {task.id} moved under {parent_id} by {request.user.username}"
+        )
+    
+    return Response({
+        'success': True,
+        'message': 'Task parent updated successfully',
+        'task_id': task.id,
+        'parent_id': parent_id,
+        'previous_parent_id': previous_id
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def get_task_subtasks(request, task_id):
+    """
+    A task's subtasks at every level (?depth=1: its children only) and the
+    share of them completed, from the subtask closure table.
+    """
+    task, error_response = get_visible_task_or_error(request, task_id)
+    if error_response is not None:
+        return error_response
+    
+    try:
+        depth = request.GET.get('depth')
+        depth = int(depth) if depth else None
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'depth must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    columns = TaskListRowSerializer.columns()
+    rows = visible_task_rows(request, subtask_rows(task.id, columns, max_depth=depth))
+    
+    return Response({
+        'success': True,
+        'task_id': task.id,
+        'parent_id': parent_id_of(task.id),
+        'progress': subtask_progress(task.id),
+        'subtasks': TaskListRowSerializer(rows).data
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@use_replica
+def get_task_blockers(request, task_id):
+    """The tasks blocking a task, directly or through others, and whether any is still open"""
+    task, error_response = get_visible_task_or_error(request, task_id)
+    if error_response is not None:
+        return error_response
+    
+    rows = blocker_rows(task.id, TaskListRowSerializer.columns())
+    
+    return Response({
+        'success': True,
+        'task_id': task.id,
+        'blocked': any(row['status'] in Task.OPEN_STATUSES for row in rows),
+        'direct_blocker_ids': direct_blocker_ids(task.id),
+        'blockers': TaskListRowSerializer(visible_task_rows(request, rows)).data
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def add_task_blocker(request, task_id):
+    """Make a task blocked by {"blocked_by": id} (Admin only)"""
+    task, error_response = get_visible_task_or_error(request, task_id)
+    if error_response is not None:
+        return error_response
+    
+    serializer = TaskBlockerSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response({
+            'success': False,
+            'message': 'Invalid blocker data',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    blocker_id = serializer.validated_data['blocked_by']
+    try:
+        added = add_blocker(task.id, blocker_id)
+    except HierarchyError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    if added:
+        record_history(
+            task,
+            request.user,
+            'updated',
+            f'Blocked by task {blocker_id}',
+            log_message=f"Task {task.id} blocked by {blocker_id} by {request.user.username}"
+        )
+    
+    return Response({
+        'success': True,
+        'message': 'Blocker added' if added else 'Task was already blocked by this task',
+        'direct_blocker_ids': direct_blocker_ids(task.id)
+    }, status=status.HTTP_201_CREATED if added else status.HTTP_200_OK)
+
+
+@api_view(['DELETE'])
+@permission_classes([IsAuthenticated, IsAdminUser])
+@idempotent
+def remove_task_blocker(request, task_id, blocker_id):
+    """Make a task no longer blocked by a task it was linked to (Admin only)"""
+    task, error_response = get_visible_task_or_error(request, task_id)
+    if error_response is not None:
+        return error_response
+    
+    if not remove_blocker(task.id, blocker_id):
+        return Response({
+            'success': False,
+            'message': 'Task is not blocked by this task'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    record_history(
+        task,
+        request.user,
+        'updated',
+        f'No longer blocked by task {blocker_id}',
+        log_message=f"Task {task.id} unblocked from {blocker_id} by {request.user.username}"
+    )
+    
+    return Response({
+        'success': True,
+        'message': 'Blocker removed',
+        'direct_blocker_ids': direct_blocker_ids(task.id)
+    })
+
+
+# Activity Feed
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_activity_feed(request):
+    """
+    Your activity feed, newest first (see tasks/activity.py): what happened
+    to the tasks you are assigned, created or commented on. Pass a page's
+    next_cursor as ?before= for the page after it.
+    """
+    try:
+        limit = min(int(request.GET.get('limit', 20)), settings.ACTIVITY_FEED_MAX_LIMIT)
+        before = request.GET.get('before')
+        before = int(before) if before else None
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'limit and before must be integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    entries, has_more = read_feed(request.user, before=before, limit=max(limit, 1))
+    last_read_id, unread = unread_count(request.user)
+    
+    return Response({
+        'success': True,
+        'unread_count': unread,
+        'last_read_id': last_read_id,
+        'next_cursor': entries[-1].id if has_more else None,
+        'entries': ActivityEntrySerializer(entries, many=True, context={'last_read_id': last_read_id}).data
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_activity_read(request):
+    """Mark your activity feed read, up to entry id 'up_to' or all of it"""
+    up_to = request.data.get('up_to')
+    if up_to is not None and (not isinstance(up_to, int) or isinstance(up_to, bool)):
+        return Response({
+            'success': False,
+            'message': 'up_to must be an entry id'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    last_read_id = mark_feed_read(request.user, up_to)
+    _, unread = unread_count(request.user)
+    
+    return Response({
+        'success': True,
+        'message': 'Activity marked as read',
+        'last_read_id': last_read_id,
+        'unread_count': unread
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def batch(request):
+    """
+    Run many API requests in one round trip (see tasks/batch.py).
+    
+    Body: {"requests": [{"method", "path", "body", "headers"}, ...], "atomic": false}.
+    Each sub-request's status code, headers and body come back in 'results', in order.
+    """
+    try:
+        sub_requests = parse_sub_requests(request.data)
+    except BatchError as e:
+        return Response({
+            'success': False,
+            'message': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    atomic = request.data.get('atomic') is True
+    results, rolled_back = run_batch(request, sub_requests, atomic=atomic)
+    
+    return Response({
+        'success': not rolled_back,
+        'message': 'Batch rolled back' if rolled_back else 'Batch completed',
+        'atomic': atomic,
+        'results': results
+    })
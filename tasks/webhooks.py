@@ -0,0 +1,374 @@
+"""
+Outbound webhooks: task events POSTed to subscribed endpoints.
+
+Admins register a ``WebhookSubscription`` (an URL and the event types it
+wants: task.created, task.updated, task.status_changed, task.deleted,
+comment.added, and task.due_soon from the reminder scheduler). Nothing is sent from the request that made a change:
+
+1. The change feed's writer (tasks/changes.py) and the comment signal call
+   ``publish_task_events`` / ``publish_comment_event``, which enqueue a
+   background job once the write commits, if anyone subscribes to the event.
+2. That job takes a snapshot of each task (as a task list row) and puts the
+   event into the outbox, a ``WebhookEvent`` row per subscription.
+3. The dispatcher job POSTs each endpoint's due events as one batch of up to
+   ``WEBHOOK_BATCH_SIZE``, over a kept-alive connection per endpoint host and
+   worker thread.
+
+Deliveries look like::
+
+    POST <url>
+    X-Webhook-Id: <delivery id>
+    X-Webhook-Timestamp: <unix time>
+    X-Webhook-Signature: sha256=<hex HMAC-SHA256 of "<timestamp>.<body>" keyed with the secret>
+
+    {"delivery_id": "...", "events": [{"id": "...", "type": "task.updated", "occurred_at": "...", "data": {...}}]}
+
+A 2xx response removes the events from the outbox. Anything else, or no
+response within ``WEBHOOK_TIMEOUT_SECONDS``, is retried with exponential
+backoff (``WEBHOOK_RETRY_BACKOFF_SECONDS``, doubling, at most
+``WEBHOOK_RETRY_MAX_DELAY_SECONDS``); after ``WEBHOOK_MAX_ATTEMPTS`` the event
+moves to ``WebhookDeadLetter``, from where an admin can redeliver it.
+Delivery is at least once: receivers should ignore event ids they have seen.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .jobs import enqueue, job_handler
+from .models import BackgroundJob, WebhookDeadLetter, WebhookEvent, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+# Change feed actions that are webhook events
+TASK_EVENT_TYPES = {
+    'created': 'task.created',
+    'updated': 'task.updated',
+    'status_changed': 'task.status_changed',
+    'deleted': 'task.deleted',
+}
+
+USER_AGENT = 'TaskManagementSystem-Webhooks/1.0'
+
+# How long a process trusts its list of subscribed event types; saving a
+# subscription refreshes it in that process at once
+SUBSCRIPTIONS_CACHE_SECONDS = 5
+
+_subscribed = {'types': frozenset(), 'loaded_at': None}
+_subscribed_lock = threading.Lock()
+
+# Kept-alive connections of this thread, by (scheme, host, port)
+_local = threading.local()
+
+
+def _subscriptions():
+    return WebhookSubscription.objects.using(DEFAULT_DB_ALIAS)
+
+
+def _outbox():
+    return WebhookEvent.objects.using(DEFAULT_DB_ALIAS)
+
+
+def subscribed_event_types():
+    """Event types some active subscription wants"""
+    with _subscribed_lock:
+        loaded_at = _subscribed['loaded_at']
+        if loaded_at is not None and time.monotonic() - loaded_at < SUBSCRIPTIONS_CACHE_SECONDS:
+            return _subscribed['types']
+    types = frozenset(
+        event_type
+        for event_types in _subscriptions().filter(is_active=True).values_list('event_types', flat=True)
+        for event_type in event_types
+    )
+    with _subscribed_lock:
+        _subscribed.update(types=types, loaded_at=time.monotonic())
+    return types
+
+
+def forget_subscriptions():
+    """Have subscribed_event_types reload, e.g. after a subscription changed"""
+    with _subscribed_lock:
+        _subscribed['loaded_at'] = None
+
+
+def _publish(events, using):
+    wanted = subscribed_event_types()
+    events = [event for event in events if event['type'] in wanted]
+    if events:
+        enqueue('queue_webhook_events', {'events': events}, using=using)
+
+
+def _event(event_type, **data):
+    return {'id': uuid.uuid4().hex, 'type': event_type, 'occurred_at': timezone.now().isoformat(), **data}
+
+
+def publish_task_events(action, task_ids, using=None):
+    """Publish the webhook events for a change feed action on tasks, once the transaction on `using` commits"""
+    if action in TASK_EVENT_TYPES:
+        _publish([_event(TASK_EVENT_TYPES[action], task_id=task_id) for task_id in task_ids], using)
+
+
+def publish_due_soon_events(task_ids, using=None):
+    """Publish task.due_soon for tasks whose due-date reminder is being sent"""
+    _publish([_event('task.due_soon', task_id=task_id) for task_id in task_ids], using)
+
+
+def publish_comment_event(comment, using=None):
+    """Publish comment.added for a new comment"""
+    _publish([_event(
+        'comment.added',
+        task_id=comment.task_id,
+        comment={
+            'id': comment.id,
+            'author_id': comment.author_id,
+            'content': comment.content,
+            'created_at': comment.created_at.isoformat(),
+        }
+    )], using)
+
+
+@job_handler('queue_webhook_events', batch_size=100)
+def queue_webhook_events(payloads):
+    """Put published events into the outbox of each subscription that wants them"""
+    from .changes import current_task_rows
+    from .serializers import TaskListRowSerializer
+
+    events = [event for payload in payloads for event in payload['events']]
+    subscriptions = list(_subscriptions().filter(is_active=True))
+
+    # The tasks as they are now, as task list rows
+    columns = TaskListRowSerializer.columns()
+    columns += [column for column in ('id', 'assigned_to_id') if column not in columns]
+    rows = current_task_rows({event['task_id'] for event in events}, columns)
+    tasks = dict(zip(rows, TaskListRowSerializer(list(rows.values())).data))
+
+    outbox = []
+    for event in events:
+        data = {'task_id': event['task_id']}
+        if event['type'] != 'task.deleted':
+            data['task'] = tasks.get(event['task_id'])
+        if 'comment' in event:
+            data['comment'] = event['comment']
+        payload = {'id': event['id'], 'type': event['type'], 'occurred_at': event['occurred_at'], 'data': data}
+        outbox += [
+            WebhookEvent(
+                subscription=subscription,
+                event_id=event['id'],
+                event_type=event['type'],
+                payload=payload,
+            )
+            for subscription in subscriptions if event['type'] in subscription.event_types
+        ]
+    # All or nothing, so the batch can run again if it fails
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        _outbox().bulk_create(outbox)
+        if outbox:
+            schedule_dispatch()
+
+
+def schedule_dispatch(delay=0):
+    """Have a worker deliver due events, unless one is already going to"""
+    pending = BackgroundJob.objects.using(DEFAULT_DB_ALIAS).filter(name='dispatch_webhooks', status='pending')
+    if not pending.filter(run_after__lte=timezone.now() + timedelta(seconds=delay)).exists():
+        enqueue('dispatch_webhooks', {}, delay=delay)
+
+
+def sign(secret, timestamp, body):
+    return hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+
+
+def _connection(url):
+    """A kept-alive connection to the URL's host, made by this thread"""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.hostname, parts.port)
+    pool = _local.__dict__.setdefault('connections', {})
+    connection = pool.get(key)
+    if connection is None:
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.hostname, parts.port, timeout=settings.WEBHOOK_TIMEOUT_SECONDS)
+        pool[key] = connection
+    return key, connection
+
+
+def _drop_connection(key):
+    connection = _local.__dict__.get('connections', {}).pop(key, None)
+    if connection is not None:
+        connection.close()
+
+
+def post(url, body, headers):
+    """POST body to url; returns the response status. Raises OSError or http.client.HTTPException."""
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += f'?{parts.query}'
+    for attempt in range(2):
+        key, connection = _connection(url)
+        reused = connection.sock is not None
+        try:
+            connection.request('POST', path, body=body, headers=headers)
+            response = connection.getresponse()
+            # Read it all, so the connection can carry the next request
+            response.read()
+        except (OSError, http.client.HTTPException):
+            _drop_connection(key)
+            # The server may have closed an idle kept-alive connection; try a new one once
+            if reused and attempt == 0:
+                continue
+            raise
+        if response.will_close:
+            _drop_connection(key)
+        return response.status
+
+
+def deliver(subscription, events):
+    """POST a batch of outbox events to their subscription. Returns None if accepted, else the error."""
+    delivery_id = uuid.uuid4().hex
+    body = json.dumps(
+        {'delivery_id': delivery_id, 'events': [event.payload for event in events]},
+        cls=DjangoJSONEncoder
+    ).encode()
+    timestamp = str(int(time.time()))
+    headers = {
+        'Content-Type': 'application/json',
+        'User-Agent': USER_AGENT,
+        'X-Webhook-Id': delivery_id,
+        'X-Webhook-Timestamp': timestamp,
+        'X-Webhook-Signature': f'sha256={sign(subscription.secret, timestamp, body)}',
+    }
+    try:
+        status_code = post(subscription.url, body, headers)
+    except (OSError, http.client.HTTPException) as e:
+        return f'{type(e).__name__}: {e}'
+    if 200 <= status_code < 300:
+        return None
+    return f'HTTP {status_code}'
+
+
+def retry_delay(attempts):
+    """Seconds to wait after a delivery's `attempts`-th failure"""
+    delay = settings.WEBHOOK_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1)
+    return min(delay, settings.WEBHOOK_RETRY_MAX_DELAY_SECONDS)
+
+
+def _failed(subscription, events, error, now):
+    """Schedule failed events for another attempt, or move them to the dead letters"""
+    retry, dead = [], []
+    for event in events:
+        event.attempts += 1
+        event.last_error = error
+        event.claimed_by = ''
+        if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            dead.append(event)
+        else:
+            event.next_attempt_at = now + timedelta(seconds=retry_delay(event.attempts))
+            retry.append(event)
+
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        _outbox().bulk_update(retry, ['attempts', 'last_error', 'claimed_by', 'next_attempt_at'])
+        WebhookDeadLetter.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+            WebhookDeadLetter(
+                subscription_id=event.subscription_id,
+                event_id=event.event_id,
+                event_type=event.event_type,
+                payload=event.payload,
+                created_at=event.created_at,
+                attempts=event.attempts,
+                last_error=error,
+            )
+            for event in dead
+        ])
+        _outbox().filter(id__in=[event.id for event in dead]).delete()
+    _subscriptions().filter(id=subscription.id).update(last_failure_at=now, last_error=error)
+    if dead:
+        logger.error(f"Webhook {subscription.url}: {len(dead)} events dead-lettered after {settings.WEBHOOK_MAX_ATTEMPTS} attempts: {error}")
+    else:
+        logger.warning(f"Webhook {subscription.url}: delivery of {len(events)} events failed, retrying: {error}")
+
+
+def _claim(subscription_id, now):
+    """Claim the subscription's next batch of due events; [] if none are left"""
+    due = _outbox().filter(subscription_id=subscription_id, claimed_by='', next_attempt_at__lte=now)
+    ids = list(due.order_by('id').values_list('id', flat=True)[:settings.WEBHOOK_BATCH_SIZE])
+    token = uuid.uuid4().hex
+    if ids:
+        # Still due: another dispatcher may have tried them since, and scheduled a retry
+        due.filter(id__in=ids).update(claimed_by=token, claimed_at=now)
+    return list(_outbox().filter(claimed_by=token).order_by('id'))
+
+
+def dispatch_due():
+    """Deliver every due outbox event, batched per subscription. Returns the number delivered."""
+    now = timezone.now()
+    # Events claimed by a dispatcher that died
+    stale = now - timedelta(seconds=settings.WEBHOOK_TIMEOUT_SECONDS * 3)
+    _outbox().exclude(claimed_by='').filter(claimed_at__lt=stale).update(claimed_by='')
+
+    subscriptions = _subscriptions().filter(
+        is_active=True,
+        id__in=_outbox().filter(claimed_by='', next_attempt_at__lte=now).values('subscription_id'),
+    )
+    delivered = 0
+    for subscription in subscriptions:
+        while True:
+            events = _claim(subscription.id, now)
+            if not events:
+                break
+            error = deliver(subscription, events)
+            if error is not None:
+                _failed(subscription, events, error, timezone.now())
+                # Leave the endpoint alone until its retries are due
+                break
+            _outbox().filter(id__in=[event.id for event in events]).delete()
+            _subscriptions().filter(id=subscription.id).update(last_success_at=timezone.now())
+            delivered += len(events)
+    if delivered:
+        logger.info(f"Delivered {delivered} webhook events")
+    return delivered
+
+
+@job_handler('dispatch_webhooks', batch_size=100)
+def dispatch_webhooks(payloads):
+    """Background job: deliver due webhook events, and come back when the next retry is due"""
+    dispatch_due()
+    next_attempt_at = (
+        _outbox().filter(claimed_by='', subscription__is_active=True)
+        .aggregate(next=Min('next_attempt_at'))['next']
+    )
+    if next_attempt_at is not None:
+        schedule_dispatch(delay=max((next_attempt_at - timezone.now()).total_seconds(), 0))
+
+
+def redeliver_dead_letters(subscription, ids=None):
+    """Move a subscription's dead letters (those in `ids`, or all) back to the outbox. Returns how many."""
+    with transaction.atomic(using=DEFAULT_DB_ALIAS):
+        dead = WebhookDeadLetter.objects.using(DEFAULT_DB_ALIAS).filter(subscription=subscription)
+        if ids is not None:
+            dead = dead.filter(id__in=ids)
+        dead = list(dead.select_for_update())
+        _outbox().bulk_create([
+            WebhookEvent(
+                subscription=subscription,
+                event_id=letter.event_id,
+                event_type=letter.event_type,
+                payload=letter.payload,
+                created_at=letter.created_at,
+            )
+            for letter in dead
+        ])
+        WebhookDeadLetter.objects.using(DEFAULT_DB_ALIAS).filter(id__in=[letter.id for letter in dead]).delete()
+        if dead:
+            transaction.on_commit(schedule_dispatch, using=DEFAULT_DB_ALIAS)
+    return len(dead)